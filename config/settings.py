@@ -15,19 +15,50 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 IMAGE_DIR = os.path.join(BASE_DIR, "data", "images", "raw")
 PROCESSED_IMAGE_DIR = os.path.join(BASE_DIR, "data", "images", "processed")
 METADATA_PATH = os.path.join(BASE_DIR, "data", "metadata.csv")
+METADATA_STORE_DIR = os.path.join(BASE_DIR, "data", "metadata")
+METADATA_SNAPSHOT_PATH = os.path.join(BASE_DIR, "data", "metadata.arrow")
 EMBEDDING_PATH = os.path.join(BASE_DIR, "data", "embeddings.json")
 OCR_PATH = os.path.join(BASE_DIR, "data", "ocr_results.json")
+TAGS_PATH = os.path.join(BASE_DIR, "data", "tags.json")
+CHECKPOINT_DIR = os.path.join(BASE_DIR, "data", "checkpoints")
+WATCH_STATE_PATH = os.path.join(BASE_DIR, "data", "watch_state.json")
+ANN_INDEX_PATH = os.path.join(BASE_DIR, "data", "embeddings.ivf.npz")
+CLUSTER_PATH = os.path.join(BASE_DIR, "data", "clusters.npz")
+EMBEDDING_RAW_PATH = os.path.join(BASE_DIR, "data", "embeddings.f32")
+EMBEDDING_SEGMENT_DIR = os.path.join(BASE_DIR, "data", "embeddings")
+EMBEDDING_VERSIONS_PATH = os.path.join(BASE_DIR, "data", "embedding_versions.json")
+CAPTION_CACHE_DIR = os.path.join(BASE_DIR, "data", "caption_cache")
+SERVING_INDEX_DIR = os.path.join(BASE_DIR, "data", "serving")
+TAG_FEATURES_PATH = os.path.join(BASE_DIR, "data", "tag_features.npz")
+JOB_QUEUE_PATH = os.path.join(BASE_DIR, "data", "jobs.db")
 
 # Configuration des modèles IA
 MODEL_CACHE_DIR = os.path.join(BASE_DIR, "models", "cache")
 CLIP_MODEL = "ViT-B/32"
-EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+# Modèle des légendes: un changement de modèle se fait par ré-encodage en
+# arrière-plan (python -m scripts.model_versions reembed), l'ancien reste servi d'ici là
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+REEMBED_RATE = float(os.getenv("REEMBED_RATE", 50))  # légendes par seconde (0: sans limite)
+REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", 64))
+
+# Tags zero-shot: taxonomie {catégorie: [tags]}, catégories puis tags retenus par seuil
+TAG_TAXONOMY_PATH = os.getenv("TAG_TAXONOMY_PATH", os.path.join(BASE_DIR, "config", "tag_taxonomy.json"))
+TAG_THRESHOLD = float(os.getenv("TAG_THRESHOLD", 0.1))
+TAG_PARENT_THRESHOLD = float(os.getenv("TAG_PARENT_THRESHOLD", 0.1))
+TAG_MAX_PARENTS = int(os.getenv("TAG_MAX_PARENTS", 3))
+TAG_MAX_TAGS = int(os.getenv("TAG_MAX_TAGS", 10))
 
 # Configuration OCR
 TESSERACT_PATH = os.getenv(
     "TESSERACT_PATH", r"C:\Program Files\Tesseract-OCR\tesseract.exe"
 )
 OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "fra+eng")
+# Moteur OCR: pytesseract (un processus tesseract par image) ou tesserocr (API en mémoire)
+OCR_ENGINE = os.getenv("OCR_ENGINE", "pytesseract")
+TESSDATA_PATH = os.getenv("TESSDATA_PREFIX", "")
+# Détection de texte avant Tesseract: off, edges (densité de traits) ou clip (tags)
+OCR_GATE = os.getenv("OCR_GATE", "off")
+OCR_GATE_EDGE_THRESHOLD = float(os.getenv("OCR_GATE_EDGE_THRESHOLD", 0.005))
 
 # Configuration de la base de données
 DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -42,6 +73,115 @@ MAX_IMAGE_SIZE = (1920, 1080)
 IMAGE_QUALITY = 85
 SIMILARITY_THRESHOLD = 0.85
 
+# Stockage des images originales: dossier local (IMAGE_DIR) ou s3://bucket/prefixe
+# (identifiants boto3 ; S3_ENDPOINT_URL pour MinIO ou un autre service compatible)
+IMAGE_STORAGE_URL = os.getenv("IMAGE_STORAGE_URL", IMAGE_DIR)
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+S3_REGION = os.getenv("S3_REGION") or None
+# Objets lus à l'avance pendant l'ingestion depuis un stockage distant
+PREFETCH_WINDOW = int(os.getenv("PREFETCH_WINDOW", 8))
+
+# Points de reprise de la pipeline: toutes les N images ou T secondes
+CHECKPOINT_EVERY = int(os.getenv("CHECKPOINT_EVERY", 500))
+CHECKPOINT_INTERVAL = float(os.getenv("CHECKPOINT_INTERVAL", 300))
+# Taille des lots écrits sur disque en mode surveillance (mémoire bornée)
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 500))
+
+# Extraction des métadonnées: threads de lecture des en-têtes (travail surtout I/O)
+METADATA_WORKERS = int(os.getenv("METADATA_WORKERS", 8))
+# Stockage des métadonnées: Parquet incrémental ("parquet", nécessite pyarrow) ou CSV complet ("csv")
+METADATA_STORAGE = os.getenv("METADATA_STORAGE", "parquet")
+# Petits fichiers Parquet d'une partition au-delà desquels ils sont fusionnés
+METADATA_COMPACTION_THRESHOLD = int(os.getenv("METADATA_COMPACTION_THRESHOLD", 16))
+
+# Mode surveillance: délai de stabilité d'un fichier avant traitement (secondes)
+WATCH_QUIET_PERIOD = float(os.getenv("WATCH_QUIET_PERIOD", 2))
+WATCH_POLL_INTERVAL = float(os.getenv("WATCH_POLL_INTERVAL", 1))
+
+# Stockage des embeddings: journal de segments en ajout seul ("segments") ou JSON unique ("json")
+EMBEDDING_STORAGE = os.getenv("EMBEDDING_STORAGE", "segments")
+SEGMENT_COMPACTION_THRESHOLD = int(os.getenv("SEGMENT_COMPACTION_THRESHOLD", 16))
+
+# Cache des embeddings par légende normalisée (légendes identiques encodées une fois)
+CAPTION_CACHE_ENABLED = os.getenv("CAPTION_CACHE_ENABLED", "true").lower() == "true"
+# Légendes gardées en mémoire (les moins récemment utilisées sont oubliées)
+CAPTION_CACHE_SIZE = int(os.getenv("CAPTION_CACHE_SIZE", 50000))
+
+# Index approximatif (IVF) pour la recherche par similarité
+ANN_ENABLED = os.getenv("ANN_ENABLED", "false").lower() == "true"
+ANN_NLIST = int(os.getenv("ANN_NLIST", 1024))
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", 16))
+ANN_MIN_TRAIN_SIZE = int(os.getenv("ANN_MIN_TRAIN_SIZE", 10000))
+# Réécriture de l'index IVF tous les N lots (segments) ; les lots suivants sont rejoués au chargement
+ANN_SAVE_INTERVAL = int(os.getenv("ANN_SAVE_INTERVAL", 50))
+
+# Clusters d'embeddings (python -m scripts.clustering): nombre de clusters et
+# clusters parcourus par la recherche textuelle (0: pas de filtrage grossier)
+CLUSTER_COUNT = int(os.getenv("CLUSTER_COUNT", 64))
+CLUSTER_NPROBE = int(os.getenv("CLUSTER_NPROBE", 0))
+# Lots d'embeddings entre deux sauvegardes des clusters par un écrivain
+# (les affectations non sauvegardées sont rejouées depuis le journal au chargement)
+CLUSTER_SAVE_INTERVAL = int(os.getenv("CLUSTER_SAVE_INTERVAL", 50))
+
+# Compression des embeddings en mémoire: float32, float16, int8 ou pq
+EMBEDDING_CODEC = os.getenv("EMBEDDING_CODEC", "float32")
+EMBEDDING_RERANK = int(os.getenv("EMBEDDING_RERANK", 0))
+PQ_SUBVECTORS = int(os.getenv("PQ_SUBVECTORS", 48))
+
+# Index partitionné: shards locaux (processus) ou distants ("hote:port,hote:port")
+EMBEDDING_SHARDS = int(os.getenv("EMBEDDING_SHARDS", 1))
+SHARD_ADDRESSES = [a for a in os.getenv("SHARD_ADDRESSES", "").split(",") if a]
+# Clé partagée des shards : vide = clé par défaut, refusée pour écouter hors de la boucle locale
+SHARD_AUTHKEY = os.getenv("SHARD_AUTHKEY", "")
+
+# API de recherche (mode serve): micro-lots d'encodage des requêtes
+SERVE_HOST = os.getenv("SERVE_HOST", "127.0.0.1")
+SERVE_PORT = int(os.getenv("SERVE_PORT", 8080))
+SERVE_MAX_BATCH = int(os.getenv("SERVE_MAX_BATCH", 32))
+SERVE_BATCH_WINDOW_MS = float(os.getenv("SERVE_BATCH_WINDOW_MS", 5))
+# Taille maximale du corps d'une requête de l'API (octets)
+SERVE_MAX_BODY_BYTES = int(os.getenv("SERVE_MAX_BODY_BYTES", 1 << 20))
+# Index partagé en lecture seule (memory-map) entre processus Streamlit/API ;
+# publié par les modes pipeline et watch
+SERVING_INDEX = os.getenv("SERVING_INDEX", "false").lower() == "true"
+# Mode watch: une publication (qui relit tout le corpus) au plus toutes les N secondes
+SERVING_PUBLISH_INTERVAL = float(os.getenv("SERVING_PUBLISH_INTERVAL", 300))
+# Rechargement incrémental de l'index par l'interface et l'API (secondes, 0: désactivé)
+INDEX_POLL_INTERVAL = float(os.getenv("INDEX_POLL_INTERVAL", 5))
+
+# Workers de traitement (fork, modèles partagés): 0 = dans le processus principal
+MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", 0))
+MODEL_WORKER_TIMEOUT = float(os.getenv("MODEL_WORKER_TIMEOUT", 600))
+# Processus de hash et d'optimisation à l'ingestion (0: dans le processus principal)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 0))
+
+# File de travaux distribuée (--mode worker): vide = traitement local, sinon
+# chemin SQLite (une machine) ou tcp://hote:port (python -m scripts.job_queue serve)
+JOB_QUEUE_URL = os.getenv("JOB_QUEUE_URL", "")
+# Clé partagée de la file : vide = clé par défaut, refusée pour écouter hors de la boucle locale
+JOB_QUEUE_AUTHKEY = os.getenv("JOB_QUEUE_AUTHKEY", "")
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", 16))
+# Bail d'une tâche réservée (prolongé par battements de cœur), en secondes
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 300))
+# Tentatives avant la lettre morte, délai doublé à chaque nouvel essai
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+JOB_BACKOFF_SECONDS = float(os.getenv("JOB_BACKOFF_SECONDS", 30))
+JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", 3600))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 2))
+
+# Backend d'inférence CPU: "torch" ou "onnx" (export au premier lancement)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+ONNX_DIR = os.path.join(BASE_DIR, "models", "onnx")
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE", "false").lower() == "true"
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", 0))
+
+# Métriques (texte Prometheus) et traces (format Chrome Trace)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() == "true"
+METRICS_PATH = os.getenv("METRICS_PATH", os.path.join(BASE_DIR, "logs", "metrics.prom"))
+TRACE_ENABLED = os.getenv("TRACE_ENABLED", "false").lower() == "true"
+TRACE_PATH = os.getenv("TRACE_PATH", os.path.join(BASE_DIR, "logs", "trace.json"))
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", 10))
+
 # Paramètres de sécurité
 ALLOWED_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".bmp"}
 MAX_UPLOAD_SIZE = 100 * 1024 * 1024  # 100 MB
@@ -1,4 +1,3 @@
-```python
 """
 Photothèque Intelligente - Pipeline principal
 Traitement complet des images: ingestion, OCR, tags, embeddings
@@ -6,17 +5,34 @@ Traitement complet des images: ingestion, OCR, tags, embeddings
 
 import os
 import sys
+import time
+import socket
 import argparse
 from datetime import datetime
 import traceback
 import subprocess
 
-from scripts.ingest import ImageIngestor
-from scripts.extract_metadata import MetadataExtractor
-from scripts.tag_clip import ClipTagger
-from scripts.ocr import OcrProcessor
-from scripts.embeddings import EmbeddingManager
-from config.settings import IMAGE_DIR, PROCESSED_IMAGE_DIR, EMBEDDING_PATH
+from scripts.ingest import image_ingestor
+from scripts.extract_metadata import metadata_extractor
+from scripts.tag_clip import clip_tagger
+from scripts.ocr import ocr_processor
+from scripts.embeddings import embedding_manager
+from scripts.checkpoint import PipelineCheckpoint
+from scripts.watcher import FolderWatchDaemon
+from scripts.server import run_server
+from scripts.worker_pool import ModelWorkerPool
+from scripts.metrics import metrics
+from scripts.storage import open_storage
+from scripts.job_queue import LeaseKeeper, open_queue
+from config.settings import (
+    IMAGE_DIR, IMAGE_STORAGE_URL, PROCESSED_IMAGE_DIR, CHECKPOINT_DIR, CHECKPOINT_EVERY, CHECKPOINT_INTERVAL,
+    STREAM_CHUNK_SIZE,
+    ALLOWED_EXTENSIONS, WATCH_STATE_PATH, WATCH_QUIET_PERIOD, WATCH_POLL_INTERVAL,
+    SERVE_HOST, SERVE_PORT, SERVE_MAX_BATCH, SERVE_BATCH_WINDOW_MS, SERVING_INDEX, SERVING_PUBLISH_INTERVAL,
+    MODEL_WORKERS, MODEL_WORKER_TIMEOUT,
+    JOB_QUEUE_URL, JOB_QUEUE_PATH, JOB_BATCH_SIZE, JOB_LEASE_SECONDS, JOB_POLL_INTERVAL,
+    METRICS_PATH, TRACE_PATH, PROGRESS_INTERVAL,
+)
 
 def print_banner():
     """Affiche le logo de l'application."""
@@ -26,7 +42,226 @@ def print_section(title):
     """Affiche un titre de section."""
     print(f"\n--- {title} ---\n")
 
-def run_pipeline():
+def process_image(image_path):
+    """
+    Traite une image: OCR, tags CLIP puis embedding de la légende.
+
+    :param image_path: Chemin de l'image optimisée
+    :return: Tuple (texte, tags, embedding), embedding valant None en cas d'échec
+    """
+    filename = os.path.basename(image_path)
+    with metrics.span("image", filename=filename):
+        # Tags CLIP (avant l'OCR: ils peuvent indiquer l'absence de texte)
+        with metrics.span("clip", filename=filename):
+            tags = clip_tagger.get_clip_tags(image_path)
+
+        # OCR
+        with metrics.span("ocr", filename=filename):
+            text = ocr_processor.run_ocr(image_path, tags)
+
+        # Combinaison texte + tags
+        caption = f"{text} {' '.join(tags)}"
+
+        # Embedding
+        with metrics.span("embedding", filename=filename):
+            embedding = embedding_manager.generate_embedding(caption)
+    return text, tags, embedding
+
+def _analyze_task(job):
+    """
+    Tâche exécutée par les workers: traite une image.
+
+    :param job: Tuple (chemin de l'image, True pour ignorer l'OCR en cache)
+    :return: Tuple ((texte, tags, embedding), mesures du worker, compteurs du cache de légendes,
+             compteurs de la détection de texte)
+    """
+    image_path, fresh = job
+    if fresh:
+        ocr_processor.ocr_cache.pop(os.path.basename(image_path), None)
+    try:
+        return process_image(image_path), metrics.drain(), _drain_caption_stats(), _drain_gate_stats()
+    except Exception:
+        metrics.drain()
+        _drain_caption_stats()
+        _drain_gate_stats()
+        raise
+
+def _drain_caption_stats():
+    """Compteurs du cache de légendes depuis le dernier appel (None si désactivé)."""
+    cache = embedding_manager.caption_cache
+    return cache.drain_stats() if cache is not None else None
+
+def _drain_gate_stats():
+    """Compteurs de la détection de texte (OCR évités) depuis le dernier appel."""
+    return ocr_processor.text_gate.drain_stats()
+
+def _init_worker():
+    """Un thread de calcul par worker: le parallélisme vient des processus."""
+    import torch
+    torch.set_num_threads(1)
+    _read_only_caption_cache()
+
+def _read_only_caption_cache():
+    """
+    Cache de légendes en lecture seule dans un processus de calcul.
+
+    Les légendes des résultats sont mémorisées et persistées par le processus
+    qui les reçoit (`_record_result`) : un worker n'accumule rien jusqu'à sa fin.
+    """
+    if embedding_manager.caption_cache is not None:
+        embedding_manager.caption_cache.read_only = True
+
+_worker_pool = None
+
+def get_worker_pool():
+    """
+    Pool de workers persistant, créé au premier usage après le chargement des modèles.
+
+    :return: ModelWorkerPool (exécution dans le processus principal si MODEL_WORKERS=0)
+    """
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = ModelWorkerPool(
+            _analyze_task, MODEL_WORKERS,
+            initializer=_init_worker, task_timeout=MODEL_WORKER_TIMEOUT,
+        )
+    else:
+        _worker_pool.health_check()
+    return _worker_pool
+
+def analyze_images(image_paths, fresh=False):
+    """
+    Traite des images (OCR, tags, embedding) via le pool de workers.
+
+    Les résultats et les mesures calculés dans les workers sont reportés
+    dans les caches OCR et tags et dans les métriques du processus principal.
+
+    :param image_paths: Chemins des images optimisées
+    :param fresh: Ignorer l'OCR en cache (images modifiées)
+    :return: Générateur de (chemin, (texte, tags, embedding) ou None, erreur)
+    """
+    jobs = [(path, fresh) for path in image_paths]
+    remaining = len(jobs)
+    for (image_path, _), ok, value in get_worker_pool().imap_unordered(jobs):
+        remaining -= 1
+        metrics.set_gauge("queue_pending_images", remaining)
+        if not ok:
+            metrics.inc("images_failed")
+            yield image_path, None, value
+            continue
+        result, worker_metrics, caption_stats, gate_stats = value
+        metrics.merge(worker_metrics)
+        if caption_stats:
+            embedding_manager.caption_cache.merge_stats(caption_stats)
+        ocr_processor.text_gate.merge_stats(gate_stats)
+        _record_result(os.path.basename(image_path), *result)
+        yield image_path, result, None
+
+def _record_result(filename, text, tags, embedding):
+    """Reporte le résultat d'une image dans les caches et les métriques du processus principal."""
+    embedding_manager.remember_caption(f"{text} {' '.join(tags)}", embedding)
+    metrics.inc("images_processed")
+    if embedding is None:
+        metrics.inc("embeddings_failed")
+    ocr_processor.ocr_cache[filename] = text
+    clip_tagger.tags_cache[filename] = tags
+
+def analyze_distributed(queue, image_paths, poll_interval=JOB_POLL_INTERVAL):
+    """
+    Fait traiter des images par les workers d'une file (--mode worker).
+
+    Les tâches sont publiées dans la file (une par image, les tâches déjà
+    présentes sont conservées) puis les résultats sont relus dans l'ordre
+    d'arrivée : le coordinateur reste le seul à écrire le catalogue. Une
+    image dont la tâche est abandonnée (lettre morte) est rendue en erreur.
+
+    :param queue: JobQueue partagée avec les workers
+    :param image_paths: Chemins des images optimisées
+    :param poll_interval: Délai entre deux lectures de la file (secondes)
+    :return: Générateur de (chemin, (texte, tags, embedding) ou None, erreur)
+    """
+    paths = {os.path.basename(path): path for path in image_paths}
+    added = queue.enqueue(paths)
+    print(f"📤 {added} tâche(s) ajoutée(s) à la file ({len(paths)} image(s) attendue(s)); "
+          f"lancez des workers avec --mode worker")
+    remaining = set(paths)
+    cursor = 0
+    while remaining:
+        batch = queue.results(cursor)
+        for seq, filename, result in batch:
+            cursor = seq
+            if filename not in remaining:
+                continue
+            remaining.discard(filename)
+            # Décision de détection de texte prise par le worker
+            ocr_processor.text_gate.merge_stats(result.get("gate", {}))
+            _record_result(filename, result["text"], result["tags"], result["embedding"])
+            yield paths[filename], (result["text"], result["tags"], result["embedding"]), None
+        if batch:
+            continue
+
+        dead = [(key, error) for key, _, error in queue.dead_letters() if key in remaining]
+        for filename, error in dead:
+            remaining.discard(filename)
+            metrics.inc("images_failed")
+            yield paths[filename], None, error or "tâche abandonnée"
+        metrics.set_gauge("queue_pending_images", len(remaining))
+        if remaining and not dead:
+            time.sleep(poll_interval)
+
+class ProgressReporter:
+    """
+    Affiche une ligne d'avancement périodique au lieu d'une ligne par image.
+    """
+
+    def __init__(self, total, interval=PROGRESS_INTERVAL):
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.failed = 0
+        self.start = self.last = datetime.now()
+
+    def update(self, failed=False):
+        self.done += 1
+        self.failed += failed
+        now = datetime.now()
+        if self.done == self.total or (now - self.last).total_seconds() >= self.interval:
+            self.last = now
+            elapsed = max((now - self.start).total_seconds(), 1e-6)
+            print(f"  [{self.done}/{self.total}] {self.done / elapsed:.1f} images/s, "
+                  f"{self.failed} échec(s)")
+
+def export_metrics():
+    """Écrit les métriques Prometheus et la trace Chrome (si activées)."""
+    metrics.export(METRICS_PATH, TRACE_PATH)
+
+def save_checkpoint(checkpoint):
+    """
+    Écrit un checkpoint et libère de la mémoire les résultats persistés.
+
+    :param checkpoint: PipelineCheckpoint de l'exécution en cours
+    """
+    flushed = checkpoint.flush(embedding_manager.store_embeddings)
+    for filename in flushed:
+        ocr_processor.ocr_cache.pop(filename, None)
+        clip_tagger.tags_cache.pop(filename, None)
+    if flushed:
+        print(f"  💾 Checkpoint: {checkpoint.state['processed']} images persistées")
+
+def finalize_checkpoint(checkpoint):
+    """
+    Reporte les résultats du checkpoint dans les fichiers OCR et tags.
+
+    Les résultats sont relus du checkpoint et écrits en flux, sans être
+    rechargés dans les caches: la mémoire ne dépend pas du nombre d'images.
+
+    :param checkpoint: PipelineCheckpoint de l'exécution terminée
+    """
+    ocr_processor.save_ocr_results((r["filename"], r["text"]) for r in checkpoint.iter_results())
+    clip_tagger.save_tags((r["filename"], r["tags"]) for r in checkpoint.iter_results())
+
+def run_pipeline(resume=False, checkpoint_every=CHECKPOINT_EVERY, checkpoint_interval=CHECKPOINT_INTERVAL,
+                 queue_url=JOB_QUEUE_URL):
     """
     Exécute la pipeline de traitement des images.
 
@@ -37,26 +272,50 @@ def run_pipeline():
     4. Tagging automatique
     5. Génération des vecteurs (embeddings)
 
+    Les résultats sont persistés toutes les `checkpoint_every` images ou
+    `checkpoint_interval` secondes ; avec `resume`, l'exécution reprend
+    au dernier checkpoint au lieu de tout recalculer.
+
+    :param resume: Reprendre depuis le dernier checkpoint
+    :param checkpoint_every: Nombre d'images entre deux checkpoints
+    :param checkpoint_interval: Délai max (secondes) entre deux checkpoints
+    :param queue_url: File de travaux (chemin SQLite ou tcp://hote:port) ; OCR,
+        tags et embeddings sont alors calculés par les workers (--mode worker)
     :return: True si la pipeline est terminée avec succès, False sinon
     """
     print_banner()
     
-    if not os.path.exists(IMAGE_DIR) or not os.listdir(IMAGE_DIR):
-        print(f"Pas d'images dans: {IMAGE_DIR}")
+    if next(iter(open_storage(IMAGE_STORAGE_URL).list()), None) is None:
+        print(f"Pas d'images dans: {IMAGE_STORAGE_URL}")
         return False
+
+    checkpoint = PipelineCheckpoint(CHECKPOINT_DIR, checkpoint_every, checkpoint_interval)
+    if resume and checkpoint.resume():
+        print(f"♻️  Reprise du checkpoint: {checkpoint.state['processed']} images déjà traitées "
+              f"({checkpoint.state['updated_at']})")
+    else:
+        checkpoint.reset()
     
     try:
         # ÉTAPE 1: Ingestion
         print_section("📥 ÉTAPE 1: Ingestion des images")
-        ImageIngestor.ingest_images(IMAGE_DIR)
-        stats = ImageIngestor.get_statistics()
-        print(f"\n✅ Ingestion terminée:")
-        print(f"   • Images traitées: {stats['total_processed']}")
-        print(f"   • Doublons trouvés: {stats['duplicates_found']}")
+        if checkpoint.stage_done("ingest"):
+            print("⏭️  Déjà effectuée (checkpoint)")
+        else:
+            image_ingestor.ingest_images(IMAGE_STORAGE_URL)
+            stats = image_ingestor.get_statistics()
+            print(f"\n✅ Ingestion terminée:")
+            print(f"   • Images traitées: {stats['total_processed']}")
+            print(f"   • Doublons trouvés: {stats['duplicates_found']}")
+            checkpoint.mark_stage_done("ingest")
         
         # ÉTAPE 2: Métadonnées
         print_section("🔍 ÉTAPE 2: Extraction des métadonnées")
-        MetadataExtractor.save_metadata(PROCESSED_IMAGE_DIR)
+        if checkpoint.stage_done("metadata"):
+            print("⏭️  Déjà effectuée (checkpoint)")
+        else:
+            metadata_extractor.save_metadata(PROCESSED_IMAGE_DIR)
+            checkpoint.mark_stage_done("metadata")
         
         # ÉTAPE 3: OCR
         print_section("📄 ÉTAPE 3: Reconnaissance Optique de Caractères (OCR)")
@@ -70,64 +329,159 @@ def run_pipeline():
         print_section("🧠 ÉTAPE 5: Génération des vecteurs")
         print("Création des représentations vectorielles...\n")
         
-        embeddings_dict = {}
         images_to_process = [
             f for f in os.listdir(PROCESSED_IMAGE_DIR)
             if f.lower().endswith(('.jpg', '.jpeg', '.png', '.webp'))
         ]
         
-        for idx, filename in enumerate(images_to_process, 1):
-            print(f"  [{idx}/{len(images_to_process)}] Traitement: {filename}")
-            
-            image_path = os.path.join(PROCESSED_IMAGE_DIR, filename)
-            
-            try:
-                # OCR
-                text = OcrProcessor.run_ocr(image_path)
-                
-                # Tags CLIP
-                tags = ClipTagger.get_clip_tags(image_path, top_k=5)
-                
-                # Combinaison texte + tags
-                caption = f"{text} {' '.join(tags)}"
-                
-                # Embedding
-                embedding = EmbeddingManager.generate_embedding(caption)
-                if embedding:
-                    embeddings_dict[filename] = embedding
-                    print(f"      ✅ Traité avec succès")
-                else:
-                    print(f"      ⚠️  Embedding échoué")
-                    
-            except Exception as e:
-                print(f"      ❌ Erreur: {str(e)[:50]}")
+        pending = [
+            os.path.join(PROCESSED_IMAGE_DIR, f)
+            for f in images_to_process if f not in checkpoint.done
+        ]
+        
+        if queue_url:
+            queue = open_queue(queue_url)
+            if not resume:
+                queue.reset()
+            results = analyze_distributed(queue, pending)
+        else:
+            results = analyze_images(pending)
+
+        progress = ProgressReporter(len(pending))
+        for image_path, result, error in results:
+            filename = os.path.basename(image_path)
+            failed = True
+            if error:
+                print(f"      ❌ Erreur sur {filename}: {error[:50]}")
+            else:
+                text, tags, embedding = result
+                checkpoint.record(filename, text, tags, embedding)
+                failed = not embedding
+                if failed:
+                    print(f"      ⚠️  Embedding échoué: {filename}")
+            progress.update(failed)
+
+            if checkpoint.should_flush():
+                save_checkpoint(checkpoint)
         
-        # Sauvegarder les embeddings
-        EmbeddingManager.store_embeddings(embeddings_dict)
-        OcrProcessor.save_ocr_results()
+        # Sauvegarder les derniers résultats
+        save_checkpoint(checkpoint)
+        finalize_checkpoint(checkpoint)
+        embedding_manager.save_ann_index()
+        publish_serving_index()
         
         # RÉSUMÉ FINAL
         print_section("✅ RÉSUMÉ FINAL")
         print(f"✓ Pipeline complété avec succès!")
         print(f"\n📊 Statistiques:")
         print(f"   • Images ingérées: {len(images_to_process)}")
-        print(f"   • Embeddings générés: {len(embeddings_dict)}")
-        print(f"   • OCR résultats: {len(OcrProcessor.ocr_cache)}")
+        print(f"   • Embeddings générés: {checkpoint.state['embeddings']}")
+        print(f"   • OCR résultats: {checkpoint.state['processed']}")
+        gate_stats = ocr_processor.text_gate.stats
+        if gate_stats["checked"]:
+            print(f"   • OCR évités (sans texte): {gate_stats['skipped']}/{gate_stats['checked']}")
+        caption_cache = embedding_manager.caption_cache
+        if caption_cache is not None and caption_cache.stats["hits"] + caption_cache.stats["misses"]:
+            print(f"   • Cache de légendes: {caption_cache.hit_rate:.0%} de hits "
+                  f"({caption_cache.stats['hits']} embeddings réutilisés)")
+        if metrics.enabled:
+            print(f"\n⏱️  Latences par étape:")
+            for stage, row in metrics.summary()["stages"].items():
+                print(f"   • {stage}: {row['count']} appels, moyenne {row['mean_ms']:.0f} ms, "
+                      f"p95 ≤ {row['p95_ms']:.0f} ms")
+            export_metrics()
+            print(f"   • Métriques: {METRICS_PATH}")
         print(f"\n💾 Fichiers de sortie:")
-        print(f"   • Métadonnées: data/metadata.csv")
-        print(f"   • Embeddings: data/embeddings.json")
+        if metadata_extractor.store is not None:
+            print(f"   • Métadonnées: data/metadata/ (Parquet), data/metadata.arrow")
+        else:
+            print(f"   • Métadonnées: data/metadata.csv")
+        print(f"   • Embeddings: data/embeddings/")
         print(f"   • OCR: data/ocr_results.json")
+        print(f"   • Tags: data/tags.json")
         print(f"\n🚀 Prochaine étape:")
         print(f"   Lancez l'interface: streamlit run ui/interface.py")
         print(f"\n⏰ Fin: {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}\n")
-        
+
+        checkpoint.reset()
         return True
+
+    except KeyboardInterrupt:
+        save_checkpoint(checkpoint)
+        print(f"\n⏸️  Interrompu. Relancez avec --resume pour continuer.")
+        return False
         
     except Exception as e:
         print(f"\n❌ Erreur fatale: {e}")
         traceback.print_exc()
+        save_checkpoint(checkpoint)
+        print(f"   Relancez avec --resume pour continuer depuis le dernier checkpoint.")
         return False
 
+def run_worker(queue_url=JOB_QUEUE_URL, batch_size=JOB_BATCH_SIZE, lease=JOB_LEASE_SECONDS,
+               until_empty=False):
+    """
+    Mode worker: traite les images d'une file de travaux partagée.
+
+    Le worker réserve des lots de tâches, prolonge leur bail tant qu'il
+    travaille et enregistre chaque résultat dans la file ; un échec est
+    retenté plus tard, éventuellement par un autre worker. Les images sont
+    lues dans PROCESSED_IMAGE_DIR (dossier partagé entre les machines).
+
+    :param queue_url: Chemin SQLite ou tcp://hote:port
+    :param batch_size: Tâches réservées à la fois
+    :param lease: Durée du bail (secondes)
+    :param until_empty: S'arrêter quand la file est vide (sinon attendre de nouvelles tâches)
+    """
+    print_banner()
+    print_section("👷 WORKER")
+    queue = open_queue(queue_url)
+    # Les légendes repartent avec les résultats : le coordinateur les persiste
+    _read_only_caption_cache()
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    print(f"Worker {worker_id} sur {queue!r}\n")
+    done = failed = dropped = 0
+    try:
+        with LeaseKeeper(queue, worker_id, lease) as keeper:
+            while True:
+                jobs = queue.claim(worker_id, batch_size, lease)
+                if not jobs:
+                    if until_empty and queue.is_drained():
+                        break
+                    time.sleep(JOB_POLL_INTERVAL)
+                    continue
+
+                keeper.track(key for key, _ in jobs)
+                paths = [os.path.join(PROCESSED_IMAGE_DIR, key) for key, _ in jobs]
+                for image_path, result, error in analyze_images(paths):
+                    filename = os.path.basename(image_path)
+                    if not keeper.release(filename):
+                        # Bail perdu : la tâche appartient désormais à un autre worker
+                        print(f"⚠️  Bail perdu pour {filename}: résultat abandonné")
+                        _drain_gate_stats()
+                        dropped += 1
+                    elif error:
+                        queue.fail(filename, worker_id, error)
+                        # Image retentée plus tard : sa détection sera recomptée
+                        _drain_gate_stats()
+                        failed += 1
+                    else:
+                        text, tags, embedding = result
+                        queue.complete(filename, worker_id, {"text": text, "tags": tags, "embedding": embedding,
+                                                             "gate": _drain_gate_stats()})
+                        done += 1
+                    # Le coordinateur écrit le catalogue : rien à garder ici
+                    ocr_processor.ocr_cache.pop(filename, None)
+                    clip_tagger.tags_cache.pop(filename, None)
+                print(f"  [{done} terminée(s), {failed} échec(s)] lot de {len(jobs)} traité")
+    except KeyboardInterrupt:
+        print("\n⏹️  Worker arrêté (les tâches en cours seront reprises à l'expiration du bail)")
+    finally:
+        get_worker_pool().close()
+        queue.close()
+        export_metrics()
+    print(f"✅ {done} tâche(s) terminée(s), {failed} échec(s), {dropped} abandonnée(s) (bail perdu)")
+
 def run_ui():
     """
     Démarrage de l'interface.
@@ -156,7 +510,109 @@ def run_ingest_only():
     """
     print_banner()
     print_section("INGESTION UNIQUEMENT")
-    ImageIngestor.ingest_images(IMAGE_DIR)
+    image_ingestor.ingest_images(IMAGE_STORAGE_URL)
+
+def index_new_images(source_paths):
+    """
+    Indexe un lot d'images nouvelles ou modifiées de bout en bout.
+
+    Ingestion, métadonnées, OCR, tags et embeddings ; seuls ces fichiers
+    sont traités. Les embeddings sont persistés par morceaux de
+    STREAM_CHUNK_SIZE images, OCR et tags à la fin du lot.
+
+    :param source_paths: Chemins des images sources (IMAGE_DIR)
+    """
+    global _serving_index_stale
+    processed_paths = [p for _, p in image_ingestor.ingest_files(source_paths) if p]
+    if not processed_paths:
+        return
+
+    metadata_extractor.append_metadata(processed_paths)
+
+    embeddings_dict = {}
+    indexed = 0
+    # Une image modifiée ne doit pas réutiliser l'ancien texte OCR
+    for image_path, result, error in analyze_images(processed_paths, fresh=True):
+        filename = os.path.basename(image_path)
+        if error:
+            print(f"      ❌ Erreur sur {filename}: {error[:50]}")
+        elif result[2]:
+            embeddings_dict[filename] = result[2]
+        if len(embeddings_dict) >= STREAM_CHUNK_SIZE:
+            if embedding_manager.store_embeddings(embeddings_dict):
+                indexed += len(embeddings_dict)
+            embeddings_dict = {}
+
+    if embeddings_dict and embedding_manager.store_embeddings(embeddings_dict):
+        indexed += len(embeddings_dict)
+    ocr_processor.save_ocr_results()
+    clip_tagger.save_tags()
+    _serving_index_stale = True
+    publish_serving_index(force=False)
+    export_metrics()
+    print(f"✅ {indexed} image(s) indexée(s) à {datetime.now().strftime('%H:%M:%S')}")
+
+_serving_index_stale = False
+_serving_index_published_at = None
+
+def publish_serving_index(force=True):
+    """
+    Publie l'index partagé (embeddings et instantané des métadonnées) lu par
+    les processus de service lorsque SERVING_INDEX est activé.
+
+    Une publication relit tout le corpus : en mode watch (force=False), elle
+    n'a lieu qu'au plus une fois par SERVING_PUBLISH_INTERVAL secondes, et
+    seulement si des images ont été indexées depuis la précédente.
+
+    :param force: Publier sans attendre l'intervalle
+    """
+    global _serving_index_stale, _serving_index_published_at
+    if not SERVING_INDEX:
+        return
+    if not force and (not _serving_index_stale or (
+            _serving_index_published_at is not None
+            and time.monotonic() - _serving_index_published_at < SERVING_PUBLISH_INTERVAL)):
+        return
+    embedding_manager.publish_serving_index()
+    if metadata_extractor.store is not None:
+        metadata_extractor.store.write_snapshot()
+    _serving_index_stale = False
+    _serving_index_published_at = time.monotonic()
+
+def run_watch():
+    """
+    Mode démon: surveille IMAGE_DIR et indexe les images au fil de l'eau.
+
+    Les modèles restent chargés entre deux événements ; seules les images
+    nouvelles ou modifiées sont traitées. Arrêt par Ctrl+C.
+    """
+    print_banner()
+    print_section("👀 SURVEILLANCE CONTINUE")
+    daemon = FolderWatchDaemon(
+        IMAGE_DIR, index_new_images, WATCH_STATE_PATH, ALLOWED_EXTENSIONS,
+        quiet_period=WATCH_QUIET_PERIOD, poll_interval=WATCH_POLL_INTERVAL,
+        on_idle=lambda: publish_serving_index(force=False),
+    )
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        print("\n⏹️  Surveillance arrêtée")
+    finally:
+        embedding_manager.save_ann_index()
+        if _serving_index_stale:
+            publish_serving_index()
+        get_worker_pool().close()
+
+def run_serve(host=SERVE_HOST, port=SERVE_PORT):
+    """
+    Mode service: API HTTP de recherche (texte, métadonnées, tags, hybride).
+
+    :param host: Adresse d'écoute
+    :param port: Port d'écoute
+    """
+    print_banner()
+    print_section("🌐 API DE RECHERCHE")
+    run_server(host, port, SERVE_MAX_BATCH, SERVE_BATCH_WINDOW_MS)
 
 def main():
     """
@@ -165,18 +621,35 @@ def main():
     Gère les arguments de ligne de commande et lance la pipeline ou l'interface en conséquence.
     """
     parser = argparse.ArgumentParser(description="Photothèque Intelligente")
-    parser.add_argument('--mode', choices=['pipeline', 'ui', 'ingest'], default='pipeline',
+    parser.add_argument('--mode', choices=['pipeline', 'ui', 'ingest', 'watch', 'serve', 'worker'], default='pipeline',
                         help='Mode d\'exécution')
+    parser.add_argument('--resume', action='store_true',
+                        help='Reprendre la pipeline depuis le dernier checkpoint')
+    parser.add_argument('--checkpoint-every', type=int, default=CHECKPOINT_EVERY,
+                        help='Nombre d\'images entre deux checkpoints')
+    parser.add_argument('--checkpoint-interval', type=float, default=CHECKPOINT_INTERVAL,
+                        help='Délai max (secondes) entre deux checkpoints')
+    parser.add_argument('--host', default=SERVE_HOST, help='Adresse d\'écoute (mode serve)')
+    parser.add_argument('--port', type=int, default=SERVE_PORT, help='Port d\'écoute (mode serve)')
+    parser.add_argument('--queue', default=JOB_QUEUE_URL,
+                        help='File de travaux (chemin SQLite ou tcp://hote:port) des modes pipeline et worker')
+    parser.add_argument('--batch-size', type=int, default=JOB_BATCH_SIZE, help='Tâches réservées à la fois (mode worker)')
+    parser.add_argument('--until-empty', action='store_true', help='Arrêter le worker quand la file est vide')
     args = parser.parse_args()
     
     if args.mode == 'pipeline':
-        success = run_pipeline()
+        success = run_pipeline(args.resume, args.checkpoint_every, args.checkpoint_interval, args.queue)
         sys.exit(0 if success else 1)
     elif args.mode == 'ui':
         run_ui()
     elif args.mode == 'ingest':
         run_ingest_only()
+    elif args.mode == 'watch':
+        run_watch()
+    elif args.mode == 'serve':
+        run_serve(args.host, args.port)
+    elif args.mode == 'worker':
+        run_worker(args.queue or JOB_QUEUE_PATH, args.batch_size, until_empty=args.until_empty)
 
 if __name__ == "__main__":
     main()
-```
\ No newline at end of file
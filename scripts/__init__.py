@@ -1,4 +1,3 @@
-```python
 # Importing required libraries
 import os
 import json
@@ -191,4 +190,3 @@ def main():
 
 if __name__ == '__main__':
     main()
-```
\ No newline at end of file
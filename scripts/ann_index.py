@@ -0,0 +1,379 @@
+"""
+Index de recherche approximative des plus proches voisins (ANN).
+Implémente un index IVF (inverted file) à centroïdes entraînés par k-means
+sphérique, avec insertions incrémentales et persistance à côté des embeddings.
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+
+
+def _normalize(vectors):
+    """Normalise des vecteurs (L2) pour que le produit scalaire soit un cosinus."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / (norms + 1e-8)
+
+
+def _top_k(scores, top_k):
+    """Retourne les indices des top_k meilleurs scores, triés par score décroissant."""
+    top_k = min(top_k, len(scores))
+    if top_k <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    return candidates[np.argsort(-scores[candidates])]
+
+
+def exact_search(ids, matrix, query, top_k=5):
+    """
+    Recherche exacte (balayage vectorisé) par similarité cosinus.
+
+    Args:
+        ids (list): Identifiants des lignes de la matrice
+        matrix (np.ndarray): Vecteurs normalisés (n, dim)
+        query (array-like): Vecteur requête
+        top_k (int): Nombre de résultats
+
+    Returns:
+        list: Tuples (identifiant, score) triés par score décroissant
+    """
+    if len(ids) == 0:
+        return []
+    scores = matrix @ _normalize(query)[0]
+    return [(ids[i], float(scores[i])) for i in _top_k(scores, top_k)]
+
+
+class IVFIndex:
+    """
+    Index IVF : les vecteurs sont répartis dans `nlist` listes inversées
+    selon leur centroïde le plus proche ; une requête ne parcourt que les
+    `nprobe` listes les plus proches.
+
+    Plus `nprobe` est grand, meilleur est le rappel et plus la latence augmente.
+    """
+
+    def __init__(self, nlist=1024, nprobe=16):
+        """
+        Initialise un index vide (non entraîné).
+
+        Args:
+            nlist (int): Nombre de centroïdes / listes inversées
+            nprobe (int): Nombre de listes parcourues par requête
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.centroids = None
+        self._list_ids = []
+        self._list_vectors = []
+        self._pending = []
+        self._id_to_list = {}
+        # Génération du journal de segments couverte par l'index (rejeu au chargement)
+        self.generation = 0
+
+    @property
+    def is_trained(self):
+        """Indique si les centroïdes ont été entraînés."""
+        return self.centroids is not None
+
+    def __len__(self):
+        return len(self._id_to_list)
+
+    def train(self, vectors, n_iter=20, max_train_size=None, seed=0):
+        """
+        Entraîne les centroïdes par k-means sphérique.
+
+        Args:
+            vectors (np.ndarray): Vecteurs d'entraînement (n, dim)
+            n_iter (int): Nombre d'itérations de k-means
+            max_train_size (int): Taille max de l'échantillon (défaut: 64 * nlist)
+            seed (int): Graine aléatoire (résultat déterministe)
+        """
+        data = _normalize(vectors)
+        rng = np.random.default_rng(seed)
+        max_train_size = max_train_size or 64 * self.nlist
+        if len(data) > max_train_size:
+            data = data[rng.choice(len(data), max_train_size, replace=False)]
+
+        nlist = max(1, min(self.nlist, len(data)))
+        centroids = data[rng.choice(len(data), nlist, replace=False)].copy()
+
+        for _ in range(n_iter):
+            assignments = self._assign(data, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, data)
+            counts = np.bincount(assignments, minlength=nlist)
+            empty = counts == 0
+            # Les centroïdes vides sont réinitialisés sur des points aléatoires
+            if empty.any():
+                sums[empty] = data[rng.choice(len(data), int(empty.sum()))]
+            centroids = _normalize(sums)
+
+        self.nlist = nlist
+        self.centroids = centroids
+        self._list_ids = [[] for _ in range(nlist)]
+        self._list_vectors = [np.empty((0, centroids.shape[1]), dtype=np.float32) for _ in range(nlist)]
+        self._pending = [[] for _ in range(nlist)]
+        self._id_to_list = {}
+
+    @staticmethod
+    def _assign(data, centroids, chunk_size=65536):
+        """Assigne chaque vecteur à son centroïde le plus proche, par blocs."""
+        assignments = np.empty(len(data), dtype=np.int64)
+        for start in range(0, len(data), chunk_size):
+            block = data[start:start + chunk_size]
+            assignments[start:start + chunk_size] = np.argmax(block @ centroids.T, axis=1)
+        return assignments
+
+    def add(self, ids, vectors):
+        """
+        Insère (ou remplace) des vecteurs dans l'index.
+
+        Args:
+            ids (list): Identifiants des images
+            vectors (array-like): Vecteurs correspondants (n, dim)
+        """
+        if not self.is_trained:
+            raise RuntimeError("L'index IVF doit être entraîné avant l'insertion")
+        if len(ids) == 0:
+            return
+
+        data = _normalize(vectors)
+        self.remove([i for i in ids if i in self._id_to_list])
+        for image_id, vector, list_no in zip(ids, data, self._assign(data, self.centroids)):
+            self._pending[list_no].append(vector)
+            self._list_ids[list_no].append(image_id)
+            self._id_to_list[image_id] = int(list_no)
+
+    def remove(self, ids):
+        """Supprime des identifiants de l'index (ignorés s'ils sont absents)."""
+        for image_id in ids:
+            list_no = self._id_to_list.pop(image_id, None)
+            if list_no is None:
+                continue
+            self._flush(list_no)
+            pos = self._list_ids[list_no].index(image_id)
+            del self._list_ids[list_no][pos]
+            self._list_vectors[list_no] = np.delete(self._list_vectors[list_no], pos, axis=0)
+
+    def _flush(self, list_no):
+        """Fusionne les insertions en attente d'une liste dans sa matrice."""
+        if self._pending[list_no]:
+            self._list_vectors[list_no] = np.vstack(
+                [self._list_vectors[list_no], np.stack(self._pending[list_no])]
+            )
+            self._pending[list_no] = []
+
+    def search(self, query, top_k=5, nprobe=None):
+        """
+        Recherche approximative des plus proches voisins.
+
+        Args:
+            query (array-like): Vecteur requête
+            top_k (int): Nombre de résultats
+            nprobe (int): Listes parcourues (défaut: self.nprobe)
+
+        Returns:
+            list: Tuples (identifiant, score cosinus) triés par score décroissant
+        """
+        if not self.is_trained or not self._id_to_list:
+            return []
+
+        query = _normalize(query)[0]
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        probed = _top_k(self.centroids @ query, nprobe)
+
+        candidate_ids = []
+        blocks = []
+        for list_no in probed:
+            self._flush(list_no)
+            if self._list_ids[list_no]:
+                candidate_ids.extend(self._list_ids[list_no])
+                blocks.append(self._list_vectors[list_no])
+        if not blocks:
+            return []
+
+        return exact_search(candidate_ids, np.vstack(blocks), query, top_k)
+
+    def save(self, path):
+        """
+        Sauvegarde l'index (écriture atomique via fichier temporaire).
+
+        Args:
+            path (str): Chemin du fichier .npz
+        """
+        if not self.is_trained:
+            return
+        for list_no in range(self.nlist):
+            self._flush(list_no)
+
+        sizes = np.array([len(ids) for ids in self._list_ids], dtype=np.int64)
+        ids = np.array([i for ids in self._list_ids for i in ids], dtype=str)
+        vectors = np.vstack(self._list_vectors)
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f, centroids=self.centroids, sizes=sizes, ids=ids, vectors=vectors,
+                nprobe=np.int64(self.nprobe), generation=np.int64(self.generation),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Charge un index sauvegardé par `save`.
+
+        Args:
+            path (str): Chemin du fichier .npz
+
+        Returns:
+            IVFIndex: Index chargé
+        """
+        with np.load(path) as data:
+            centroids = data["centroids"]
+            index = cls(nlist=len(centroids), nprobe=int(data["nprobe"]))
+            index.centroids = centroids
+            offsets = np.concatenate([[0], np.cumsum(data["sizes"])])
+            ids = data["ids"].tolist()
+            vectors = data["vectors"]
+            if "generation" in data.files:
+                index.generation = int(data["generation"])
+
+        index._pending = [[] for _ in range(index.nlist)]
+        for list_no in range(index.nlist):
+            start, end = offsets[list_no], offsets[list_no + 1]
+            index._list_ids.append(ids[start:end])
+            index._list_vectors.append(vectors[start:end])
+            for image_id in ids[start:end]:
+                index._id_to_list[image_id] = list_no
+        return index
+
+
+def apply_log_changes(index, segment_log):
+    """
+    Insère dans l'index les segments publiés depuis `index.generation`.
+
+    Après une compaction de segments non lus, les lots relus forment l'état
+    complet : les identifiants qui n'y figurent plus sont retirés de l'index.
+
+    Args:
+        index (IVFIndex): Index entraîné
+        segment_log (SegmentLog): Journal des embeddings
+
+    Returns:
+        int: Nombre de segments rejoués
+    """
+    generation, reset, changes = segment_log.read_changes(index.generation)
+    if reset:
+        current = set()
+        for ids, _, deleted in changes:
+            current.difference_update(deleted)
+            current.update(ids)
+        index.remove([i for i in list(index._id_to_list) if i not in current])
+    for ids, vectors, deleted in changes:
+        index.remove(deleted)
+        index.add(ids, vectors)
+    index.generation = generation
+    return len(changes)
+
+
+def recall_at_k(index, ids, matrix, queries, top_k=10, nprobe=None):
+    """
+    Mesure le rappel@k de l'index par rapport à la recherche exacte.
+
+    Args:
+        index (IVFIndex): Index entraîné et rempli
+        ids (list): Identifiants de la matrice de référence
+        matrix (np.ndarray): Vecteurs normalisés de référence
+        queries (np.ndarray): Requêtes (m, dim)
+        top_k (int): Nombre de voisins comparés
+        nprobe (int): Listes parcourues
+
+    Returns:
+        float: Proportion moyenne des vrais top_k retrouvés
+    """
+    hits = 0
+    for query in queries:
+        truth = {i for i, _ in exact_search(ids, matrix, query, top_k)}
+        found = {i for i, _ in index.search(query, top_k, nprobe=nprobe)}
+        hits += len(truth & found)
+    return hits / (len(queries) * top_k) if len(queries) else 0.0
+
+
+def compare_with_exact(index, ids, matrix, queries, top_k=10, nprobe_values=(1, 4, 16, 64)):
+    """
+    Compare rappel@k et latence de l'index pour plusieurs valeurs de nprobe.
+
+    Returns:
+        list: Un dictionnaire par configuration (nprobe, recall, p50_ms, p99_ms),
+              plus une ligne de référence pour la recherche exacte (nprobe=None)
+    """
+    def _latencies(search):
+        timings = []
+        for query in queries:
+            start = time.perf_counter()
+            search(query)
+            timings.append((time.perf_counter() - start) * 1000)
+        return np.percentile(timings, 50), np.percentile(timings, 99)
+
+    p50, p99 = _latencies(lambda q: exact_search(ids, matrix, q, top_k))
+    report = [{"nprobe": None, "recall": 1.0, "p50_ms": p50, "p99_ms": p99}]
+
+    for nprobe in nprobe_values:
+        p50, p99 = _latencies(lambda q: index.search(q, top_k, nprobe=nprobe))
+        report.append({
+            "nprobe": nprobe,
+            "recall": recall_at_k(index, ids, matrix, queries, top_k, nprobe),
+            "p50_ms": p50,
+            "p99_ms": p99,
+        })
+    return report
+
+
+def main():
+    """Compare l'index IVF à la recherche exacte sur les embeddings stockés ou synthétiques."""
+    parser = argparse.ArgumentParser(description="Rappel@k de l'index IVF vs recherche exacte")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Nombre de vecteurs synthétiques (0: embeddings stockés)")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--nlist", type=int, default=None)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        # Données groupées, plus proches de vrais embeddings qu'un bruit uniforme
+        centers = rng.normal(size=(max(1, args.synthetic // 500), args.dim))
+        vectors = centers[rng.integers(len(centers), size=args.synthetic)]
+        vectors = vectors + 0.5 * rng.normal(size=vectors.shape)
+        ids = [f"img_{i}" for i in range(args.synthetic)]
+    else:
+        from scripts.segment_log import load_stored_embeddings
+        embeddings = load_stored_embeddings()
+        ids = list(embeddings)
+        vectors = np.array([embeddings[i] for i in ids], dtype=np.float32)
+
+    matrix = _normalize(vectors)
+    nlist = args.nlist or max(1, int(4 * np.sqrt(len(ids))))
+    index = IVFIndex(nlist=nlist)
+    index.train(matrix)
+    index.add(ids, matrix)
+
+    queries = matrix[rng.choice(len(matrix), min(args.queries, len(matrix)), replace=False)]
+    queries = queries + 0.1 * rng.normal(size=queries.shape)
+
+    print(f"📊 {len(ids)} vecteurs, nlist={index.nlist}, top_k={args.top_k}")
+    for row in compare_with_exact(index, ids, matrix, queries, args.top_k, args.nprobe):
+        label = "exact" if row["nprobe"] is None else f"nprobe={row['nprobe']}"
+        print(f"  {label:>12}  rappel@{args.top_k}={row['recall']:.3f}  "
+              f"p50={row['p50_ms']:.2f} ms  p99={row['p99_ms']:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+"""
+Benchmark par étape de la pipeline sur un corpus synthétique déterministe.
+Mesure le débit, la latence et le pic de mémoire (RSS) de chaque étape :
+hash, optimisation, métadonnées/EXIF (séparées ou en une seule lecture
+d'en-tête), OCR, tags CLIP, embeddings et recherche.
+Les résultats sont écrits en JSON pour comparer les exécutions entre elles.
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import threading
+import contextlib
+from datetime import datetime
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+# Types d'images du corpus, attribués à tour de rôle
+CORPUS_KINDS = ("photo", "document", "alpha", "large")
+
+_WORDS = ("facture", "plage", "montagne", "réunion", "contrat", "voiture", "total",
+          "coucher", "soleil", "forêt", "ville", "document", "écran", "anniversaire")
+
+
+def _photo(rng, size):
+    """Photo synthétique : bruit basse fréquence agrandi (zones lisses, dégradés)."""
+    low = rng.normal(size=(size[1] // 40, size[0] // 40, 3)) * 60 + 128
+    image = Image.fromarray(np.clip(low, 0, 255).astype(np.uint8)).resize(size, Image.BICUBIC)
+    exif = Image.Exif()
+    exif[0x010F] = "Phototheque"                                # Make
+    exif[0x0110] = f"Bench-{int(rng.integers(100))}"            # Model
+    exif[0x0132] = "2024:01:01 12:00:00"                        # DateTime
+    return image, exif
+
+
+def _document(rng, size):
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=max(12, size[0] // 50))
+    for y in range(40, size[1] - 40, max(20, size[0] // 25)):
+        draw.text((40, y), " ".join(rng.choice(_WORDS, size=6)), fill="black", font=font)
+    return image
+
+
+def generate_corpus(directory, count=40, seed=0):
+    """
+    Crée un corpus d'images reproductible (mêmes octets à graine égale).
+
+    Args:
+        directory (str): Dossier de sortie
+        count (int): Nombre d'images
+        seed (int): Graine aléatoire
+
+    Returns:
+        list: [{"path", "kind", "caption"}]
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for i in range(count):
+        kind = CORPUS_KINDS[i % len(CORPUS_KINDS)]
+        if kind == "photo":
+            image, exif = _photo(rng, (1600, 1200))
+            path = os.path.join(directory, f"{i:05d}_photo.jpg")
+            image.save(path, "JPEG", quality=90, exif=exif)
+        elif kind == "document":
+            path = os.path.join(directory, f"{i:05d}_document.png")
+            _document(rng, (1240, 1754)).save(path, "PNG")
+        elif kind == "alpha":
+            image, _ = _photo(rng, (800, 800))
+            alpha = Image.fromarray(rng.integers(0, 256, size=(800, 800), dtype=np.uint8))
+            image.putalpha(alpha)
+            path = os.path.join(directory, f"{i:05d}_alpha.png")
+            image.save(path, "PNG")
+        else:
+            image, exif = _photo(rng, (6000, 4000))
+            path = os.path.join(directory, f"{i:05d}_large.jpg")
+            image.save(path, "JPEG", quality=92, exif=exif)
+        caption = " ".join(rng.choice(_WORDS, size=int(rng.integers(3, 10))))
+        corpus.append({"path": path, "kind": kind, "caption": caption})
+    return corpus
+
+
+def current_rss():
+    """
+    Mémoire résidente du processus (octets).
+
+    Lue dans /proc sous Linux ; ailleurs, le pic depuis le démarrage
+    (resource) sert d'approximation.
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RSSSampler:
+    """Échantillonne la RSS en arrière-plan pour en retenir le pic."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.baseline = 0
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.baseline = self.peak = current_rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+def run_stage(name, func, items, quiet=True):
+    """
+    Mesure une étape appliquée à chaque élément.
+
+    Args:
+        name (str): Nom de l'étape
+        func (callable): Fonction appelée sur chaque élément
+        items (list): Éléments traités
+        quiet (bool): Masquer les messages affichés par l'étape
+
+    Returns:
+        dict: Débit, latences et mémoire de l'étape
+    """
+    latencies = np.empty(len(items))
+    errors = 0
+    output = io.StringIO() if quiet else sys.stdout
+    with RSSSampler() as rss, contextlib.redirect_stdout(output):
+        start = time.perf_counter()
+        for i, item in enumerate(items):
+            t0 = time.perf_counter()
+            try:
+                func(item)
+            except Exception:
+                errors += 1
+            latencies[i] = time.perf_counter() - t0
+        total = time.perf_counter() - start
+
+    return {
+        "stage": name,
+        "items": len(items),
+        "errors": errors,
+        "total_s": total,
+        "throughput_per_s": len(items) / total if total else 0.0,
+        "latency_mean_ms": float(latencies.mean() * 1000) if len(items) else 0.0,
+        "latency_p50_ms": float(np.percentile(latencies, 50) * 1000) if len(items) else 0.0,
+        "latency_p95_ms": float(np.percentile(latencies, 95) * 1000) if len(items) else 0.0,
+        "peak_rss_mb": rss.peak / 2**20,
+        "rss_delta_mb": (rss.peak - rss.baseline) / 2**20,
+    }
+
+
+@contextlib.contextmanager
+def _stage_hash(corpus, workdir, args):
+    from scripts.ingest import image_ingestor
+    yield image_ingestor._hash_image, [e["path"] for e in corpus]
+
+
+@contextlib.contextmanager
+def _stage_optimize(corpus, workdir, args):
+    from scripts.ingest import image_ingestor
+    out_dir = os.path.join(workdir, "optimized")
+    os.makedirs(out_dir, exist_ok=True)
+
+    def optimize(entry):
+        name = os.path.splitext(os.path.basename(entry["path"]))[0] + ".jpg"
+        if not image_ingestor._optimize_image(entry["path"], os.path.join(out_dir, name)):
+            raise RuntimeError("échec de l'optimisation")
+    yield optimize, corpus
+
+
+@contextlib.contextmanager
+def _stage_metadata(corpus, workdir, args):
+    from scripts.extract_metadata import metadata_extractor
+    yield metadata_extractor.extract_image_info, [e["path"] for e in corpus]
+
+
+@contextlib.contextmanager
+def _stage_headers(corpus, workdir, args):
+    # Ligne complète (infos + EXIF) en une seule ouverture du fichier
+    from scripts.extract_metadata import metadata_extractor
+    yield metadata_extractor.extract_row, [e["path"] for e in corpus]
+
+
+@contextlib.contextmanager
+def _stage_exif(corpus, workdir, args):
+    from scripts.extract_metadata import metadata_extractor
+    yield metadata_extractor.extract_exif_data, [e["path"] for e in corpus]
+
+
+@contextlib.contextmanager
+def _stage_ocr(corpus, workdir, args):
+    from scripts.ocr import ocr_processor
+
+    def ocr(path):
+        # Sans cache: chaque appel mesure un vrai passage de Tesseract
+        ocr_processor.ocr_cache.pop(os.path.basename(path), None)
+        ocr_processor.run_ocr(path)
+    yield ocr, [e["path"] for e in corpus]
+
+
+@contextlib.contextmanager
+def _stage_clip(corpus, workdir, args):
+    from scripts.tag_clip import clip_tagger
+    yield clip_tagger.get_clip_tags, [e["path"] for e in corpus]
+
+
+@contextlib.contextmanager
+def _stage_embedding(corpus, workdir, args):
+    from scripts.embeddings import embedding_manager
+    yield embedding_manager.generate_embedding, [e["caption"] for e in corpus]
+
+
+@contextlib.contextmanager
+def _synthetic_index(manager, size, dim, seed=0):
+    """Remplace temporairement l'index du manager par `size` vecteurs synthétiques."""
+    saved = (manager.embeddings_cache, manager._matrix, manager.ann_index, manager.sharded_index)
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(size, dim)).astype(np.float32)
+    cache = manager._new_cache()
+    cache.update({f"synthetic_{i:07d}.jpg": v.tolist() for i, v in enumerate(vectors)})
+    manager.embeddings_cache, manager._matrix = cache, None
+    manager.ann_index = manager.sharded_index = None
+    try:
+        yield
+    finally:
+        (manager.embeddings_cache, manager._matrix,
+         manager.ann_index, manager.sharded_index) = saved
+
+
+@contextlib.contextmanager
+def _stage_search(corpus, workdir, args):
+    from scripts.embeddings import embedding_manager
+
+    # Requêtes encodées une fois: seule la recherche est mesurée
+    vectors = embedding_manager.encode_batch([e["caption"] for e in corpus])
+    with _synthetic_index(embedding_manager, args.index_size, len(vectors[0])):
+        yield (lambda v: embedding_manager.search_by_vector(v, 10)), vectors
+
+
+STAGES = {
+    "hash": _stage_hash,
+    "optimize": _stage_optimize,
+    "metadata": _stage_metadata,
+    "exif": _stage_exif,
+    "headers": _stage_headers,
+    "ocr": _stage_ocr,
+    "clip": _stage_clip,
+    "embedding": _stage_embedding,
+    "search": _stage_search,
+}
+
+
+def run_benchmark(stages, count=40, seed=0, index_size=10000, workdir=None):
+    """
+    Génère le corpus puis mesure chaque étape demandée.
+
+    Args:
+        stages (list): Noms d'étapes (voir STAGES)
+        count (int): Taille du corpus
+        seed (int): Graine du corpus
+        index_size (int): Nombre de vecteurs de l'index de l'étape search
+        workdir (str): Dossier de travail (temporaire si None)
+
+    Returns:
+        dict: Description de l'environnement et résultats par étape
+    """
+    cleanup = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix="phototheque_bench_")
+    args = argparse.Namespace(index_size=index_size)
+    try:
+        corpus = generate_corpus(os.path.join(workdir, "corpus"), count, seed)
+        results = {}
+        for name in stages:
+            with STAGES[name](corpus, workdir, args) as (func, items):
+                results[name] = run_stage(name, func, items)
+            row = results[name]
+            print(f"  {name:>10}: {row['throughput_per_s']:8.1f}/s  "
+                  f"p50={row['latency_p50_ms']:.1f} ms  pic RSS={row['peak_rss_mb']:.0f} Mo")
+    finally:
+        if cleanup:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "corpus": {"count": count, "seed": seed, "kinds": list(CORPUS_KINDS)},
+        "index_size": index_size,
+        "stages": results,
+    }
+
+
+def main():
+    """Lance le benchmark et écrit les résultats JSON."""
+    parser = argparse.ArgumentParser(description="Benchmark par étape de la pipeline")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=list(STAGES))
+    parser.add_argument("--count", type=int, default=40, help="Nombre d'images du corpus")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--index-size", type=int, default=10000,
+                        help="Vecteurs synthétiques de l'étape search")
+    parser.add_argument("--workdir", default=None, help="Conserver le corpus dans ce dossier")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    print(f"📊 Benchmark: {args.count} images, étapes {', '.join(args.stages)}")
+    report = run_benchmark(args.stages, args.count, args.seed, args.index_size, args.workdir)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"✅ Résultats: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
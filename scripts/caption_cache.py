@@ -0,0 +1,119 @@
+"""
+Cache persistant des embeddings par légende.
+Beaucoup d'images produisent la même légende (ex: "Aucun texte détecté"
+suivi des mêmes tags) : la légende normalisée est hachée et son vecteur
+réutilisé au lieu de relancer le modèle. Le cache est stocké dans un
+journal de segments, un dossier par modèle ; seules les légendes les plus
+récemment utilisées restent en mémoire.
+"""
+
+import hashlib
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+from scripts.segment_log import SegmentLog
+
+
+def normalize_caption(text):
+    """
+    Normalise une légende sans changer son embedding.
+
+    Forme Unicode NFKC, minuscules (MiniLM est insensible à la casse) et
+    espaces consécutifs réduits.
+    """
+    return " ".join(unicodedata.normalize("NFKC", text).lower().split())
+
+
+def caption_key(text):
+    """Clé de cache d'une légende (SHA-1 de la forme normalisée)."""
+    return hashlib.sha1(normalize_caption(text).encode("utf-8")).hexdigest()
+
+
+class CaptionCache:
+    """Association légende normalisée -> embedding, persistée en segments."""
+
+    def __init__(self, directory, compaction_threshold=16, max_entries=50000):
+        """
+        Args:
+            directory (str): Dossier du journal (propre au modèle d'embedding)
+            compaction_threshold (int): Compaction au-delà de N segments
+            max_entries (int): Légendes gardées en mémoire (LRU) ; une légende
+                oubliée est ré-encodée si elle revient
+        """
+        self.segment_log = SegmentLog(directory)
+        self.compaction_threshold = compaction_threshold
+        self.max_entries = max_entries
+        # Vecteurs float32, du moins au plus récemment utilisé
+        self.vectors = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0}
+        # Processus de calcul (workers) : les ajouts restent en mémoire sans être
+        # persistés, le processus principal écrit les légendes des résultats reçus
+        self.read_only = False
+        self._pending = {}
+        self._load_recent()
+
+    def _load_recent(self):
+        """Charge les légendes des segments les plus récents, dans la limite de max_entries."""
+        recent = {}
+        for _, ids, vectors, _ in self.segment_log.iter_segments(newest_first=True):
+            for row, key in enumerate(ids):
+                if len(recent) >= self.max_entries:
+                    break
+                if key not in recent:
+                    recent[key] = np.array(vectors[row], dtype=np.float32)
+            if len(recent) >= self.max_entries:
+                break
+        self.vectors.update(reversed(recent.items()))
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def get(self, caption):
+        """
+        Returns:
+            list: Embedding en cache, ou None (compté comme défaut de cache)
+        """
+        key = caption_key(caption)
+        vector = self.vectors.get(key)
+        if vector is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        self.vectors.move_to_end(key)
+        return vector.tolist()
+
+    def add(self, caption, vector):
+        """Mémorise l'embedding d'une légende (persisté au prochain `flush`)."""
+        key = caption_key(caption)
+        if key in self.vectors or key in self._pending:
+            return
+        vector = np.asarray(vector, dtype=np.float32)
+        self.vectors[key] = vector
+        if not self.read_only:
+            self._pending[key] = vector
+        while len(self.vectors) > self.max_entries:
+            self.vectors.popitem(last=False)
+
+    def flush(self):
+        """Persiste les nouvelles légendes dans un segment."""
+        if not self._pending:
+            return
+        self.segment_log.append(self._pending)
+        self._pending = {}
+        self.segment_log.start_background_compaction(self.compaction_threshold)
+
+    def drain_stats(self):
+        """Retourne et remet à zéro les compteurs (transmis par les workers)."""
+        stats, self.stats = self.stats, {"hits": 0, "misses": 0}
+        return stats
+
+    def merge_stats(self, stats):
+        for name, value in stats.items():
+            self.stats[name] += value
+
+    @property
+    def hit_rate(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
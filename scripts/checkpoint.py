@@ -0,0 +1,160 @@
+"""
+Points de reprise (checkpoints) de la pipeline.
+Persiste périodiquement l'OCR, les tags et les embeddings déjà calculés
+pour qu'une exécution interrompue reprenne là où elle s'était arrêtée,
+avec une mémoire bornée par l'intervalle entre deux checkpoints.
+"""
+
+import os
+import json
+import time
+import shutil
+from datetime import datetime
+
+from scripts.segment_log import atomic_write
+
+
+class PipelineCheckpoint:
+    """
+    Journal de progression d'une exécution de la pipeline.
+
+    Fichiers du dossier de checkpoint :
+      - state.json : étapes terminées, nombre d'images et date du dernier checkpoint
+      - results.jsonl : un enregistrement {filename, text, tags} par image traitée
+    """
+
+    def __init__(self, directory, every=500, interval=300.0):
+        """
+        Args:
+            directory (str): Dossier du checkpoint
+            every (int): Checkpoint toutes les N images
+            interval (float): Checkpoint au plus tard toutes les T secondes
+        """
+        self.directory = directory
+        self.every = every
+        self.interval = interval
+        self.state_path = os.path.join(directory, "state.json")
+        self.results_path = os.path.join(directory, "results.jsonl")
+        self.state = {"stages_done": [], "processed": 0, "embeddings": 0, "updated_at": None}
+        self.done = set()
+        self._pending_results = []
+        self._pending_embeddings = {}
+        self._last_flush = time.monotonic()
+
+    def reset(self):
+        """Supprime tout checkpoint existant (nouvelle exécution)."""
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def resume(self):
+        """
+        Recharge le dernier checkpoint.
+
+        Returns:
+            bool: True si un checkpoint a été trouvé
+        """
+        if not os.path.exists(self.state_path):
+            os.makedirs(self.directory, exist_ok=True)
+            return False
+
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            self.state = json.load(f)
+        # Seuls les enregistrements couverts par state.json sont valides :
+        # les lignes écrites après le dernier checkpoint (crash) sont tronquées
+        valid_bytes = 0
+        if os.path.exists(self.results_path):
+            with open(self.results_path, "rb") as f:
+                for _ in range(self.state["processed"]):
+                    line = f.readline()
+                    self.done.add(json.loads(line)["filename"])
+                    valid_bytes += len(line)
+            with open(self.results_path, "r+b") as f:
+                f.truncate(valid_bytes)
+        return True
+
+    def iter_results(self):
+        """
+        Parcourt les résultats persistés sans tout charger en mémoire.
+
+        Yields:
+            dict: {filename, text, tags}
+        """
+        if not os.path.exists(self.results_path):
+            return
+        with open(self.results_path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
+
+    def stage_done(self, stage):
+        """Indique si une étape a été terminée lors d'une exécution précédente."""
+        return stage in self.state["stages_done"]
+
+    def mark_stage_done(self, stage):
+        """Enregistre la fin d'une étape."""
+        if stage not in self.state["stages_done"]:
+            self.state["stages_done"].append(stage)
+            self._write_state()
+
+    def record(self, filename, text, tags, embedding):
+        """
+        Mémorise le résultat d'une image jusqu'au prochain checkpoint.
+
+        Args:
+            filename (str): Nom du fichier
+            text (str): Texte OCR
+            tags (list): Tags CLIP
+            embedding (list): Embedding (None si échec)
+        """
+        self._pending_results.append({"filename": filename, "text": text, "tags": tags})
+        if embedding is not None:
+            self._pending_embeddings[filename] = embedding
+        self.done.add(filename)
+
+    def should_flush(self):
+        """Indique si un checkpoint est dû (nombre d'images ou délai atteint)."""
+        if not self._pending_results:
+            return False
+        return (len(self._pending_results) >= self.every
+                or time.monotonic() - self._last_flush >= self.interval)
+
+    def flush(self, store_embeddings):
+        """
+        Écrit un checkpoint : embeddings, puis résultats, puis état.
+
+        Si la sauvegarde des embeddings échoue, rien n'est écrit : les images
+        restent en attente pour le checkpoint suivant et une reprise les retraite.
+
+        Args:
+            store_embeddings (callable): Persiste un dict d'embeddings
+                (retourne False en cas d'échec)
+
+        Returns:
+            list: Noms des fichiers persistés par ce checkpoint
+        """
+        if not self._pending_results:
+            return []
+
+        if self._pending_embeddings and store_embeddings(self._pending_embeddings) is False:
+            self._last_flush = time.monotonic()
+            return []
+
+        with open(self.results_path, "a", encoding="utf-8") as f:
+            for result in self._pending_results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        flushed = [result["filename"] for result in self._pending_results]
+        self.state["processed"] += len(flushed)
+        self.state["embeddings"] += len(self._pending_embeddings)
+        self._write_state()
+
+        self._pending_results = []
+        self._pending_embeddings = {}
+        self._last_flush = time.monotonic()
+        return flushed
+
+    def _write_state(self):
+        self.state["updated_at"] = datetime.now().isoformat()
+        data = json.dumps(self.state, indent=2).encode("utf-8")
+        atomic_write(self.state_path, lambda f: f.write(data))
@@ -0,0 +1,325 @@
+"""
+Regroupement des embeddings par k-means en mini-lots (hors ligne).
+Le job parcourt les embeddings stockés par blocs (mémoire bornée), entraîne
+les centroïdes avec MiniBatchKMeans puis enregistre centroïdes et affectations
+dans data/clusters.npz. Les nouveaux embeddings sont ensuite affectés au
+centroïde le plus proche, qui se déplace vers eux (règle du k-means en
+mini-lots), sans réentraînement. Les centroïdes servent aussi de filtre
+grossier pour la recherche textuelle.
+"""
+
+import os
+import argparse
+from collections import Counter
+
+import numpy as np
+
+from config.settings import CLUSTER_PATH, CLUSTER_COUNT, STREAM_CHUNK_SIZE
+from scripts.ann_index import _normalize, _top_k
+from scripts.segment_log import atomic_write
+
+
+def _reservoir(chunks, size, seed=0):
+    """Échantillon uniforme d'au plus `size` vecteurs normalisés d'un flux de blocs."""
+    rng = np.random.default_rng(seed)
+    sample, seen = None, 0
+    for _, vectors in chunks:
+        data = _normalize(vectors)
+        if sample is None:
+            sample = np.empty((size, data.shape[1]), dtype=np.float32)
+        for vector in data:
+            if seen < size:
+                sample[seen] = vector
+            else:
+                slot = rng.integers(seen + 1)
+                if slot < size:
+                    sample[slot] = vector
+            seen += 1
+    return np.empty((0, 0), dtype=np.float32) if sample is None else sample[:min(seen, size)]
+
+
+class ClusterIndex:
+    """Centroïdes et affectation {filename: cluster} des embeddings."""
+
+    def __init__(self, centroids=None, counts=None):
+        """
+        Args:
+            centroids (np.ndarray): Centroïdes (k, dim), None si non entraîné
+            counts (np.ndarray): Vecteurs vus par centroïde (pas d'apprentissage)
+        """
+        self.centroids = None if centroids is None else np.asarray(centroids, dtype=np.float32)
+        if counts is None and centroids is not None:
+            counts = np.zeros(len(self.centroids), dtype=np.int64)
+        self.counts = counts
+        self.labels = {}
+        self.scores = {}
+        self.generation = 0
+        # Modèle d'embedding des vecteurs regroupés (None: fichier antérieur au suivi des modèles)
+        self.model = None
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    @property
+    def n_clusters(self):
+        return 0 if self.centroids is None else len(self.centroids)
+
+    def __len__(self):
+        return len(self.labels)
+
+    @classmethod
+    def fit(cls, chunks, n_clusters=CLUSTER_COUNT, passes=1, seed=0, init_size=None):
+        """
+        Entraîne les centroïdes par MiniBatchKMeans sur un flux de blocs.
+
+        Un premier parcours tire un échantillon uniforme (réservoir) qui sert à
+        initialiser les centroïdes (k-means++) : les blocs arrivent dans l'ordre
+        d'ingestion, le premier bloc seul ne serait pas représentatif.
+
+        Args:
+            chunks (callable): Retourne un itérateur de blocs (ids, vecteurs),
+                appelé pour l'échantillon, chaque passage et l'affectation
+            n_clusters (int): Nombre de clusters (réduit s'il y a moins de vecteurs)
+            passes (int): Passages d'entraînement sur les données
+            seed (int): Graine (résultat déterministe)
+            init_size (int): Taille de l'échantillon d'initialisation (défaut: 3 * n_clusters, au moins 1024)
+
+        Returns:
+            ClusterIndex: Index entraîné, tous les vecteurs affectés
+        """
+        from sklearn.cluster import MiniBatchKMeans
+
+        sample = _reservoir(chunks(), init_size or max(3 * n_clusters, 1024), seed)
+        if not len(sample):
+            return cls()
+        model = MiniBatchKMeans(n_clusters=min(n_clusters, len(sample)), n_init=1, random_state=seed)
+        model.partial_fit(sample)
+        for _ in range(passes):
+            for _, vectors in chunks():
+                model.partial_fit(_normalize(vectors))
+
+        index = cls(model.cluster_centers_)
+        for ids, vectors in chunks():
+            index.update(ids, vectors, learn=False)
+        index.counts = np.bincount(list(index.labels.values()), minlength=index.n_clusters).astype(np.int64)
+        return index
+
+    def assign(self, vectors):
+        """
+        Returns:
+            tuple: (cluster le plus proche, similarité cosinus) de chaque vecteur
+        """
+        scores = _normalize(vectors) @ _normalize(self.centroids).T
+        labels = scores.argmax(axis=1)
+        return labels, scores[np.arange(len(labels)), labels]
+
+    def update(self, ids, vectors, learn=True):
+        """
+        Affecte des embeddings nouveaux ou modifiés à leur cluster.
+
+        Avec `learn`, chaque centroïde se déplace vers la moyenne des vecteurs
+        qu'il reçoit, pondérée par le nombre de vecteurs qu'il a déjà vus.
+
+        Args:
+            ids (list): Identifiants des images
+            vectors (array-like): Vecteurs (n, dim)
+            learn (bool): Mettre à jour les centroïdes
+        """
+        if not self.is_trained or len(ids) == 0:
+            return
+        data = _normalize(vectors)
+        labels, scores = self.assign(data)
+        if learn:
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, labels, data)
+            added = np.bincount(labels, minlength=self.n_clusters)
+            moved = added > 0
+            self.counts += added
+            self.centroids[moved] += (sums[moved] - added[moved, None] * self.centroids[moved]) / self.counts[moved, None]
+        for image_id, label, score in zip(ids, labels.tolist(), scores.tolist()):
+            self.labels[image_id] = label
+            self.scores[image_id] = score
+
+    def remove(self, ids):
+        """Retire des identifiants (les centroïdes ne bougent pas)."""
+        for image_id in ids:
+            self.labels.pop(image_id, None)
+            self.scores.pop(image_id, None)
+
+    def sizes(self):
+        """Nombre d'images par cluster."""
+        return np.bincount(list(self.labels.values()), minlength=self.n_clusters)
+
+    def groups(self):
+        """Images de chaque cluster, de la plus proche du centroïde à la plus éloignée."""
+        groups = {}
+        for image_id in sorted(self.labels, key=lambda i: -self.scores[i]):
+            groups.setdefault(self.labels[image_id], []).append(image_id)
+        return groups
+
+    def probe(self, query, nprobe):
+        """Clusters dont le centroïde est le plus proche de la requête."""
+        return _top_k(_normalize(self.centroids) @ _normalize(query)[0], nprobe)
+
+    def save(self, path=CLUSTER_PATH):
+        ids = list(self.labels)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        atomic_write(path, lambda f: np.savez(
+            f,
+            centroids=self.centroids,
+            counts=self.counts,
+            ids=np.array(ids, dtype=str),
+            labels=np.array([self.labels[i] for i in ids], dtype=np.int32),
+            scores=np.array([self.scores[i] for i in ids], dtype=np.float32),
+            generation=np.array(self.generation),
+            model=np.array(self.model or ""),
+        ))
+
+    @classmethod
+    def load(cls, path=CLUSTER_PATH):
+        with np.load(path) as data:
+            index = cls(data["centroids"], data["counts"])
+            ids = data["ids"].tolist()
+            index.labels = dict(zip(ids, data["labels"].tolist()))
+            index.scores = dict(zip(ids, data["scores"].tolist()))
+            index.generation = int(data["generation"])
+            if "model" in data.files:
+                index.model = str(data["model"]) or None
+        return index
+
+
+def top_tags(filenames, tags, count=3):
+    """
+    Tags les plus fréquents d'un groupe d'images (libellé d'un cluster).
+
+    Args:
+        filenames (list): Images du cluster
+        tags (dict): {filename: [tags]} (data/tags.json)
+        count (int): Nombre de tags
+
+    Returns:
+        list: Tags du plus fréquent au moins fréquent
+    """
+    counter = Counter(tag for filename in filenames for tag in tags.get(filename, ()))
+    return [tag for tag, _ in counter.most_common(count)]
+
+
+def iter_stored_chunks(chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Parcourt les embeddings stockés par blocs (ids, vecteurs).
+
+    Avec le journal de segments, seul un segment à la fois est en mémoire.
+    """
+    from config.settings import EMBEDDING_STORAGE
+    from scripts.model_versions import active_segment_dir
+    from scripts.segment_log import MANIFEST_NAME, SegmentLog, load_stored_embeddings
+
+    segment_dir = active_segment_dir()
+    if EMBEDDING_STORAGE == "segments" and os.path.exists(os.path.join(segment_dir, MANIFEST_NAME)):
+        yield from SegmentLog(segment_dir).iter_current(chunk_size)
+        return
+    embeddings = load_stored_embeddings()
+    ids = list(embeddings)
+    for start in range(0, len(ids), chunk_size):
+        block = ids[start:start + chunk_size]
+        yield block, np.array([embeddings[i] for i in block], dtype=np.float32)
+
+
+def _stored_generation():
+    from config.settings import EMBEDDING_STORAGE
+    from scripts.model_versions import active_segment_dir
+    from scripts.segment_log import SegmentLog
+
+    if EMBEDDING_STORAGE != "segments":
+        return 0
+    return SegmentLog(active_segment_dir()).generation
+
+
+def build_clusters(n_clusters=CLUSTER_COUNT, chunk_size=STREAM_CHUNK_SIZE, passes=1, path=CLUSTER_PATH):
+    """
+    Entraîne les clusters sur tous les embeddings stockés et les enregistre.
+
+    Returns:
+        ClusterIndex: Index construit
+    """
+    from scripts.model_versions import version_registry
+
+    generation = _stored_generation()
+    index = ClusterIndex.fit(lambda: iter_stored_chunks(chunk_size), n_clusters, passes)
+    index.generation = generation
+    index.model = version_registry.active()["model"]
+    if index.is_trained:
+        index.save(path)
+    return index
+
+
+def apply_log_changes(index, segment_log):
+    """
+    Affecte aux clusters les segments publiés depuis `index.generation`.
+
+    Args:
+        index (ClusterIndex): Clusters entraînés
+        segment_log (SegmentLog): Journal des embeddings
+
+    Returns:
+        bool: False si une compaction a fusionné des segments non lus (reconstruction nécessaire)
+    """
+    generation, reset, changes = segment_log.read_changes(index.generation)
+    if reset and index.generation:
+        return False
+    for ids, vectors, deleted in changes:
+        index.remove(deleted)
+        index.update(ids, vectors)
+    index.generation = generation
+    return True
+
+
+def update_clusters(path=CLUSTER_PATH):
+    """
+    Applique aux clusters les segments publiés depuis leur construction.
+
+    Reconstruit tout si une compaction a fusionné des segments non lus.
+
+    Returns:
+        ClusterIndex: Index à jour
+    """
+    from config.settings import EMBEDDING_STORAGE
+    from scripts.model_versions import version_registry
+    from scripts.segment_log import SegmentLog
+
+    index = ClusterIndex.load(path)
+    active = version_registry.active()
+    if EMBEDDING_STORAGE != "segments" or index.model not in (None, active["model"]):
+        # Clusters d'un autre modèle: centroïdes dans un autre espace
+        return build_clusters(index.n_clusters, path=path)
+    if not apply_log_changes(index, SegmentLog(active["dir"])):
+        return build_clusters(index.n_clusters, path=path)
+    index.save(path)
+    return index
+
+
+def main():
+    """Construit ou met à jour les clusters des embeddings stockés."""
+    parser = argparse.ArgumentParser(description="Clusters d'embeddings (k-means en mini-lots)")
+    parser.add_argument("--clusters", type=int, default=CLUSTER_COUNT, help="Nombre de clusters")
+    parser.add_argument("--passes", type=int, default=1, help="Passages d'entraînement")
+    parser.add_argument("--chunk-size", type=int, default=STREAM_CHUNK_SIZE)
+    parser.add_argument("--update", action="store_true",
+                        help="Affecter seulement les nouveaux embeddings (clusters existants)")
+    args = parser.parse_args()
+
+    if args.update and os.path.exists(CLUSTER_PATH):
+        index = update_clusters()
+    else:
+        index = build_clusters(args.clusters, args.chunk_size, args.passes)
+    if not index.is_trained:
+        print("⚠️  Aucun embedding à regrouper")
+        return
+    sizes = index.sizes()
+    print(f"✅ {len(index)} embeddings en {index.n_clusters} clusters: {CLUSTER_PATH} "
+          f"(taille médiane {int(np.median(sizes))}, max {int(sizes.max())})")
+
+
+if __name__ == "__main__":
+    main()
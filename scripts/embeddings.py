@@ -1,8 +1,27 @@
-```python
 import json
+import threading
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from config.settings import EMBEDDING_MODEL, EMBEDDING_PATH, MODEL_CACHE_DIR
+from config.settings import (
+    EMBEDDING_PATH,
+    ANN_ENABLED, ANN_INDEX_PATH, ANN_NLIST, ANN_NPROBE, ANN_MIN_TRAIN_SIZE, ANN_SAVE_INTERVAL,
+    EMBEDDING_CODEC, EMBEDDING_RERANK, EMBEDDING_RAW_PATH, PQ_SUBVECTORS,
+    EMBEDDING_SHARDS, SHARD_ADDRESSES, SHARD_AUTHKEY,
+    EMBEDDING_STORAGE, EMBEDDING_SEGMENT_DIR, SEGMENT_COMPACTION_THRESHOLD, STREAM_CHUNK_SIZE,
+    CAPTION_CACHE_ENABLED, CAPTION_CACHE_SIZE, SERVING_INDEX, SERVING_INDEX_DIR,
+    CLUSTER_PATH, CLUSTER_NPROBE, CLUSTER_SAVE_INTERVAL,
+)
+from scripts.ann_index import IVFIndex, exact_search, apply_log_changes as apply_ann_log_changes
+from scripts.caption_cache import CaptionCache
+from scripts.clustering import ClusterIndex, apply_log_changes
+from scripts.metrics import metrics
+from scripts.model_versions import (
+    ModelMismatchError, caption_cache_dir, load_text_encoder, model_id, version_registry,
+)
+from scripts.quantization import make_codec
+from scripts.sharding import ShardedIndex, authkey_bytes
+from scripts.segment_log import SegmentLog
+from scripts.serving_index import ServingIndex, publish_serving_index, published_model
+from scripts.vector_store import VectorStore
 import os
 
 class EmbeddingManager:
@@ -17,84 +36,865 @@ class EmbeddingManager:
         """
         Initializes the EmbeddingManager instance.
 
-        Loads the pre-trained SentenceTransformer model and sets up the cache directory.
+        Loads the SentenceTransformer model of the active embedding version (see
+        scripts.model_versions), which differs from EMBEDDING_MODEL until the
+        stored captions have been re-embedded with the configured model. A serving
+        process switches to the model of the published index when it maps it.
         """
-        self.model = SentenceTransformer(
-            EMBEDDING_MODEL,
-            cache_folder=MODEL_CACHE_DIR
-        )
-        self.embeddings_cache = {}
-        self._load_existing_embeddings()
+        self.registry = version_registry
+        self._registry_signature = self.registry.signature()
+        active = self.registry.active()
+        self.model_id = active["model"]
+        self.segment_dir = active["dir"]
+        if self.model_id != model_id():
+            print(f"⚠️  Embeddings du modèle {self.model_id}, modèle configuré {model_id()}: "
+                  f"recherche servie avec {self.model_id} jusqu'au ré-encodage "
+                  f"(python -m scripts.model_versions reembed)")
+        self.model, self.encoder = load_text_encoder(self.model_id)
+        self.caption_cache = self._open_caption_cache() if CAPTION_CACHE_ENABLED else None
+        # Stored vectors, loaded on first use by a search (see `embeddings_cache`)
+        self._embeddings_cache = None
+        self._serving = SERVING_INDEX
+        self._matrix = None
+        self._rows = None
+        # Generation of the segment log reflected by the cache (hot reload)
+        self.generation = 0
+        # Serializes searches with the changes applied by `refresh`
+        self._lock = threading.RLock()
+        self.ann_index = None
+        # Store batches added to the IVF index since its last save
+        self._ann_unsaved = 0
+        self.sharded_index = None
+        self.segment_log = None
+        # Clusters built offline (scripts.clustering) and cluster of each matrix row
+        self.cluster_index = None
+        self._cluster_mtime = None
+        self._row_clusters = None
+        # Store batches assigned to clusters since their last save
+        self._cluster_unsaved = 0
+        self._load_cluster_index()
+        if self._serving and ServingIndex.exists(SERVING_INDEX_DIR):
+            # A per-process IVF index or shard set would not follow the published generation
+            if ANN_ENABLED or EMBEDDING_SHARDS > 1 or SHARD_ADDRESSES:
+                print("⚠️  ANN_ENABLED et les shards sont ignorés avec SERVING_INDEX "
+                      "(recherche sur l'index de service partagé)")
+        else:
+            if ANN_ENABLED:
+                self._load_ann_index()
+            if EMBEDDING_SHARDS > 1 or SHARD_ADDRESSES:
+                self._start_shards()
+
+    @property
+    def embeddings_cache(self):
+        """
+        Stored embeddings ({filename: embedding}, VectorStore or ServingIndex).
+
+        Loaded on first access, so that a process which only writes (pipeline,
+        watch mode) appends to the segment log without holding every vector.
+        """
+        if self._embeddings_cache is None:
+            with self._lock:
+                if self._embeddings_cache is None:
+                    self._load_existing_embeddings()
+        return self._embeddings_cache
+
+    @embeddings_cache.setter
+    def embeddings_cache(self, cache):
+        self._embeddings_cache = cache
+
+    @staticmethod
+    def _new_cache():
+        """
+        Creates an empty embeddings cache.
+
+        A plain dict of float lists with the default float32 codec, otherwise a
+        compressed VectorStore (float16, int8 or product-quantized codes).
+        """
+        if EMBEDDING_CODEC == "float32":
+            return {}
+        # Fichier brut propre au processus: plusieurs serveurs peuvent tourner en parallèle
+        raw_path = f"{EMBEDDING_RAW_PATH}.{os.getpid()}"
+        return VectorStore(make_codec(EMBEDDING_CODEC, **EmbeddingManager._codec_kwargs()), raw_path,
+                           rerank=EMBEDDING_RERANK)
+
+    @staticmethod
+    def _codec_kwargs():
+        """Parameters of the configured codec (number of PQ subvectors)."""
+        return {"m": PQ_SUBVECTORS} if EMBEDDING_CODEC == "pq" else {}
+
+    def _open_caption_cache(self):
+        """
+        Opens the caption -> embedding cache of the current model and backend.
+
+        Each model/backend pair gets its own directory so that vectors from
+        different encoders are never mixed.
+        """
+        return CaptionCache(caption_cache_dir(self.model_id, self.encoder.name), SEGMENT_COMPACTION_THRESHOLD,
+                            max_entries=CAPTION_CACHE_SIZE)
 
     def _load_existing_embeddings(self):
         """
-        Loads existing embeddings from the cache file.
+        Loads existing embeddings from the segment log (or the JSON file).
 
-        If the cache file exists, it loads the embeddings from it and stores them in the cache.
-        If there's an error, it prints an error message.
+        If stored embeddings exist, they are loaded into the cache.
+        When serving (SERVING_INDEX), the published read-only index is memory-mapped
+        instead (shared between processes), and a reload only swaps the mapping.
+        If there's an error, it prints an error message and the cache stays empty.
         """
-        if os.path.exists(EMBEDDING_PATH):
-            try:
+        try:
+            if self._serving:
+                if isinstance(self._embeddings_cache, ServingIndex):
+                    self._embeddings_cache.reload()
+                    return
+                if ServingIndex.exists(SERVING_INDEX_DIR):
+                    index = ServingIndex(SERVING_INDEX_DIR)
+                    self._use_published_model()
+                    self.embeddings_cache = index
+                    self._matrix = None
+                    return
+                print("⚠️  Aucun index de service publié, embeddings chargés en mémoire")
+            generation = 0
+            data = {}
+            if EMBEDDING_STORAGE == "segments":
+                segment_log = self._open_segment_log()
+                data = segment_log.load()
+                generation = segment_log.generation
+            elif os.path.exists(EMBEDDING_PATH):
                 with open(EMBEDDING_PATH, 'r', encoding='utf-8') as f:
                     data = json.load(f)
-                    self.embeddings_cache = data
+            if EMBEDDING_CODEC != "float32":
+                cache = self._new_cache()
+                cache.update(data)
+                data = cache
+            with self._lock:
+                self.embeddings_cache = data
+                self._matrix = None
+                self.generation = generation
+        except Exception as e:
+            print(f"⚠️  Impossible de charger les embeddings: {e}")
+            if self._embeddings_cache is None:
+                self.embeddings_cache = self._new_cache()
+
+    def _use_published_model(self) -> bool:
+        """
+        Encodes queries with the model of the published serving index (read path only).
+
+        Returns True when the model changed.
+        """
+        model = published_model(SERVING_INDEX_DIR)
+        if not model or model == self.model_id:
+            return False
+        sentence_model, encoder = load_text_encoder(model)
+        with self._lock:
+            self._set_model(model, sentence_model, encoder)
+        print(f"🔀 Modèle d'embedding servi: {model}")
+        return True
+
+    def _use_writer_version(self) -> None:
+        """
+        Makes this process a writer of the version `registry.active()` points to.
+
+        The published serving index is read-only and may still hold the previous
+        model: a process that encodes captions for ingestion or stores embeddings
+        uses the active model and segment directory, and reads the storage.
+        """
+        if not self._serving:
+            return
+        active = self.registry.active()
+        loaded = None
+        if active["model"] != self.model_id:
+            loaded = load_text_encoder(active["model"])
+        with self._lock:
+            if not self._serving:
+                return
+            self._serving = False
+            if isinstance(self._embeddings_cache, ServingIndex):
+                self._embeddings_cache = None
+                self._matrix = None
+            if loaded is not None:
+                self._set_model(active["model"], *loaded)
+            if active["dir"] != self.segment_dir:
+                if self.segment_log is not None:
+                    self.segment_log.stop_background_compaction()
+                self.segment_dir = active["dir"]
+                self.segment_log = None
+
+    def _open_segment_log(self):
+        """
+        Opens the segment log of the active embedding version (vectors tagged with the model id).
+
+        On first use, an existing embeddings.json is imported as the first segment.
+        """
+        if self.segment_log is None:
+            self.segment_log = SegmentLog(self.segment_dir, model=self.model_id)
+            if (self.segment_log.generation == 0 and self.segment_dir == EMBEDDING_SEGMENT_DIR
+                    and os.path.exists(EMBEDDING_PATH)):
+                with open(EMBEDDING_PATH, 'r', encoding='utf-8') as f:
+                    self.segment_log.append(json.load(f))
+                print(f"✅ {EMBEDDING_PATH} importé dans {EMBEDDING_SEGMENT_DIR}")
+        return self.segment_log
+
+    def _load_ann_index(self):
+        """
+        Loads the IVF index stored next to the embeddings.
+
+        If no index exists yet, an empty one is created; it is trained as soon as
+        the store holds ANN_MIN_TRAIN_SIZE embeddings. With segments, the batches
+        stored after the last save of the index are replayed from the log.
+        """
+        self.ann_index = IVFIndex(nlist=ANN_NLIST, nprobe=ANN_NPROBE)
+        self._ann_unsaved = 0
+        if os.path.exists(ANN_INDEX_PATH):
+            try:
+                index = IVFIndex.load(ANN_INDEX_PATH)
+                index.nprobe = ANN_NPROBE
+                if EMBEDDING_STORAGE == "segments":
+                    apply_ann_log_changes(index, self._open_segment_log())
+                self.ann_index = index
             except Exception as e:
-                print(f"⚠️  Impossible de charger les embeddings: {e}")
+                print(f"⚠️  Impossible de charger l'index ANN: {e}")
+
+    def _start_shards(self):
+        """
+        Starts the sharded index and distributes the stored embeddings to it.
+
+        Shards are local worker processes, or remote shard servers when
+        SHARD_ADDRESSES is set. The vectors are streamed from the segment log
+        by chunks: the coordinator only keeps the shard connections, not the
+        embeddings (`refresh` forwards the later changes of the log).
+        """
+        addresses = [(a.split(":")[0], int(a.split(":")[1])) for a in SHARD_ADDRESSES]
+        try:
+            self.sharded_index = ShardedIndex(
+                EMBEDDING_SHARDS, codec_name=EMBEDDING_CODEC, rerank=EMBEDDING_RERANK,
+                addresses=addresses or None, authkey=authkey_bytes(SHARD_AUTHKEY),
+                codec_kwargs=self._codec_kwargs(),
+            ).start()
+            if EMBEDDING_STORAGE == "segments":
+                segment_log = SegmentLog(self.segment_dir)
+                for ids, vectors in segment_log.iter_current(STREAM_CHUNK_SIZE):
+                    self.sharded_index.add(dict(zip(ids, vectors.tolist())))
+                self.generation = segment_log.generation
+            else:
+                self.sharded_index.add(dict(self.embeddings_cache.items()))
+        except Exception as e:
+            print(f"⚠️  Impossible de démarrer les shards: {e}")
+            self.sharded_index = None
+
+    def _get_matrix(self):
+        """
+        Returns the cached embeddings as (ids, normalized float32 matrix).
 
-    def generate_embedding(self, text: str) -> list:
+        The matrix is rebuilt lazily after the cache changes.
+        """
+        if self._matrix is None:
+            ids = list(self.embeddings_cache)
+            matrix = np.array([self.embeddings_cache[i] for i in ids], dtype=np.float32)
+            if len(ids):
+                matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-8
+            self._matrix = (ids, matrix)
+            self._rows = {image_id: row for row, image_id in enumerate(ids)}
+            self._row_clusters = None
+        return self._matrix
+
+    def _patch_matrix(self, upserts: dict, removed: list) -> None:
+        """
+        Applies added, updated and removed embeddings to the search matrix in place.
+
+        A removed row is replaced by the last one; new rows are appended.
+        """
+        ids, matrix = self._matrix
+        rows = self._rows
+        for image_id in removed:
+            row = rows.pop(image_id, None)
+            if row is None:
+                continue
+            last = len(ids) - 1
+            if row != last:
+                ids[row] = ids[last]
+                rows[ids[row]] = row
+                matrix[row] = matrix[last]
+            ids.pop()
+        matrix = matrix[:len(ids)]
+
+        if upserts:
+            upsert_ids = list(upserts)
+            vectors = np.array([upserts[i] for i in upsert_ids], dtype=np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-8
+            new = []
+            for image_id, vector in zip(upsert_ids, vectors):
+                if image_id in rows:
+                    matrix[rows[image_id]] = vector
+                else:
+                    rows[image_id] = len(ids)
+                    ids.append(image_id)
+                    new.append(vector)
+            if new:
+                matrix = np.vstack([matrix.reshape(-1, vectors.shape[1]), np.stack(new)])
+        self._matrix = (ids, matrix)
+        self._row_clusters = None
+
+    def build_ann_index(self) -> None:
+        """
+        Trains the IVF index on every cached embedding and saves it.
+
+        Call it again after large imports to refresh the centroids.
+        """
+        ids, matrix = self._get_matrix()
+        if not ids:
+            return
+        index = IVFIndex(nlist=ANN_NLIST, nprobe=ANN_NPROBE)
+        index.train(matrix)
+        index.add(ids, matrix)
+        index.generation = self.generation
+        index.save(ANN_INDEX_PATH)
+        self.ann_index = index
+        self._ann_unsaved = 0
+        print(f"✅ Index ANN construit: {len(ids)} vecteurs, {index.nlist} listes")
+
+    def generate_embedding(self, text: str, cache: bool = True) -> list:
         """
         Generates an embedding for the given text.
 
-        Uses the pre-trained SentenceTransformer model to generate an embedding for the text.
+        Uses the configured inference backend (PyTorch or ONNX Runtime) to generate an embedding for the text.
+        Identical captions (after normalization) are served from the caption cache; with cache=False
+        (search queries) the cache and its statistics are left untouched. Captions encoded for
+        ingestion (cache=True) always use the active version's model, never the serving one.
         Returns the embedding as a list. If there's an error, it prints an error message and returns None.
         """
+        if cache:
+            self._use_writer_version()
+        if cache and self.caption_cache is not None:
+            cached = self.caption_cache.get(text)
+            if cached is not None:
+                metrics.inc("caption_cache_hits")
+                return cached
+            metrics.inc("caption_cache_misses")
         try:
-            embedding = self.model.encode(text, convert_to_numpy=True)
-            return embedding.tolist()
+            embedding = self.encoder.encode([text])[0].tolist()
+            if cache:
+                self.remember_caption(text, embedding)
+            return embedding
         except Exception as e:
             print(f"Erreur embedding: {e}")
             return None
 
-    def store_embeddings(self, embeddings_dict: dict) -> None:
+    def store_embeddings(self, embeddings_dict: dict) -> bool:
         """
-        Stores the given embeddings in the cache.
+        Stores the given embeddings.
 
-        Updates the cache with the given embeddings and saves it to the cache file.
+        Persists them as a new segment in the append-only log (cost proportional
+        to the batch), or by a full rewrite of the JSON file when EMBEDDING_STORAGE
+        is "json". With segments, the in-memory cache is only updated if a search
+        already loaded it: a writer's memory does not grow with the corpus.
         Prints a success message if the embeddings are saved successfully.
-        If there's an error, it prints an error message.
+        If there's an error, it prints an error message and returns False so
+        that callers (checkpoints) do not mark these images as done.
         """
         try:
-            self.embeddings_cache.update(embeddings_dict)
-            with open(EMBEDDING_PATH, 'w', encoding='utf-8') as f:
-                json.dump(self.embeddings_cache, f, indent=2)
+            # L'index de service est en lecture seule: un écrivain relit le stockage à la demande
+            self._use_writer_version()
+            if EMBEDDING_STORAGE == "segments":
+                segment_log = self._open_segment_log()
+                generation = segment_log.append(embeddings_dict)
+                with self._lock:
+                    if self._embeddings_cache is not None:
+                        self._embeddings_cache.update(embeddings_dict)
+                        self._matrix = None
+                    self.generation = generation
+                segment_log.start_background_compaction(SEGMENT_COMPACTION_THRESHOLD)
+                if self.registry.active()["dir"] != self.segment_dir:
+                    print(f"⚠️  Version {self.registry.active()['model']} activée: ces embeddings "
+                          f"({self.model_id}) seront repris par le prochain "
+                          f"`python -m scripts.model_versions reembed`; relancez ce processus")
+            else:
+                self.embeddings_cache.update(embeddings_dict)
+                self._matrix = None
+                with open(EMBEDDING_PATH, 'w', encoding='utf-8') as f:
+                    json.dump(dict(self.embeddings_cache.items()), f, indent=2)
+            if self.caption_cache is not None:
+                self.caption_cache.flush()
             print(f"✅ {len(embeddings_dict)} embeddings sauvegardés")
         except Exception as e:
             print(f"❌ Erreur lors de la sauvegarde: {e}")
+            return False
+
+        if self.ann_index is not None:
+            self._update_ann_index(embeddings_dict)
+        if self.sharded_index is not None:
+            self.sharded_index.add(embeddings_dict)
+        self._update_clusters(embeddings_dict, [])
+        return True
+
+    def remove_embeddings(self, image_ids: list) -> None:
+        """
+        Removes embeddings from the cache and records the removal in the segment log.
+
+        Readers apply the removal on their next `refresh`. When the vectors were
+        not loaded (writer process), the removal is only recorded in the log.
+        """
+        self._use_writer_version()
+        cache = self._embeddings_cache if EMBEDDING_STORAGE == "segments" else self.embeddings_cache
+        removed = list(image_ids) if cache is None else [i for i in image_ids if i in cache]
+        if not removed:
+            return
+        try:
+            if cache is not None:
+                with self._lock:
+                    self._apply_changes({}, removed)
+            else:
+                if self.sharded_index is not None:
+                    self.sharded_index.remove(removed)
+                if self.ann_index is not None and self.ann_index.is_trained:
+                    self.ann_index.remove(removed)
+            if EMBEDDING_STORAGE == "segments":
+                self.generation = self._open_segment_log().append({}, deleted=removed)
+            else:
+                with open(EMBEDDING_PATH, 'w', encoding='utf-8') as f:
+                    json.dump(dict(self.embeddings_cache.items()), f, indent=2)
+            self._ann_index_changed()
+            print(f"🗑️  {len(removed)} embeddings supprimés")
+        except Exception as e:
+            print(f"❌ Erreur lors de la suppression: {e}")
+            return
+        self._update_clusters({}, removed)
+
+    def _apply_changes(self, upserts: dict, removed: list) -> None:
+        """
+        Applies a delta to the cache, the search matrix and the ANN index (caller holds the lock).
+        """
+        cache = self.embeddings_cache
+        if removed:
+            if isinstance(cache, VectorStore):
+                cache.remove(removed)
+            else:
+                for image_id in removed:
+                    cache.pop(image_id, None)
+        if upserts:
+            cache.update(upserts)
+        if self._matrix is not None:
+            self._patch_matrix(upserts, removed)
+        if self.ann_index is not None and self.ann_index.is_trained:
+            self.ann_index.remove(removed)
+            self.ann_index.add(list(upserts), [upserts[i] for i in upserts])
+        if self.sharded_index is not None:
+            if removed:
+                self.sharded_index.remove(removed)
+            if upserts:
+                self.sharded_index.add(upserts)
+
+    def refresh(self) -> dict:
+        """
+        Hot reload: applies only the changes published since the cached generation.
+
+        New segments of the log are read and their added, updated and removed
+        embeddings applied to the cache, the search matrix and the ANN index;
+        nothing is re-read when no generation was published. A full reload only
+        happens when a compaction merged segments this reader had not seen. With
+        the shared serving index, the mapping is swapped to the latest generation.
+
+        Clusters rebuilt or updated on disk are reloaded as well. When another
+        embedding version became active (new model), the process switches to it.
+
+        Returns:
+            dict: generation, added, updated, removed, reset (full reload), clusters (reloaded)
+                and switched (new model version)
+        """
+        stats = {"generation": self.generation, "added": 0, "updated": 0, "removed": 0, "reset": False}
+        stats["switched"] = self._follow_active_version()
+        stats["clusters"] = self._load_cluster_index()
+        if stats["switched"]:
+            stats.update(generation=self.generation, added=len(self._embeddings_cache or ()), reset=True)
+            return stats
+        if self.sharded_index is not None and self.sharded_index.failed:
+            print(f"🔁 Redémarrage des shards (perdus: {sorted(self.sharded_index.failed)})")
+            self._restart_shards(stats)
+        if self._embeddings_cache is None:
+            if self.sharded_index is not None and EMBEDDING_STORAGE == "segments":
+                self._refresh_shards(stats)
+            # Not loaded yet: the first search reads the latest state
+            return stats
+        if isinstance(self._embeddings_cache, ServingIndex):
+            stats["reset"] = self.embeddings_cache.reload()
+            stats["generation"] = self.embeddings_cache.generation
+            return stats
+        if EMBEDDING_STORAGE != "segments":
+            self._load_existing_embeddings()
+            stats["reset"] = True
+            return stats
+
+        generation, reset, changes = self._open_segment_log().read_changes(self.generation)
+        if generation == self.generation and not changes:
+            return stats
+        with self._lock:
+            if reset:
+                self.embeddings_cache = self._new_cache()
+                self._matrix = None
+                if self.ann_index is not None:
+                    self._load_ann_index()
+            for ids, vectors, deleted in changes:
+                removed = [i for i in deleted if i in self.embeddings_cache]
+                upserts = dict(zip(ids, vectors.tolist()))
+                updated = sum(1 for i in upserts if i in self.embeddings_cache)
+                self._apply_changes(upserts, removed)
+                stats["removed"] += len(removed)
+                stats["updated"] += updated
+                stats["added"] += len(upserts) - updated
+            self.generation = generation
+        stats.update(generation=generation, reset=reset)
+        return stats
+
+    def _refresh_shards(self, stats: dict) -> None:
+        """
+        Forwards the segments published since the last generation to the shards.
+
+        The vectors are not kept by the coordinator. After a compaction this
+        reader had not seen, the shards are restarted from the log.
+        """
+        generation, reset, changes = SegmentLog(self.segment_dir).read_changes(self.generation)
+        if generation == self.generation and not changes:
+            return
+        if reset:
+            self._restart_shards(stats)
+            return
+        for ids, vectors, deleted in changes:
+            if deleted:
+                self.sharded_index.remove(deleted)
+            if ids:
+                self.sharded_index.add(dict(zip(ids, vectors.tolist())))
+            stats["removed"] += len(deleted)
+            stats["added"] += len(ids)
+        self.generation = generation
+        stats["generation"] = generation
+
+    def _restart_shards(self, stats: dict) -> None:
+        """
+        Restarts the shards and refills them from the log.
+
+        Used when a shard process was lost (searches return partial results until
+        then) or after a compaction of segments not forwarded yet. A loaded cache
+        keeps its generation: the changes it applies next are idempotent for the shards.
+        """
+        generation = self.generation
+        self.sharded_index.close()
+        self._start_shards()
+        if self._embeddings_cache is not None:
+            self.generation = generation
+        stats.update(generation=self.generation, reset=True)
+
+    def _follow_active_version(self) -> bool:
+        """
+        Switches to the embedding version the registry (or the published serving index) points to.
+
+        The new encoder and embeddings are loaded first; they replace the old ones
+        under the lock, so a search sees either the old model and vectors or the
+        new ones, never a mix. Returns True when the model changed.
+        """
+        model = published_model(SERVING_INDEX_DIR) if self._serving else None
+        if model:
+            if model == self.model_id:
+                return False
+            sentence_model, encoder = load_text_encoder(model)
+            with self._lock:
+                if isinstance(self._embeddings_cache, ServingIndex):
+                    self._embeddings_cache.reload()
+                self._set_model(model, sentence_model, encoder)
+            print(f"🔀 Modèle d'embedding servi: {model}")
+            return True
+
+        signature = self.registry.signature()
+        if signature == self._registry_signature:
+            return False
+        self._registry_signature = signature
+        active = self.registry.active()
+        if active["dir"] == self.segment_dir:
+            return False
+
+        sentence_model, encoder = load_text_encoder(active["model"])
+        segment_log = SegmentLog(active["dir"], model=active["model"])
+        # Vectors are only re-read if this process had loaded them
+        loaded = self._embeddings_cache is not None
+        data = segment_log.load() if loaded and EMBEDDING_STORAGE == "segments" else {}
+        old_log = self.segment_log
+        with self._lock:
+            self._set_model(active["model"], sentence_model, encoder)
+            self.segment_dir = active["dir"]
+            self.segment_log = segment_log
+            cache = None
+            if loaded:
+                cache = self._new_cache()
+                cache.update(data)
+            self.embeddings_cache = cache
+            self._matrix = None
+            self.generation = segment_log.generation
+            # Index et clusters du modèle précédent: autre espace vectoriel
+            if self.ann_index is not None:
+                self.ann_index = IVFIndex(nlist=ANN_NLIST, nprobe=ANN_NPROBE)
+            self.cluster_index = None
+            self._cluster_mtime = None
+            self._row_clusters = None
+        if old_log is not None:
+            old_log.stop_background_compaction()
+        if self.ann_index is not None and loaded and len(cache) >= ANN_MIN_TRAIN_SIZE:
+            self.build_ann_index()
+        if self.sharded_index is not None:
+            self.sharded_index.close()
+            self._start_shards()
+        print(f"🔀 Version d'embeddings active: {active['model']}")
+        return True
+
+    def _set_model(self, model: str, sentence_model, encoder) -> None:
+        """Replaces the model, its encoder and its caption cache (caller holds the lock)."""
+        if self.caption_cache is not None:
+            self.caption_cache.flush()
+        self.model_id = model
+        self.model = sentence_model
+        self.encoder = encoder
+        self.caption_cache = self._open_caption_cache() if CAPTION_CACHE_ENABLED else None
+
+    def _load_cluster_index(self) -> bool:
+        """
+        Loads the clusters saved by `python -m scripts.clustering` if the file changed.
+
+        Segments published after the saved generation (assignments a writer had
+        not saved yet) are replayed from the log.
+        Returns True when a new version was loaded.
+        """
+        try:
+            mtime = os.stat(CLUSTER_PATH).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._cluster_mtime:
+            return False
+        try:
+            index = ClusterIndex.load(CLUSTER_PATH)
+        except Exception as e:
+            print(f"⚠️  Impossible de charger les clusters: {e}")
+            return False
+        if index.model not in (None, self.model_id):
+            # Clusters d'un autre modèle: ignorés jusqu'à leur reconstruction
+            self._cluster_mtime = mtime
+            return False
+        if EMBEDDING_STORAGE == "segments" and index.is_trained:
+            try:
+                # Rows missing after a compaction stay unassigned (always scanned)
+                apply_log_changes(index, SegmentLog(self.segment_dir))
+            except Exception as e:
+                print(f"⚠️  Impossible de rattraper les clusters: {e}")
+        with self._lock:
+            self.cluster_index = index
+            self._cluster_mtime = mtime
+            self._row_clusters = None
+        return True
+
+    def _update_clusters(self, upserts: dict, removed: list) -> None:
+        """
+        Assigns new embeddings to their nearest cluster (centroids move towards them).
+
+        With segments, the clusters file is only rewritten every CLUSTER_SAVE_INTERVAL
+        batches: assignments not saved yet are replayed from the log when it is loaded.
+        Does nothing until the clusters have been built.
+        """
+        if self.cluster_index is None:
+            return
+        try:
+            with self._lock:
+                self.cluster_index.remove(removed)
+                ids = list(upserts)
+                self.cluster_index.update(ids, [upserts[i] for i in ids])
+                self.cluster_index.generation = self.generation
+                self._row_clusters = None
+            self._cluster_unsaved += 1
+            if EMBEDDING_STORAGE == "segments" and self._cluster_unsaved < CLUSTER_SAVE_INTERVAL:
+                return
+            self.cluster_index.save(CLUSTER_PATH)
+            self._cluster_mtime = os.stat(CLUSTER_PATH).st_mtime_ns
+            self._cluster_unsaved = 0
+        except Exception as e:
+            print(f"⚠️  Erreur lors de la mise à jour des clusters: {e}")
+
+    def publish_serving_index(self) -> None:
+        """
+        Publishes the stored embeddings as a new generation of the shared serving index.
+
+        Serving processes (SERVING_INDEX) switch to it on their next reload. The
+        vectors are read from the active version's storage, not from the index
+        previously published; with segments they are streamed from the log by
+        chunks, so the writer never loads the whole corpus.
+        """
+        self._use_writer_version()
+        try:
+            if EMBEDDING_STORAGE == "segments":
+                embeddings = self._open_segment_log().iter_current(STREAM_CHUNK_SIZE)
+            else:
+                embeddings = self.embeddings_cache
+            name = publish_serving_index(embeddings, SERVING_INDEX_DIR, model=self.model_id)
+            print(f"✅ Index de service publié: {name}")
+        except Exception as e:
+            print(f"⚠️  Impossible de publier l'index de service: {e}")
+
+    def remember_caption(self, caption: str, embedding: list) -> None:
+        """
+        Adds a caption embedding to the caption cache (persisted with the next store).
+
+        Also used by the main process for embeddings computed in worker processes.
+        """
+        if self.caption_cache is not None and embedding is not None:
+            self.caption_cache.add(caption, embedding)
+
+    def _update_ann_index(self, embeddings_dict: dict) -> None:
+        """
+        Inserts new embeddings into the ANN index, training it first if needed.
+
+        With segments, the training threshold is checked against the manifest
+        count, so the writer does not load the vectors before training.
+        """
+        try:
+            if not self.ann_index.is_trained:
+                stored = (self._open_segment_log().approx_count if EMBEDDING_STORAGE == "segments"
+                          else len(self.embeddings_cache))
+                if stored >= ANN_MIN_TRAIN_SIZE:
+                    self.build_ann_index()
+                return
+            ids = list(embeddings_dict)
+            self.ann_index.add(ids, [embeddings_dict[i] for i in ids])
+            self._ann_index_changed()
+        except Exception as e:
+            print(f"⚠️  Erreur lors de la mise à jour de l'index ANN: {e}")
+
+    def _ann_index_changed(self) -> None:
+        """
+        Records a batch applied to the trained ANN index.
+
+        Saving rewrites every vector of the index: with segments, it is only done
+        every ANN_SAVE_INTERVAL batches and by `save_ann_index` at the end of a run.
+        Batches not saved yet are replayed from the log when the index is loaded.
+        """
+        if self.ann_index is None or not self.ann_index.is_trained:
+            return
+        self.ann_index.generation = self.generation
+        self._ann_unsaved += 1
+        if EMBEDDING_STORAGE != "segments" or self._ann_unsaved >= ANN_SAVE_INTERVAL:
+            self.save_ann_index()
+
+    def save_ann_index(self) -> None:
+        """
+        Saves the ANN index if batches were added since its last save (end of a run).
+        """
+        if self.ann_index is None or not self._ann_unsaved:
+            return
+        try:
+            self.ann_index.save(ANN_INDEX_PATH)
+            self._ann_unsaved = 0
+        except Exception as e:
+            print(f"⚠️  Impossible de sauvegarder l'index ANN: {e}")
 
     def search_similar(self, query_text: str, top_k: int = 5) -> list:
         """
         Searches for similar embeddings in the cache.
 
         Uses the generated embedding for the query text to search for similar embeddings in the cache.
+        Shards are queried in parallel when EMBEDDING_SHARDS > 1; otherwise the trained IVF index
+        is used when ANN_ENABLED is set, or a vectorized exact scan (limited to the closest
+        clusters when CLUSTER_NPROBE is set).
         Returns a list of tuples containing the filename and similarity score of the top-k similar embeddings.
         If the cache is empty, it returns an empty list.
         """
+        if self.sharded_index is None and not self.embeddings_cache:
+            return []
+
+        # Query encoded and searched with the same model version
+        with self._lock:
+            query_embedding = self.generate_embedding(query_text, cache=False)
+            if query_embedding is None:
+                return []
+            return self.search_by_vector(query_embedding, top_k)
+
+    def count(self) -> int:
+        """
+        Number of searchable embeddings.
+
+        With shards, the count is asked to the shard processes instead of loading the vectors here.
+        """
+        if self.sharded_index is not None:
+            return len(self.sharded_index)
+        return len(self.embeddings_cache)
+
+    def encode_batch(self, texts: list) -> list:
+        """
+        Generates embeddings for several texts in a single model call.
+
+        Used for search queries: the caption cache is not consulted nor filled.
+        Returns a list of embeddings (lists of floats), in the same order as the texts.
+        """
+        return self.encoder.encode(texts).tolist()
+
+    def encode_queries(self, texts: list) -> list:
+        """
+        Encodes search queries and tags each vector with the model that produced it.
+
+        Returns a list of (model id, embedding) pairs, in the same order as the texts.
+        Pass the model id to `search_by_vector`: a query encoded just before a
+        version switch is then rejected instead of being compared with vectors
+        of another model.
+        """
+        with self._lock:
+            model, encoder = self.model_id, self.encoder
+        return [(model, vector) for vector in encoder.encode(texts).tolist()]
+
+    def search_by_vector(self, query_embedding: list, top_k: int = 5, model: str = None) -> list:
+        """
+        Searches for the embeddings most similar to an already encoded query.
+
+        With shards, the vectors live in the shard processes only. The shared
+        serving index is searched directly: a process ANN index is not used on it.
+        When `model` is given (see `encode_queries`), it is checked against the
+        searched vectors under the lock that a version switch takes, and
+        ModelMismatchError is raised if the query was encoded by another model.
+        Returns a list of (filename, score) tuples sorted by decreasing similarity.
+        """
+        if model is None:
+            return self._search_by_vector(query_embedding, top_k)
+        with self._lock:
+            if model != self.model_id:
+                raise ModelMismatchError(f"requête encodée par {model}, modèle courant: {self.model_id}")
+            return self._search_by_vector(query_embedding, top_k, model)
+
+    def _search_by_vector(self, query_embedding: list, top_k: int, model: str = None) -> list:
+        """Searches the shards, the serving index, the ANN index or the cached vectors."""
+        if self.sharded_index is not None and not isinstance(self._embeddings_cache, ServingIndex):
+            return self.sharded_index.search(query_embedding, top_k)
+
         if not self.embeddings_cache:
             return []
 
-        query_embedding = np.array(self.generate_embedding(query_text))
-        similarities = {}
+        with self._lock:
+            if isinstance(self.embeddings_cache, ServingIndex):
+                return self.embeddings_cache.search(query_embedding, top_k, model)
+
+            if self.ann_index is not None and self.ann_index.is_trained:
+                return self.ann_index.search(query_embedding, top_k)
 
-        for filename, emb in self.embeddings_cache.items():
-            emb_array = np.array(emb)
-            # Calcul de la similarité cosinus
-            similarity = np.dot(query_embedding, emb_array) / (
-                np.linalg.norm(query_embedding) * np.linalg.norm(emb_array) + 1e-8
-            )
-            similarities[filename] = float(similarity)
+            if isinstance(self.embeddings_cache, VectorStore):
+                return self.embeddings_cache.search(query_embedding, top_k)
 
-        sorted_results = sorted(similarities.items(), key=lambda x: x[1], reverse=True)
-        return sorted_results[:top_k]
+            ids, matrix = self._get_matrix()
+            if CLUSTER_NPROBE > 0 and self.cluster_index is not None and self.cluster_index.is_trained:
+                return self._search_clusters(ids, matrix, query_embedding, top_k)
+            return exact_search(ids, matrix, query_embedding, top_k)
+
+    def _search_clusters(self, ids: list, matrix: np.ndarray, query_embedding: list, top_k: int) -> list:
+        """
+        Exact search restricted to the rows of the CLUSTER_NPROBE clusters closest to the query.
+
+        Embeddings not assigned to a cluster yet are always scanned (caller holds the lock).
+        """
+        if self._row_clusters is None:
+            labels = self.cluster_index.labels
+            self._row_clusters = np.array([labels.get(i, -1) for i in ids], dtype=np.int32)
+        probed = self.cluster_index.probe(query_embedding, CLUSTER_NPROBE)
+        rows = np.flatnonzero(np.isin(self._row_clusters, probed) | (self._row_clusters < 0))
+        return [(ids[row], score) for row, score in exact_search(rows, matrix[rows], query_embedding, top_k)]
 
 
 # Instance globale
@@ -104,11 +904,10 @@ def generate_embedding(text: str) -> list:
     """Fonction de compatibilité."""
     return embedding_manager.generate_embedding(text)
 
-def store_embeddings(embeddings_dict: dict) -> None:
+def store_embeddings(embeddings_dict: dict) -> bool:
     """Fonction de compatibilité."""
-    embedding_manager.store_embeddings(embeddings_dict)
+    return embedding_manager.store_embeddings(embeddings_dict)
 
 def search_similar(query_text: str, top_k: int = 5) -> list:
     """Fonction de compatibilité."""
     return embedding_manager.search_similar(query_text, top_k)
-```
\ No newline at end of file
@@ -1,10 +1,45 @@
-```python
 import os
 import csv
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 from PIL.ExifTags import TAGS
 from datetime import datetime
-from config.settings import IMAGE_DIR, PROCESSED_IMAGE_DIR, METADATA_PATH
+from config.settings import (
+    IMAGE_DIR, PROCESSED_IMAGE_DIR, METADATA_PATH, METADATA_WORKERS,
+    METADATA_STORAGE, METADATA_STORE_DIR, STREAM_CHUNK_SIZE,
+)
+from scripts.metrics import metrics
+from scripts.streaming import bounded_map, chunked, write_csv_rows
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
+
+# EXIF tags kept in the CSV: (column, IFD, tag id). IFD None is the main IFD,
+# 0x8769 the Exif sub-IFD (shooting parameters).
+EXIF_FIELDS = (
+    ('Make', None, 0x010F),
+    ('Model', None, 0x0110),
+    ('Software', None, 0x0131),
+    ('DateTime', None, 0x0132),
+    ('Orientation', None, 0x0112),
+    ('DateTimeOriginal', 0x8769, 0x9003),
+    ('ExposureTime', 0x8769, 0x829A),
+    ('FNumber', 0x8769, 0x829D),
+    ('ISOSpeedRatings', 0x8769, 0x8827),
+    ('FocalLength', 0x8769, 0x920A),
+    ('LensModel', 0x8769, 0xA434),
+)
+
+EXIF_COLUMNS = [name for name, _, _ in EXIF_FIELDS]
+
+# Fixed schema of metadata.csv
+METADATA_COLUMNS = [
+    'filename', 'filepath', 'size_kb', 'extracted_at', 'width', 'height', 'format', 'mode',
+] + EXIF_COLUMNS
+
+# Keys of the records returned by extract_record (typed store)
+RECORD_COLUMNS = [
+    'filename', 'filepath', 'size_bytes', 'mtime', 'extracted_at', 'width', 'height', 'format', 'mode',
+] + EXIF_COLUMNS
 
 class MetadataExtractor:
     """
@@ -19,6 +54,24 @@ class MetadataExtractor:
     def __init__(self):
         """Initialize the metadata extractor."""
         self.metadata = []
+        self.storage = METADATA_STORAGE
+        self._store = None
+
+    @property
+    def store(self):
+        """
+        Parquet metadata store, or None when metadata is saved as CSV.
+
+        Falls back to CSV if pyarrow is not installed.
+        """
+        if self.storage == "parquet" and self._store is None:
+            try:
+                from scripts.metadata_store import MetadataStore
+                self._store = MetadataStore(METADATA_STORE_DIR)
+            except ImportError as e:
+                print(f"⚠️  pyarrow indisponible ({e}), métadonnées enregistrées en CSV")
+                self.storage = "csv"
+        return self._store
 
     def extract_exif_data(self, image_path: str) -> dict:
         """
@@ -87,56 +140,198 @@ class MetadataExtractor:
         
         return info
     
+    def extract_record(self, image_path: str, stat: os.stat_result = None) -> dict:
+        """
+        Extract the metadata of an image with a single open of the file.
+
+        Only the image header is parsed (PIL decodes pixels lazily), so the cost
+        is dominated by I/O. EXIF values are returned as read by PIL, without
+        conversion or truncation.
+
+        Args:
+            image_path (str): Path to the image.
+            stat (os.stat_result): File status if already known (from os.scandir).
+
+        Returns:
+            dict: filename, filepath, size_bytes, mtime, extracted_at, width, height,
+                format, mode and the EXIF_FIELDS columns (None when missing).
+        """
+        record = dict.fromkeys(RECORD_COLUMNS)
+        record['filename'] = os.path.basename(image_path)
+        record['filepath'] = image_path
+        record['extracted_at'] = datetime.now()
+
+        with metrics.span("metadata", filename=record['filename']):
+            try:
+                stat = stat or os.stat(image_path)
+                record['size_bytes'] = stat.st_size
+                record['mtime'] = stat.st_mtime
+                with Image.open(image_path) as image:
+                    record['width'] = image.width
+                    record['height'] = image.height
+                    record['format'] = image.format
+                    record['mode'] = image.mode
+                    exif = image.getexif()
+                    ifds = {None: exif}
+                    for name, ifd, tag_id in EXIF_FIELDS:
+                        if ifd not in ifds:
+                            ifds[ifd] = exif.get_ifd(ifd)
+                        record[name] = ifds[ifd].get(tag_id)
+            except Exception as e:
+                print(f"❌ Erreur lors de la lecture de {image_path}: {e}")
+        return record
+
+    def extract_row(self, image_path: str, stat: os.stat_result = None) -> dict:
+        """
+        Extract a metadata.csv row with a single open of the file.
+
+        Args:
+            image_path (str): Path to the image.
+            stat (os.stat_result): File status if already known (from os.scandir).
+
+        Returns:
+            dict: Row following METADATA_COLUMNS, missing values set to ''.
+        """
+        record = self.extract_record(image_path, stat)
+        row = dict.fromkeys(METADATA_COLUMNS, '')
+        for column in METADATA_COLUMNS:
+            value = record.get(column)
+            if value is not None:
+                row[column] = str(value)[:100] if column in EXIF_COLUMNS else value
+        row['extracted_at'] = record['extracted_at'].isoformat()
+        if record['size_bytes'] is not None:
+            row['size_kb'] = record['size_bytes'] / 1024
+        return row
+
+    def _scan_images(self, image_folder: str):
+        """Yield (path, stat) of the images of a folder, without stat-ing other files."""
+        with os.scandir(image_folder) as entries:
+            for entry in entries:
+                # Check if the file is an image
+                if entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield entry.path, entry.stat()
+
+    def iter_metadata(self, image_folder: str = IMAGE_DIR, workers: int = METADATA_WORKERS):
+        """
+        Yield the metadata row of each image in a folder.
+
+        Headers are read by a thread pool; the folder is walked as results are
+        consumed, so memory stays bounded whatever the number of files.
+
+        Args:
+            image_folder (str): Path to the folder containing images.
+            workers (int): Number of reading threads (1: no thread pool).
+
+        Yields:
+            dict: Row following METADATA_COLUMNS, in directory order.
+        """
+        yield from self._parallel(self.extract_row, self._scan_images(image_folder), workers)
+
+    def _parallel(self, extract, items, workers: int = METADATA_WORKERS):
+        """Apply `extract` to (path, stat) items from a bounded thread pool, in order."""
+        def task(item):
+            return extract(*item)
+
+        if workers <= 1:
+            yield from map(task, items)
+            return
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="metadata") as executor:
+            yield from bounded_map(executor, task, items, workers * 4)
+
     def save_metadata(self, image_folder: str = IMAGE_DIR) -> None:
         """
         Extract and save metadata from all images in a folder.
 
+        Rows follow the fixed METADATA_COLUMNS schema and are streamed to disk as
+        they are extracted, so memory use does not grow with the number of images.
+        With the Parquet store, only new or modified images are read and appended.
+
         Args:
             image_folder (str): Path to the folder containing images.
         """
-        # Initialize an empty list to store metadata
-        metadata_list = []
-        
-        # Iterate over the files in the image folder
-        for filename in os.listdir(image_folder):
-            # Check if the file is an image
-            if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp')):
-                # Get the full path to the image
-                image_path = os.path.join(image_folder, filename)
-                
-                # Extract image information and EXIF data
-                info = self.extract_image_info(image_path)
-                exif = self.extract_exif_data(image_path)
-                info.update(exif)
-                
-                # Add the metadata to the list
-                metadata_list.append(info)
-                print(f"  ✓ Métadonnées extraites: {filename}")
-        
-        # Save the metadata to a CSV file
-        if metadata_list:
-            try:
-                # Get the unique keys from the metadata list
-                keys = set()
-                for item in metadata_list:
-                    keys.update(item.keys())
-                keys = sorted(list(keys))
-                
-                # Write the metadata to the CSV file
-                with open(METADATA_PATH, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.DictWriter(f, fieldnames=keys)
-                    writer.writeheader()
-                    writer.writerows(metadata_list)
-                
-                print(f"✅ Métadonnées sauvegardées: {METADATA_PATH}")
-            except Exception as e:
-                # Handle any exceptions that occur during CSV writing
-                print(f"❌ Erreur lors de la sauvegarde: {e}")
+        if self.store is not None:
+            self._save_to_store(image_folder)
+            return
+        try:
+            count = write_csv_rows(METADATA_PATH, self.iter_metadata(image_folder), METADATA_COLUMNS)
+        except Exception as e:
+            # Handle any exceptions that occur during CSV writing
+            print(f"❌ Erreur lors de la sauvegarde: {e}")
+            return
+
+        if count:
+            print(f"✅ Métadonnées sauvegardées: {METADATA_PATH} ({count} images)")
         else:
             # Handle the case where no images are found
             print("⚠️  Aucune image trouvée pour extraire les métadonnées")
 
 
+    def _save_to_store(self, image_folder: str) -> None:
+        """
+        Append new or modified images (size or mtime changed) to the Parquet store.
+
+        Unchanged files are skipped from their directory entry, without being opened.
+        """
+        store = self.store
+        try:
+            changed = (
+                (path, stat) for path, stat in self._scan_images(image_folder)
+                if not store.is_current(os.path.basename(path), stat)
+            )
+            count = 0
+            for records in chunked(self._parallel(self.extract_record, changed), STREAM_CHUNK_SIZE):
+                count += store.append(records)
+            total = store.write_snapshot()
+        except Exception as e:
+            print(f"❌ Erreur lors de la sauvegarde: {e}")
+            return
+
+        if total:
+            print(f"✅ Métadonnées sauvegardées: {store.directory} "
+                  f"({count} nouvelles ou modifiées, {total} images)")
+        else:
+            print("⚠️  Aucune image trouvée pour extraire les métadonnées")
+
+    def append_metadata(self, image_paths: list) -> None:
+        """
+        Append the metadata of a few images to the existing CSV file.
+
+        Used for incremental indexing: the columns of the existing file are kept,
+        extra keys are ignored. A modified image gets a new row; the last row
+        for a filename wins when the CSV is loaded. With the Parquet store the
+        images are appended to today's partition instead.
+
+        Args:
+            image_paths (list): Paths of the images to add.
+        """
+        if self.store is not None:
+            try:
+                self.store.append([self.extract_record(path) for path in image_paths])
+            except Exception as e:
+                print(f"❌ Erreur lors de l'ajout des métadonnées: {e}")
+            return
+
+        rows = [self.extract_row(image_path) for image_path in image_paths]
+        if not rows:
+            return
+
+        try:
+            fieldnames = None
+            if os.path.exists(METADATA_PATH):
+                with open(METADATA_PATH, 'r', newline='', encoding='utf-8') as f:
+                    fieldnames = next(csv.reader(f), None)
+
+            if fieldnames:
+                with open(METADATA_PATH, 'a', newline='', encoding='utf-8') as f:
+                    writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+                    writer.writerows(rows)
+            else:
+                write_csv_rows(METADATA_PATH, rows, METADATA_COLUMNS)
+        except Exception as e:
+            # Handle any exceptions that occur during CSV writing
+            print(f"❌ Erreur lors de l'ajout des métadonnées: {e}")
+
+
 # Instance globale
 metadata_extractor = MetadataExtractor()
 
@@ -147,4 +342,3 @@ def save_metadata() -> None:
 def extract_metadata(image_path: str) -> dict:
     """Extrait les métadonnées d'une seule image."""
     return metadata_extractor.extract_image_info(image_path)
-```
\ No newline at end of file
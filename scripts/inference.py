@@ -0,0 +1,456 @@
+"""
+Backends d'inférence CPU pour MiniLM (embeddings) et CLIP (tags).
+Le backend "torch" utilise les modèles PyTorch tels quels ; le backend
+"onnx" exporte les modèles en ONNX (optionnellement quantifiés en int8
+dynamique) et les exécute avec ONNX Runtime, nombre de threads réglable.
+"""
+
+import os
+import json
+import time
+import numpy as np
+
+
+def _ort_session(model_path, threads=0):
+    """Ouvre une session ONNX Runtime sur CPU."""
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+    return ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+
+def _quantize(model_path):
+    """
+    Quantifie dynamiquement les poids d'un modèle ONNX en int8.
+
+    Returns:
+        str: Chemin du modèle quantifié
+    """
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantized_path = model_path.replace(".onnx", ".int8.onnx")
+    if not os.path.exists(quantized_path):
+        quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+    return quantized_path
+
+
+class TorchTextEncoder:
+    """Encodeur de texte SentenceTransformer (PyTorch, float32)."""
+
+    name = "torch"
+
+    def __init__(self, model):
+        self.model = model
+
+    def encode(self, texts):
+        """
+        Args:
+            texts (list): Textes à encoder
+
+        Returns:
+            np.ndarray: Embeddings (n, dim)
+        """
+        return self.model.encode(texts, convert_to_numpy=True, batch_size=max(1, len(texts)))
+
+
+class OnnxTextEncoder:
+    """
+    Encodeur de texte MiniLM exécuté par ONNX Runtime.
+
+    Reproduit la chaîne SentenceTransformer: transformer, mean pooling sur
+    le masque d'attention, puis normalisation L2 si le modèle d'origine l'applique.
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_dir, quantize=False, threads=0):
+        """
+        Args:
+            model_dir (str): Dossier produit par `export`
+            quantize (bool): Utiliser la version int8 dynamique
+            threads (int): Threads intra-op (0: défaut ONNX Runtime)
+        """
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, "config.json"), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        model_path = os.path.join(model_dir, "model.onnx")
+        if quantize:
+            model_path = _quantize(model_path)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = _ort_session(model_path, threads)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    @staticmethod
+    def export(sentence_model, model_dir):
+        """
+        Exporte le transformer d'un SentenceTransformer en ONNX.
+
+        Args:
+            sentence_model (SentenceTransformer): Modèle chargé
+            model_dir (str): Dossier de sortie
+        """
+        import torch
+
+        os.makedirs(model_dir, exist_ok=True)
+        transformer = sentence_model[0]
+        tokenizer = transformer.tokenizer
+        inputs = tokenizer(["exemple d'export"], return_tensors="pt", padding=True)
+        names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in inputs]
+        axes = {n: {0: "batch", 1: "sequence"} for n in names}
+        axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        torch.onnx.export(
+            transformer.auto_model,
+            tuple(inputs[n] for n in names),
+            os.path.join(model_dir, "model.onnx"),
+            input_names=names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=axes,
+            opset_version=14,
+        )
+        tokenizer.save_pretrained(model_dir)
+        normalize = any(type(m).__name__ == "Normalize" for m in sentence_model)
+        with open(os.path.join(model_dir, "config.json"), "w", encoding="utf-8") as f:
+            json.dump({"normalize": normalize, "max_length": transformer.max_seq_length}, f)
+
+    def encode(self, texts):
+        inputs = self.tokenizer(
+            list(texts), return_tensors="np", padding=True, truncation=True,
+            max_length=self.config["max_length"],
+        )
+        feeds = {k: v.astype(np.int64) for k, v in inputs.items() if k in self.input_names}
+        hidden = self.session.run(None, feeds)[0]
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        embeddings = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.config["normalize"]:
+            embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12
+        return embeddings
+
+
+class TorchClipEncoder:
+    """Encodeur CLIP PyTorch (image et texte séparés)."""
+
+    name = "torch"
+
+    def __init__(self, model, processor, device="cpu"):
+        self.model = model
+        self.processor = processor
+        self.device = device
+        self.logit_scale = float(model.logit_scale.exp().item())
+
+    def image_features(self, images):
+        import torch
+
+        inputs = self.processor(images=images, return_tensors="pt").to(self.device)
+        with torch.no_grad():
+            return self.model.get_image_features(**inputs).cpu().numpy()
+
+    def text_features(self, texts):
+        import torch
+
+        inputs = self.processor(text=texts, return_tensors="pt", padding=True).to(self.device)
+        with torch.no_grad():
+            return self.model.get_text_features(**inputs).cpu().numpy()
+
+
+class OnnxClipEncoder:
+    """Encodeurs image et texte de CLIP exécutés par ONNX Runtime."""
+
+    name = "onnx"
+
+    def __init__(self, model_dir, quantize=False, threads=0):
+        from transformers import CLIPProcessor
+
+        with open(os.path.join(model_dir, "config.json"), "r", encoding="utf-8") as f:
+            self.logit_scale = json.load(f)["logit_scale"]
+        image_path = os.path.join(model_dir, "image.onnx")
+        text_path = os.path.join(model_dir, "text.onnx")
+        if quantize:
+            image_path, text_path = _quantize(image_path), _quantize(text_path)
+        self.processor = CLIPProcessor.from_pretrained(model_dir)
+        self.image_session = _ort_session(image_path, threads)
+        self.text_session = _ort_session(text_path, threads)
+
+    @staticmethod
+    def export(model, processor, model_dir):
+        """
+        Exporte les deux tours de CLIP en ONNX.
+
+        Args:
+            model (CLIPModel): Modèle chargé
+            processor (CLIPProcessor): Préprocesseur associé
+            model_dir (str): Dossier de sortie
+        """
+        import torch
+        from PIL import Image
+
+        class _ImageTower(torch.nn.Module):
+            def __init__(self, clip):
+                super().__init__()
+                self.clip = clip
+
+            def forward(self, pixel_values):
+                return self.clip.get_image_features(pixel_values=pixel_values)
+
+        class _TextTower(torch.nn.Module):
+            def __init__(self, clip):
+                super().__init__()
+                self.clip = clip
+
+            def forward(self, input_ids, attention_mask):
+                return self.clip.get_text_features(input_ids=input_ids, attention_mask=attention_mask)
+
+        os.makedirs(model_dir, exist_ok=True)
+        model = model.to("cpu").eval()
+        pixels = processor(images=Image.new("RGB", (224, 224)), return_tensors="pt")["pixel_values"]
+        text = processor(text=["une photo", "un document"], return_tensors="pt", padding=True)
+
+        torch.onnx.export(
+            _ImageTower(model), (pixels,), os.path.join(model_dir, "image.onnx"),
+            input_names=["pixel_values"], output_names=["image_embeds"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+            opset_version=14,
+        )
+        torch.onnx.export(
+            _TextTower(model), (text["input_ids"], text["attention_mask"]),
+            os.path.join(model_dir, "text.onnx"),
+            input_names=["input_ids", "attention_mask"], output_names=["text_embeds"],
+            dynamic_axes={"input_ids": {0: "batch", 1: "sequence"},
+                          "attention_mask": {0: "batch", 1: "sequence"},
+                          "text_embeds": {0: "batch"}},
+            opset_version=14,
+        )
+        processor.save_pretrained(model_dir)
+        with open(os.path.join(model_dir, "config.json"), "w", encoding="utf-8") as f:
+            json.dump({"logit_scale": float(model.logit_scale.exp().item())}, f)
+
+    def image_features(self, images):
+        pixels = self.processor(images=images, return_tensors="np")["pixel_values"]
+        return self.image_session.run(None, {"pixel_values": pixels.astype(np.float32)})[0]
+
+    def text_features(self, texts):
+        inputs = self.processor(text=texts, return_tensors="np", padding=True)
+        feeds = {k: inputs[k].astype(np.int64) for k in ("input_ids", "attention_mask")}
+        return self.text_session.run(None, feeds)[0]
+
+
+def clip_probabilities(image_features, text_features, logit_scale):
+    """
+    Probabilités zero-shot (softmax sur les tags) à partir des features CLIP.
+
+    Args:
+        image_features (np.ndarray): Features images (n, d)
+        text_features (np.ndarray): Features des tags (t, d)
+        logit_scale (float): Échelle des logits du modèle
+
+    Returns:
+        np.ndarray: Probabilités (n, t)
+    """
+    image_features = image_features / np.linalg.norm(image_features, axis=-1, keepdims=True)
+    text_features = text_features / np.linalg.norm(text_features, axis=-1, keepdims=True)
+    logits = logit_scale * image_features @ text_features.T
+    logits -= logits.max(axis=-1, keepdims=True)
+    probs = np.exp(logits)
+    return probs / probs.sum(axis=-1, keepdims=True)
+
+
+def create_text_encoder(sentence_model, backend, onnx_dir, quantize=False, threads=0, export_name="minilm"):
+    """
+    Crée l'encodeur de texte du backend demandé (export ONNX au premier usage).
+
+    Retombe sur PyTorch si ONNX Runtime est absent ou si l'export échoue.
+    `export_name` est le sous-dossier de l'export (un par modèle de légendes).
+    """
+    if backend == "onnx":
+        model_dir = os.path.join(onnx_dir, export_name)
+        try:
+            if not os.path.exists(os.path.join(model_dir, "model.onnx")):
+                print(f"📦 Export ONNX de {export_name} vers {model_dir}")
+                OnnxTextEncoder.export(sentence_model, model_dir)
+            return OnnxTextEncoder(model_dir, quantize, threads)
+        except Exception as e:
+            print(f"⚠️  Backend ONNX indisponible pour MiniLM ({e}), utilisation de PyTorch")
+    return TorchTextEncoder(sentence_model)
+
+
+def create_clip_encoder(model, processor, backend, onnx_dir, quantize=False, threads=0, device="cpu"):
+    """
+    Crée l'encodeur CLIP du backend demandé (export ONNX au premier usage).
+
+    Retombe sur PyTorch si ONNX Runtime est absent ou si l'export échoue.
+    """
+    if backend == "onnx":
+        model_dir = os.path.join(onnx_dir, "clip")
+        try:
+            if not os.path.exists(os.path.join(model_dir, "image.onnx")):
+                print(f"📦 Export ONNX de CLIP vers {model_dir}")
+                OnnxClipEncoder.export(model, processor, model_dir)
+            return OnnxClipEncoder(model_dir, quantize, threads)
+        except Exception as e:
+            print(f"⚠️  Backend ONNX indisponible pour CLIP ({e}), utilisation de PyTorch")
+    return TorchClipEncoder(model, processor, device)
+
+
+def _time_calls(func, batches):
+    """Latences (ms) de func sur chaque lot, après un appel de préchauffage."""
+    func(batches[0])
+    latencies = []
+    for batch in batches:
+        start = time.perf_counter()
+        func(batch)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.array(latencies)
+
+
+def _latency_summary(latencies, items):
+    return {
+        "throughput_per_s": items / (latencies.sum() / 1000),
+        "latency_p50_ms": float(np.percentile(latencies, 50)),
+        "latency_p95_ms": float(np.percentile(latencies, 95)),
+    }
+
+
+def compare_text_encoders(reference, candidate, texts, batch_size=32, top_k=10):
+    """
+    Compare deux encodeurs de texte : débit, latence et accord de classement.
+
+    Args:
+        reference: Encodeur de référence (PyTorch)
+        candidate: Encodeur évalué (ONNX)
+        texts (list): Corpus de textes (sert aussi de requêtes)
+        batch_size (int): Taille des lots mesurés
+        top_k (int): Profondeur du classement comparé
+
+    Returns:
+        dict: Mesures par backend et accord candidat/référence
+    """
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    report = {}
+    for encoder in (reference, candidate):
+        report[encoder.name] = _latency_summary(_time_calls(encoder.encode, batches), len(texts))
+
+    ref = np.asarray(reference.encode(texts), dtype=np.float32)
+    cand = np.asarray(candidate.encode(texts), dtype=np.float32)
+    ref /= np.linalg.norm(ref, axis=1, keepdims=True) + 1e-12
+    cand /= np.linalg.norm(cand, axis=1, keepdims=True) + 1e-12
+    k = min(top_k, len(texts))
+    ref_top = np.argsort(-(ref @ ref.T), axis=1)[:, :k]
+    cand_top = np.argsort(-(cand @ cand.T), axis=1)[:, :k]
+    overlap = np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)])
+    report["agreement"] = {
+        "mean_cosine": float((ref * cand).sum(axis=1).mean()),
+        f"ranking_overlap@{k}": float(overlap),
+    }
+    return report
+
+
+def compare_clip_encoders(reference, candidate, images, tags, top_k=5):
+    """
+    Compare deux encodeurs CLIP : débit, latence et accord des tags zero-shot.
+
+    Args:
+        reference: Encodeur de référence (PyTorch)
+        candidate: Encodeur évalué (ONNX)
+        images (list): Images PIL
+        tags (list): Tags candidats
+        top_k (int): Nombre de tags retenus par image
+
+    Returns:
+        dict: Mesures par backend et accord candidat/référence
+    """
+    report, top = {}, {}
+    for encoder in (reference, candidate):
+        report[encoder.name] = _latency_summary(
+            _time_calls(encoder.image_features, [[image] for image in images]), len(images)
+        )
+        probs = clip_probabilities(
+            encoder.image_features(images), encoder.text_features(tags), encoder.logit_scale
+        )
+        top[encoder.name] = np.argsort(-probs, axis=1)[:, :top_k]
+
+    ref_top, cand_top = top[reference.name], top[candidate.name]
+    report["agreement"] = {
+        "top1": float(np.mean(ref_top[:, 0] == cand_top[:, 0])),
+        f"tag_overlap@{top_k}": float(np.mean(
+            [len(set(a) & set(b)) / top_k for a, b in zip(ref_top, cand_top)]
+        )),
+    }
+    return report
+
+
+def _benchmark_images(directory, count, seed=0):
+    """Images du dossier traité, complétées par des images synthétiques."""
+    from PIL import Image
+
+    images = []
+    if os.path.isdir(directory):
+        for name in sorted(os.listdir(directory))[:count]:
+            try:
+                images.append(Image.open(os.path.join(directory, name)).convert("RGB"))
+            except Exception:
+                continue
+    rng = np.random.default_rng(seed)
+    while len(images) < count:
+        pixels = rng.integers(0, 256, size=(224, 224, 3), dtype=np.uint8)
+        images.append(Image.fromarray(pixels))
+    return images
+
+
+def main():
+    """Compare les backends PyTorch et ONNX Runtime sur MiniLM et CLIP."""
+    import argparse
+    from config.settings import (
+        EMBEDDING_MODEL, MODEL_CACHE_DIR, PROCESSED_IMAGE_DIR, ONNX_DIR,
+    )
+
+    parser = argparse.ArgumentParser(description="Benchmark des backends d'inférence CPU")
+    parser.add_argument("--texts", type=int, default=512)
+    parser.add_argument("--images", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--quantize", action="store_true", help="Modèles ONNX int8 dynamiques")
+    parser.add_argument("--output", default=None, help="Fichier JSON des résultats")
+    args = parser.parse_args()
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from scripts.tag_clip import clip_tagger
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    words = ["facture", "plage", "montagne", "réunion", "chat", "contrat", "voiture",
+             "coucher de soleil", "document", "écran", "anniversaire", "forêt", "ville"]
+    rng = np.random.default_rng(0)
+    texts = [" ".join(rng.choice(words, size=rng.integers(3, 12))) for _ in range(args.texts)]
+
+    sentence_model = SentenceTransformer(EMBEDDING_MODEL, cache_folder=MODEL_CACHE_DIR)
+    text_report = compare_text_encoders(
+        TorchTextEncoder(sentence_model),
+        create_text_encoder(sentence_model, "onnx", ONNX_DIR, args.quantize, args.threads),
+        texts, args.batch_size,
+    )
+
+    clip_model = clip_tagger.model.to("cpu").eval()
+    processor = clip_tagger.processor
+    clip_report = compare_clip_encoders(
+        TorchClipEncoder(clip_model, processor),
+        create_clip_encoder(clip_model, processor, "onnx", ONNX_DIR, args.quantize, args.threads),
+        _benchmark_images(PROCESSED_IMAGE_DIR, args.images), clip_tagger.candidate_tags,
+    )
+
+    report = {"quantize": args.quantize, "threads": args.threads,
+              "minilm": text_report, "clip": clip_report}
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,19 @@
-```python
+import io
 import os
 import hashlib
 import shutil
+from collections import deque
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from PIL import Image
-from config.settings import IMAGE_DIR, PROCESSED_IMAGE_DIR, IMAGE_QUALITY, MAX_IMAGE_SIZE
+from config.settings import (
+    IMAGE_DIR, PROCESSED_IMAGE_DIR, IMAGE_QUALITY, MAX_IMAGE_SIZE, INGEST_WORKERS,
+    IMAGE_STORAGE_URL, PREFETCH_WINDOW,
+)
+from scripts.metrics import metrics
+from scripts.storage import iter_prefetched, open_storage
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp')
 
 class ImageIngestor:
     """
@@ -39,7 +49,7 @@ class ImageIngestor:
         Optimise une image en réduisant sa taille et en compressant.
 
         Args:
-            input_path (str): Chemin de l'image source.
+            input_path (str): Chemin de l'image source (ou fichier binaire ouvert).
             output_path (str): Chemin de sortie (optionnel).
 
         Returns:
@@ -63,61 +73,211 @@ class ImageIngestor:
 
             # Sauvegarder avec compression
             image.save(output_path, 'JPEG', quality=IMAGE_QUALITY, optimize=True)
-            print(f"  ✓ Image optimisée: {os.path.basename(input_path)}")
+            print(f"  ✓ Image optimisée: {os.path.basename(output_path)}")
             return True
 
         except Exception as e:
-            print(f"⚠️  Erreur lors de l'optimisation de {input_path}: {e}")
+            print(f"⚠️  Erreur lors de l'optimisation de {os.path.basename(output_path)}: {e}")
             return False
 
-    def ingest_images(self, source_folder: str = IMAGE_DIR, remove_duplicates: bool = True) -> None:
+    def ingest_images(self, source_folder: str = IMAGE_STORAGE_URL, remove_duplicates: bool = True,
+                      workers: int = INGEST_WORKERS) -> None:
         """
-        Ingère les images d'un dossier.
+        Ingère les images d'un dossier ou d'un stockage objet (s3://bucket/prefixe).
 
         Args:
-            source_folder (str): Dossier source (défaut: IMAGE_DIR)
+            source_folder (str): Dossier ou URL source (défaut: IMAGE_STORAGE_URL)
             remove_duplicates (bool): Supprimer les doublons
+            workers (int): Processus de hash et d'optimisation (0: séquentiel)
         """
         if source_folder is None:
-            source_folder = IMAGE_DIR
+            source_folder = IMAGE_STORAGE_URL
 
-        if not os.path.exists(source_folder):
+        storage = open_storage(source_folder)
+        local = storage.local_path("") is not None
+        if local and not os.path.exists(source_folder):
             print(f"⚠️  Dossier non trouvé: {source_folder}")
             return
 
         print(f"📁 Ingestion depuis: {source_folder}")
 
-        for filename in os.listdir(source_folder):
-            if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp')):
-                source_path = os.path.join(source_folder, filename)
-                output_path = os.path.join(PROCESSED_IMAGE_DIR, filename)
+        keys = (info.key for info in storage.list() if info.key.lower().endswith(IMAGE_EXTENSIONS))
+        if local:
+            results = self.ingest_files((storage.local_path(key) for key in keys), remove_duplicates, workers)
+        else:
+            results = self.ingest_objects(storage, keys, remove_duplicates, workers)
+        for _ in results:
+            pass
 
-                # Calculer le hash
-                img_hash = self._hash_image(source_path)
-                if not img_hash:
-                    continue
+        print(f"\n📊 Résumé de l'ingestion:")
+        print(f"  ✓ Images traitées: {len(self.processed_hashes)}")
+        print(f"  ⚠️  Doublons trouvés: {len(self.duplicates)}")
+
+    def ingest_file(self, source_path: str, remove_duplicates: bool = True) -> str:
+        """
+        Ingère une seule image: détection de doublon puis optimisation.
+
+        Args:
+            source_path (str): Chemin de l'image source
+            remove_duplicates (bool): Supprimer les doublons
+
+        Returns:
+            str: Chemin de l'image optimisée, ou None (doublon ou erreur)
+        """
+        filename = os.path.basename(source_path)
+
+        # Calculer le hash
+        with metrics.span("hash", filename=filename):
+            img_hash = self._hash_image(source_path)
+        output_path = self._claim(source_path, img_hash, remove_duplicates)
+        if output_path is None:
+            return None
+
+        # Optimiser et stocker
+        with metrics.span("optimize", filename=filename):
+            optimized = self._optimize_image(source_path, output_path)
+        return self._report(source_path, output_path, optimized)
+
+    def ingest_files(self, source_paths, remove_duplicates: bool = True, workers: int = INGEST_WORKERS):
+        """
+        Ingère une liste d'images, en parallèle sur `workers` processus.
+
+        Le hash et l'optimisation (redimensionnement, compression JPEG) sont
+        calculés dans les processus ; la détection des doublons reste dans le
+        processus principal, qui réserve chaque hash dans l'ordre des fichiers
+        avant d'envoyer l'optimisation : le résultat est le même qu'en séquentiel
+        (la première occurrence est conservée, les suivantes sont des doublons).
+        Un processus arrêté brutalement ne fait échouer que l'image qu'il
+        traitait : les autres tâches perdues avec le pool sont relancées.
+
+        Args:
+            source_paths (iterable): Chemins des images sources
+            remove_duplicates (bool): Supprimer les doublons
+            workers (int): Nombre de processus (0: dans le processus principal)
 
-                # Vérifier les doublons
-                if img_hash in self.processed_hashes:
-                    print(f"[⚠️] Doublon détecté: {filename}")
-                    self.duplicates.append(filename)
-                    if remove_duplicates:
-                        # Optionnel: déplacer vers un dossier duplicates
-                        pass
+        Yields:
+            tuple: (chemin source, chemin optimisé ou None), dans l'ordre des fichiers
+        """
+        if workers <= 0:
+            for source_path in source_paths:
+                yield source_path, self.ingest_file(source_path, remove_duplicates)
+            return
+
+        window = workers * 4
+        with _IngestPool(workers) as pool:
+            def hashed():
+                items = ((source_path, (source_path,)) for source_path in source_paths)
+                for source_path, _, (_, img_hash, worker_metrics) in pool.map(_hash_task, items, window, _hash_crashed):
+                    metrics.merge(worker_metrics)
+                    yield source_path, img_hash, source_path
+            yield from self._optimize_claimed(pool, hashed(), remove_duplicates, window)
+
+    def ingest_objects(self, storage, keys, remove_duplicates: bool = True, workers: int = INGEST_WORKERS,
+                       window: int = PREFETCH_WINDOW):
+        """
+        Ingère des objets d'un stockage distant (voir scripts.storage).
+
+        Les objets sont lus à l'avance, au plus `window` à la fois, pendant que
+        les précédents sont traités. Le hash est calculé dans le processus
+        principal sur le contenu déjà lu ; l'optimisation part dans les
+        processus comme pour `ingest_files`.
+
+        Args:
+            storage (Storage): Stockage source
+            keys (iterable): Clés des images
+            remove_duplicates (bool): Supprimer les doublons
+            workers (int): Processus d'optimisation (0: dans le processus principal)
+            window (int): Objets lus à l'avance
+
+        Yields:
+            tuple: (clé, chemin optimisé ou None), dans l'ordre des clés
+        """
+        def hashed():
+            for key, data in iter_prefetched(storage, keys, window):
+                if isinstance(data, Exception):
+                    print(f"⚠️  Erreur lors de la lecture de {key}: {data}")
+                    yield key, None, None
+                    continue
+                with metrics.span("hash", filename=os.path.basename(key)):
+                    img_hash = hashlib.md5(data).hexdigest()
+                yield key, img_hash, data
+
+        if workers <= 0:
+            for key, img_hash, data in hashed():
+                output_path = self._claim(key, img_hash, remove_duplicates)
+                if output_path is None:
+                    yield key, None
                     continue
+                with metrics.span("optimize", filename=os.path.basename(key)):
+                    optimized = self._optimize_image(io.BytesIO(data), output_path)
+                yield key, self._report(key, output_path, optimized)
+            return
 
-                # Ajouter au hash set
-                self.processed_hashes.add(img_hash)
+        with _IngestPool(workers) as pool:
+            yield from self._optimize_claimed(pool, hashed(), remove_duplicates, workers * 4)
 
-                # Optimiser et stocker
-                if self._optimize_image(source_path, output_path):
-                    print(f"[✓] Image importée: {filename}")
-                else:
-                    print(f"[✗] Erreur lors du traitement: {filename}")
+    def _optimize_claimed(self, pool, hashed, remove_duplicates: bool, window: int):
+        """
+        Réserve chaque hash dans l'ordre puis envoie l'optimisation aux processus.
 
-        print(f"\n📊 Résumé de l'ingestion:")
-        print(f"  ✓ Images traitées: {len(self.processed_hashes)}")
-        print(f"  ⚠️  Doublons trouvés: {len(self.duplicates)}")
+        Args:
+            pool (_IngestPool): Processus d'optimisation
+            hashed (iterable): Triplets (source, hash, chemin ou contenu à optimiser)
+            remove_duplicates (bool): Supprimer les doublons
+            window (int): Optimisations en cours au maximum
+
+        Yields:
+            tuple: (source, chemin optimisé ou None), dans l'ordre des sources
+        """
+        def claimed():
+            for source, img_hash, payload in hashed:
+                output_path = self._claim(source, img_hash, remove_duplicates)
+                yield source, (payload, output_path) if output_path is not None else None
+
+        for source, args, result in pool.map(_optimize_task, claimed(), window, _optimize_crashed):
+            if result is None:
+                yield source, None
+                continue
+            optimized, worker_metrics = result
+            metrics.merge(worker_metrics)
+            yield source, self._report(source, args[1], optimized)
+
+    def _claim(self, source_path: str, img_hash: str, remove_duplicates: bool = True) -> str:
+        """
+        Réserve le hash d'une image (échec de hash ou doublon: None).
+
+        Returns:
+            str: Chemin de sortie de l'image optimisée, ou None
+        """
+        filename = os.path.basename(source_path)
+        if not img_hash:
+            metrics.inc("images_failed")
+            return None
+
+        # Vérifier les doublons
+        if img_hash in self.processed_hashes:
+            print(f"[⚠️] Doublon détecté: {filename}")
+            metrics.inc("duplicates_skipped")
+            self.duplicates.append(filename)
+            if remove_duplicates:
+                # Optionnel: déplacer vers un dossier duplicates
+                pass
+            return None
+
+        # Ajouter au hash set
+        self.processed_hashes.add(img_hash)
+        return os.path.join(PROCESSED_IMAGE_DIR, filename)
+
+    def _report(self, source_path: str, output_path: str, optimized: bool) -> str:
+        """Compte et affiche le résultat de l'optimisation d'une image."""
+        filename = os.path.basename(source_path)
+        if optimized:
+            metrics.inc("images_ingested")
+            print(f"[✓] Image importée: {filename}")
+            return output_path
+        metrics.inc("images_failed")
+        print(f"[✗] Erreur lors du traitement: {filename}")
+        return None
 
     def get_statistics(self) -> dict:
         """
@@ -137,6 +297,168 @@ class ImageIngestor:
 # Instance globale
 image_ingestor = ImageIngestor()
 
+
+def _init_ingest_worker():
+    """Repart de mesures vides: celles héritées du parent par fork y sont déjà comptées."""
+    metrics.drain()
+
+
+class _IngestPool:
+    """
+    Processus d'ingestion qui survivent à l'arrêt brutal de l'un d'eux.
+
+    Avec ProcessPoolExecutor, un processus tué (mémoire, signal, crash d'une
+    bibliothèque C) casse tout le pool : toutes les tâches en cours échouent
+    avec BrokenProcessPool. Le pool est alors recréé et chaque tâche perdue
+    relancée seule, ce qui isole celle qui a provoqué l'arrêt.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.restarts = 0
+        self.executor = self._start()
+
+    def _start(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_ingest_worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def restart(self) -> None:
+        """Remplace un pool cassé (attend que toutes ses tâches soient marquées en échec)."""
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.executor = self._start()
+        self.restarts += 1
+        metrics.inc("ingest_pool_restarts")
+        print("⚠️  Processus d'ingestion arrêté brutalement: pool redémarré")
+
+    def _run_alone(self, func, args, crashed) -> Future:
+        """
+        Exécute une tâche seule dans le pool ; si elle le casse encore, elle est en faute.
+
+        Deux essais : des tâches d'un autre flux du même pool peuvent encore
+        tourner au premier, pas au second (le pool vient d'être recréé).
+        """
+        done = Future()
+        for _ in range(2):
+            try:
+                done.set_result(self.executor.submit(func, *args).result())
+                return done
+            except BrokenProcessPool:
+                self.restart()
+            except Exception as e:
+                done.set_exception(e)
+                return done
+        done.set_result(crashed(args))
+        return done
+
+    def _recover(self, entries, func, crashed, generation: int) -> None:
+        """
+        Relance une à une les tâches perdues avec un pool cassé ou remplacé.
+
+        Le pool n'est recréé que s'il s'agit encore de celui de la tâche en échec
+        (`generation`) : un autre flux du même pool a pu le redémarrer déjà.
+        """
+        if generation == self.restarts:
+            self.restart()
+        for entry in entries:
+            future = entry[2]
+            if future is not None and _lost(future):
+                entry[2] = self._run_alone(func, entry[1], crashed)
+
+    def map(self, func, items, window: int, crashed):
+        """
+        Comme bounded_map, en survivant à l'arrêt brutal d'un processus.
+
+        Args:
+            func (callable): Tâche exécutée dans les processus
+            items (iterable): Paires (clé, arguments de func ou None: rien à calculer)
+            window (int): Tâches en cours au maximum
+            crashed (callable): Résultat d'une tâche qui a fait tomber son processus
+
+        Yields:
+            tuple: (clé, arguments, résultat ou None), dans l'ordre des éléments
+        """
+        pending = deque()
+
+        def take():
+            key, args, future, generation = entry = pending.popleft()
+            if future is None:
+                return key, args, None
+            try:
+                try:
+                    return key, args, future.result()
+                except (BrokenProcessPool, CancelledError):
+                    pending.appendleft(entry)
+                    self._recover(pending, func, crashed, generation)
+                    pending.popleft()
+                    return key, args, entry[2].result()
+            except Exception as e:
+                print(f"⚠️  Erreur dans un processus d'ingestion ({os.path.basename(key)}): {e}")
+                return key, args, crashed(args)
+
+        for key, args in items:
+            future = None
+            if args is not None:
+                try:
+                    future = self.executor.submit(func, *args)
+                except BrokenProcessPool:
+                    self._recover(pending, func, crashed, self.restarts)
+                    future = self.executor.submit(func, *args)
+            pending.append([key, args, future, self.restarts])
+            # Résultats rendus dans l'ordre, au plus `window` tâches en cours
+            while pending and (pending[0][2] is None or pending[0][2].done() or len(pending) > window):
+                yield take()
+        while pending:
+            yield take()
+
+
+def _lost(future) -> bool:
+    """Tâche annulée ou perdue avec son pool (terminée: le pool a été arrêté)."""
+    return future.cancelled() or isinstance(future.exception(), BrokenProcessPool)
+
+
+def _hash_task(source_path):
+    """
+    Tâche des processus d'ingestion: hash d'une image.
+
+    Returns:
+        tuple: (chemin, hash ou None, mesures du processus)
+    """
+    with metrics.span("hash", filename=os.path.basename(source_path)):
+        img_hash = image_ingestor._hash_image(source_path)
+    return source_path, img_hash, metrics.drain()
+
+
+def _optimize_task(source, output_path):
+    """
+    Tâche des processus d'ingestion: optimisation d'une image.
+
+    Args:
+        source: Chemin de l'image, ou son contenu (bytes) lu depuis un stockage distant
+
+    Returns:
+        tuple: (succès, mesures du processus)
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    with metrics.span("optimize", filename=os.path.basename(output_path)):
+        optimized = image_ingestor._optimize_image(source, output_path)
+    return optimized, metrics.drain()
+
+
+def _hash_crashed(args):
+    """Résultat du hash d'une image dont le processus s'est arrêté."""
+    return args[0], None, None
+
+
+def _optimize_crashed(args):
+    """Résultat de l'optimisation d'une image dont le processus s'est arrêté."""
+    return False, None
+
 def ingest_images(folder: str = IMAGE_DIR) -> None:
     """
     Fonction de compatibilité pour ingérer des images.
@@ -157,4 +479,3 @@ def hash_image(image_path: str) -> str:
         str: Hash de l'image ou None si une erreur est survenue.
     """
     return image_ingestor._hash_image(image_path)
-```
\ No newline at end of file
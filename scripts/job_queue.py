@@ -0,0 +1,610 @@
+"""
+File de travaux distribuée pour les workers de la pipeline (une tâche par image).
+Un worker réserve un lot de tâches pour une durée limitée (bail) qu'il
+prolonge tant qu'il travaille ; une tâche dont le bail expire (worker arrêté)
+redevient disponible. Les échecs sont retentés avec un délai croissant, puis
+la tâche passe en lettre morte après JOB_MAX_ATTEMPTS tentatives.
+
+Les résultats sont enregistrés dans la file, un par image : une tâche
+terminée deux fois (bail expiré puis repris) ne garde que le premier
+résultat. Le coordinateur (`--mode pipeline` avec une file) les relit dans
+l'ordre d'arrivée et reste le seul à écrire le catalogue (embeddings, OCR,
+tags).
+
+Deux implémentations de la même interface :
+  - SQLiteJobQueue : base SQLite partagée par les processus d'une machine ;
+  - RemoteJobQueue : client d'un serveur de file (`python -m scripts.job_queue serve`)
+    pour des workers sur plusieurs machines.
+"""
+
+import abc
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from multiprocessing.connection import Client, Listener
+
+from config.settings import (
+    JOB_QUEUE_PATH, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_BACKOFF_SECONDS, JOB_BACKOFF_MAX,
+    JOB_QUEUE_AUTHKEY,
+)
+from scripts.sharding import authkey_bytes, listen_authkey
+
+
+class JobQueue(abc.ABC):
+    """Interface commune des files de travaux."""
+
+    @abc.abstractmethod
+    def enqueue(self, keys, payloads=None):
+        """
+        Ajoute des tâches ; une clé déjà présente est ignorée (réenvoi sans effet).
+
+        Args:
+            keys (iterable): Identifiants des tâches (noms de fichiers)
+            payloads (dict): Données associées {clé: objet JSON} (optionnel)
+
+        Returns:
+            int: Nombre de tâches ajoutées
+        """
+
+    @abc.abstractmethod
+    def claim(self, worker_id, batch_size=1, lease=JOB_LEASE_SECONDS):
+        """
+        Réserve jusqu'à `batch_size` tâches disponibles pour `lease` secondes.
+
+        Returns:
+            list: Tuples (clé, données)
+        """
+
+    @abc.abstractmethod
+    def heartbeat(self, worker_id, keys, lease=JOB_LEASE_SECONDS):
+        """
+        Prolonge le bail des tâches encore réservées par `worker_id`.
+
+        Returns:
+            list: Clés dont le bail a été prolongé (les autres ont été perdues)
+        """
+
+    @abc.abstractmethod
+    def complete(self, key, worker_id, result):
+        """
+        Enregistre le résultat d'une tâche.
+
+        Returns:
+            bool: False si la tâche avait déjà un résultat (ignoré)
+        """
+
+    @abc.abstractmethod
+    def fail(self, key, worker_id, error):
+        """
+        Signale l'échec d'une tâche : nouvel essai après un délai, ou lettre morte.
+
+        Returns:
+            str: Nouvel état ("pending", "dead" ou "ignored" si le bail était perdu)
+        """
+
+    @abc.abstractmethod
+    def results(self, after=0, limit=500):
+        """
+        Résultats enregistrés après le numéro `after`, dans l'ordre d'arrivée.
+
+        Returns:
+            list: Tuples (numéro, clé, résultat)
+        """
+
+    @abc.abstractmethod
+    def counts(self):
+        """
+        Returns:
+            dict: Nombre de tâches par état (pending, leased, done, dead)
+        """
+
+    @abc.abstractmethod
+    def dead_letters(self):
+        """
+        Returns:
+            list: Tuples (clé, tentatives, dernière erreur) des tâches abandonnées
+        """
+
+    @abc.abstractmethod
+    def retry_dead(self, keys=None):
+        """
+        Remet en file des tâches abandonnées (toutes si `keys` vaut None).
+
+        Returns:
+            int: Nombre de tâches remises en file
+        """
+
+    @abc.abstractmethod
+    def reset(self):
+        """Supprime toutes les tâches et tous les résultats (nouvelle exécution)."""
+
+    def close(self):
+        pass
+
+    def is_drained(self):
+        """Indique qu'aucune tâche n'est en attente ni en cours."""
+        counts = self.counts()
+        return counts["pending"] == 0 and counts["leased"] == 0
+
+
+def backoff_delay(attempts, base=JOB_BACKOFF_SECONDS, maximum=JOB_BACKOFF_MAX):
+    """Délai avant un nouvel essai : doublé à chaque tentative, plafonné."""
+    return min(maximum, base * 2 ** max(attempts - 1, 0))
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    File de travaux dans une base SQLite (WAL), partagée par les processus d'une machine.
+
+    Les réservations se font dans une transaction exclusive : deux workers
+    ne reçoivent jamais la même tâche disponible.
+    """
+
+    def __init__(self, path=JOB_QUEUE_PATH, max_attempts=JOB_MAX_ATTEMPTS,
+                 backoff=JOB_BACKOFF_SECONDS, backoff_max=JOB_BACKOFF_MAX, clock=time.time):
+        """
+        Args:
+            path (str): Fichier de la base
+            max_attempts (int): Tentatives avant la lettre morte
+            backoff (float): Délai avant le premier nouvel essai (secondes)
+            backoff_max (float): Délai maximal entre deux essais
+            clock (callable): Horloge (secondes), remplaçable dans les tests
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.clock = clock
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Connexion partagée entre threads (battements de cœur, serveur) sous verrou
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                key TEXT PRIMARY KEY,
+                payload TEXT,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                last_error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, available_at);
+            CREATE TABLE IF NOT EXISTS results (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT UNIQUE NOT NULL,
+                worker TEXT,
+                result TEXT NOT NULL
+            );
+        """)
+
+    def __repr__(self):
+        return f"SQLiteJobQueue({self.path!r})"
+
+    def _transaction(self):
+        return _Transaction(self._conn, self._lock)
+
+    def _expire_leases(self, now):
+        """Traite les baux expirés comme des échecs (worker arrêté ou bloqué)."""
+        expired = self._conn.execute(
+            "SELECT key, attempts, lease_expires FROM jobs WHERE state = 'leased' AND lease_expires <= ?", (now,)
+        ).fetchall()
+        for key, attempts, expired_at in expired:
+            # Délai compté depuis l'expiration, pas depuis sa constatation
+            self._retry_or_bury(key, attempts, "bail expiré", expired_at)
+
+    def _retry_or_bury(self, key, attempts, error, failed_at):
+        if attempts >= self.max_attempts:
+            state, available_at = "dead", failed_at
+        else:
+            state, available_at = "pending", failed_at + backoff_delay(attempts, self.backoff, self.backoff_max)
+        self._conn.execute(
+            "UPDATE jobs SET state = ?, available_at = ?, lease_owner = NULL, lease_expires = NULL, "
+            "last_error = ? WHERE key = ?",
+            (state, available_at, error, key),
+        )
+        return state
+
+    def enqueue(self, keys, payloads=None):
+        payloads = payloads or {}
+        rows = [(key, json.dumps(payloads.get(key))) for key in keys]
+        with self._transaction():
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO jobs (key, payload) VALUES (?, ?)", rows)
+            return self._conn.total_changes - before
+
+    def claim(self, worker_id, batch_size=1, lease=JOB_LEASE_SECONDS):
+        now = self.clock()
+        with self._transaction():
+            self._expire_leases(now)
+            rows = self._conn.execute(
+                "SELECT key, payload FROM jobs WHERE state = 'pending' AND available_at <= ? "
+                "ORDER BY available_at, rowid LIMIT ?",
+                (now, batch_size),
+            ).fetchall()
+            self._conn.executemany(
+                "UPDATE jobs SET state = 'leased', attempts = attempts + 1, lease_owner = ?, "
+                "lease_expires = ? WHERE key = ?",
+                [(worker_id, now + lease, key) for key, _ in rows],
+            )
+        return [(key, json.loads(payload)) for key, payload in rows]
+
+    def heartbeat(self, worker_id, keys, lease=JOB_LEASE_SECONDS):
+        now = self.clock()
+        extended = []
+        with self._transaction():
+            for key in keys:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET lease_expires = ? WHERE key = ? AND state = 'leased' "
+                    "AND lease_owner = ? AND lease_expires > ?",
+                    (now + lease, key, worker_id, now),
+                )
+                if cursor.rowcount:
+                    extended.append(key)
+        return extended
+
+    def complete(self, key, worker_id, result):
+        with self._transaction():
+            # Le premier résultat l'emporte : une reprise après un bail
+            # expiré produit le même calcul, le doublon est ignoré
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO results (key, worker, result) VALUES (?, ?, ?)",
+                (key, worker_id, json.dumps(result, ensure_ascii=False)),
+            )
+            self._conn.execute(
+                "UPDATE jobs SET state = 'done', lease_owner = NULL, lease_expires = NULL WHERE key = ?",
+                (key,),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, key, worker_id, error):
+        now = self.clock()
+        with self._transaction():
+            row = self._conn.execute(
+                "SELECT attempts FROM jobs WHERE key = ? AND state = 'leased' AND lease_owner = ?",
+                (key, worker_id),
+            ).fetchone()
+            if row is None:
+                return "ignored"
+            return self._retry_or_bury(key, row[0], str(error), now)
+
+    def results(self, after=0, limit=500):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, key, result FROM results WHERE seq > ? ORDER BY seq LIMIT ?", (after, limit)
+            ).fetchall()
+        return [(seq, key, json.loads(result)) for seq, key, result in rows]
+
+    def counts(self):
+        with self._transaction():
+            self._expire_leases(self.clock())
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        counts = dict.fromkeys(("pending", "leased", "done", "dead"), 0)
+        counts.update(rows)
+        return counts
+
+    def dead_letters(self):
+        with self._lock:
+            return [tuple(row) for row in self._conn.execute(
+                "SELECT key, attempts, last_error FROM jobs WHERE state = 'dead' ORDER BY key"
+            )]
+
+    def retry_dead(self, keys=None):
+        with self._transaction():
+            if keys is None:
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET state = 'pending', attempts = 0, available_at = 0 WHERE state = 'dead'"
+                )
+                return cursor.rowcount
+            count = 0
+            for key in keys:
+                count += self._conn.execute(
+                    "UPDATE jobs SET state = 'pending', attempts = 0, available_at = 0 "
+                    "WHERE key = ? AND state = 'dead'", (key,)
+                ).rowcount
+            return count
+
+    def reset(self):
+        with self._transaction():
+            self._conn.execute("DELETE FROM jobs")
+            self._conn.execute("DELETE FROM results")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _Transaction:
+    """Transaction exclusive (BEGIN IMMEDIATE) sous le verrou de la connexion."""
+
+    def __init__(self, conn, lock):
+        self.conn = conn
+        self.lock = lock
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+        except BaseException:
+            self.lock.release()
+            raise
+        return self.conn
+
+    def __exit__(self, exc_type, *exc):
+        try:
+            self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        finally:
+            self.lock.release()
+
+
+# Méthodes appelables à distance (interface JobQueue)
+_REMOTE_METHODS = {
+    "enqueue", "claim", "heartbeat", "complete", "fail", "results",
+    "counts", "dead_letters", "retry_dead", "reset",
+}
+
+
+def serve_queue_connection(conn, queue):
+    """
+    Traite les appels reçus sur une connexion : (méthode, args) -> ("ok", valeur).
+
+    Args:
+        conn: Connexion multiprocessing
+        queue (JobQueue): File servie
+    """
+    while True:
+        try:
+            method, args = conn.recv()
+        except (EOFError, OSError):
+            break
+        if method not in _REMOTE_METHODS:
+            conn.send(("error", f"Méthode inconnue: {method}"))
+            continue
+        try:
+            conn.send(("ok", getattr(queue, method)(*args)))
+        except Exception as e:
+            conn.send(("error", str(e)))
+    conn.close()
+
+
+class QueueServer:
+    """
+    Serveur de file pour les workers distants (un thread par connexion).
+
+    La file servie est en général une SQLiteJobQueue locale au serveur.
+    """
+
+    def __init__(self, queue, address, authkey):
+        """
+        Args:
+            queue (JobQueue): File servie
+            address (tuple): (hôte, port) d'écoute (port 0: choisi par le système)
+            authkey (bytes): Clé partagée avec les clients
+        """
+        self.queue = queue
+        self.authkey = authkey
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self._closed = False
+        self._thread = None
+
+    def serve_forever(self):
+        while not self._closed:
+            try:
+                conn = self.listener.accept()
+            except OSError:
+                break
+            except Exception as e:
+                # Client refusé (clé invalide) : le serveur continue
+                print(f"⚠️  Connexion refusée: {e}")
+                continue
+            if self._closed:
+                conn.close()
+                break
+            threading.Thread(target=serve_queue_connection, args=(conn, self.queue), daemon=True).start()
+
+    def start(self):
+        """Sert la file dans un thread d'arrière-plan."""
+        self._thread = threading.Thread(target=self.serve_forever, name="job-queue-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._closed = True
+        if self._thread is not None:
+            # accept() n'est pas interrompu par la fermeture du socket : connexion de réveil
+            try:
+                Client(self.address, authkey=self.authkey).close()
+            except OSError:
+                pass
+        self.listener.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+class RemoteJobQueue(JobQueue):
+    """Client d'un QueueServer (même interface que SQLiteJobQueue)."""
+
+    def __init__(self, address, authkey=None):
+        """
+        Args:
+            address (tuple): (hôte, port) du serveur
+            authkey (bytes): Clé partagée avec le serveur (défaut: JOB_QUEUE_AUTHKEY)
+        """
+        self.address = tuple(address)
+        self._conn = Client(self.address, authkey=authkey or authkey_bytes(JOB_QUEUE_AUTHKEY))
+        # Une connexion n'est pas thread-safe : un appel à la fois
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"RemoteJobQueue('tcp://{self.address[0]}:{self.address[1]}')"
+
+    def _call(self, method, *args):
+        with self._lock:
+            self._conn.send((method, args))
+            status, value = self._conn.recv()
+        if status != "ok":
+            raise RuntimeError(f"Erreur de la file: {value}")
+        return value
+
+    def enqueue(self, keys, payloads=None):
+        return self._call("enqueue", list(keys), payloads)
+
+    def claim(self, worker_id, batch_size=1, lease=JOB_LEASE_SECONDS):
+        return [tuple(job) for job in self._call("claim", worker_id, batch_size, lease)]
+
+    def heartbeat(self, worker_id, keys, lease=JOB_LEASE_SECONDS):
+        return self._call("heartbeat", worker_id, list(keys), lease)
+
+    def complete(self, key, worker_id, result):
+        return self._call("complete", key, worker_id, result)
+
+    def fail(self, key, worker_id, error):
+        return self._call("fail", key, worker_id, str(error))
+
+    def results(self, after=0, limit=500):
+        return self._call("results", after, limit)
+
+    def counts(self):
+        return self._call("counts")
+
+    def dead_letters(self):
+        return self._call("dead_letters")
+
+    def retry_dead(self, keys=None):
+        return self._call("retry_dead", None if keys is None else list(keys))
+
+    def reset(self):
+        return self._call("reset")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_queue(url=JOB_QUEUE_PATH):
+    """
+    Ouvre une file à partir d'une URL : tcp://hote:port (serveur) ou chemin SQLite.
+
+    Returns:
+        JobQueue: RemoteJobQueue ou SQLiteJobQueue
+    """
+    if url.startswith("tcp://"):
+        host, _, port = url[len("tcp://"):].rpartition(":")
+        return RemoteJobQueue((host, int(port)))
+    if url.startswith("sqlite://"):
+        url = url[len("sqlite://"):]
+    return SQLiteJobQueue(url)
+
+
+class LeaseKeeper:
+    """
+    Prolonge en arrière-plan le bail des tâches d'un worker (battement de cœur).
+    """
+
+    def __init__(self, queue, worker_id, lease=JOB_LEASE_SECONDS, interval=None):
+        """
+        Args:
+            queue (JobQueue): File des tâches
+            worker_id (str): Identifiant du worker
+            lease (float): Durée du bail (secondes)
+            interval (float): Période des battements (défaut: un tiers du bail)
+        """
+        self.queue = queue
+        self.worker_id = worker_id
+        self.lease = lease
+        self.interval = interval or lease / 3
+        self.keys = set()
+        self.lost = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def track(self, keys):
+        with self._lock:
+            self.keys.update(keys)
+
+    def release(self, key):
+        """
+        Arrête de suivre une tâche terminée.
+
+        Returns:
+            bool: False si son bail a été perdu (tâche confiée à un autre worker)
+        """
+        with self._lock:
+            self.keys.discard(key)
+            if key in self.lost:
+                self.lost.discard(key)
+                return False
+            return True
+
+    def beat(self):
+        """Un battement : prolonge les baux suivis, note ceux qui ont été perdus."""
+        with self._lock:
+            keys = list(self.keys)
+        if not keys:
+            return
+        extended = set(self.queue.heartbeat(self.worker_id, keys, self.lease))
+        with self._lock:
+            lost = self.keys.intersection(keys) - extended
+            self.lost.update(lost)
+            self.keys -= lost
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.beat()
+            except Exception as e:
+                print(f"⚠️  Battement de cœur impossible: {e}")
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._loop, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def main():
+    """Sert une file SQLite sur le réseau, ou affiche son état."""
+    parser = argparse.ArgumentParser(description="File de travaux de la pipeline")
+    parser.add_argument("command", choices=["serve", "status", "retry-dead"])
+    parser.add_argument("--queue", default=JOB_QUEUE_PATH, help="Base SQLite ou tcp://hote:port")
+    parser.add_argument("--host", default="127.0.0.1", help="0.0.0.0 pour les workers distants (JOB_QUEUE_AUTHKEY requis)")
+    parser.add_argument("--port", type=int, default=6200)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        try:
+            authkey = listen_authkey(args.host, JOB_QUEUE_AUTHKEY, "JOB_QUEUE_AUTHKEY")
+        except ValueError as e:
+            parser.error(str(e))
+    queue = open_queue(args.queue)
+    if args.command == "serve":
+        server = QueueServer(queue, (args.host, args.port), authkey)
+        print(f"🚀 File de travaux {args.queue} à l'écoute sur {args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.close()
+    elif args.command == "status":
+        counts = queue.counts()
+        print(f"📋 {counts['pending']} en attente, {counts['leased']} en cours, "
+              f"{counts['done']} terminées, {counts['dead']} abandonnées")
+        for key, attempts, error in queue.dead_letters():
+            print(f"  ☠️  {key} ({attempts} tentatives): {error}")
+    else:
+        print(f"🔁 {queue.retry_dead()} tâche(s) remise(s) en file")
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()
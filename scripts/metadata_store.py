@@ -0,0 +1,402 @@
+"""
+Stockage typé et incrémental des métadonnées au format Parquet.
+Chaque exécution ajoute un fichier par lot d'images nouvelles ou modifiées
+dans une partition par date d'ingestion (data/metadata/ingest_date=AAAA-MM-JJ/),
+au lieu de réécrire un CSV complet. Les petits fichiers d'une partition sont
+fusionnés dès qu'ils dépassent un seuil. Les lecteurs ne chargent que les
+colonnes utiles ; un instantané Arrow (IPC, non compressé) s'ouvre sans copie
+par memory-map depuis un notebook.
+"""
+
+import os
+import time
+import argparse
+from collections.abc import Mapping
+from datetime import date, datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+from config.settings import METADATA_STORE_DIR, METADATA_SNAPSHOT_PATH, METADATA_COMPACTION_THRESHOLD
+from scripts.segment_log import atomic_write
+
+# Colonnes et types (les valeurs EXIF ne sont plus tronquées ni converties en texte)
+SCHEMA = pa.schema([
+    ("filename", pa.string()),
+    ("filepath", pa.string()),
+    ("size_bytes", pa.int64()),
+    ("mtime", pa.float64()),
+    ("extracted_at", pa.timestamp("us")),
+    ("width", pa.int32()),
+    ("height", pa.int32()),
+    ("format", pa.string()),
+    ("mode", pa.string()),
+    ("Make", pa.string()),
+    ("Model", pa.string()),
+    ("Software", pa.string()),
+    ("DateTime", pa.timestamp("s")),
+    ("Orientation", pa.int16()),
+    ("DateTimeOriginal", pa.timestamp("s")),
+    ("ExposureTime", pa.float64()),
+    ("FNumber", pa.float64()),
+    ("ISOSpeedRatings", pa.int32()),
+    ("FocalLength", pa.float64()),
+    ("LensModel", pa.string()),
+])
+
+PARTITIONING = ds.partitioning(pa.schema([("ingest_date", pa.string())]), flavor="hive")
+
+# Taille en deçà de laquelle un fichier Parquet est fusionné par `compact`
+SMALL_PART_BYTES = 64 * 2**20
+
+
+def _to_type(value, arrow_type):
+    """Convertit une valeur lue par PIL vers le type Arrow de sa colonne (None si impossible)."""
+    if value is None:
+        return None
+    try:
+        if isinstance(value, tuple):          # ex: ISOSpeedRatings multiple
+            value = value[0]
+        if pa.types.is_string(arrow_type):
+            if isinstance(value, bytes):
+                value = value.decode("utf-8", errors="replace")
+            return str(value).strip("\x00 ") or None
+        if pa.types.is_timestamp(arrow_type):
+            if isinstance(value, datetime):
+                return value
+            return datetime.strptime(str(value).strip("\x00 "), "%Y:%m:%d %H:%M:%S")
+        if pa.types.is_integer(arrow_type):
+            return int(value)
+        if pa.types.is_floating(arrow_type):
+            return float(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    return value
+
+
+def to_table(records):
+    """
+    Construit une table Arrow typée à partir d'enregistrements de `extract_record`.
+
+    Args:
+        records (list): Dictionnaires (clés de SCHEMA, valeurs brutes)
+
+    Returns:
+        pa.Table: Table au schéma SCHEMA
+    """
+    columns = {field.name: [_to_type(r.get(field.name), field.type) for r in records]
+               for field in SCHEMA}
+    return pa.table(columns, schema=SCHEMA)
+
+
+def _latest(table):
+    """Garde la ligne la plus récente (extracted_at) de chaque fichier."""
+    if table.num_rows == 0:
+        return table
+    keys = table.select(["filename", "extracted_at"]).to_pandas()
+    keep = keys.sort_values("extracted_at", kind="stable").drop_duplicates("filename", keep="last")
+    return table.take(sorted(keep.index))
+
+
+class MetadataStore:
+    """Jeu de données Parquet partitionné par date d'ingestion, en ajout seul."""
+
+    def __init__(self, directory=METADATA_STORE_DIR, snapshot_path=METADATA_SNAPSHOT_PATH):
+        """
+        Args:
+            directory (str): Racine du jeu de données
+            snapshot_path (str): Fichier de l'instantané Arrow
+        """
+        self.directory = directory
+        self.snapshot_path = snapshot_path
+        self._known = None
+
+    def exists(self):
+        return os.path.isdir(self.directory) and any(
+            name.startswith("ingest_date=") for name in os.listdir(self.directory)
+        )
+
+    def parts(self):
+        """
+        Fichiers Parquet publiés (chemins), dans l'ordre d'écriture par partition.
+
+        Un lecteur qui mémorise cette liste ne lit ensuite que les nouveaux fichiers.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        paths = []
+        for partition in sorted(os.listdir(self.directory)):
+            if partition.startswith("ingest_date="):
+                paths += self._partition_parts(os.path.join(self.directory, partition))
+        return paths
+
+    @staticmethod
+    def _partition_parts(folder):
+        """Fichiers Parquet publiés d'une partition."""
+        return [os.path.join(folder, name) for name in sorted(os.listdir(folder))
+                if name.startswith("part-") and name.endswith(".parquet")]
+
+    def dataset(self, memory_map=False, paths=None):
+        """
+        Jeu de données pyarrow (lecture paresseuse, filtres et projections poussés).
+
+        Args:
+            memory_map (bool): Lire les fichiers par memory-map plutôt que par copie
+            paths (list): Limiter la lecture à ces fichiers (voir `parts`)
+
+        Returns:
+            ds.Dataset: None si le stockage est vide
+        """
+        filesystem = fs.LocalFileSystem(use_mmap=memory_map)
+        if paths is not None:
+            return ds.dataset(paths, schema=SCHEMA, format="parquet", filesystem=filesystem) if paths else None
+        if not self.exists():
+            return None
+        return ds.dataset(
+            self.directory, schema=SCHEMA, format="parquet", partitioning=PARTITIONING,
+            filesystem=filesystem,
+        )
+
+    def known_files(self):
+        """
+        Taille et date de modification indexées de chaque fichier.
+
+        Seules les colonnes filename, size_bytes, mtime et extracted_at sont lues.
+
+        Returns:
+            dict: {filename: (size_bytes, mtime)}
+        """
+        if self._known is None:
+            dataset = self.dataset()
+            self._known = {}
+            if dataset is not None:
+                table = _latest(dataset.to_table(columns=["filename", "size_bytes", "mtime", "extracted_at"]))
+                self._known = dict(zip(
+                    table.column("filename").to_pylist(),
+                    zip(table.column("size_bytes").to_pylist(), table.column("mtime").to_pylist()),
+                ))
+        return self._known
+
+    def is_current(self, filename, stat):
+        """True si le fichier est déjà indexé avec la même taille et la même date."""
+        return self.known_files().get(filename) == (stat.st_size, stat.st_mtime)
+
+    def append(self, records, ingest_date=None):
+        """
+        Ajoute les enregistrements nouveaux ou modifiés dans un nouveau fichier Parquet.
+
+        Args:
+            records (list): Enregistrements de `extract_record`
+            ingest_date (date): Partition (aujourd'hui par défaut)
+
+        Returns:
+            int: Nombre de lignes écrites
+        """
+        known = self.known_files()
+        fresh = [r for r in records
+                 if known.get(r["filename"]) != (r.get("size_bytes"), r.get("mtime"))]
+        if not fresh:
+            return 0
+
+        partition = os.path.join(self.directory, f"ingest_date={(ingest_date or date.today()).isoformat()}")
+        os.makedirs(partition, exist_ok=True)
+        self._write_part(partition, to_table(fresh))
+        for r in fresh:
+            known[r["filename"]] = (r.get("size_bytes"), r.get("mtime"))
+        if len(self._partition_parts(partition)) > METADATA_COMPACTION_THRESHOLD:
+            self.compact_partition(partition)
+        return len(fresh)
+
+    @staticmethod
+    def _write_part(partition, table):
+        """Publie une table dans un nouveau fichier de la partition."""
+        name = f"part-{time.time_ns()}-{os.getpid()}.parquet"
+        # Fichier temporaire préfixé par "." : ignoré par les lecteurs jusqu'au renommage
+        tmp_path = os.path.join(partition, f".{name}.tmp")
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, os.path.join(partition, name))
+
+    def compact_partition(self, partition):
+        """
+        Fusionne les petits fichiers Parquet d'une partition en un seul.
+
+        Seule la dernière version de chaque image est gardée. Le fichier fusionné
+        est publié avant la suppression des anciens : un lecteur voit au pire des
+        doublons, que `read` écarte.
+
+        Args:
+            partition (str): Dossier de la partition
+
+        Returns:
+            int: Nombre de fichiers fusionnés
+        """
+        small = [p for p in self._partition_parts(partition) if os.path.getsize(p) < SMALL_PART_BYTES]
+        if len(small) < 2:
+            return 0
+        table = _latest(ds.dataset(small, schema=SCHEMA, format="parquet").to_table())
+        self._write_part(partition, table)
+        for path in small:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return len(small)
+
+    def compact(self):
+        """
+        Fusionne les petits fichiers de chaque partition (`python -m scripts.metadata_store --compact`).
+
+        Returns:
+            int: Nombre de fichiers fusionnés
+        """
+        if not self.exists():
+            return 0
+        return sum(self.compact_partition(os.path.join(self.directory, partition))
+                   for partition in sorted(os.listdir(self.directory))
+                   if partition.startswith("ingest_date="))
+
+    def read(self, columns=None, filter=None, memory_map=False, paths=None):
+        """
+        Lit la dernière version de chaque image.
+
+        Args:
+            columns (list): Colonnes à charger (toutes si None)
+            filter (ds.Expression): Filtre poussé dans la lecture (ex: ds.field("filename") == "a.jpg"),
+                appliqué à chaque version stockée avant de garder la plus récente
+            memory_map (bool): Lecture par memory-map
+            paths (list): Limiter la lecture à ces fichiers (voir `parts`)
+
+        Returns:
+            pa.Table: Une ligne par fichier (table vide si le stockage est vide)
+        """
+        dataset = self.dataset(memory_map, paths)
+        if dataset is None:
+            schema = SCHEMA if columns is None else pa.schema([SCHEMA.field(c) for c in columns])
+            return schema.empty_table()
+        wanted = None if columns is None else list(dict.fromkeys(["filename", "extracted_at", *columns]))
+        table = _latest(dataset.to_table(columns=wanted, filter=filter))
+        return table if columns is None else table.select(columns)
+
+    def get(self, filename):
+        """
+        Returns:
+            dict: Toutes les colonnes d'une image ({} si inconnue)
+        """
+        rows = self.read(filter=ds.field("filename") == filename).to_pylist()
+        return rows[0] if rows else {}
+
+    def write_snapshot(self):
+        """
+        Écrit la dernière version de chaque image en un fichier Arrow IPC non compressé.
+
+        Les colonnes de ce format s'utilisent directement depuis la projection
+        mémoire du fichier (voir `open_snapshot`). Les lignes sont triées par nom
+        de fichier pour la recherche dichotomique de `MetadataView`.
+
+        Returns:
+            int: Nombre de lignes
+        """
+        table = self.read().sort_by("filename").combine_chunks()
+
+        def write(f):
+            with pa.ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+
+        atomic_write(self.snapshot_path, write)
+        return table.num_rows
+
+
+def open_snapshot(path=METADATA_SNAPSHOT_PATH, columns=None):
+    """
+    Ouvre l'instantané sans copie (memory-map), par exemple depuis un notebook :
+
+        table = open_snapshot(columns=["filename", "width", "DateTimeOriginal"])
+        df = table.to_pandas()
+
+    Returns:
+        pa.Table: Colonnes adossées au fichier projeté en mémoire
+    """
+    table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+    return table if columns is None else table.select(columns)
+
+
+class MetadataView(Mapping):
+    """
+    Vue {filename: ligne} en lecture seule sur une table Arrow.
+
+    Adossée à l'instantané mappé, elle remplace le dictionnaire de métadonnées
+    des processus de service sans copier les colonnes dans chaque processus.
+    Les lignes étant triées par nom de fichier, une image est retrouvée par
+    recherche dichotomique (comme `ServingIndex.row`).
+    """
+
+    def __init__(self, table):
+        names = table.column("filename")
+        if len(names) > 1 and not pc.all(pc.less_equal(names[:-1], names[1:])).as_py():
+            # Instantané antérieur au tri: copie triée en mémoire
+            table = table.sort_by("filename")
+            names = table.column("filename")
+        self.table = table
+        self._filenames = names.chunk(0) if names.num_chunks == 1 else names.combine_chunks()
+
+    def _row(self, filename):
+        """Ligne d'une image (recherche dichotomique), ou -1."""
+        names = self._filenames
+        low, high = 0, len(names)
+        while low < high:
+            middle = (low + high) // 2
+            if names[middle].as_py() < filename:
+                low = middle + 1
+            else:
+                high = middle
+        return low if low < len(names) and names[low].as_py() == filename else -1
+
+    def __getitem__(self, filename):
+        i = self._row(filename)
+        if i < 0:
+            raise KeyError(filename)
+        return self.table.slice(i, 1).to_pylist()[0]
+
+    def __contains__(self, filename):
+        return self._row(filename) >= 0
+
+    def __iter__(self):
+        for chunk in self.table.column("filename").chunks:
+            yield from chunk.to_pylist()
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def items(self):
+        """Paires (filename, ligne), converties lot par lot."""
+        for batch in self.table.to_batches(max_chunksize=4096):
+            for row in batch.to_pylist():
+                yield row["filename"], row
+
+
+def main():
+    """Statistiques du stockage, fusion des petits fichiers et écriture de l'instantané Arrow."""
+    parser = argparse.ArgumentParser(description="Stockage Parquet des métadonnées")
+    parser.add_argument("--snapshot", action="store_true", help="Écrire l'instantané Arrow")
+    parser.add_argument("--compact", action="store_true", help="Fusionner les petits fichiers Parquet")
+    args = parser.parse_args()
+
+    store = MetadataStore()
+    if not store.exists():
+        print(f"⚠️  Aucun stockage Parquet dans {store.directory}")
+        return
+    if args.compact:
+        print(f"🗜️  {store.compact()} fichiers Parquet fusionnés")
+    dataset = store.dataset()
+    print(f"📦 {len(dataset.files)} fichiers Parquet, {dataset.count_rows()} lignes, "
+          f"{len(store.known_files())} images")
+    if args.snapshot:
+        count = store.write_snapshot()
+        print(f"✅ Instantané: {store.snapshot_path} ({count} images)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Métriques et traces structurées de la pipeline.
+Histogrammes de latence par étape, compteurs (images traitées, ignorées,
+en échec, hits de cache) et jauges (files d'attente), exportés au format
+texte Prometheus ; spans optionnels exportés au format Chrome Trace
+(chrome://tracing, Perfetto). Désactivé, le coût se limite à un test booléen.
+"""
+
+import os
+import json
+import time
+import threading
+from bisect import bisect_left
+
+from config.settings import METRICS_ENABLED, TRACE_ENABLED
+from scripts.segment_log import atomic_write
+
+# Bornes des histogrammes de latence (secondes)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Histogramme cumulable à bornes fixes."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # dernier: au-delà de la plus grande borne
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, counts, total, count):
+        self.counts = [a + b for a, b in zip(self.counts, counts)]
+        self.sum += total
+        self.count += count
+
+    def quantile(self, q):
+        """Estimation d'un quantile (borne supérieure du seuil atteint)."""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class _NullSpan:
+    """Span sans effet, utilisé lorsque les métriques sont désactivées."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("registry", "name", "args", "start", "wall")
+
+    def __init__(self, registry, name, args):
+        self.registry = registry
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.start
+        self.registry.observe(self.name, duration)
+        if self.registry.tracing:
+            self.registry._add_event({
+                "name": self.name, "ph": "X", "cat": "pipeline",
+                "ts": int(self.wall * 1e6), "dur": int(duration * 1e6),
+                "pid": os.getpid(), "tid": threading.get_ident(),
+                "args": self.args,
+            })
+        return False
+
+
+class MetricsRegistry:
+    """Registre des compteurs, jauges, histogrammes et événements de trace."""
+
+    def __init__(self, enabled=False, tracing=False, max_events=1_000_000):
+        """
+        Args:
+            enabled (bool): Collecter les métriques
+            tracing (bool): Enregistrer aussi chaque span (trace Chrome)
+            max_events (int): Nombre max d'événements de trace conservés
+        """
+        self.enabled = enabled
+        self.tracing = enabled and tracing
+        self.max_events = max_events
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.events = []
+        self.dropped_events = 0
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1):
+        """Incrémente un compteur."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        """Fixe la valeur courante d'une jauge (ex: taille d'une file)."""
+        if self.enabled:
+            self.gauges[name] = value
+
+    def observe(self, stage, seconds):
+        """Ajoute une latence à l'histogramme d'une étape."""
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = self.histograms[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def span(self, stage, **args):
+        """
+        Mesure la durée d'un bloc `with` (histogramme, et trace si activée).
+
+        Args:
+            stage (str): Nom de l'étape
+            **args: Attributs enregistrés dans la trace (ex: filename)
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, stage, args)
+
+    def _add_event(self, event):
+        with self._lock:
+            if len(self.events) < self.max_events:
+                self.events.append(event)
+            else:
+                self.dropped_events += 1
+
+    def drain(self):
+        """
+        Retourne les mesures accumulées depuis le dernier appel et les remet à zéro.
+
+        Utilisé par les workers pour renvoyer leurs mesures au processus principal.
+
+        Returns:
+            dict: État sérialisable (voir `merge`), None si désactivé
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            state = {
+                "counters": self.counters,
+                "histograms": {k: (h.counts, h.sum, h.count) for k, h in self.histograms.items()},
+                "events": self.events,
+            }
+            self.counters, self.histograms, self.events = {}, {}, []
+        return state
+
+    def merge(self, state):
+        """Ajoute les mesures d'un autre processus (résultat de `drain`)."""
+        if not self.enabled or not state:
+            return
+        with self._lock:
+            for name, value in state["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for stage, (counts, total, count) in state["histograms"].items():
+                self.histograms.setdefault(stage, Histogram()).merge(counts, total, count)
+            room = max(0, self.max_events - len(self.events))
+            self.events.extend(state["events"][:room])
+            self.dropped_events += max(0, len(state["events"]) - room)
+
+    def summary(self):
+        """
+        Résumé lisible : compteurs et latences p50/p95 par étape (millisecondes).
+        """
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "stages": {
+                    stage: {"count": h.count,
+                            "mean_ms": 1000 * h.sum / h.count if h.count else 0.0,
+                            "p50_ms": 1000 * h.quantile(0.5),
+                            "p95_ms": 1000 * h.quantile(0.95)}
+                    for stage, h in sorted(self.histograms.items())
+                },
+            }
+
+    def to_prometheus(self, prefix="phototheque"):
+        """
+        Exporte les métriques au format texte Prometheus.
+
+        Returns:
+            str: Exposition texte (compteurs, jauges, histogrammes)
+        """
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                metric = f"{prefix}_{name}_total"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+            for name, value in sorted(self.gauges.items()):
+                metric = f"{prefix}_{name}"
+                lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+            if self.histograms:
+                metric = f"{prefix}_stage_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                for stage, h in sorted(self.histograms.items()):
+                    cumulative = 0
+                    for bound, n in zip(h.buckets, h.counts):
+                        cumulative += n
+                        lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {h.count}')
+                    lines.append(f'{metric}_sum{{stage="{stage}"}} {h.sum}')
+                    lines.append(f'{metric}_count{{stage="{stage}"}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Écrit l'exposition Prometheus (fichier lu par le textfile collector)."""
+        if not self.enabled:
+            return
+        data = self.to_prometheus().encode("utf-8")
+        atomic_write(path, lambda f: f.write(data))
+
+    def write_chrome_trace(self, path):
+        """Écrit les spans au format Chrome Trace (JSON)."""
+        if not self.tracing:
+            return
+        with self._lock:
+            trace = {"traceEvents": list(self.events), "displayTimeUnit": "ms",
+                     "otherData": {"dropped_events": self.dropped_events}}
+        data = json.dumps(trace, ensure_ascii=False).encode("utf-8")
+        atomic_write(path, lambda f: f.write(data))
+
+    def export(self, prometheus_path, trace_path):
+        """Écrit les deux exports (si activés)."""
+        try:
+            self.write_prometheus(prometheus_path)
+            self.write_chrome_trace(trace_path)
+        except Exception as e:
+            print(f"⚠️  Impossible d'écrire les métriques: {e}")
+
+
+# Instance globale
+metrics = MetricsRegistry(METRICS_ENABLED, TRACE_ENABLED)
@@ -0,0 +1,445 @@
+"""
+Versions du modèle d'embedding des légendes.
+Chaque modèle a son propre journal de segments (data/embeddings pour le
+premier, data/embeddings-<modèle> ensuite) et le registre
+data/embedding_versions.json désigne la version active, celle que chargent
+les processus de service. Après un changement d'EMBEDDING_MODEL, le job de
+ré-encodage construit la nouvelle version en arrière-plan, à débit limité,
+à partir des légendes déjà calculées (OCR + tags, sans relancer OCR ni
+CLIP) ; le registre est remplacé atomiquement une fois la version complète
+et les lecteurs basculent à leur prochain rafraîchissement.
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import argparse
+
+from config.settings import (
+    EMBEDDING_MODEL, EMBEDDING_SEGMENT_DIR, EMBEDDING_VERSIONS_PATH, MODEL_CACHE_DIR,
+    INFERENCE_BACKEND, ONNX_DIR, ONNX_QUANTIZE, ONNX_THREADS,
+    OCR_PATH, TAGS_PATH, CAPTION_CACHE_DIR, REEMBED_RATE, REEMBED_BATCH_SIZE,
+)
+from scripts.caption_cache import caption_key
+from scripts.segment_log import MANIFEST_NAME, SegmentLog, atomic_write
+
+# Modèle d'origine : son export ONNX garde le dossier historique models/onnx/minilm
+DEFAULT_MODEL = "all-MiniLM-L6-v2"
+
+
+class ModelMismatchError(RuntimeError):
+    """Requête encodée par un autre modèle que celui des vecteurs interrogés (changement de version)."""
+
+
+def model_id(name=EMBEDDING_MODEL, backend=INFERENCE_BACKEND, quantize=ONNX_QUANTIZE):
+    """
+    Identifiant des vecteurs d'un modèle : son nom, suffixé de -int8 avec
+    ONNX quantifié (les poids int8 déplacent légèrement les vecteurs).
+    """
+    return f"{name}-int8" if backend == "onnx" and quantize else name
+
+
+def model_name(model):
+    """Nom SentenceTransformer d'un identifiant de modèle."""
+    return model[:-len("-int8")] if model.endswith("-int8") else model
+
+
+def _slug(text):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", text)
+
+
+def onnx_export_name(name):
+    """Sous-dossier de models/onnx de l'export d'un modèle de légendes."""
+    return "minilm" if name == DEFAULT_MODEL else _slug(name)
+
+
+def caption_cache_dir(model, encoder_name):
+    """Dossier du cache de légendes d'un modèle et d'un backend (jamais partagé entre modèles)."""
+    namespace = f"{model_name(model)}-{encoder_name}"
+    if encoder_name == "onnx" and model.endswith("-int8"):
+        namespace += "-int8"
+    return os.path.join(CAPTION_CACHE_DIR, namespace.replace("/", "_"))
+
+
+def load_text_encoder(model):
+    """
+    Charge le modèle SentenceTransformer d'un identifiant et son encodeur.
+
+    Returns:
+        tuple: (modèle SentenceTransformer, encodeur de scripts.inference)
+    """
+    from sentence_transformers import SentenceTransformer
+    from scripts.inference import create_text_encoder
+
+    name = model_name(model)
+    sentence_model = SentenceTransformer(name, cache_folder=MODEL_CACHE_DIR)
+    quantize = model.endswith("-int8")
+    backend = "onnx" if quantize else INFERENCE_BACKEND
+    encoder = create_text_encoder(sentence_model, backend, ONNX_DIR, quantize, ONNX_THREADS,
+                                  export_name=onnx_export_name(name))
+    return sentence_model, encoder
+
+
+def _manifest_model(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            return json.load(f).get("model")
+    except FileNotFoundError:
+        return None
+
+
+class VersionRegistry:
+    """
+    Registre des versions d'embeddings : active (servie), en construction et précédente.
+
+    Sans registre (installation antérieure), la version active est le journal
+    historique, du modèle inscrit dans son manifeste ou du modèle configuré.
+    """
+
+    def __init__(self, path=EMBEDDING_VERSIONS_PATH, root=EMBEDDING_SEGMENT_DIR, default_model=None):
+        """
+        Args:
+            path (str): Fichier du registre
+            root (str): Journal historique (première version)
+            default_model (str): Modèle d'un journal sans identifiant (défaut: modèle configuré)
+        """
+        self.path = path
+        self.root = root
+        self.default_model = default_model or model_id()
+
+    def version_dir(self, model):
+        """Dossier du journal d'une nouvelle version."""
+        return f"{self.root}-{_slug(model)}"
+
+    def read(self):
+        """
+        Returns:
+            dict: {"active": {model, dir}, "building": {...} ou None, "previous": {...} ou None}
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            model = _manifest_model(self.root) or self.default_model
+            return {"active": {"model": model, "dir": self.root}, "building": None, "previous": None}
+        # Dossiers enregistrés relativement au registre (données déplaçables)
+        base = os.path.dirname(self.path)
+        for version in state.values():
+            if version:
+                version["dir"] = os.path.normpath(os.path.join(base, version["dir"]))
+        return state
+
+    def write(self, state):
+        base = os.path.dirname(self.path)
+        stored = {
+            role: dict(version, dir=os.path.relpath(version["dir"], base)) if version else None
+            for role, version in state.items()
+        }
+        os.makedirs(base or ".", exist_ok=True)
+        data = json.dumps(stored, indent=2).encode("utf-8")
+        atomic_write(self.path, lambda f: f.write(data))
+
+    def active(self):
+        """Version servie: {"model", "dir"}."""
+        return self.read()["active"]
+
+    def signature(self):
+        """Date de modification du registre (None s'il n'existe pas), pour détecter une bascule."""
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def switch(self, source_generation):
+        """
+        Bascule atomique : la version en construction devient active.
+
+        Args:
+            source_generation (int): Dernière génération de l'ancienne version
+                reportée dans la nouvelle (rattrapage ultérieur)
+        """
+        state = self.read()
+        building = state["building"]
+        building.pop("source_generation", None)
+        state.update(
+            previous=dict(state["active"], generation=source_generation),
+            active=building,
+            building=None,
+        )
+        self.write(state)
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def load_captions(ocr_path=OCR_PATH, tags_path=TAGS_PATH):
+    """
+    Légendes des images recomposées comme dans la pipeline (texte OCR puis tags)
+    à partir des résultats enregistrés.
+
+    Returns:
+        dict: {filename: légende}
+    """
+    texts = _read_json(ocr_path)
+    tags = _read_json(tags_path)
+    return {f: f"{texts.get(f, '')} {' '.join(tags.get(f, []))}" for f in set(texts) | set(tags)}
+
+
+class ReembeddingJob:
+    """
+    Construit la version d'un nouveau modèle à partir de la version active.
+
+    Les légendes sont encodées par lots, au plus `rate` par seconde, pour
+    laisser le CPU aux processus de service. Le job reprend là où il s'était
+    arrêté : les images déjà présentes dans la nouvelle version sont sautées.
+    """
+
+    def __init__(self, registry, model, encode, captions=load_captions, rate=REEMBED_RATE,
+                 batch_size=REEMBED_BATCH_SIZE, caption_cache=None, sleep=time.sleep, clock=time.monotonic):
+        """
+        Args:
+            registry (VersionRegistry): Registre des versions
+            model (str): Identifiant du nouveau modèle
+            encode (callable): Encode une liste de légendes avec le nouveau modèle
+            captions (callable): Retourne {filename: légende}, relu avant chaque rattrapage
+            rate (float): Légendes encodées par seconde au maximum (0: sans limite)
+            batch_size (int): Légendes par appel au modèle
+            caption_cache (CaptionCache): Cache de légendes du nouveau modèle (optionnel)
+        """
+        self.registry = registry
+        self.model = model
+        self.encode = encode
+        self.load_captions = captions
+        self.rate = rate
+        self.batch_size = batch_size
+        self.caption_cache = caption_cache
+        self.sleep = sleep
+        self.clock = clock
+        self.captions = {}
+        self.stats = {"encoded": 0, "cached": 0, "deleted": 0, "missing": 0}
+        self._start = None
+        self._budget = 0
+
+    def _throttle(self, count):
+        """Attend pour ne pas dépasser `rate` légendes par seconde depuis le début."""
+        if self.rate <= 0:
+            return
+        if self._start is None:
+            self._start = self.clock()
+        self._budget += count
+        delay = self._start + self._budget / self.rate - self.clock()
+        if delay > 0:
+            self.sleep(delay)
+
+    def _encode(self, captions):
+        """Encode des légendes : cache de légendes, puis une fois chaque légende distincte."""
+        vectors = [None] * len(captions)
+        missing = {}
+        for position, caption in enumerate(captions):
+            cached = self.caption_cache.get(caption) if self.caption_cache is not None else None
+            if cached is not None:
+                vectors[position] = cached
+                self.stats["cached"] += 1
+            else:
+                missing.setdefault(caption_key(caption), []).append(position)
+        if missing:
+            unique = [captions[positions[0]] for positions in missing.values()]
+            self._throttle(len(unique))
+            for caption, vector, positions in zip(unique, self.encode(unique), missing.values()):
+                vector = [float(x) for x in vector]
+                for position in positions:
+                    vectors[position] = vector
+                if self.caption_cache is not None:
+                    self.caption_cache.add(caption, vector)
+            self.stats["encoded"] += len(unique)
+            # Les doublons d'un même lot réutilisent le vecteur calculé : comptés comme des hits
+            self.stats["cached"] += sum(len(positions) - 1 for positions in missing.values())
+        return vectors
+
+    def _reembed(self, log, ids):
+        """Encode les légendes de `ids` et les ajoute au journal de la nouvelle version."""
+        for start in range(0, len(ids), self.batch_size):
+            block = []
+            for image_id in ids[start:start + self.batch_size]:
+                if image_id in self.captions:
+                    block.append(image_id)
+                else:
+                    # Sans légende enregistrée, l'image n'aura pas de vecteur dans la nouvelle version
+                    self.stats["missing"] += 1
+            if not block:
+                continue
+            vectors = self._encode([self.captions[i] for i in block])
+            log.append(dict(zip(block, vectors)))
+            if self.caption_cache is not None:
+                self.caption_cache.flush()
+
+    def _catch_up(self, source, target, cursor):
+        """
+        Reporte dans `target` les changements publiés dans `source` depuis `cursor`.
+
+        Returns:
+            int: Génération de `source` atteinte
+        """
+        while True:
+            generation, reset, changes = source.read_changes(cursor)
+            if generation == cursor or not changes:
+                return generation
+            self.captions = self.load_captions()
+            if reset:
+                # Compaction de segments non lus : seul l'état complet est connu,
+                # les images absentes de la nouvelle version sont encodées
+                current = {}
+                for ids, _, deleted in changes:
+                    for image_id in deleted:
+                        current.pop(image_id, None)
+                    current.update(dict.fromkeys(ids))
+                stored = _stored_ids(target)
+                deleted = [i for i in stored if i not in current]
+                if deleted:
+                    target.append({}, deleted=deleted)
+                self.stats["deleted"] += len(deleted)
+                self._reembed(target, [i for i in current if i not in stored])
+            else:
+                for ids, _, deleted in changes:
+                    if deleted:
+                        target.append({}, deleted=deleted)
+                        self.stats["deleted"] += len(deleted)
+                    self._reembed(target, ids)
+            cursor = generation
+
+    def run(self):
+        """
+        Construit la nouvelle version puis bascule le registre.
+
+        Returns:
+            bool: True si la nouvelle version est devenue active
+        """
+        state = self.registry.read()
+        if state["active"]["model"] == self.model:
+            self.catch_up_previous()
+            return False
+
+        building = state.get("building")
+        if not building or building["model"] != self.model:
+            building = {"model": self.model, "dir": self.registry.version_dir(self.model), "source_generation": 0}
+            # Restes d'une construction abandonnée ou d'une ancienne version du même modèle
+            if building["dir"] != state["active"]["dir"]:
+                shutil.rmtree(building["dir"], ignore_errors=True)
+            state["building"] = building
+            self.registry.write(state)
+
+        source = SegmentLog(state["active"]["dir"])
+        target = SegmentLog(building["dir"], model=self.model)
+        cursor = building["source_generation"]
+        if cursor == 0:
+            # Passage complet sur l'état servi, puis rattrapage de ce qui a changé entre-temps
+            cursor = source.generation
+            self.captions = self.load_captions()
+            done = _stored_ids(target)
+            for ids, _ in source.iter_current(self.batch_size):
+                self._reembed(target, [i for i in ids if i not in done])
+            self._save_cursor(cursor)
+
+        cursor = self._catch_up(source, target, cursor)
+        self.registry.switch(cursor)
+        # Écritures de l'ancienne version arrivées pendant la bascule
+        self.catch_up_previous()
+        return True
+
+    def _save_cursor(self, cursor):
+        state = self.registry.read()
+        state["building"]["source_generation"] = cursor
+        self.registry.write(state)
+
+    def catch_up_previous(self):
+        """
+        Reporte dans la version active les embeddings écrits dans la version
+        précédente après la bascule (écrivains lancés avant celle-ci).
+
+        Returns:
+            int: Génération de la version précédente atteinte
+        """
+        state = self.registry.read()
+        previous = state.get("previous")
+        if not previous or not os.path.exists(os.path.join(previous["dir"], MANIFEST_NAME)):
+            return 0
+        source = SegmentLog(previous["dir"])
+        target = SegmentLog(state["active"]["dir"], model=state["active"]["model"])
+        cursor = previous.get("generation", 0)
+        generation = self._catch_up(source, target, cursor) if cursor else source.generation
+        if generation != cursor:
+            state = self.registry.read()
+            state["previous"]["generation"] = generation
+            self.registry.write(state)
+        return generation
+
+
+def _stored_ids(log):
+    """Identifiants présents dans un journal (un segment à la fois en mémoire)."""
+    return {image_id for ids, _ in log.iter_current() for image_id in ids}
+
+
+def active_segment_dir():
+    """Journal de segments de la version active."""
+    return version_registry.active()["dir"]
+
+
+# Instance globale
+version_registry = VersionRegistry()
+
+
+def main():
+    """Affiche les versions d'embeddings ou ré-encode les légendes avec le modèle configuré."""
+    parser = argparse.ArgumentParser(description="Versions du modèle d'embedding des légendes")
+    parser.add_argument("command", choices=["status", "reembed"])
+    parser.add_argument("--model", default=EMBEDDING_MODEL, help="Nouveau modèle (défaut: EMBEDDING_MODEL)")
+    parser.add_argument("--rate", type=float, default=REEMBED_RATE, help="Légendes par seconde (0: sans limite)")
+    parser.add_argument("--batch-size", type=int, default=REEMBED_BATCH_SIZE)
+    args = parser.parse_args()
+
+    state = version_registry.read()
+    target = model_id(args.model)
+    if args.command == "status":
+        for role in ("active", "building", "previous"):
+            version = state.get(role)
+            if version:
+                log = SegmentLog(version["dir"])
+                count = sum(s["count"] for s in log.manifest["segments"])
+                print(f"  {role}: {version['model']} ({version['dir']}, génération {log.generation}, "
+                      f"~{count} vecteurs)")
+        if state["active"]["model"] != target:
+            print(f"⚠️  Modèle configuré {target} différent du modèle servi: "
+                  f"python -m scripts.model_versions reembed")
+        return
+
+    from config.settings import CAPTION_CACHE_ENABLED, SERVING_INDEX, SERVING_INDEX_DIR, STREAM_CHUNK_SIZE
+    from scripts.caption_cache import CaptionCache
+    from scripts.serving_index import publish_serving_index
+
+    _, encoder = load_text_encoder(target)
+    cache = CaptionCache(caption_cache_dir(target, encoder.name)) if CAPTION_CACHE_ENABLED else None
+    job = ReembeddingJob(version_registry, target, encoder.encode, load_captions, args.rate,
+                         args.batch_size, caption_cache=cache)
+    print(f"🔁 Ré-encodage des légendes: {state['active']['model']} -> {target} "
+          f"({args.rate:g} légendes/s max)")
+    switched = job.run()
+    stats = job.stats
+    print(f"✅ {stats['encoded']} légendes encodées, {stats['cached']} en cache, "
+          f"{stats['deleted']} suppressions, {stats['missing']} images sans légende")
+    if switched:
+        print(f"🔀 Version active: {target} (les processus de service basculent au prochain rafraîchissement)")
+        if SERVING_INDEX:
+            active = version_registry.active()
+            publish_serving_index(SegmentLog(active["dir"]).iter_current(STREAM_CHUNK_SIZE),
+                                  SERVING_INDEX_DIR, model=active["model"])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,29 @@
-```python
 import os
 import json
+import threading
 from PIL import Image
-import pytesseract
-from config.settings import TESSERACT_PATH, OCR_LANGUAGE, OCR_PATH
+
+try:
+    import pytesseract
+    from pytesseract import TesseractNotFoundError
+except ImportError:
+    # Seul le moteur tesserocr (OCR_ENGINE=tesserocr) est alors utilisable
+    pytesseract = None
+
+    class TesseractNotFoundError(EnvironmentError):
+        """pytesseract n'est pas installé."""
+
+from config.settings import (
+    TESSERACT_PATH, OCR_LANGUAGE, OCR_PATH, OCR_GATE, OCR_GATE_EDGE_THRESHOLD,
+    OCR_ENGINE, TESSDATA_PATH,
+)
+from scripts.text_gate import TextPresenceGate
+from scripts.metrics import metrics
+from scripts.streaming import write_json_object, merged_items
 
 # Set Tesseract path for pytesseract
-pytesseract.pytesseract.pytesseract_cmd = TESSERACT_PATH
+if pytesseract is not None:
+    pytesseract.pytesseract.pytesseract_cmd = TESSERACT_PATH
 
 class OCRProcessor:
     """
@@ -22,6 +39,9 @@ class OCRProcessor:
         Charge le cache OCR si disponible.
         """
         self.ocr_cache = {}  # Dictionnaire pour stocker les résultats OCR
+        self.text_gate = TextPresenceGate(OCR_GATE, edge_threshold=OCR_GATE_EDGE_THRESHOLD)
+        self.engine = OCR_ENGINE  # "pytesseract" (processus par image) ou "tesserocr"
+        self._local = threading.local()  # Une API Tesseract par thread et par processus
         self._load_cached_ocr()  # Charge le cache OCR
         
     def _load_cached_ocr(self):
@@ -37,25 +57,75 @@ class OCRProcessor:
             except Exception as e:
                 print(f"Impossible de charger le cache OCR: {e}")
     
-    def run_ocr(self, image_path):
+    def _tesseract_api(self):
+        """
+        Retourne l'API Tesseract persistante du thread courant (moteur tesserocr).
+        
+        Les modèles de langue sont chargés une seule fois ; un processus créé
+        par fork recrée sa propre API au lieu de réutiliser celle du parent.
+        
+        :return: tesserocr.PyTessBaseAPI
+        """
+        if getattr(self._local, "pid", None) != os.getpid():
+            import tesserocr
+            kwargs = {"lang": OCR_LANGUAGE}
+            if TESSDATA_PATH:
+                kwargs["path"] = TESSDATA_PATH
+            self._local.api = tesserocr.PyTessBaseAPI(**kwargs)
+            self._local.pid = os.getpid()
+        return self._local.api
+    
+    def _recognize(self, image):
+        """
+        Reconnaît le texte d'une image avec le moteur configuré.
+        
+        Avec tesserocr, l'image est transmise en mémoire à une API déjà
+        initialisée ; pytesseract reste utilisé en repli.
+        
+        :param image: Image PIL
+        :return: Texte brut
+        """
+        if self.engine == "tesserocr":
+            try:
+                api = self._tesseract_api()
+                if image.mode not in ("1", "L", "RGB", "RGBA"):
+                    image = image.convert("RGB")
+                api.SetImage(image)
+                return api.GetUTF8Text()
+            except (ImportError, RuntimeError) as e:
+                print(f"⚠️  tesserocr indisponible ({e}), utilisation de pytesseract")
+                self.engine = "pytesseract"
+        if pytesseract is None:
+            raise TesseractNotFoundError()
+        return pytesseract.image_to_string(image, lang=OCR_LANGUAGE)
+    
+    def run_ocr(self, image_path, tags=None):
         """
         Effectue l'OCR sur une image.
         
+        Tesseract n'est pas lancé si la détection de texte (OCR_GATE) juge
+        que l'image n'en contient pas.
+        
         :param image_path: Chemin d'accès à l'image
+        :param tags: Tags CLIP de l'image (détection OCR_GATE=clip)
         :return: Le texte reconnu dans l'image
         """
         filename = os.path.basename(image_path)
         
         # Vérifie si le résultat est déjà dans le cache
         if filename in self.ocr_cache:
+            metrics.inc("ocr_cache_hits")
             return self.ocr_cache[filename]
         
         try:
             # Ouvre l'image
             image = Image.open(image_path)
             
-            # Effectue l'OCR
-            text = pytesseract.image_to_string(image, lang=OCR_LANGUAGE)
+            # Effectue l'OCR, sauf si l'image ne semble pas contenir de texte
+            run, _ = self.text_gate.decide(image_path, image, tags)
+            if not run:
+                metrics.inc("ocr_skipped")
+            text = self._recognize(image) if run else ""
             
             # Nettoie le texte
             text = text.strip()
@@ -68,7 +138,7 @@ class OCRProcessor:
             print(f"OCR effectué: {filename}")
             return text
         
-        except pytesseract.TesseractNotFoundError:
+        except TesseractNotFoundError:
             print("Tesseract n'est pas installé. Installez-le et configurez TESSERACT_PATH")
             return "Erreur: Tesseract non disponible"
         
@@ -76,16 +146,19 @@ class OCRProcessor:
             print(f"Erreur OCR sur {filename}: {e}")
             return f"Erreur OCR: {str(e)}"
     
-    def save_ocr_results(self):
+    def save_ocr_results(self, updates=None):
         """
         Sauvegarde les résultats OCR dans un fichier JSON.
         
+        Le fichier est écrit en flux: les résultats `updates` (ex: relus d'un
+        checkpoint) ne sont pas chargés en mémoire.
+        
+        :param updates: Itérable de paires (filename, texte) prioritaires sur le cache
         :return: None
         """
         try:
-            with open(OCR_PATH, 'w', encoding='utf-8') as f:
-                json.dump(self.ocr_cache, f, indent=2, ensure_ascii=False)
-            print(f"Résultats OCR sauvegardés: {OCR_PATH}")
+            count = write_json_object(OCR_PATH, merged_items(updates or (), self.ocr_cache))
+            print(f"Résultats OCR sauvegardés: {OCR_PATH} ({count} images)")
         except Exception as e:
             print(f"Erreur lors de la sauvegarde OCR: {e}")
 
@@ -93,14 +166,15 @@ class OCRProcessor:
 # Instance globale
 ocr_processor = OCRProcessor()
 
-def run_ocr(image_path):
+def run_ocr(image_path, tags=None):
     """
     Fonction de compatibilité pour effectuer l'OCR sur une image.
     
     :param image_path: Chemin d'accès à l'image
+    :param tags: Tags CLIP de l'image (détection OCR_GATE=clip)
     :return: Le texte reconnu dans l'image
     """
-    return ocr_processor.run_ocr(image_path)
+    return ocr_processor.run_ocr(image_path, tags)
 
 def save_ocr_results():
     """
@@ -109,4 +183,3 @@ def save_ocr_results():
     :return: None
     """
     ocr_processor.save_ocr_results()
-```
\ No newline at end of file
@@ -0,0 +1,277 @@
+"""
+Représentations compressées des embeddings.
+Fournit des codecs float16, int8 (quantification scalaire) et PQ
+(quantification produit) capables de scorer une requête directement
+sur les codes, sans décompresser toute la matrice.
+"""
+
+import argparse
+import numpy as np
+
+# Taille des blocs convertis en float32 lors du calcul des scores
+_SCORE_CHUNK = 65536
+
+
+def _chunked_scores(codes, to_float, query):
+    """Calcule codes @ query par blocs pour borner la mémoire temporaire."""
+    scores = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), _SCORE_CHUNK):
+        block = to_float(codes[start:start + _SCORE_CHUNK])
+        scores[start:start + _SCORE_CHUNK] = block @ query
+    return scores
+
+
+class Float32Codec:
+    """Stockage exact en float32 (référence, 4 octets par dimension)."""
+
+    name = "float32"
+    dtype = np.float32
+
+    def fit(self, vectors):
+        """Aucun entraînement nécessaire."""
+
+    def code_size(self, dim):
+        """Nombre de colonnes de codes pour une dimension donnée."""
+        return dim
+
+    def encode(self, vectors):
+        return np.asarray(vectors, dtype=np.float32)
+
+    def decode(self, codes):
+        return np.asarray(codes, dtype=np.float32)
+
+    def scores(self, query, codes):
+        return codes @ np.asarray(query, dtype=np.float32)
+
+    def state(self):
+        """Paramètres à persister (aucun)."""
+        return {}
+
+
+class Float16Codec(Float32Codec):
+    """Demi-précision : 2 octets par dimension, perte négligeable sur le cosinus."""
+
+    name = "float16"
+    dtype = np.float16
+
+    def encode(self, vectors):
+        return np.asarray(vectors, dtype=np.float32).astype(np.float16)
+
+    def scores(self, query, codes):
+        return _chunked_scores(codes, lambda b: b.astype(np.float32), np.asarray(query, dtype=np.float32))
+
+
+class Int8Codec(Float32Codec):
+    """
+    Quantification scalaire : chaque dimension est ramenée sur 256 niveaux
+    entre son minimum et son maximum observés (1 octet par dimension).
+    """
+
+    name = "int8"
+    dtype = np.int8
+
+    def __init__(self):
+        self.offset = None
+        self.scale = None
+
+    def fit(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        low, high = vectors.min(axis=0), vectors.max(axis=0)
+        self.offset = low
+        self.scale = np.maximum(high - low, 1e-8) / 255.0
+
+    def encode(self, vectors):
+        levels = np.rint((np.asarray(vectors, dtype=np.float32) - self.offset) / self.scale)
+        return (np.clip(levels, 0, 255) - 128).astype(np.int8)
+
+    def decode(self, codes):
+        return self.offset + (codes.astype(np.float32) + 128) * self.scale
+
+    def scores(self, query, codes):
+        # q . (offset + (c + 128) * scale) = q . offset + (q * scale) . (c + 128)
+        query = np.asarray(query, dtype=np.float32)
+        weighted = query * self.scale
+        bias = float(query @ self.offset) + 128.0 * float(weighted.sum())
+        return _chunked_scores(codes, lambda b: b.astype(np.float32), weighted) + bias
+
+    def state(self):
+        return {"offset": self.offset, "scale": self.scale}
+
+
+class PQCodec(Float32Codec):
+    """
+    Quantification produit : le vecteur est découpé en `m` sous-vecteurs,
+    chacun remplacé par l'indice (1 octet) de son centroïde le plus proche.
+    Les scores sont calculés par tables de correspondance (ADC).
+    """
+
+    name = "pq"
+    dtype = np.uint8
+
+    def __init__(self, m=48, n_iter=15, seed=0):
+        """
+        Args:
+            m (int): Nombre de sous-vecteurs (doit diviser la dimension)
+            n_iter (int): Itérations de k-means par sous-espace
+            seed (int): Graine aléatoire
+        """
+        self.m = m
+        self.n_iter = n_iter
+        self.seed = seed
+        self.codebooks = None
+
+    def code_size(self, dim):
+        return self.m
+
+    def _split(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape[1] % self.m:
+            raise ValueError(f"La dimension {vectors.shape[1]} n'est pas divisible par m={self.m}")
+        return vectors.reshape(len(vectors), self.m, -1)
+
+    def fit(self, vectors, max_train_size=65536):
+        rng = np.random.default_rng(self.seed)
+        sub = self._split(vectors)
+        if len(sub) > max_train_size:
+            sub = sub[rng.choice(len(sub), max_train_size, replace=False)]
+
+        k = min(256, len(sub))
+        codebooks = np.empty((self.m, k, sub.shape[2]), dtype=np.float32)
+        for j in range(self.m):
+            data = sub[:, j, :]
+            centroids = data[rng.choice(len(data), k, replace=False)].copy()
+            for _ in range(self.n_iter):
+                assignments = self._nearest(data, centroids)
+                counts = np.bincount(assignments, minlength=k)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignments, data)
+                filled = counts > 0
+                centroids[filled] = sums[filled] / counts[filled, None]
+            codebooks[j] = centroids
+        self.codebooks = codebooks
+
+    @staticmethod
+    def _nearest(data, centroids):
+        distances = (
+            (data ** 2).sum(axis=1, keepdims=True)
+            - 2 * data @ centroids.T
+            + (centroids ** 2).sum(axis=1)
+        )
+        return np.argmin(distances, axis=1)
+
+    def encode(self, vectors):
+        sub = self._split(vectors)
+        codes = np.empty((len(sub), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            codes[:, j] = self._nearest(sub[:, j, :], self.codebooks[j])
+        return codes
+
+    def decode(self, codes):
+        parts = [self.codebooks[j][codes[:, j]] for j in range(self.m)]
+        return np.concatenate(parts, axis=1)
+
+    def scores(self, query, codes):
+        sub_query = self._split(np.asarray(query, dtype=np.float32)[None, :])[0]
+        # Table (m, k) des produits scalaires entre sous-requêtes et centroïdes
+        lut = np.einsum("mkd,md->mk", self.codebooks, sub_query)
+        scores = np.zeros(len(codes), dtype=np.float32)
+        for j in range(self.m):
+            scores += lut[j][codes[:, j]]
+        return scores
+
+    def state(self):
+        return {"codebooks": self.codebooks}
+
+
+CODECS = {
+    "float32": Float32Codec,
+    "float16": Float16Codec,
+    "int8": Int8Codec,
+    "pq": PQCodec,
+}
+
+
+def make_codec(name, **kwargs):
+    """
+    Instancie un codec par son nom.
+
+    Args:
+        name (str): 'float32', 'float16', 'int8' ou 'pq'
+        **kwargs: Paramètres du codec (ex: m pour PQ)
+
+    Returns:
+        Codec: Instance du codec
+    """
+    if name not in CODECS:
+        raise ValueError(f"Codec inconnu: {name} (choix: {', '.join(CODECS)})")
+    return CODECS[name](**kwargs)
+
+
+def evaluate_codec(codec, matrix, queries, top_k=10, rerank=0):
+    """
+    Mesure la qualité de classement d'un codec par rapport au float32.
+
+    Args:
+        codec: Codec entraîné
+        matrix (np.ndarray): Vecteurs normalisés float32 (n, dim)
+        queries (np.ndarray): Requêtes normalisées (q, dim)
+        top_k (int): Nombre de résultats comparés
+        rerank (int): Candidats reclassés en float32 (0: aucun)
+
+    Returns:
+        dict: rappel@k et octets par vecteur
+    """
+    codes = codec.encode(matrix)
+    hits = 0
+    for query in queries:
+        truth = set(np.argsort(-(matrix @ query))[:top_k])
+        scores = codec.scores(query, codes)
+        candidates = np.argsort(-scores)[:max(top_k, rerank)]
+        if rerank:
+            candidates = candidates[np.argsort(-(matrix[candidates] @ query))]
+        hits += len(truth & set(candidates[:top_k]))
+    return {
+        "codec": codec.name,
+        "rerank": rerank,
+        "recall": hits / (len(queries) * top_k),
+        "bytes_per_vector": codes.nbytes / len(codes),
+    }
+
+
+def main():
+    """Compare les codecs sur les embeddings stockés ou synthétiques."""
+    parser = argparse.ArgumentParser(description="Qualité des embeddings compressés")
+    parser.add_argument("--synthetic", type=int, default=0,
+                        help="Nombre de vecteurs synthétiques (0: embeddings stockés)")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, default=100)
+    parser.add_argument("--pq-m", type=int, default=48)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.synthetic:
+        centers = rng.normal(size=(max(1, args.synthetic // 500), args.dim))
+        matrix = centers[rng.integers(len(centers), size=args.synthetic)]
+        matrix = matrix + 0.5 * rng.normal(size=matrix.shape)
+    else:
+        from scripts.segment_log import load_stored_embeddings
+        matrix = np.array(list(load_stored_embeddings().values()))
+
+    matrix = matrix.astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-8
+    queries = matrix[rng.choice(len(matrix), min(args.queries, len(matrix)), replace=False)]
+
+    print(f"📊 {len(matrix)} vecteurs de dimension {matrix.shape[1]}, top_k={args.top_k}")
+    for name in CODECS:
+        codec = make_codec(name, m=args.pq_m) if name == "pq" else make_codec(name)
+        codec.fit(matrix)
+        for rerank in sorted({0, args.rerank}):
+            row = evaluate_codec(codec, matrix, queries, args.top_k, rerank)
+            print(f"  {name:>8}  rerank={rerank:<4} rappel@{args.top_k}={row['recall']:.3f}  "
+                  f"{row['bytes_per_vector']:.0f} octets/vecteur")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,21 @@ Module de recherche avancée dans la photothèque.
 Permet de rechercher les images par texte, tags, métadonnées et similarité.
 """
 
+import io
 import csv
+import json
 import os
+import time
+import threading
 from scripts.embeddings import embedding_manager
-from config.settings import METADATA_PATH
+from scripts.extract_metadata import metadata_extractor
+from config.settings import (
+    METADATA_PATH, METADATA_SNAPSHOT_PATH, TAGS_PATH, SERVING_INDEX, INDEX_POLL_INTERVAL,
+)
+
+# Colonnes chargées en mémoire pour les filtres (stockage Parquet) ; le détail
+# d'une image est lu à la demande par get_image_info
+SEARCH_COLUMNS = ["filename", "width", "height", "format", "mode", "Make", "Model", "DateTimeOriginal"]
 
 
 class ImageSearchEngine:
@@ -14,23 +25,176 @@ class ImageSearchEngine:
 
     def __init__(self):
         """Initialise le moteur de recherche."""
+        # Position de lecture des métadonnées et des tags, pour le rechargement incrémental
+        self._metadata_cursor = None
+        self._tags_mtime = None
+        self._last_poll = 0.0
+        self._poll_lock = threading.Lock()
         self.metadata = self._load_metadata()
+        self.tags = self._load_tags()
 
     def _load_metadata(self):
-        """Charge les métadonnées depuis le fichier CSV."""
+        """
+        Charge les métadonnées (colonnes de filtrage du stockage Parquet, ou fichier CSV).
+
+        Avec SERVING_INDEX, l'instantané Arrow est mappé en mémoire (partagé entre
+        processus) ; recharger ne fait que remplacer la projection. La position
+        atteinte est mémorisée pour que `refresh` ne lise que la suite.
+        """
         metadata = {}
+        self._metadata_cursor = None
+        store = metadata_extractor.store
+        if SERVING_INDEX and store is not None and os.path.exists(METADATA_SNAPSHOT_PATH):
+            try:
+                from scripts.metadata_store import MetadataView, open_snapshot
+                mtime = os.stat(METADATA_SNAPSHOT_PATH).st_mtime_ns
+                view = MetadataView(open_snapshot(METADATA_SNAPSHOT_PATH))
+                self._metadata_cursor = ("snapshot", mtime)
+                return view
+            except Exception as e:
+                print(f"⚠️  Erreur lors du chargement des métadonnées: {e}")
+        if store is not None and store.exists():
+            try:
+                parts = store.parts()
+                for row in store.read(SEARCH_COLUMNS, paths=parts).to_pylist():
+                    metadata[row["filename"]] = row
+                self._metadata_cursor = ("parquet", set(parts))
+                return metadata
+            except Exception as e:
+                print(f"⚠️  Erreur lors du chargement des métadonnées: {e}")
         if os.path.exists(METADATA_PATH):
             try:
-                with open(METADATA_PATH, "r", encoding="utf-8") as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        filename = row.get("filename")
-                        if filename:
-                            metadata[filename] = row
+                metadata.update(self._read_csv_metadata(None))
             except Exception as e:
                 print(f"⚠️  Erreur lors du chargement des métadonnées: {e}")
         return metadata
 
+    def _read_csv_metadata(self, cursor):
+        """
+        Lit les lignes de metadata.csv à partir d'une position (tout le fichier si cursor est None).
+
+        Seules les lignes complètes sont lues : une ligne en cours d'ajout sera lue au prochain appel.
+
+        Returns:
+            dict: Lignes lues, par nom de fichier
+        """
+        with open(METADATA_PATH, "rb") as f:
+            stat = os.fstat(f.fileno())
+            offset, fieldnames = (0, None) if cursor is None else cursor[2:]
+            f.seek(offset)
+            data = f.read(stat.st_size - offset)
+        data = data[:data.rfind(b"\n") + 1]
+        lines = io.StringIO(data.decode("utf-8"), newline="")
+        reader = csv.DictReader(lines, fieldnames=fieldnames)
+        rows = {row["filename"]: row for row in reader if row.get("filename")}
+        self._metadata_cursor = ("csv", stat.st_ino, offset + len(data), reader.fieldnames)
+        return rows
+
+    def _load_tags(self):
+        """Charge les tags générés par CLIP depuis le fichier JSON."""
+        tags = {}
+        if os.path.exists(TAGS_PATH):
+            try:
+                self._tags_mtime = os.stat(TAGS_PATH).st_mtime_ns
+                with open(TAGS_PATH, "r", encoding="utf-8") as f:
+                    tags = json.load(f)
+            except Exception as e:
+                print(f"⚠️  Erreur lors du chargement des tags: {e}")
+        return tags
+
+    def _refresh_metadata(self):
+        """
+        Applique les métadonnées publiées depuis le dernier chargement.
+
+        Stockage Parquet : seuls les nouveaux fichiers de partition sont lus
+        (relecture complète après une fusion des petits fichiers).
+        CSV : seules les lignes ajoutées en fin de fichier sont lues (relecture
+        complète si le fichier a été réécrit). Instantané mappé : nouvelle
+        projection s'il a été remplacé.
+
+        Les recherches parcourent `self.metadata` depuis d'autres threads : le
+        dictionnaire n'est jamais modifié en place, les lignes lues sont
+        appliquées à une copie qui le remplace d'un coup.
+
+        Returns:
+            int: Nombre de lignes appliquées
+        """
+        cursor = self._metadata_cursor
+        store = metadata_extractor.store
+        if cursor is None:
+            self.metadata = self._load_metadata()
+            return len(self.metadata)
+
+        if cursor[0] == "snapshot":
+            if os.stat(METADATA_SNAPSHOT_PATH).st_mtime_ns == cursor[1]:
+                return 0
+            self.metadata = self._load_metadata()
+            return len(self.metadata)
+
+        if cursor[0] == "parquet":
+            parts = store.parts()
+            if not cursor[1] <= set(parts):
+                # Fichiers fusionnés (MetadataStore.compact): une version plus récente
+                # lue dans une autre partition ne doit pas être écrasée, tout est relu
+                self.metadata = self._load_metadata()
+                return len(self.metadata)
+            new_parts = [p for p in parts if p not in cursor[1]]
+            if not new_parts:
+                return 0
+            rows = {row["filename"]: row for row in store.read(SEARCH_COLUMNS, paths=new_parts).to_pylist()}
+            self._metadata_cursor = ("parquet", cursor[1] | set(new_parts))
+        else:
+            stat = os.stat(METADATA_PATH)
+            if stat.st_ino != cursor[1] or stat.st_size < cursor[2]:
+                self.metadata = self._load_metadata()
+                return len(self.metadata)
+            rows = self._read_csv_metadata(cursor)
+        if rows:
+            metadata = dict(self.metadata)
+            metadata.update(rows)
+            self.metadata = metadata
+        return len(rows)
+
+    def refresh(self):
+        """
+        Rechargement à chaud : applique uniquement ce qui a changé depuis le
+        dernier chargement (embeddings, métadonnées, tags).
+
+        Returns:
+            dict: Statistiques des embeddings (voir EmbeddingManager.refresh),
+                plus "metadata" (lignes appliquées) et "tags" (fichier relu)
+        """
+        stats = embedding_manager.refresh()
+        try:
+            stats["metadata"] = self._refresh_metadata()
+        except Exception as e:
+            print(f"⚠️  Erreur lors de l'actualisation des métadonnées: {e}")
+            stats["metadata"] = 0
+        stats["tags"] = False
+        if os.path.exists(TAGS_PATH) and os.stat(TAGS_PATH).st_mtime_ns != self._tags_mtime:
+            self.tags = self._load_tags()
+            stats["tags"] = True
+        return stats
+
+    def poll(self, interval=INDEX_POLL_INTERVAL):
+        """
+        Appelle `refresh` si le dernier rafraîchissement date de plus de `interval` secondes.
+
+        Sans effet si un autre thread rafraîchit déjà, ou si interval <= 0.
+
+        Returns:
+            dict: Statistiques de `refresh`, ou None si rien n'a été fait
+        """
+        if interval <= 0 or time.monotonic() - self._last_poll < interval:
+            return None
+        if not self._poll_lock.acquire(blocking=False):
+            return None
+        try:
+            self._last_poll = time.monotonic()
+            return self.refresh()
+        finally:
+            self._poll_lock.release()
+
     def search_by_text(self, query, top_k=10):
         """
         Recherche par texte utilisant les embeddings.
@@ -67,15 +231,15 @@ class ImageSearchEngine:
 
             for key, value in filters.items():
                 if key == "min_width":
-                    if int(metadata.get("width", 0)) < value:
+                    if int(metadata.get("width") or 0) < value:
                         match = False
                         break
                 elif key == "min_height":
-                    if int(metadata.get("height", 0)) < value:
+                    if int(metadata.get("height") or 0) < value:
                         match = False
                         break
                 elif key == "format":
-                    if metadata.get("format", "").upper() != value.upper():
+                    if (metadata.get("format") or "").upper() != value.upper():
                         match = False
                         break
                 elif key in metadata:
@@ -90,7 +254,7 @@ class ImageSearchEngine:
 
     def search_by_tags(self, tags, mode="any"):
         """
-        Recherche par tags (nécessite les tags générés préalablement).
+        Recherche par tags (générés par la pipeline dans data/tags.json).
 
         Args:
             tags (list): Tags à chercher
@@ -99,9 +263,16 @@ class ImageSearchEngine:
         Returns:
             list: Fichiers correspondant
         """
-        # Note: Nécessite une table tags en base de données
-        # Implémentation future avec persistance des tags
-        return []
+        wanted = set(tags)
+        if not wanted:
+            return []
+
+        results = []
+        for filename, image_tags in self.tags.items():
+            image_tags = set(image_tags)
+            if (mode == "all" and wanted <= image_tags) or (mode != "all" and wanted & image_tags):
+                results.append(filename)
+        return sorted(results)
 
     def advanced_search(self, text_query=None, metadata_filters=None, limit=20):
         """
@@ -143,6 +314,12 @@ class ImageSearchEngine:
         Returns:
             dict: Informations de l'image
         """
+        store = metadata_extractor.store
+        if isinstance(self.metadata, dict) and store is not None and filename in self.metadata:
+            try:
+                return store.get(filename)
+            except Exception as e:
+                print(f"⚠️  Erreur lors de la lecture des métadonnées de {filename}: {e}")
         return self.metadata.get(filename, {})
 
 
@@ -0,0 +1,416 @@
+"""
+Journal d'embeddings en segments, en ajout seul et résistant aux crashs.
+Chaque lot d'embeddings est écrit dans un nouveau segment ; un manifeste
+remplacé atomiquement (fsync + rename) liste les segments valides. Une
+compaction en arrière-plan fusionne les segments sans bloquer les écritures.
+
+Un segment "seg-N.npz" contient les identifiants et les suppressions ; ses
+vecteurs sont dans "seg-N.npy", non compressé, lu en mémoire mappée : seules
+les lignes parcourues sont chargées, même après une compaction.
+"""
+
+import os
+import json
+import time
+import threading
+import numpy as np
+
+MANIFEST_NAME = "MANIFEST.json"
+
+
+def _fsync_dir(directory):
+    """Rend durable un rename dans `directory` (sans effet sous Windows)."""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, write):
+    """
+    Écrit un fichier de façon atomique : fichier temporaire, fsync, puis rename.
+
+    Args:
+        path (str): Chemin final
+        write (callable): Fonction recevant le fichier binaire ouvert
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(os.path.dirname(path) or ".")
+
+
+def _vectors_name(name):
+    """Fichier des vecteurs d'un segment ("seg-N.npz" -> "seg-N.npy")."""
+    return f"{os.path.splitext(name)[0]}.npy"
+
+
+def _write_npy(f, shape, blocks):
+    """Écrit un tableau float32 .npy bloc par bloc (sans le construire en entier)."""
+    np.lib.format.write_array_header_1_0(f, {
+        "descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+        "fortran_order": False,
+        "shape": tuple(shape),
+    })
+    for block in blocks:
+        f.write(np.ascontiguousarray(block, dtype=np.float32).tobytes())
+
+
+class SegmentLog:
+    """
+    Journal de segments d'embeddings (un seul écrivain, lecteurs multiples).
+
+    Un lecteur ne voit jamais de fichier partiel : un segment n'existe pour
+    lui qu'une fois référencé par le manifeste, lui-même remplacé atomiquement.
+
+    Le manifeste et chaque segment portent l'identifiant du modèle qui a
+    produit les vecteurs : un écrivain d'un autre modèle est refusé.
+    """
+
+    def __init__(self, directory, model=None):
+        """
+        Args:
+            directory (str): Dossier des segments et du manifeste
+            model (str): Modèle des vecteurs écrits (None: pas de contrôle)
+        """
+        self.directory = directory
+        self.writer_model = model
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._compaction_thread = None
+        self._stop_compaction = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        """Lit le manifeste courant (vide si le journal est neuf)."""
+        if not os.path.exists(self.manifest_path):
+            return {"generation": 0, "next_segment": 1, "segments": []}
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _reload_manifest(self):
+        """
+        Relit le manifeste publié (un autre processus a pu compacter entre-temps).
+
+        Le numéro réservé par une compaction en cours n'est pas encore publié :
+        il est conservé pour qu'un ajout ne réutilise pas le nom de son segment.
+        """
+        with self._lock:
+            manifest = self._read_manifest()
+            manifest["next_segment"] = max(manifest["next_segment"], self.manifest["next_segment"])
+            self.manifest = manifest
+            return manifest
+
+    def _write_manifest(self, manifest):
+        data = json.dumps(manifest, indent=2).encode("utf-8")
+        atomic_write(self.manifest_path, lambda f: f.write(data))
+        self.manifest = manifest
+
+    @property
+    def generation(self):
+        """Génération courante (incrémentée à chaque ajout)."""
+        return self.manifest["generation"]
+
+    @property
+    def model(self):
+        """Modèle des vecteurs du journal (None pour un journal antérieur au suivi des modèles)."""
+        return self.manifest.get("model")
+
+    @property
+    def approx_count(self):
+        """
+        Nombre d'embeddings d'après le manifeste, sans lire les segments
+        (majorant : une image réécrite compte une fois par segment).
+        """
+        return max(0, sum(s["count"] - s.get("deleted", 0) for s in self.manifest["segments"]))
+
+    @property
+    def segment_count(self):
+        return len(self.manifest["segments"])
+
+    def append(self, embeddings_dict, deleted=()):
+        """
+        Ajoute un lot d'embeddings (et de suppressions) dans un nouveau segment.
+
+        Le coût est proportionnel au lot, pas à la taille totale du journal.
+
+        Args:
+            embeddings_dict (dict): {filename: embedding}
+            deleted (iterable): Identifiants à supprimer
+
+        Returns:
+            int: Génération créée
+        """
+        ids = list(embeddings_dict)
+        deleted = list(deleted)
+        if not ids and not deleted:
+            return self.generation
+
+        vectors = np.array([embeddings_dict[i] for i in ids], dtype=np.float32)
+        with self._lock:
+            manifest = json.loads(json.dumps(self.manifest))
+            if self.writer_model is not None:
+                if manifest.get("model") not in (None, self.writer_model):
+                    raise ValueError(f"{self.directory} contient des vecteurs de {manifest['model']}, "
+                                     f"pas de {self.writer_model}")
+                manifest["model"] = self.writer_model
+            name = f"seg-{manifest['next_segment']:08d}.npz"
+            self._write_segment(name, ids, vectors, deleted)
+
+            manifest["generation"] += 1
+            manifest["next_segment"] += 1
+            manifest["segments"].append({
+                "name": name,
+                "generation": manifest["generation"],
+                "count": len(ids),
+                "deleted": len(deleted),
+                "model": manifest.get("model"),
+            })
+            self._write_manifest(manifest)
+            return manifest["generation"]
+
+    def _write_segment(self, name, ids, vectors, deleted):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        vectors = vectors.reshape(len(ids), -1) if len(ids) else vectors.reshape(0, 0)
+        self._write_segment_blocks(name, ids, vectors.shape, [vectors], deleted)
+
+    def _write_segment_blocks(self, name, ids, shape, blocks, deleted):
+        """Écrit les vecteurs (par blocs) puis les identifiants d'un segment."""
+        atomic_write(os.path.join(self.directory, _vectors_name(name)),
+                     lambda f: _write_npy(f, shape, blocks))
+        atomic_write(os.path.join(self.directory, name), lambda f: np.savez(
+            f,
+            ids=np.array(ids, dtype=str),
+            deleted=np.array(deleted, dtype=str),
+        ))
+
+    def _read_ids(self, segment):
+        """Lit les identifiants et les suppressions d'un segment, sans ses vecteurs."""
+        with np.load(os.path.join(self.directory, segment["name"])) as data:
+            return data["ids"].tolist(), data["deleted"].tolist()
+
+    def _read_vectors(self, segment):
+        """Ouvre les vecteurs d'un segment en mémoire mappée (lecture seule)."""
+        path = os.path.join(self.directory, segment["name"])
+        with np.load(path) as data:
+            if "vectors" in data.files:
+                # Segment écrit avant la séparation des vecteurs
+                return data["vectors"]
+        return np.load(os.path.join(self.directory, _vectors_name(segment["name"])), mmap_mode="r")
+
+    def iter_segments(self, since_generation=0, newest_first=False):
+        """
+        Parcourt les segments postérieurs à une génération, dans l'ordre.
+
+        Args:
+            since_generation (int): Génération déjà connue du lecteur
+            newest_first (bool): Du plus récent au plus ancien
+
+        Yields:
+            tuple: (génération, ids, vecteurs (mémoire mappée), ids supprimés)
+        """
+        segments = self.manifest["segments"]
+        for segment in reversed(segments) if newest_first else segments:
+            if segment["generation"] <= since_generation:
+                continue
+            ids, deleted = self._read_ids(segment)
+            yield segment["generation"], ids, self._read_vectors(segment), deleted
+
+    def read_changes(self, since_generation):
+        """
+        Lit les changements publiés depuis une génération (rechargement incrémental).
+
+        Args:
+            since_generation (int): Dernière génération appliquée par le lecteur
+
+        Returns:
+            tuple: (génération courante, reset, [(ids, vecteurs, ids supprimés), ...]).
+                reset vaut True lorsque le lecteur doit repartir de zéro : une
+                compaction a fusionné des segments qu'il n'avait pas lus (le premier
+                lot contient alors l'état complet), ou le journal a été recréé.
+        """
+        for attempt in range(3):
+            self._reload_manifest()
+            if self.generation < since_generation:
+                since_generation = 0
+            segments = [s for s in self.manifest["segments"] if s["generation"] > since_generation]
+            reset = since_generation == 0 or bool(segments and segments[0].get("compacted"))
+            try:
+                changes = [(ids, vectors, deleted) for _, ids, vectors, deleted
+                           in self.iter_segments(0 if reset else since_generation)]
+                return self.generation, reset, changes
+            except FileNotFoundError:
+                # Compaction concurrente : relecture du nouveau manifeste
+                if attempt == 2:
+                    raise
+                time.sleep(0.1)
+
+    def load(self):
+        """
+        Reconstruit l'état complet {filename: embedding} en rejouant les segments.
+
+        Returns:
+            dict: Embeddings (listes de floats)
+        """
+        for attempt in range(3):
+            self._reload_manifest()
+            try:
+                embeddings = {}
+                for _, ids, vectors, deleted in self.iter_segments():
+                    for image_id in deleted:
+                        embeddings.pop(image_id, None)
+                    embeddings.update(zip(ids, vectors.tolist()))
+                return embeddings
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+                time.sleep(0.1)
+
+    def iter_current(self, chunk_size=1000):
+        """
+        Parcourt l'état courant par blocs, sans construire le dictionnaire complet.
+
+        Un premier passage ne lit que les identifiants pour savoir quel segment
+        détient la dernière version de chaque image ; les vecteurs sont ensuite
+        lus en mémoire mappée, un bloc de `chunk_size` lignes à la fois.
+
+        Yields:
+            tuple: (ids, vecteurs (n, d))
+        """
+        manifest = self._reload_manifest()
+        for ids, vectors, rows in self._iter_owned_rows(list(manifest["segments"])):
+            for start in range(0, len(rows), chunk_size):
+                block = rows[start:start + chunk_size]
+                yield [ids[row] for row in block], vectors[block]
+
+    def _iter_owned_rows(self, segments):
+        """
+        Pour chaque segment, les lignes qui portent la dernière version de leur image.
+
+        Yields:
+            tuple: (ids du segment, vecteurs (mémoire mappée), lignes retenues)
+        """
+        owner = {}
+        for position, segment in enumerate(segments):
+            ids, deleted = self._read_ids(segment)
+            for image_id in deleted:
+                owner.pop(image_id, None)
+            owner.update(dict.fromkeys(ids, position))
+
+        for position, segment in enumerate(segments):
+            ids, _ = self._read_ids(segment)
+            rows = [row for row, image_id in enumerate(ids) if owner.get(image_id) == position]
+            if rows:
+                yield ids, self._read_vectors(segment), rows
+
+    def compact(self):
+        """
+        Fusionne tous les segments existants en un seul.
+
+        Les segments ajoutés pendant la fusion sont conservés tels quels ; les
+        anciens fichiers ne sont supprimés qu'après publication du manifeste.
+        Les vecteurs sont recopiés par blocs depuis les segments mappés : la
+        mémoire utilisée ne dépend pas de la taille du corpus.
+        """
+        with self._lock:
+            snapshot = list(self.manifest["segments"])
+            if len(snapshot) < 2:
+                return
+            name = f"seg-{self.manifest['next_segment']:08d}.npz"
+            self.manifest["next_segment"] += 1
+
+        owned = list(self._iter_owned_rows(snapshot))
+        ids = [segment_ids[row] for segment_ids, _, rows in owned for row in rows]
+        dim = owned[0][1].shape[1] if owned else 0
+
+        def blocks(chunk_size=10000):
+            for _, vectors, rows in owned:
+                for start in range(0, len(rows), chunk_size):
+                    yield vectors[rows[start:start + chunk_size]]
+
+        self._write_segment_blocks(name, ids, (len(ids), dim), blocks(), [])
+
+        with self._lock:
+            manifest = json.loads(json.dumps(self.manifest))
+            if [s["name"] for s in manifest["segments"][:len(snapshot)]] != [s["name"] for s in snapshot]:
+                # Le journal a été remplacé pendant la fusion : le résultat est abandonné
+                for filename in (name, _vectors_name(name)):
+                    os.remove(os.path.join(self.directory, filename))
+                return
+            remaining = manifest["segments"][len(snapshot):]
+            manifest["segments"] = [{
+                "name": name,
+                "generation": snapshot[-1]["generation"],
+                "count": len(ids),
+                "deleted": 0,
+                "compacted": True,
+                "model": manifest.get("model"),
+            }] + remaining
+            self._write_manifest(manifest)
+
+        del owned
+        for segment in snapshot:
+            for filename in (segment["name"], _vectors_name(segment["name"])):
+                try:
+                    os.remove(os.path.join(self.directory, filename))
+                except OSError:
+                    pass
+        print(f"🗜️  Compaction: {len(snapshot)} segments fusionnés ({len(ids)} embeddings)")
+
+    def start_background_compaction(self, max_segments=16, interval=30.0):
+        """
+        Lance un thread qui compacte dès que le nombre de segments dépasse un seuil.
+
+        Args:
+            max_segments (int): Seuil de déclenchement
+            interval (float): Période de vérification (secondes)
+        """
+        if self._compaction_thread is not None:
+            return
+
+        def _loop():
+            while not self._stop_compaction.wait(interval):
+                if self.segment_count > max_segments:
+                    try:
+                        self.compact()
+                    except Exception as e:
+                        print(f"⚠️  Erreur de compaction: {e}")
+
+        self._compaction_thread = threading.Thread(target=_loop, name="segment-compaction", daemon=True)
+        self._compaction_thread.start()
+
+    def stop_background_compaction(self):
+        """Arrête le thread de compaction."""
+        self._stop_compaction.set()
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+            self._compaction_thread = None
+        self._stop_compaction.clear()
+
+
+def load_stored_embeddings():
+    """
+    Charge les embeddings persistés selon EMBEDDING_STORAGE (segments ou JSON).
+
+    Avec les segments, c'est la génération active (servie) qui est lue.
+
+    Returns:
+        dict: {filename: embedding}
+    """
+    from config.settings import EMBEDDING_STORAGE, EMBEDDING_PATH
+    from scripts.model_versions import active_segment_dir
+
+    segment_dir = active_segment_dir()
+    if EMBEDDING_STORAGE == "segments" and os.path.exists(os.path.join(segment_dir, MANIFEST_NAME)):
+        return SegmentLog(segment_dir).load()
+    if os.path.exists(EMBEDDING_PATH):
+        with open(EMBEDDING_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return {}
@@ -0,0 +1,384 @@
+"""
+Service HTTP asynchrone de recherche dans la photothèque.
+Les requêtes textuelles concurrentes sont regroupées en micro-lots pour
+un seul appel d'encodage du modèle ; les modèles restent chargés entre
+les requêtes et des statistiques de latence et de taille de lot sont exposées.
+"""
+
+import time
+import json
+import asyncio
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+from scripts.model_versions import ModelMismatchError
+
+
+class LatencyStats:
+    """Fenêtre glissante de mesures (latences ou tailles de lot)."""
+
+    def __init__(self, window=1000):
+        self.values = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, value):
+        self.values.append(value)
+        self.count += 1
+
+    def summary(self):
+        """Retourne le nombre total de mesures et les percentiles de la fenêtre."""
+        if not self.values:
+            return {"count": self.count}
+        values = np.fromiter(self.values, dtype=np.float64)
+        return {
+            "count": self.count,
+            "mean": float(values.mean()),
+            "p50": float(np.percentile(values, 50)),
+            "p95": float(np.percentile(values, 95)),
+            "p99": float(np.percentile(values, 99)),
+            "max": float(values.max()),
+        }
+
+
+class MicroBatcher:
+    """
+    Regroupe les encodages demandés dans une courte fenêtre de temps en un
+    seul appel `encode_batch(texts)`, exécuté hors de la boucle asyncio.
+    """
+
+    def __init__(self, encode_batch, max_batch=32, window_ms=5.0):
+        """
+        Args:
+            encode_batch (callable): Encode une liste de textes, retourne une liste de vecteurs
+            max_batch (int): Taille maximale d'un lot
+            window_ms (float): Délai d'attente max pour compléter un lot (millisecondes)
+        """
+        self.encode_batch = encode_batch
+        self.max_batch = max_batch
+        self.window = window_ms / 1000.0
+        self.batch_sizes = LatencyStats()
+        self.encode_latency = LatencyStats()
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        """Démarre la tâche de regroupement (dans la boucle courante)."""
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def encode(self, text):
+        """
+        Encode un texte, éventuellement avec d'autres requêtes concurrentes.
+
+        Returns:
+            list: Embedding du texte
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            texts = [text for text, _ in batch]
+            start = time.perf_counter()
+            try:
+                vectors = await loop.run_in_executor(None, self.encode_batch, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.encode_latency.add((time.perf_counter() - start) * 1000)
+            self.batch_sizes.add(len(batch))
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+
+class HTTPError(Exception):
+    """Erreur renvoyée au client avec un code HTTP."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class SearchService:
+    """
+    API de recherche : texte, métadonnées, tags et hybride.
+
+    Routes :
+      GET  /search/text?q=...&k=10
+      POST /search/metadata   {"min_width": 800, "format": "JPEG"}
+      GET  /search/tags?tags=mer,paysage&mode=any
+      POST /search/hybrid     {"text": "...", "filters": {...}, "tags": [...], "mode": "any", "limit": 20}
+      GET  /stats
+      GET  /health
+    """
+
+    def __init__(self, search_engine, embedding_manager, max_batch=32, window_ms=5.0, poll_interval=0.0,
+                 max_body=1 << 20):
+        """
+        Args:
+            search_engine (ImageSearchEngine): Moteur de recherche (métadonnées, tags)
+            embedding_manager (EmbeddingManager): Encodage et recherche vectorielle
+            max_batch (int): Taille maximale d'un micro-lot d'encodage
+            window_ms (float): Fenêtre de regroupement (millisecondes)
+            poll_interval (float): Période de rechargement incrémental de l'index (0: aucun)
+            max_body (int): Taille maximale du corps d'une requête (octets)
+        """
+        self.poll_interval = poll_interval
+        self.max_body = max_body
+        self.search_engine = search_engine
+        self.embedding_manager = embedding_manager
+        # Chaque vecteur est étiqueté avec le modèle qui l'a encodé
+        self.batcher = MicroBatcher(embedding_manager.encode_queries, max_batch, window_ms)
+        self.latency = {}
+        self.started_at = time.time()
+        self.routes = {
+            ("GET", "/search/text"): self.search_text,
+            ("POST", "/search/metadata"): self.search_metadata,
+            ("GET", "/search/tags"): self.search_tags,
+            ("POST", "/search/hybrid"): self.search_hybrid,
+            ("GET", "/stats"): self.stats,
+            ("GET", "/health"): self.health,
+        }
+
+    async def _run_blocking(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def _search_text(self, text, top_k, attempts=3):
+        """
+        Encode un texte (micro-lot) puis cherche ses plus proches voisins.
+
+        Une requête encodée juste avant un changement de modèle est rejetée par
+        `search_by_vector` : elle est ré-encodée avec le nouveau modèle.
+        """
+        for _ in range(attempts):
+            model, vector = await self.batcher.encode(text)
+            try:
+                return await self._run_blocking(self.embedding_manager.search_by_vector, vector, top_k, model)
+            except ModelMismatchError:
+                continue
+        raise HTTPError(503, "Changement de modèle en cours, réessayez")
+
+    @staticmethod
+    def _positive_int(value, name):
+        value = int(value)
+        if value <= 0:
+            raise HTTPError(400, f"Paramètre '{name}' doit être positif")
+        return value
+
+    async def search_text(self, params, body):
+        query = params.get("q", "").strip()
+        if not query:
+            raise HTTPError(400, "Paramètre 'q' manquant")
+        top_k = self._positive_int(params.get("k", 10), "k")
+        results = await self._search_text(query, top_k)
+        return {"results": [{"filename": f, "score": s} for f, s in results]}
+
+    async def search_metadata(self, params, body):
+        results = await self._run_blocking(self.search_engine.search_by_metadata, body or {})
+        return {"results": results}
+
+    async def search_tags(self, params, body):
+        tags = [t.strip() for t in params.get("tags", "").split(",") if t.strip()]
+        if not tags:
+            raise HTTPError(400, "Paramètre 'tags' manquant")
+        results = self.search_engine.search_by_tags(tags, params.get("mode", "any"))
+        return {"results": results}
+
+    async def search_hybrid(self, params, body):
+        body = body or {}
+        limit = self._positive_int(body.get("limit", 20), "limit")
+        allowed = None
+        if body.get("filters"):
+            allowed = set(await self._run_blocking(self.search_engine.search_by_metadata, body["filters"]))
+        if body.get("tags"):
+            tagged = set(self.search_engine.search_by_tags(body["tags"], body.get("mode", "any")))
+            allowed = tagged if allowed is None else allowed & tagged
+
+        if not body.get("text"):
+            return {"results": [{"filename": f, "score": None} for f in sorted(allowed or [])[:limit]]}
+
+        # Sur-échantillonnage pour qu'il reste assez de résultats après filtrage
+        candidates = limit if allowed is None else limit * 10
+        results = await self._search_text(body["text"], candidates)
+        results = [(f, s) for f, s in results if allowed is None or f in allowed][:limit]
+        return {"results": [{"filename": f, "score": s} for f, s in results]}
+
+    async def stats(self, params, body):
+        return {
+            "uptime_s": time.time() - self.started_at,
+            "indexed": self.embedding_manager.count(),
+            "latency_ms": {route: stats.summary() for route, stats in self.latency.items()},
+            "batch_size": self.batcher.batch_sizes.summary(),
+            "encode_ms": self.batcher.encode_latency.summary(),
+        }
+
+    async def _poll_index(self):
+        """Applique périodiquement les changements publiés de l'index."""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                stats = await self._run_blocking(self.search_engine.refresh)
+                if stats["added"] or stats["updated"] or stats["removed"] or stats["reset"]:
+                    print(f"🔄 Index: génération {stats['generation']} (+{stats['added']} "
+                          f"~{stats['updated']} -{stats['removed']})")
+            except Exception as e:
+                print(f"⚠️  Erreur d'actualisation de l'index: {e}")
+
+    async def health(self, params, body):
+        return {"status": "ok"}
+
+    async def dispatch(self, method, target, body):
+        """
+        Exécute une requête et retourne (code HTTP, réponse JSON).
+        """
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            known = any(path == url.path for _, path in self.routes)
+            return (405 if known else 404), {"error": f"{method} {url.path} non supporté"}
+
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        start = time.perf_counter()
+        try:
+            payload = json.loads(body) if body else None
+            result = 200, await handler(params, payload)
+        except HTTPError as e:
+            result = e.status, {"error": str(e)}
+        except (ValueError, TypeError) as e:
+            result = 400, {"error": str(e)}
+        except Exception as e:
+            result = 500, {"error": str(e)}
+        self.latency.setdefault(url.path, LatencyStats()).add((time.perf_counter() - start) * 1000)
+        return result
+
+    async def handle_connection(self, reader, writer):
+        """Traite les requêtes HTTP/1.1 d'une connexion (keep-alive supporté)."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", 0))
+                except ValueError:
+                    length = -1
+                if not 0 <= length <= self.max_body:
+                    # Corps non lu: la connexion est fermée après la réponse
+                    status = 413 if length > self.max_body else 400
+                    await self._respond(writer, status, {"error": f"Content-Length invalide ou > {self.max_body}"},
+                                        keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self.dispatch(method.upper(), target, body)
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(data)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1")
+            + data
+        )
+        await writer.drain()
+
+    async def serve(self, host, port, ready=None):
+        """
+        Lance le serveur jusqu'à annulation.
+
+        Args:
+            host (str): Adresse d'écoute
+            port (int): Port d'écoute (0: port libre choisi par le système)
+            ready (asyncio.Future): Reçoit le port effectif une fois le serveur prêt
+        """
+        self.batcher.start()
+        poller = asyncio.create_task(self._poll_index()) if self.poll_interval > 0 else None
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        actual_port = server.sockets[0].getsockname()[1]
+        if ready is not None:
+            ready.set_result(actual_port)
+        print(f"🚀 API de recherche sur http://{host}:{actual_port}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if poller is not None:
+                poller.cancel()
+            await self.batcher.stop()
+
+
+def run_server(host, port, max_batch=32, window_ms=5.0):
+    """
+    Charge les modèles puis lance l'API de recherche.
+
+    Args:
+        host (str): Adresse d'écoute
+        port (int): Port d'écoute
+        max_batch (int): Taille maximale d'un micro-lot d'encodage
+        window_ms (float): Fenêtre de regroupement (millisecondes)
+    """
+    from config.settings import INDEX_POLL_INTERVAL, SERVE_MAX_BODY_BYTES
+    from scripts.search import search_engine
+    from scripts.embeddings import embedding_manager
+
+    # Premier encodage hors requête: les modèles sont chauds dès le démarrage
+    embedding_manager.encode_batch(["préchauffage"])
+    service = SearchService(search_engine, embedding_manager, max_batch, window_ms,
+                            poll_interval=INDEX_POLL_INTERVAL, max_body=SERVE_MAX_BODY_BYTES)
+    try:
+        asyncio.run(service.serve(host, port))
+    except KeyboardInterrupt:
+        print("\n⏹️  Serveur arrêté")
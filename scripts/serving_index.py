@@ -0,0 +1,253 @@
+"""
+Index de recherche partagé entre processus de service (Streamlit, API).
+Les embeddings sont publiés dans des fichiers .npy en lecture seule
+(identifiants triés et vecteurs normalisés), que chaque processus mappe
+en mémoire : les pages sont partagées par le cache du système au lieu
+d'être copiées dans un dictionnaire par processus. Chaque publication
+crée une nouvelle génération puis remplace le pointeur CURRENT de façon
+atomique ; un lecteur bascule sur la nouvelle génération en remplaçant
+sa projection mémoire, sans interrompre les recherches en cours.
+"""
+
+import os
+import shutil
+import argparse
+from collections.abc import Mapping
+
+import numpy as np
+
+from config.settings import SERVING_INDEX_DIR
+from scripts.ann_index import _normalize, _top_k
+from scripts.model_versions import ModelMismatchError
+from scripts.segment_log import _write_npy, atomic_write
+
+CURRENT_NAME = "CURRENT"
+MODEL_NAME = "MODEL"
+
+
+def _generation_dirs(directory):
+    """Générations publiées, de la plus ancienne à la plus récente."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name for name in os.listdir(directory) if name.startswith("gen-"))
+
+
+def _read_current(directory):
+    try:
+        with open(os.path.join(directory, CURRENT_NAME), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _read_model(path):
+    """Modèle d'une génération publiée (None si non renseigné)."""
+    try:
+        with open(os.path.join(path, MODEL_NAME), "r", encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def published_model(directory=SERVING_INDEX_DIR):
+    """Modèle d'embedding de la génération publiée (CURRENT)."""
+    name = _read_current(directory)
+    return _read_model(os.path.join(directory, name)) if name else None
+
+
+def publish_serving_index(embeddings, directory=SERVING_INDEX_DIR, keep=2, model=None, block_size=10000):
+    """
+    Publie une nouvelle génération de l'index à partir des embeddings.
+
+    Les fichiers sont écrits dans un dossier neuf, puis CURRENT est remplacé
+    atomiquement : un lecteur voit l'ancienne ou la nouvelle génération, jamais
+    un mélange. Les générations au-delà de `keep` sont supprimées (sous Linux,
+    un lecteur qui les mappe encore garde un accès valide jusqu'à sa bascule).
+
+    Les blocs de vecteurs sont normalisés et écrits tels quels dans un fichier
+    temporaire, puis recopiés dans l'ordre des identifiants par blocs de
+    `block_size` lignes : seuls les identifiants sont triés en mémoire.
+
+    Args:
+        embeddings (Mapping | iterable): {filename: embedding}, ou blocs
+            (ids, vecteurs) d'identifiants distincts (SegmentLog.iter_current)
+        directory (str): Dossier de l'index
+        keep (int): Nombre de générations conservées
+        model (str): Modèle des vecteurs (les lecteurs encodent leurs requêtes avec le même)
+        block_size (int): Lignes recopiées à la fois
+
+    Returns:
+        str: Nom de la génération publiée
+    """
+    if isinstance(embeddings, Mapping):
+        ids = list(embeddings)
+        embeddings = [(ids, [embeddings[i] for i in ids])]
+
+    os.makedirs(directory, exist_ok=True)
+    existing = _generation_dirs(directory)
+    number = int(existing[-1].split("-")[1]) + 1 if existing else 1
+    name = f"gen-{number:06d}"
+    path = os.path.join(directory, name)
+    os.makedirs(path)
+
+    ids, dim = [], 0
+    unsorted_path = os.path.join(path, "vectors.unsorted")
+    with open(unsorted_path, "wb") as f:
+        for block_ids, vectors in embeddings:
+            if not len(block_ids):
+                continue
+            block = np.asarray(vectors, dtype=np.float32).reshape(len(block_ids), -1)
+            dim = block.shape[1]
+            f.write((block / (np.linalg.norm(block, axis=1, keepdims=True) + 1e-8)).tobytes())
+            ids.extend(block_ids)
+
+    encoded = np.array([i.encode("utf-8") for i in ids], dtype=bytes) if ids else np.empty(0, dtype="S1")
+    order = np.argsort(encoded, kind="stable")
+    encoded = encoded[order]
+    unsorted = np.memmap(unsorted_path, dtype=np.float32, mode="r", shape=(len(ids), dim)) if ids else None
+
+    def blocks():
+        for start in range(0, len(order), block_size):
+            yield unsorted[order[start:start + block_size]]
+
+    atomic_write(os.path.join(path, "ids.npy"), lambda f: np.save(f, encoded))
+    atomic_write(os.path.join(path, "vectors.npy"), lambda f: _write_npy(f, (len(ids), dim), blocks()))
+    del unsorted
+    os.remove(unsorted_path)
+    if model:
+        atomic_write(os.path.join(path, MODEL_NAME), lambda f: f.write(model.encode("utf-8")))
+    atomic_write(os.path.join(directory, CURRENT_NAME), lambda f: f.write(name.encode("utf-8")))
+
+    for old in _generation_dirs(directory)[:-keep]:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+    return name
+
+
+class _Generation:
+    """Projection mémoire d'une génération (identifiants triés et vecteurs)."""
+
+    def __init__(self, directory, name):
+        path = os.path.join(directory, name)
+        self.name = name
+        self.model = _read_model(path)
+        self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+
+    def row(self, image_id):
+        """Ligne d'un identifiant (recherche dichotomique), ou None."""
+        key = image_id.encode("utf-8")
+        i = int(np.searchsorted(self.ids, key))
+        if i < len(self.ids) and self.ids[i] == key:
+            return i
+        return None
+
+
+class ServingIndex(Mapping):
+    """
+    Dictionnaire {filename: embedding} en lecture seule, adossé à l'index publié.
+
+    S'utilise comme `EmbeddingManager.embeddings_cache` dans les processus de
+    service. La génération courante est un seul attribut : `reload` la remplace
+    en une affectation, les recherches en cours terminent sur l'ancienne.
+    """
+
+    def __init__(self, directory=SERVING_INDEX_DIR):
+        """
+        Args:
+            directory (str): Dossier de l'index publié
+        """
+        self.directory = directory
+        self._generation = None
+        self.reload()
+
+    @staticmethod
+    def exists(directory=SERVING_INDEX_DIR):
+        return _read_current(directory) is not None
+
+    @property
+    def generation(self):
+        """Nom de la génération mappée (None si rien n'est publié)."""
+        return self._generation.name if self._generation is not None else None
+
+    @property
+    def model(self):
+        """Modèle des vecteurs mappés (None si non renseigné à la publication)."""
+        return self._generation.model if self._generation is not None else None
+
+    def reload(self):
+        """
+        Bascule sur la génération publiée si elle a changé.
+
+        Returns:
+            bool: True si une nouvelle génération a été mappée
+        """
+        name = _read_current(self.directory)
+        if name is None or name == self.generation:
+            return False
+        self._generation = _Generation(self.directory, name)
+        return True
+
+    def __getitem__(self, image_id):
+        generation = self._generation
+        row = generation.row(image_id) if generation is not None else None
+        if row is None:
+            raise KeyError(image_id)
+        return generation.vectors[row].tolist()
+
+    def __contains__(self, image_id):
+        generation = self._generation
+        return generation is not None and generation.row(image_id) is not None
+
+    def __iter__(self):
+        generation = self._generation
+        if generation is None:
+            return iter(())
+        return (i.decode("utf-8") for i in generation.ids)
+
+    def __len__(self):
+        return 0 if self._generation is None else len(self._generation.ids)
+
+    def search(self, query, top_k=5, model=None):
+        """
+        Recherche exacte par similarité cosinus sur les vecteurs mappés.
+
+        Args:
+            query (array-like): Vecteur de la requête
+            top_k (int): Nombre de résultats
+            model (str): Modèle qui a encodé la requête (contrôlé sur la génération parcourue)
+
+        Returns:
+            list: Tuples (filename, score) triés par score décroissant
+        """
+        generation = self._generation
+        if model and generation is not None and generation.model and generation.model != model:
+            raise ModelMismatchError(f"requête encodée par {model}, index servi: {generation.model}")
+        if generation is None or not len(generation.ids):
+            return []
+        scores = generation.vectors @ _normalize(query)[0]
+        return [(generation.ids[i].decode("utf-8"), float(scores[i])) for i in _top_k(scores, top_k)]
+
+
+def main():
+    """Publie l'index de service à partir des embeddings stockés."""
+    from config.settings import EMBEDDING_STORAGE, STREAM_CHUNK_SIZE
+    from scripts.model_versions import version_registry
+    from scripts.segment_log import MANIFEST_NAME, SegmentLog, load_stored_embeddings
+
+    parser = argparse.ArgumentParser(description="Index de recherche partagé (memory-map)")
+    parser.add_argument("--directory", default=SERVING_INDEX_DIR)
+    parser.add_argument("--keep", type=int, default=2, help="Générations conservées")
+    args = parser.parse_args()
+
+    active = version_registry.active()
+    if EMBEDDING_STORAGE == "segments" and os.path.exists(os.path.join(active["dir"], MANIFEST_NAME)):
+        # Lecture par blocs: les vecteurs du corpus ne sont pas chargés en entier
+        embeddings = SegmentLog(active["dir"]).iter_current(STREAM_CHUNK_SIZE)
+    else:
+        embeddings = load_stored_embeddings()
+    name = publish_serving_index(embeddings, args.directory, args.keep, active["model"])
+    print(f"✅ Index de service publié: {name} ({len(ServingIndex(args.directory))} vecteurs)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,321 @@
+"""
+Index d'embeddings partitionné (sharding) avec recherche scatter-gather.
+Chaque shard vit dans son propre processus (local ou distant) et ne
+contient que les images dont le hash d'identifiant lui revient ; le
+coordinateur diffuse chaque requête et fusionne les top-k partiels.
+"""
+
+import os
+import heapq
+import zlib
+import socket
+import argparse
+import tempfile
+import ipaddress
+import threading
+import multiprocessing
+from multiprocessing.connection import Client, Listener
+
+from scripts.quantization import make_codec
+from scripts.vector_store import VectorStore
+
+
+# Clé utilisée quand aucune n'est configurée : connue de tous, elle ne protège
+# que des connexions locales (multiprocessing.connection désérialise les messages)
+DEFAULT_AUTHKEY = "phototheque"
+
+
+def authkey_bytes(secret):
+    """Clé d'authentification d'une connexion (la clé par défaut si `secret` est vide)."""
+    return (secret or DEFAULT_AUTHKEY).encode("utf-8")
+
+
+def is_loopback(host):
+    """Indique si une adresse d'écoute n'est joignable que depuis la machine."""
+    try:
+        return ipaddress.ip_address(socket.gethostbyname(host)).is_loopback
+    except (OSError, ValueError):
+        return False
+
+
+def listen_authkey(host, secret, setting):
+    """
+    Clé d'un serveur : écouter ailleurs que sur la boucle locale exige une clé explicite.
+
+    Args:
+        host (str): Adresse d'écoute
+        secret (str): Clé configurée (vide: clé par défaut)
+        setting (str): Variable d'environnement de la clé (message d'erreur)
+
+    Returns:
+        bytes: Clé d'authentification
+
+    Raises:
+        ValueError: Adresse réseau sans clé configurée
+    """
+    if not secret and not is_loopback(host):
+        raise ValueError(f"Écoute sur {host} refusée avec la clé par défaut: définissez {setting}")
+    return authkey_bytes(secret)
+
+
+def shard_for(image_id, n_shards):
+    """
+    Détermine le shard d'une image (hash stable entre processus et machines).
+
+    Args:
+        image_id (str): Identifiant (nom de fichier) de l'image
+        n_shards (int): Nombre de shards
+
+    Returns:
+        int: Numéro du shard
+    """
+    return zlib.crc32(image_id.encode("utf-8")) % n_shards
+
+
+def serve_shard(conn, codec_name="float32", rerank=0, raw_dir=None, codec_kwargs=None):
+    """
+    Boucle de service d'un shard : traite les commandes reçues sur `conn`.
+
+    Commandes: ("add", dict), ("remove", ids), ("search", vecteur, top_k),
+    ("count",), ("ping",) et ("stop",).
+
+    Args:
+        conn: Connexion multiprocessing (Pipe locale ou socket distante)
+        codec_name (str): Codec de stockage des vecteurs du shard
+        rerank (int): Candidats reclassés en float32
+        raw_dir (str): Dossier du fichier brut du shard
+        codec_kwargs (dict): Paramètres du codec (ex: {"m": PQ_SUBVECTORS} pour PQ)
+    """
+    raw_path = os.path.join(raw_dir or tempfile.gettempdir(), f"shard-{os.getpid()}.f32")
+    store = VectorStore(make_codec(codec_name, **(codec_kwargs or {})), raw_path, rerank=rerank)
+
+    while True:
+        try:
+            command, *args = conn.recv()
+        except EOFError:
+            break
+        try:
+            if command == "add":
+                store.update(args[0])
+                conn.send(("ok", len(store)))
+            elif command == "remove":
+                store.remove(args[0])
+                conn.send(("ok", len(store)))
+            elif command == "search":
+                conn.send(("ok", store.search(args[0], args[1])))
+            elif command == "count":
+                conn.send(("ok", len(store)))
+            elif command == "ping":
+                conn.send(("ok", "pong"))
+            elif command == "stop":
+                conn.send(("ok", None))
+                break
+            else:
+                conn.send(("error", f"Commande inconnue: {command}"))
+        except Exception as e:
+            conn.send(("error", str(e)))
+    conn.close()
+
+
+def run_shard_server(address, authkey, codec_name="float32", rerank=0, codec_kwargs=None):
+    """
+    Expose un shard sur le réseau (un coordinateur à la fois).
+
+    Args:
+        address (tuple): (hôte, port) d'écoute
+        authkey (bytes): Clé partagée avec le coordinateur
+        codec_kwargs (dict): Paramètres du codec (voir `serve_shard`)
+    """
+    with Listener(address, authkey=authkey) as listener:
+        print(f"🚀 Shard à l'écoute sur {address[0]}:{address[1]}")
+        while True:
+            with listener.accept() as conn:
+                serve_shard(conn, codec_name, rerank, codec_kwargs=codec_kwargs)
+
+
+class ShardedIndex:
+    """
+    Coordinateur d'un index partitionné en N shards.
+
+    Les shards sont soit des processus locaux lancés par `start()`, soit des
+    serveurs distants (`run_shard_server`) dont on fournit les adresses.
+    """
+
+    def __init__(self, n_shards=4, codec_name="float32", rerank=0, addresses=None, authkey=None,
+                 codec_kwargs=None):
+        """
+        Args:
+            n_shards (int): Nombre de shards locaux (ignoré si `addresses` est fourni)
+            codec_name (str): Codec de stockage dans les shards locaux
+            rerank (int): Candidats reclassés en float32 dans chaque shard
+            addresses (list): Adresses (hôte, port) de shards distants
+            authkey (bytes): Clé d'authentification des shards distants
+            codec_kwargs (dict): Paramètres du codec des shards locaux (ex: {"m": 48} pour PQ)
+        """
+        self.addresses = addresses
+        self.authkey = authkey
+        self.n_shards = len(addresses) if addresses else n_shards
+        self.codec_name = codec_name
+        self.codec_kwargs = codec_kwargs or {}
+        self.rerank = rerank
+        self._conns = []
+        self._processes = []
+        # Shards dont la connexion est perdue (processus arrêté) : plus interrogés
+        self.failed = set()
+        # Les connexions ne sont pas thread-safe : une requête à la fois par coordinateur
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Démarre les processus shards locaux ou se connecte aux shards distants."""
+        if self._conns:
+            return self
+        if self.addresses:
+            self._conns = [Client(tuple(a), authkey=self.authkey) for a in self.addresses]
+            return self
+
+        ctx = multiprocessing.get_context("spawn")
+        for _ in range(self.n_shards):
+            parent_conn, child_conn = ctx.Pipe()
+            process = ctx.Process(
+                target=serve_shard,
+                args=(child_conn, self.codec_name, self.rerank, None, self.codec_kwargs),
+                daemon=True,
+            )
+            process.start()
+            child_conn.close()
+            self._conns.append(parent_conn)
+            self._processes.append(process)
+        return self
+
+    def _broadcast(self, messages, partial=False):
+        """
+        Envoie un message par shard puis collecte les réponses (en parallèle côté shards).
+
+        Un shard dont la connexion est perdue est ajouté à `failed` et n'est plus
+        interrogé. Avec `partial`, les réponses des autres shards sont retournées
+        (recherche dégradée) ; sinon, RuntimeError tant qu'un shard manque.
+        """
+        with self._lock:
+            sent = []
+            for shard, (conn, message) in enumerate(zip(self._conns, messages)):
+                if shard in self.failed:
+                    continue
+                try:
+                    conn.send(message)
+                    sent.append(shard)
+                except (EOFError, OSError) as e:
+                    self._mark_failed(shard, e)
+            replies = []
+            for shard in sent:
+                try:
+                    replies.append(self._conns[shard].recv())
+                except (EOFError, OSError) as e:
+                    self._mark_failed(shard, e)
+        if self.failed and (not partial or len(self.failed) == self.n_shards):
+            raise RuntimeError(f"Shard(s) indisponible(s): {sorted(self.failed)}")
+        for status, payload in replies:
+            if status != "ok":
+                raise RuntimeError(f"Erreur de shard: {payload}")
+        return [payload for _, payload in replies]
+
+    def _mark_failed(self, shard, error):
+        self.failed.add(shard)
+        print(f"⚠️  Shard {shard} indisponible ({error or type(error).__name__}): "
+              f"résultats partiels jusqu'à son redémarrage")
+
+    def add(self, embeddings_dict):
+        """
+        Répartit des embeddings entre les shards.
+
+        Args:
+            embeddings_dict (dict): {filename: embedding}
+        """
+        parts = [{} for _ in range(self.n_shards)]
+        for image_id, vector in embeddings_dict.items():
+            parts[shard_for(image_id, self.n_shards)][image_id] = vector
+        self._broadcast([("add", part) for part in parts])
+
+    def remove(self, image_ids):
+        """
+        Supprime des embeddings de leurs shards (identifiants absents ignorés).
+
+        Args:
+            image_ids (list): Identifiants à supprimer
+        """
+        parts = [[] for _ in range(self.n_shards)]
+        for image_id in image_ids:
+            parts[shard_for(image_id, self.n_shards)].append(image_id)
+        self._broadcast([("remove", part) for part in parts])
+
+    def search(self, query_vector, top_k=5):
+        """
+        Recherche scatter-gather : top-k local par shard puis fusion globale.
+
+        Un shard perdu est ignoré (résultats partiels, avec un avertissement) ;
+        RuntimeError si aucun ne répond.
+
+        Args:
+            query_vector (list): Embedding de la requête
+            top_k (int): Nombre de résultats
+
+        Returns:
+            list: Tuples (filename, score) triés par score décroissant
+        """
+        query = [float(x) for x in query_vector]
+        partial = self._broadcast([("search", query, top_k)] * self.n_shards, partial=True)
+        return heapq.nlargest(top_k, (r for results in partial for r in results), key=lambda r: r[1])
+
+    def __len__(self):
+        return sum(self._broadcast([("count",)] * self.n_shards, partial=True))
+
+    def ping(self):
+        """Vérifie que tous les shards répondent."""
+        try:
+            return all(r == "pong" for r in self._broadcast([("ping",)] * self.n_shards))
+        except RuntimeError:
+            return False
+
+    def close(self):
+        """Arrête les shards locaux et ferme les connexions."""
+        for conn in self._conns:
+            try:
+                if not self.addresses:
+                    conn.send(("stop",))
+                    conn.recv()
+                conn.close()
+            except (EOFError, OSError):
+                pass
+        for process in self._processes:
+            process.join(timeout=5)
+        self._conns = []
+        self._processes = []
+        self.failed = set()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    """Lance un serveur de shard distant."""
+    parser = argparse.ArgumentParser(description="Serveur de shard d'embeddings")
+    parser.add_argument("--host", default="127.0.0.1", help="0.0.0.0 pour les coordinateurs distants (SHARD_AUTHKEY requis)")
+    parser.add_argument("--port", type=int, default=6100)
+    parser.add_argument("--codec", default="float32")
+    parser.add_argument("--rerank", type=int, default=0)
+    parser.add_argument("--pq-m", type=int, default=None, help="Sous-vecteurs PQ (défaut: PQ_SUBVECTORS)")
+    args = parser.parse_args()
+
+    from config.settings import SHARD_AUTHKEY, PQ_SUBVECTORS
+    try:
+        authkey = listen_authkey(args.host, SHARD_AUTHKEY, "SHARD_AUTHKEY")
+    except ValueError as e:
+        parser.error(str(e))
+    codec_kwargs = {"m": args.pq_m or PQ_SUBVECTORS} if args.codec == "pq" else None
+    run_shard_server((args.host, args.port), authkey, args.codec, args.rerank, codec_kwargs)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Stockage des images sources : dossier local ou stockage objet compatible S3.
+Les deux implémentations offrent la même interface (list, stat, lecture
+d'une plage d'octets, write). Le préchargement asynchrone garde une fenêtre
+bornée d'objets en cours de lecture pendant que la pipeline traite les
+précédents : la latence du réseau est masquée sans charger tout le stockage
+en mémoire.
+"""
+
+import abc
+import os
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+from urllib.parse import urlparse
+
+from config.settings import S3_ENDPOINT_URL, S3_REGION, PREFETCH_WINDOW
+from scripts.segment_log import atomic_write
+
+
+class ObjectInfo(NamedTuple):
+    """Description d'un objet (clé relative au stockage)."""
+    key: str
+    size: int
+    mtime: float
+
+
+class Storage(abc.ABC):
+    """Interface commune aux stockages d'images."""
+
+    @abc.abstractmethod
+    def list(self, prefix=""):
+        """
+        Objets dont la clé commence par `prefix` (un seul niveau, comme os.listdir).
+
+        Yields:
+            ObjectInfo: Clé, taille et date de modification
+        """
+
+    @abc.abstractmethod
+    def stat(self, key):
+        """
+        Returns:
+            ObjectInfo: Description de l'objet (FileNotFoundError s'il n'existe pas)
+        """
+
+    @abc.abstractmethod
+    def read(self, key, start=0, length=None):
+        """
+        Lit un objet entier, ou `length` octets à partir de `start`.
+
+        Returns:
+            bytes: Contenu lu
+        """
+
+    @abc.abstractmethod
+    def write(self, key, data):
+        """Écrit (ou remplace) un objet."""
+
+    def local_path(self, key):
+        """Chemin local de l'objet s'il est lisible directement, sinon None."""
+        return None
+
+
+class LocalStorage(Storage):
+    """Stockage dans un dossier local."""
+
+    def __init__(self, root):
+        """
+        Args:
+            root (str): Dossier racine
+        """
+        self.root = root
+
+    def __repr__(self):
+        return f"LocalStorage({self.root!r})"
+
+    def list(self, prefix=""):
+        if not os.path.isdir(self.root):
+            return
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.name.startswith(prefix) and entry.is_file():
+                    stat = entry.stat()
+                    yield ObjectInfo(entry.name, stat.st_size, stat.st_mtime)
+
+    def stat(self, key):
+        stat = os.stat(self.local_path(key))
+        return ObjectInfo(key, stat.st_size, stat.st_mtime)
+
+    def read(self, key, start=0, length=None):
+        with open(self.local_path(key), "rb") as f:
+            f.seek(start)
+            return f.read(-1 if length is None else length)
+
+    def write(self, key, data):
+        path = self.local_path(key)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        atomic_write(path, lambda f: f.write(data))
+
+    def local_path(self, key):
+        return os.path.join(self.root, key)
+
+
+class S3Storage(Storage):
+    """
+    Stockage objet compatible S3 (AWS, MinIO, Ceph...).
+
+    Les identifiants sont ceux de boto3 (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY,
+    ~/.aws/credentials) ; S3_ENDPOINT_URL désigne un service autre qu'AWS.
+    """
+
+    def __init__(self, bucket, prefix="", client=None, endpoint_url=S3_ENDPOINT_URL, region=S3_REGION):
+        """
+        Args:
+            bucket (str): Nom du bucket
+            prefix (str): Préfixe des clés (un "dossier" du bucket)
+            client: Client S3 (boto3.client("s3") par défaut)
+            endpoint_url (str): URL du service (None: AWS)
+            region (str): Région
+        """
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        if client is None:
+            import boto3
+            client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self.client = client
+
+    def __repr__(self):
+        return f"S3Storage('s3://{self.bucket}/{self.prefix}')"
+
+    def list(self, prefix=""):
+        kwargs = {"Bucket": self.bucket, "Prefix": self.prefix + prefix, "Delimiter": "/"}
+        while True:
+            response = self.client.list_objects_v2(**kwargs)
+            for item in response.get("Contents", ()):
+                yield ObjectInfo(
+                    item["Key"][len(self.prefix):], item["Size"], item["LastModified"].timestamp(),
+                )
+            if not response.get("IsTruncated"):
+                return
+            kwargs["ContinuationToken"] = response["NextContinuationToken"]
+
+    def stat(self, key):
+        try:
+            response = self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except Exception as e:
+            raise _not_found(e, key)
+        return ObjectInfo(key, response["ContentLength"], response["LastModified"].timestamp())
+
+    def read(self, key, start=0, length=None):
+        kwargs = {"Bucket": self.bucket, "Key": self.prefix + key}
+        if length is not None:
+            if length <= 0:
+                return b""
+            kwargs["Range"] = f"bytes={start}-{start + length - 1}"
+        elif start:
+            kwargs["Range"] = f"bytes={start}-"
+        try:
+            response = self.client.get_object(**kwargs)
+        except Exception as e:
+            raise _not_found(e, key)
+        return response["Body"].read()
+
+    def write(self, key, data):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+
+
+def _not_found(error, key):
+    """Traduit l'erreur « objet absent » du client S3 en FileNotFoundError."""
+    code = str(getattr(error, "response", {}).get("Error", {}).get("Code", ""))
+    if code in ("404", "NoSuchKey", "NotFound"):
+        return FileNotFoundError(key)
+    return error
+
+
+def open_storage(url):
+    """
+    Ouvre un stockage à partir d'une URL : s3://bucket/prefixe ou chemin local.
+
+    Returns:
+        Storage: S3Storage ou LocalStorage
+    """
+    if url.startswith("s3://"):
+        parsed = urlparse(url)
+        return S3Storage(parsed.netloc, parsed.path)
+    return LocalStorage(url)
+
+
+_END = object()
+
+
+async def prefetch(storage, keys, window=PREFETCH_WINDOW, executor=None):
+    """
+    Lit des objets en gardant au plus `window` lectures en cours.
+
+    Les lectures suivantes sont lancées pendant que l'appelant traite les
+    résultats déjà rendus ; une erreur de lecture est rendue à la place du
+    contenu, sans interrompre le flux.
+
+    Un itérable paresseux (`storage.list()`) est parcouru dans un thread
+    dédié : la pagination du listing S3 ne bloque ni la boucle ni les
+    lectures en cours.
+
+    Args:
+        storage (Storage): Stockage lu
+        keys (iterable): Clés, parcourues au fil des lectures
+        window (int): Lectures simultanées au maximum
+        executor: Exécuteur des lectures bloquantes (défaut de la boucle si None)
+
+    Yields:
+        tuple: (clé, contenu ou exception), dans l'ordre des clés
+    """
+    loop = asyncio.get_running_loop()
+    pending = deque()
+    # Une liste ou un tuple est déjà en mémoire : pas d'aller-retour par thread
+    lister = None
+    if not isinstance(keys, (list, tuple)):
+        lister = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch-list")
+    keys = iter(keys)
+    try:
+        while True:
+            if lister is None:
+                key = next(keys, _END)
+            else:
+                key = await loop.run_in_executor(lister, next, keys, _END)
+            if key is _END:
+                break
+            pending.append((key, loop.run_in_executor(executor, storage.read, key)))
+            if len(pending) >= window:
+                yield await _next_result(pending)
+        while pending:
+            yield await _next_result(pending)
+    finally:
+        if lister is not None:
+            lister.shutdown(wait=False)
+
+
+async def _next_result(pending):
+    key, future = pending.popleft()
+    try:
+        return key, await future
+    except Exception as e:
+        return key, e
+
+
+def iter_prefetched(storage, keys, window=PREFETCH_WINDOW):
+    """
+    Version synchrone de `prefetch` pour la pipeline.
+
+    La boucle asyncio tourne dans un thread dédié ; les lectures continuent
+    pendant que l'appelant traite l'objet rendu.
+
+    Yields:
+        tuple: (clé, contenu ou exception), dans l'ordre des clés
+    """
+    loop = asyncio.new_event_loop()
+    executor = ThreadPoolExecutor(max_workers=max(1, window), thread_name_prefix="prefetch")
+    thread = threading.Thread(target=loop.run_forever, name="prefetch-loop", daemon=True)
+    thread.start()
+    results = prefetch(storage, keys, window, executor)
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(results.__anext__(), loop).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        asyncio.run_coroutine_threadsafe(results.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        executor.shutdown(wait=True)
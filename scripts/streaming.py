@@ -0,0 +1,128 @@
+"""
+Outils d'écriture en flux pour une pipeline à mémoire bornée.
+Les résultats sont écrits entrée par entrée (JSON) ou ligne par ligne (CSV)
+au lieu d'être accumulés dans une liste ou un dictionnaire complet.
+"""
+
+import os
+import csv
+import json
+from collections import deque
+from itertools import islice
+
+from scripts.segment_log import atomic_write
+
+
+def chunked(iterable, size):
+    """
+    Découpe un itérable en listes d'au plus `size` éléments.
+
+    Yields:
+        list: Morceau suivant
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def bounded_map(executor, func, iterable, window):
+    """
+    Comme executor.map, mais avec au plus `window` tâches soumises en avance.
+
+    executor.map consomme tout l'itérable dès l'appel ; ici la lecture de
+    l'itérable (ex: parcours d'un dossier) avance au rythme des résultats.
+
+    Yields:
+        Résultats de `func`, dans l'ordre de l'itérable
+    """
+    pending = deque()
+    for item in iterable:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def merged_items(updates, existing):
+    """
+    Paires (clé, valeur) des mises à jour, puis celles de `existing` non remplacées.
+
+    Seules les clés déjà écrites sont gardées en mémoire, pas les valeurs.
+
+    Args:
+        updates (iterable): Paires (clé, valeur) prioritaires, parcourues une fois
+        existing (dict): Valeurs déjà connues
+    """
+    written = set()
+    for key, value in updates:
+        if key in written:
+            continue
+        written.add(key)
+        yield key, value
+    for key, value in existing.items():
+        if key not in written:
+            yield key, value
+
+
+def write_json_object(path, items):
+    """
+    Écrit un objet JSON {clé: valeur} à partir d'un flux de paires, atomiquement.
+
+    Le format (indentation de 2, UTF-8 non échappé) est celui de json.dump(..., indent=2).
+
+    Args:
+        path (str): Fichier de sortie
+        items (iterable): Paires (clé, valeur)
+
+    Returns:
+        int: Nombre d'entrées écrites
+    """
+    count = 0
+
+    def write(f):
+        nonlocal count
+        f.write(b"{")
+        for key, value in items:
+            value_json = json.dumps(value, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+            entry = f'{"," if count else ""}\n  {json.dumps(str(key), ensure_ascii=False)}: {value_json}'
+            f.write(entry.encode("utf-8"))
+            count += 1
+        f.write(b"\n}" if count else b"}")
+
+    atomic_write(path, write)
+    return count
+
+
+def write_csv_rows(path, rows, fieldnames):
+    """
+    Écrit un CSV à colonnes connues d'avance ligne par ligne, atomiquement.
+
+    Les clés absentes du schéma sont ignorées, les colonnes manquantes laissées vides.
+
+    Args:
+        path (str): Fichier CSV de sortie
+        rows (iterable): Dictionnaires, un par ligne
+        fieldnames (list): Colonnes du fichier
+
+    Returns:
+        int: Nombre de lignes écrites
+    """
+    count = 0
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        if count:
+            os.replace(tmp_path, path)
+        return count
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
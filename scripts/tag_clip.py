@@ -15,7 +15,15 @@ except ImportError:
         "⚠️  Transformers n'est pas installé. Installez avec: pip install transformers"
     )
 
-from config.settings import MODEL_CACHE_DIR, CLIP_MODEL
+from config.settings import (
+    MODEL_CACHE_DIR, CLIP_MODEL, TAGS_PATH,
+    INFERENCE_BACKEND, ONNX_DIR, ONNX_QUANTIZE, ONNX_THREADS,
+    TAG_TAXONOMY_PATH, TAG_FEATURES_PATH, TAG_THRESHOLD, TAG_PARENT_THRESHOLD,
+    TAG_MAX_PARENTS, TAG_MAX_TAGS,
+)
+from scripts.inference import create_clip_encoder
+from scripts.streaming import write_json_object, merged_items
+from scripts.tag_taxonomy import TagTaxonomy
 
 
 class CLIPTagger:
@@ -37,63 +45,78 @@ class CLIPTagger:
             self.model = None
             self.processor = None
 
-        # Prédéfini de tags possibles
-        self.candidate_tags = [
-            "personne",
-            "visage",
-            "paysage",
-            "montagne",
-            "mer",
-            "forêt",
-            "ville",
-            "urbain",
-            "bâtiment",
-            "architecture",
-            "nature",
-            "animal",
-            "chien",
-            "chat",
-            "oiseau",
-            "insecte",
-            "voiture",
-            "route",
-            "fleur",
-            "arbre",
-            "eau",
-            "intérieur",
-            "extérieur",
-            "jour",
-            "nuit",
-            "coucher de soleil",
-            "portrait",
-            "groupe",
-            "selfie",
-            "nourriture",
-            "boisson",
-            "texte",
-            "document",
-            "écran",
-            "espace",
-            "abstrait",
-            "noir et blanc",
-            "couleur",
-            "vintage",
-            "moderne",
-            "flou",
-        ]
-
-    def get_clip_tags(self, image_path, top_k=5):
+        self.encoder = None
+        if self.model is not None:
+            self.encoder = create_clip_encoder(
+                self.model, self.processor, INFERENCE_BACKEND, ONNX_DIR,
+                ONNX_QUANTIZE, ONNX_THREADS, self.device,
+            )
+        self.tags_cache = {}
+        self._load_cached_tags()
+
+        # Vocabulaire hiérarchique; features texte calculées avant le fork des workers
+        self.taxonomy = self._load_taxonomy()
+        if self.encoder is not None and len(self.taxonomy):
+            model_name = f"openai/clip-vit-base-patch32-{self.encoder.name}"
+            if self.encoder.name == "onnx" and ONNX_QUANTIZE:
+                model_name += "-int8"
+            try:
+                self.taxonomy.encode(self.encoder.text_features, model_name, TAG_FEATURES_PATH)
+                print(f"🏷️  {len(self.taxonomy)} tags dans {len(self.taxonomy.parents)} catégories")
+            except Exception as e:
+                print(f"⚠️  Erreur lors de l'encodage des tags: {e}")
+
+    @property
+    def candidate_tags(self):
+        """Tous les tags de la taxonomie."""
+        return self.taxonomy.labels
+
+    def _load_taxonomy(self):
+        """Charge la taxonomie de tags (vide si le fichier est absent ou invalide)."""
+        try:
+            return TagTaxonomy.from_file(TAG_TAXONOMY_PATH)
+        except Exception as e:
+            print(f"⚠️  Impossible de charger la taxonomie {TAG_TAXONOMY_PATH}: {e}")
+            return TagTaxonomy({})
+
+    def _load_cached_tags(self):
+        """Charge les tags déjà générés, si disponibles."""
+        if os.path.exists(TAGS_PATH):
+            try:
+                with open(TAGS_PATH, "r", encoding="utf-8") as f:
+                    self.tags_cache = json.load(f)
+            except Exception as e:
+                print(f"⚠️  Impossible de charger les tags: {e}")
+
+    def save_tags(self, updates=None):
+        """
+        Sauvegarde les tags générés dans un fichier JSON, écrit en flux.
+
+        Args:
+            updates (iterable): Paires (filename, tags) prioritaires sur le cache
+        """
+        try:
+            count = write_json_object(TAGS_PATH, merged_items(updates or (), self.tags_cache))
+            print(f"✅ Tags sauvegardés: {TAGS_PATH} ({count} images)")
+        except Exception as e:
+            print(f"❌ Erreur lors de la sauvegarde des tags: {e}")
+
+    def get_clip_tags(self, image_path, top_k=TAG_MAX_TAGS):
         """
         Génère des tags automatiques pour une image.
 
+        Les catégories de la taxonomie sont évaluées d'abord, puis seulement
+        les tags des catégories retenues ; chaque tag dont la probabilité
+        atteint TAG_THRESHOLD est gardé.
+
         Args:
             image_path (str): Chemin de l'image
-            top_k (int): Nombre de tags à générer
+            top_k (int): Nombre maximal de tags
 
         Returns:
             list: Liste des tags pertinents
         """
-        if not self.model or not self.processor:
+        if not self.model or not self.processor or not self.taxonomy.encoded:
             print(f"⚠️  Modèle CLIP non disponible pour {image_path}")
             return ["sans-tag"]
 
@@ -101,25 +124,15 @@ class CLIPTagger:
             # Charger et pré-traiter l'image
             image = Image.open(image_path).convert("RGB")
 
-            # Préparer les inputs
-            inputs = self.processor(
-                text=self.candidate_tags,
-                images=image,
-                return_tensors="pt",
-                padding=True,
-            )
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
-
-            # Générer les probabilités
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-                logits_per_image = outputs.logits_per_image
-
-            # Extraire les meilleurs tags
-            probs = logits_per_image.softmax(dim=1)[0]
-            top_indices = torch.topk(probs, top_k).indices.cpu().numpy()
+            # Seule la tour image tourne par image: les features des tags sont en cache
+            image_features = self.encoder.image_features(image)
+            selected = self.taxonomy.select(
+                image_features, self.encoder.logit_scale, TAG_THRESHOLD,
+                TAG_PARENT_THRESHOLD, TAG_MAX_PARENTS, top_k,
+            )[0]
 
-            tags = [self.candidate_tags[idx] for idx in top_indices]
+            tags = [tag for tag, _ in selected]
+            self.tags_cache[os.path.basename(image_path)] = tags
             print(f"  ✓ Tags générés: {image_path}")
             return tags
 
@@ -150,7 +163,7 @@ class CLIPTagger:
 clip_tagger = CLIPTagger()
 
 
-def get_clip_tags(image_path, top_k=5):
+def get_clip_tags(image_path, top_k=TAG_MAX_TAGS):
     """Fonction de compatibilité."""
     return clip_tagger.get_clip_tags(image_path, top_k)
 
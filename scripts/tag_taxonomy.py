@@ -0,0 +1,168 @@
+"""
+Taxonomie de tags zero-shot à deux niveaux (catégories et tags).
+Le vocabulaire est lu depuis un fichier JSON {catégorie: [tags]} et peut
+compter des milliers de tags : chaque image est d'abord comparée aux
+catégories, puis seulement aux tags des catégories retenues. Les features
+texte sont calculées une fois, dans une matrice par niveau, et mises en
+cache sur disque. Les tags sont retenus par seuil (multi-label) plutôt
+qu'en nombre fixe.
+"""
+
+import os
+import json
+import hashlib
+
+import numpy as np
+
+from scripts.ann_index import _normalize
+from scripts.segment_log import atomic_write
+
+
+def _softmax(logits):
+    logits = logits - logits.max(axis=-1, keepdims=True)
+    probs = np.exp(logits)
+    return probs / probs.sum(axis=-1, keepdims=True)
+
+
+def load_taxonomy(path):
+    """
+    Lit une taxonomie JSON.
+
+    Chaque catégorie est une liste de tags, ou un objet
+    {"children": [...], "always": true, "prompt": "..."} : une catégorie
+    "always" (ex: style, moment de la journée) est évaluée pour toutes les
+    images, "prompt" remplace le nom de la catégorie comme texte CLIP.
+
+    Returns:
+        dict: {catégorie: {"children": [...], "always": bool, "prompt": str}}
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    taxonomy = {}
+    for parent, value in raw.items():
+        if isinstance(value, list):
+            value = {"children": value}
+        taxonomy[parent] = {
+            "children": list(value.get("children", [])),
+            "always": bool(value.get("always", False)),
+            "prompt": value.get("prompt", parent),
+        }
+    return taxonomy
+
+
+class TagTaxonomy:
+    """Vocabulaire hiérarchique et sélection des tags d'une image."""
+
+    def __init__(self, taxonomy):
+        """
+        Args:
+            taxonomy (dict): Résultat de `load_taxonomy`
+        """
+        self.taxonomy = taxonomy
+        self.parents = list(taxonomy)
+        self.prompts = [taxonomy[p]["prompt"] for p in self.parents]
+        self.always = [i for i, p in enumerate(self.parents) if taxonomy[p]["always"]]
+        # Tags uniques (un tag peut appartenir à plusieurs catégories)
+        positions = {}
+        self.children = []
+        for parent in self.parents:
+            indices = [positions.setdefault(label, len(positions)) for label in taxonomy[parent]["children"]]
+            self.children.append(np.array(indices, dtype=np.intp))
+        self.labels = list(positions)
+        self.parent_features = None
+        self.child_features = None
+
+    @classmethod
+    def from_file(cls, path):
+        return cls(load_taxonomy(path))
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def encoded(self):
+        return self.child_features is not None
+
+    def cache_key(self, model_name):
+        """Identifie la taxonomie et le modèle dont proviennent les features en cache."""
+        data = json.dumps([model_name, self.taxonomy], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    def encode(self, text_features, model_name="", cache_path=None, batch_size=256):
+        """
+        Calcule les features texte des catégories et des tags (normalisées, float32).
+
+        Args:
+            text_features (callable): Liste de textes -> features (n, d)
+            model_name (str): Modèle et backend, pour invalider le cache
+            cache_path (str): Fichier .npz de cache (None: pas de cache)
+            batch_size (int): Textes encodés par appel
+        """
+        key = self.cache_key(model_name)
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with np.load(cache_path) as data:
+                    if str(data["key"]) == key:
+                        self.parent_features = data["parents"]
+                        self.child_features = data["children"]
+                        return
+            except Exception as e:
+                print(f"⚠️  Cache des tags illisible ({e}), recalcul")
+
+        def encode_all(texts):
+            batches = [text_features(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+            return _normalize(np.concatenate(batches)) if batches else np.empty((0, 0), np.float32)
+
+        self.parent_features = encode_all(self.prompts)
+        self.child_features = encode_all(self.labels)
+        if cache_path:
+            os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+            atomic_write(cache_path, lambda f: np.savez(
+                f, key=np.array(key), parents=self.parent_features, children=self.child_features,
+            ))
+
+    def select(self, image_features, logit_scale, threshold=0.1, parent_threshold=0.1,
+               max_parents=3, max_tags=10):
+        """
+        Sélectionne les tags d'images, de la catégorie vers le tag.
+
+        Les catégories sont classées par softmax ; au plus `max_parents` dont
+        la probabilité atteint `parent_threshold` sont retenues (au moins la
+        meilleure), plus les catégories "always". Dans chaque catégorie retenue,
+        un softmax sur ses seuls tags garde ceux dont la probabilité atteint
+        `threshold` : plusieurs tags par catégorie sont possibles, et le
+        meilleur tag de la catégorie principale est toujours gardé.
+
+        Args:
+            image_features (np.ndarray): Features images (n, d)
+            logit_scale (float): Échelle des logits du modèle
+            threshold (float): Probabilité minimale d'un tag dans sa catégorie
+            parent_threshold (float): Probabilité minimale d'une catégorie
+            max_parents (int): Catégories explorées par image
+            max_tags (int): Tags retenus par image au maximum
+
+        Returns:
+            list: Pour chaque image, tuples (tag, probabilité) triés par probabilité décroissante
+        """
+        images = _normalize(image_features)
+        parent_probs = _softmax(logit_scale * images @ self.parent_features.T)
+        results = []
+        for image, probs in zip(images, parent_probs):
+            ranked = np.argsort(-probs)
+            chosen = [i for i in ranked[:max_parents] if probs[i] >= parent_threshold] or [ranked[0]]
+            scores = {}
+            for parent in dict.fromkeys(chosen + self.always):
+                indices = self.children[parent]
+                if not len(indices):
+                    continue
+                child_probs = _softmax(logit_scale * self.child_features[indices] @ image)
+                keep = child_probs >= threshold
+                if parent == chosen[0]:
+                    # Au moins un tag pour la catégorie principale
+                    keep[child_probs.argmax()] = True
+                for index, prob in zip(indices[keep], child_probs[keep]):
+                    if prob > scores.get(index, 0.0):
+                        scores[index] = float(prob)
+            ranked_tags = sorted(scores.items(), key=lambda item: -item[1])[:max_tags]
+            results.append([(self.labels[i], prob) for i, prob in ranked_tags])
+        return results
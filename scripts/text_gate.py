@@ -0,0 +1,171 @@
+"""
+Détection rapide de la présence de texte avant l'OCR.
+Tesseract est coûteux et la plupart des photos ne contiennent pas de texte :
+un test peu coûteux (densité de traits sur une miniature, ou scores CLIP des
+tags "texte", "document" et "écran") permet d'ignorer l'OCR sur ces images.
+"""
+
+import os
+import csv
+import argparse
+import numpy as np
+from PIL import Image
+
+# Tags CLIP indiquant la présence probable de texte
+TEXT_TAGS = ("texte", "document", "écran")
+
+
+def stroke_features(image, size=256, contrast=40):
+    """
+    Mesure la densité de traits contrastés d'une image réduite.
+
+    Le texte produit de nombreuses transitions nettes et courtes le long
+    des lignes ; une photo en a peu (zones lisses) ou de faible contraste.
+
+    Args:
+        image (PIL.Image): Image à analyser
+        size (int): Plus grand côté de la miniature
+        contrast (int): Écart de niveau de gris d'un bord de trait (0-255)
+
+    Returns:
+        dict: edge_density (part de pixels sur un bord) et text_rows
+              (part des lignes contenant au moins 8 transitions)
+    """
+    thumbnail = image.convert("L")
+    thumbnail.thumbnail((size, size))
+    gray = np.asarray(thumbnail, dtype=np.int16)
+    if gray.shape[0] < 2 or gray.shape[1] < 2:
+        return {"edge_density": 0.0, "text_rows": 0.0}
+
+    horizontal = np.abs(np.diff(gray, axis=1)) > contrast
+    vertical = np.abs(np.diff(gray, axis=0)) > contrast
+    edge_density = (horizontal.mean() + vertical.mean()) / 2
+    transitions = horizontal.sum(axis=1)
+    text_rows = float(np.mean(transitions >= 8))
+    return {"edge_density": float(edge_density), "text_rows": text_rows}
+
+
+class TextPresenceGate:
+    """Décide si une image mérite un passage de Tesseract."""
+
+    def __init__(self, method="edges", edge_threshold=0.005, row_threshold=0.03,
+                 clip_threshold=1, verbose=True):
+        """
+        Args:
+            method (str): 'edges' (densité de traits), 'clip' (tags) ou 'off'
+            edge_threshold (float): Densité de bords minimale
+            row_threshold (float): Part minimale de lignes de texte
+            clip_threshold (int): Nombre minimal de tags texte parmi les tags de l'image
+            verbose (bool): Afficher chaque OCR ignoré
+        """
+        if method not in ("edges", "clip", "off"):
+            raise ValueError(f"Méthode de détection inconnue: {method}")
+        self.method = method
+        self.edge_threshold = edge_threshold
+        self.row_threshold = row_threshold
+        self.clip_threshold = clip_threshold
+        self.verbose = verbose
+        self.stats = {"checked": 0, "skipped": 0}
+
+    def decide(self, image_path, image=None, tags=None):
+        """
+        Args:
+            image_path (str): Chemin de l'image
+            image (PIL.Image): Image déjà ouverte (évite une relecture)
+            tags (list): Tags CLIP de l'image (méthode 'clip')
+
+        Returns:
+            tuple: (True si l'OCR doit être lancé, raison)
+        """
+        if self.method == "off":
+            return True, "détection désactivée"
+
+        if self.method == "clip" and tags is not None:
+            hits = sum(tag in TEXT_TAGS for tag in tags)
+            run = hits >= self.clip_threshold
+            reason = f"{hits} tag(s) texte"
+        else:
+            # Sans tags disponibles, la méthode 'clip' retombe sur l'heuristique
+            if image is None:
+                with Image.open(image_path) as opened:
+                    features = stroke_features(opened)
+            else:
+                features = stroke_features(image)
+            run = (features["edge_density"] >= self.edge_threshold
+                   and features["text_rows"] >= self.row_threshold)
+            reason = (f"bords {features['edge_density']:.3f}, "
+                      f"lignes {features['text_rows']:.2f}")
+
+        self.stats["checked"] += 1
+        if not run:
+            self.stats["skipped"] += 1
+            if self.verbose:
+                print(f"  ⏭️  OCR ignoré ({reason}): {os.path.basename(image_path)}")
+        return run, reason
+
+    def drain_stats(self):
+        """Retourne et remet à zéro les compteurs (transmis par les workers)."""
+        stats, self.stats = self.stats, {"checked": 0, "skipped": 0}
+        return stats
+
+    def merge_stats(self, stats):
+        for name, value in stats.items():
+            self.stats[name] += value
+
+
+def evaluate_gate(gate, labels, image_dir=""):
+    """
+    Mesure la qualité de la détection sur un échantillon annoté.
+
+    Args:
+        gate (TextPresenceGate): Détecteur évalué
+        labels (dict): {chemin: True si l'image contient du texte}
+        image_dir (str): Dossier préfixé aux chemins relatifs
+
+    Returns:
+        dict: précision et rappel de "contient du texte", taux d'OCR évités
+    """
+    tp = fp = fn = tn = 0
+    for path, has_text in labels.items():
+        run, _ = gate.decide(os.path.join(image_dir, path))
+        if run and has_text:
+            tp += 1
+        elif run:
+            fp += 1
+        elif has_text:
+            fn += 1
+        else:
+            tn += 1
+    total = max(1, tp + fp + fn + tn)
+    return {
+        "images": tp + fp + fn + tn,
+        "precision": tp / (tp + fp) if tp + fp else 1.0,
+        "recall": tp / (tp + fn) if tp + fn else 1.0,
+        "skip_rate": (fn + tn) / total,
+    }
+
+
+def main():
+    """Évalue l'heuristique sur un CSV annoté (filename,has_text)."""
+    from config.settings import PROCESSED_IMAGE_DIR
+
+    parser = argparse.ArgumentParser(description="Précision/rappel de la détection de texte")
+    parser.add_argument("labels", help="CSV avec les colonnes filename,has_text (0/1)")
+    parser.add_argument("--image-dir", default=PROCESSED_IMAGE_DIR)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.002, 0.005, 0.01, 0.02])
+    args = parser.parse_args()
+
+    with open(args.labels, "r", encoding="utf-8") as f:
+        labels = {row["filename"]: row["has_text"].strip() in ("1", "true", "oui")
+                  for row in csv.DictReader(f)}
+
+    print(f"📊 {len(labels)} images annotées ({sum(labels.values())} avec texte)")
+    for threshold in args.thresholds:
+        gate = TextPresenceGate("edges", edge_threshold=threshold, verbose=False)
+        row = evaluate_gate(gate, labels, args.image_dir)
+        print(f"  seuil={threshold:<6} précision={row['precision']:.3f} "
+              f"rappel={row['recall']:.3f} OCR évités={row['skip_rate']:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Stockage compact des embeddings en mémoire.
+Les vecteurs sont gardés sous forme de codes compressés dans une matrice
+contiguë ; les originaux float32 restent sur disque (fichier mappé) pour
+le reclassement exact des meilleurs candidats.
+"""
+
+import os
+import weakref
+from collections.abc import Mapping
+import numpy as np
+
+
+def _remove_file(path):
+    """Supprime le fichier brut à la destruction du stockage."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class VectorStore(Mapping):
+    """
+    Dictionnaire {filename: embedding} adossé à une matrice de codes.
+
+    S'utilise comme `EmbeddingManager.embeddings_cache` : `len`, itération,
+    accès par clé (vecteur float32 exact sous forme de liste) et `update`.
+    """
+
+    def __init__(self, codec, raw_path, rerank=0, refit_growth=2.0):
+        """
+        Args:
+            codec: Codec de compression (voir scripts.quantization)
+            raw_path (str): Fichier binaire des vecteurs float32 d'origine
+            rerank (int): Candidats reclassés en float32 par défaut (0: aucun)
+            refit_growth (float): Réentraîne le codec quand la taille est multipliée par ce facteur
+        """
+        self.codec = codec
+        self.raw_path = raw_path
+        self.rerank = rerank
+        self.refit_growth = refit_growth
+        self.dim = None
+        self.ids = []
+        self._rows = {}
+        self._codes = None
+        self._fitted_size = 0
+        self._raw = None
+        # Le fichier brut est reconstruit à partir de la source de vérité (JSON)
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+        weakref.finalize(self, _remove_file, raw_path)
+
+    def __getitem__(self, image_id):
+        return self._raw_vectors()[self._rows[image_id]].tolist()
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, image_id):
+        return image_id in self._rows
+
+    @property
+    def nbytes(self):
+        """Mémoire occupée par les codes compressés."""
+        return 0 if self._codes is None else self._codes[:len(self.ids)].nbytes
+
+    def _raw_vectors(self):
+        """Vue mappée (lecture seule) des vecteurs float32 d'origine."""
+        if self._raw is None:
+            self._raw = np.memmap(self.raw_path, dtype=np.float32, mode="r",
+                                  shape=(len(self.ids), self.dim))
+        return self._raw
+
+    @staticmethod
+    def _normalize(vectors):
+        return vectors / (np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-8)
+
+    def update(self, embeddings_dict):
+        """
+        Ajoute ou remplace des embeddings.
+
+        Args:
+            embeddings_dict (dict): {filename: embedding}
+        """
+        if not embeddings_dict:
+            return
+        new_ids = list(embeddings_dict)
+        vectors = np.array([embeddings_dict[i] for i in new_ids], dtype=np.float32)
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self._codes = np.empty((0, self.codec.code_size(self.dim)), dtype=self.codec.dtype)
+
+        rows = []
+        appended = []
+        for image_id in new_ids:
+            if image_id not in self._rows:
+                self._rows[image_id] = len(self.ids)
+                self.ids.append(image_id)
+                appended.append(image_id)
+            rows.append(self._rows[image_id])
+        rows = np.array(rows)
+
+        self._write_raw(rows, vectors, len(appended))
+
+        size = len(self.ids)
+        if self._fitted_size == 0 or size >= self.refit_growth * self._fitted_size:
+            # (Ré)entraînement sur l'ensemble des vecteurs puis ré-encodage complet
+            normalized = self._normalize(np.asarray(self._raw_vectors()))
+            self.codec.fit(normalized)
+            self._codes = self.codec.encode(normalized)
+            self._fitted_size = size
+            return
+
+        if size > len(self._codes):
+            capacity = max(size, int(len(self._codes) * 1.5))
+            grown = np.empty((capacity, self._codes.shape[1]), dtype=self._codes.dtype)
+            grown[:len(self._codes)] = self._codes
+            self._codes = grown
+        self._codes[rows] = self.codec.encode(self._normalize(vectors))
+
+    def remove(self, image_ids):
+        """
+        Supprime des embeddings (identifiants absents ignorés).
+
+        La dernière ligne prend la place de chaque ligne supprimée, dans les
+        codes comme dans le fichier brut, qui est ensuite tronqué.
+        """
+        rows = [self._rows[i] for i in image_ids if i in self._rows]
+        if not rows:
+            return
+        raw = np.memmap(self.raw_path, dtype=np.float32, mode="r+", shape=(len(self.ids), self.dim))
+        for image_id in image_ids:
+            row = self._rows.pop(image_id, None)
+            if row is None:
+                continue
+            last = len(self.ids) - 1
+            if row != last:
+                moved = self.ids[last]
+                self.ids[row] = moved
+                self._rows[moved] = row
+                self._codes[row] = self._codes[last]
+                raw[row] = raw[last]
+            self.ids.pop()
+        raw.flush()
+        del raw
+        self._raw = None
+        os.truncate(self.raw_path, len(self.ids) * self.dim * 4)
+
+    def _write_raw(self, rows, vectors, n_appended):
+        """Écrit les vecteurs d'origine : ajout en fin de fichier, remplacement sur place."""
+        self._raw = None
+        with open(self.raw_path, "ab") as f:
+            first_new = len(self.ids) - n_appended
+            f.write(vectors[rows >= first_new].tobytes())
+        replaced = rows < len(self.ids) - n_appended
+        if replaced.any():
+            raw = np.memmap(self.raw_path, dtype=np.float32, mode="r+", shape=(len(self.ids), self.dim))
+            raw[rows[replaced]] = vectors[replaced]
+            raw.flush()
+            del raw
+
+    def search(self, query, top_k=5, rerank=None):
+        """
+        Recherche par similarité cosinus sur les codes compressés.
+
+        Args:
+            query (array-like): Vecteur requête
+            top_k (int): Nombre de résultats
+            rerank (int): Candidats reclassés en float32 exact (défaut: self.rerank)
+
+        Returns:
+            list: Tuples (filename, score) triés par score décroissant
+        """
+        if not self.ids:
+            return []
+        size = len(self.ids)
+        query = np.asarray(query, dtype=np.float32)
+        query = query / (np.linalg.norm(query) + 1e-8)
+        scores = self.codec.scores(query, self._codes[:size])
+
+        rerank = self.rerank if rerank is None else rerank
+        n_candidates = min(size, max(top_k, rerank))
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+
+        if rerank:
+            candidates = np.sort(candidates)
+            candidate_scores = self._normalize(np.asarray(self._raw_vectors()[candidates])) @ query
+        else:
+            candidate_scores = scores[candidates]
+
+        order = np.argsort(-candidate_scores)[:top_k]
+        return [(self.ids[candidates[i]], float(candidate_scores[i])) for i in order]
@@ -0,0 +1,257 @@
+"""
+Surveillance d'un dossier d'images pour l'indexation incrémentale continue.
+Utilise inotify sous Linux (via ctypes, sans dépendance) et un balayage
+périodique ailleurs ; les fichiers en cours d'écriture sont ignorés tant
+que leur taille et leur date de modification ne sont pas stables.
+"""
+
+import os
+import sys
+import json
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+
+# Masques inotify (voir <sys/inotify.h>)
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Détecte les fichiers créés, modifiés ou déplacés dans un dossier (Linux)."""
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): Dossier surveillé
+
+        Raises:
+            OSError: Si inotify n'est pas disponible
+        """
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify n'est disponible que sous Linux")
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 a échoué")
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_MODIFY
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            os.close(self.fd)
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch a échoué sur {directory}")
+
+    def poll(self, timeout):
+        """
+        Attend des événements pendant au plus `timeout` secondes.
+
+        Returns:
+            set: Noms des fichiers concernés
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        names = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Détecte les changements par comparaison de balayages successifs."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._snapshot = scan_directory(directory)
+
+    def poll(self, timeout):
+        time.sleep(timeout)
+        current = scan_directory(self.directory)
+        changed = {name for name, sig in current.items() if self._snapshot.get(name) != sig}
+        self._snapshot = current
+        return changed
+
+    def close(self):
+        pass
+
+
+def scan_directory(directory, extensions=None):
+    """
+    Signature (taille, mtime) de chaque fichier d'un dossier.
+
+    Args:
+        directory (str): Dossier à parcourir
+        extensions (set): Extensions retenues (toutes si None)
+
+    Returns:
+        dict: {nom: [taille, mtime_ns]}
+    """
+    signatures = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            if extensions and os.path.splitext(entry.name)[1].lower() not in extensions:
+                continue
+            stat = entry.stat()
+            signatures[entry.name] = [stat.st_size, stat.st_mtime_ns]
+    return signatures
+
+
+def create_watcher(directory, use_inotify=True):
+    """
+    Crée le meilleur observateur disponible (inotify, sinon balayage).
+
+    Returns:
+        InotifyWatcher | PollingWatcher
+    """
+    if use_inotify:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            print(f"⚠️  inotify indisponible ({e}), surveillance par balayage")
+    return PollingWatcher(directory)
+
+
+class FolderWatchDaemon:
+    """
+    Démon de surveillance : transmet au handler les images nouvelles ou
+    modifiées, une fois leur écriture terminée.
+
+    L'état (signature des fichiers déjà traités) est persisté pour qu'un
+    redémarrage ne retraite que ce qui a changé entre-temps.
+    """
+
+    def __init__(self, directory, handler, state_path, extensions,
+                 quiet_period=2.0, poll_interval=1.0, use_inotify=True, on_idle=None):
+        """
+        Args:
+            directory (str): Dossier surveillé
+            handler (callable): Reçoit la liste des chemins prêts à traiter
+            state_path (str): Fichier JSON des signatures déjà traitées
+            extensions (set): Extensions d'images acceptées
+            quiet_period (float): Durée sans changement avant traitement (secondes)
+            poll_interval (float): Attente max par itération (secondes)
+            use_inotify (bool): Tenter inotify avant le balayage
+            on_idle (callable): Appelé à chaque itération (tâches périodiques)
+        """
+        self.directory = directory
+        self.handler = handler
+        self.state_path = state_path
+        self.extensions = {e.lower() for e in extensions}
+        self.quiet_period = quiet_period
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify
+        self.on_idle = on_idle
+        self.processed = self._load_state()
+        self._pending = {}
+
+    def _load_state(self):
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"⚠️  Impossible de charger l'état de surveillance: {e}")
+        return {}
+
+    def _save_state(self):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.processed, f)
+        os.replace(tmp_path, self.state_path)
+
+    def _signature(self, name):
+        try:
+            stat = os.stat(os.path.join(self.directory, name))
+        except OSError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def _mark_candidates(self, names):
+        """Enregistre des fichiers modifiés ; le délai de stabilité repart de zéro."""
+        now = time.monotonic()
+        for name in names:
+            if os.path.splitext(name)[1].lower() in self.extensions:
+                self._pending[name] = (self._signature(name), now)
+
+    def ready_files(self):
+        """
+        Retourne les fichiers stables depuis `quiet_period` et non encore traités.
+
+        Returns:
+            list: Noms de fichiers prêts
+        """
+        now = time.monotonic()
+        ready = []
+        for name, (signature, since) in list(self._pending.items()):
+            current = self._signature(name)
+            if current is None:
+                del self._pending[name]
+            elif current != signature:
+                # Fichier encore en cours d'écriture
+                self._pending[name] = (current, now)
+            elif now - since >= self.quiet_period:
+                del self._pending[name]
+                if self.processed.get(name) != current:
+                    ready.append(name)
+        return sorted(ready)
+
+    def process_ready(self):
+        """Transmet les fichiers prêts au handler et mémorise leur signature."""
+        ready = self.ready_files()
+        if not ready:
+            return 0
+        signatures = {name: self._signature(name) for name in ready}
+        try:
+            self.handler([os.path.join(self.directory, name) for name in ready])
+        except Exception as e:
+            # Non mémorisés: ces fichiers seront repris au prochain démarrage
+            print(f"❌ Erreur lors du traitement de {len(ready)} fichier(s): {e}")
+            return 0
+        self.processed.update({n: s for n, s in signatures.items() if s is not None})
+        self._save_state()
+        return len(ready)
+
+    def run(self, stop_event=None):
+        """
+        Boucle principale : rattrapage initial puis traitement au fil de l'eau.
+
+        Args:
+            stop_event (threading.Event): Arrête la boucle lorsqu'il est positionné
+        """
+        watcher = create_watcher(self.directory, self.use_inotify)
+        print(f"👀 Surveillance de {self.directory} ({type(watcher).__name__})")
+
+        # Rattrapage : fichiers ajoutés ou modifiés pendant l'arrêt du démon
+        current = scan_directory(self.directory, self.extensions)
+        self._mark_candidates([n for n, sig in current.items() if self.processed.get(n) != sig])
+
+        try:
+            while stop_event is None or not stop_event.is_set():
+                timeout = self.poll_interval if not self._pending else min(self.poll_interval, self.quiet_period)
+                self._mark_candidates(watcher.poll(timeout))
+                self.process_ready()
+                if self.on_idle is not None:
+                    self.on_idle()
+        finally:
+            watcher.close()
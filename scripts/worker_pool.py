@@ -0,0 +1,224 @@
+"""
+Pool persistant de processus de traitement partageant les modèles chargés.
+Les modèles sont chargés une seule fois dans le processus parent ; les
+workers sont créés par fork et partagent leurs poids en copie sur écriture.
+Les workers vivent d'un lot à l'autre, répondent à des contrôles de santé
+et sont redémarrés s'ils plantent ou dépassent le délai d'une tâche.
+"""
+
+import gc
+import os
+import time
+import multiprocessing
+from collections import deque
+from multiprocessing.connection import wait
+
+
+def _worker_loop(conn, task, initializer):
+    """Boucle d'un worker : exécute les tâches reçues jusqu'au message d'arrêt."""
+    if initializer is not None:
+        initializer()
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+        kind, payload = message
+        if kind == "ping":
+            conn.send(("pong", os.getpid()))
+            continue
+        try:
+            conn.send(("ok", task(payload)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+    conn.close()
+
+
+class _Worker:
+    """Processus worker et sa connexion côté parent."""
+
+    def __init__(self, context, task, initializer):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_worker_loop, args=(child_conn, task, initializer), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.job = None      # (index, item, tentatives)
+        self.started = None  # début de la tâche en cours
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class ModelWorkerPool:
+    """
+    Pool de workers fork partageant les modèles du parent.
+
+    Sans fork (Windows) ou avec `workers=0`, les tâches sont exécutées
+    dans le processus courant.
+    """
+
+    def __init__(self, task, workers=2, initializer=None, task_timeout=600.0, max_retries=1):
+        """
+        Args:
+            task (callable): Fonction appliquée à chaque élément (module-level, modèles globaux)
+            workers (int): Nombre de processus
+            initializer (callable): Appelée une fois au démarrage de chaque worker
+            task_timeout (float): Durée max d'une tâche avant redémarrage du worker (secondes)
+            max_retries (int): Nouvelles tentatives d'un élément après un crash du worker
+        """
+        self.task = task
+        self.initializer = initializer
+        self.task_timeout = task_timeout
+        self.max_retries = max_retries
+        self.restarts = 0
+        self.workers = []
+        if workers and "fork" in multiprocessing.get_all_start_methods():
+            self.n_workers = workers
+            self._context = multiprocessing.get_context("fork")
+        else:
+            if workers:
+                print("⚠️  fork indisponible, traitement dans le processus principal")
+            self.n_workers = 0
+            self._context = None
+
+    def start(self):
+        """Crée les workers (à appeler une fois les modèles chargés)."""
+        if not self.n_workers or self.workers:
+            return
+        gc.collect()
+        self.workers = [self._spawn() for _ in range(self.n_workers)]
+        print(f"🧵 {self.n_workers} workers démarrés (modèles partagés par fork)")
+
+    def _spawn(self):
+        # Objets existants exclus du GC le temps du fork : le ramasse-miettes des
+        # workers ne touche pas leurs en-têtes, les pages des modèles restent
+        # partagées. Le parent les rend ensuite au GC (sinon ils ne sont plus collectés)
+        gc.freeze()
+        try:
+            return _Worker(self._context, self.task, self.initializer)
+        finally:
+            gc.unfreeze()
+
+    def _restart(self, worker):
+        worker.kill()
+        self.restarts += 1
+        replacement = self._spawn()
+        self.workers[self.workers.index(worker)] = replacement
+        return replacement
+
+    def health_check(self, timeout=5.0):
+        """
+        Vérifie que chaque worker inactif répond ; redémarre les autres.
+
+        Returns:
+            int: Nombre de workers redémarrés
+        """
+        restarted = 0
+        for worker in list(self.workers):
+            if worker.job is not None:
+                continue
+            try:
+                worker.conn.send(("ping", None))
+                healthy = worker.conn.poll(timeout) and worker.conn.recv()[0] == "pong"
+            except (OSError, EOFError):
+                healthy = False
+            if not healthy:
+                print(f"⚠️  Worker {worker.process.pid} ne répond pas, redémarrage")
+                self._restart(worker)
+                restarted += 1
+        return restarted
+
+    def imap_unordered(self, items):
+        """
+        Applique la tâche à chaque élément, dans l'ordre d'achèvement.
+
+        Yields:
+            tuple: (élément, succès, résultat ou message d'erreur)
+        """
+        for _, item, ok, value in self._execute(items):
+            yield item, ok, value
+
+    def map(self, items):
+        """
+        Applique la tâche à chaque élément.
+
+        Returns:
+            list: (élément, succès, résultat ou message d'erreur), dans l'ordre des éléments
+        """
+        results = sorted(self._execute(items), key=lambda r: r[0])
+        return [(item, ok, value) for _, item, ok, value in results]
+
+    def _execute(self, items):
+        if not self.n_workers:
+            for index, item in enumerate(items):
+                try:
+                    yield index, item, True, self.task(item)
+                except Exception as e:
+                    yield index, item, False, f"{type(e).__name__}: {e}"
+            return
+
+        self.start()
+        pending = deque((index, item, 0) for index, item in enumerate(items))
+        busy = 0
+        while pending or busy:
+            for worker in self.workers:
+                if worker.job is None and pending:
+                    worker.job = pending.popleft()
+                    worker.started = time.monotonic()
+                    worker.conn.send(("task", worker.job[1]))
+                    busy += 1
+
+            active = {w.conn: w for w in self.workers if w.job is not None}
+            sentinels = {w.process.sentinel: w for w in active.values()}
+            ready = wait(list(active) + list(sentinels), timeout=1.0)
+
+            for worker in {active.get(r) or sentinels[r] for r in ready}:
+                index, item, attempts = worker.job
+                try:
+                    status, value = worker.conn.recv()
+                except (EOFError, OSError):
+                    status, value = "crash", f"worker {worker.process.pid} arrêté"
+                busy -= 1
+                if status == "crash":
+                    self._restart(worker)
+                    if attempts < self.max_retries:
+                        pending.append((index, item, attempts + 1))
+                    else:
+                        yield index, item, False, value
+                    continue
+                worker.job = None
+                yield index, item, status == "ok", value
+
+            now = time.monotonic()
+            for worker in list(self.workers):
+                if worker.job is not None and now - worker.started > self.task_timeout:
+                    index, item, _ = worker.job
+                    busy -= 1
+                    self._restart(worker)
+                    yield index, item, False, f"délai dépassé ({self.task_timeout:.0f} s)"
+
+    def close(self):
+        """Arrête proprement les workers."""
+        for worker in self.workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=5)
+            worker.kill()
+        self.workers = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
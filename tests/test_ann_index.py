@@ -0,0 +1,92 @@
+import numpy as np
+from scripts.ann_index import IVFIndex, apply_log_changes, exact_search, recall_at_k, _normalize
+
+
+def _clustered_vectors(n=2000, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(20, dim))
+    vectors = centers[rng.integers(20, size=n)] + 0.3 * rng.normal(size=(n, dim))
+    return [f"img_{i}.jpg" for i in range(n)], _normalize(vectors)
+
+
+def test_exact_search_order():
+    """Teste que la recherche exacte renvoie l'identifiant le plus proche en premier."""
+    ids, matrix = _clustered_vectors(n=200)
+    results = exact_search(ids, matrix, matrix[42], top_k=3)
+    assert results[0][0] == "img_42.jpg"
+    assert results[0][1] >= results[1][1] >= results[2][1]
+
+
+def test_recall_against_exact():
+    """Teste que le rappel augmente avec nprobe et atteint 1 en parcourant toutes les listes."""
+    ids, matrix = _clustered_vectors()
+    index = IVFIndex(nlist=32, nprobe=4)
+    index.train(matrix)
+    index.add(ids, matrix)
+
+    queries = matrix[:50]
+    low = recall_at_k(index, ids, matrix, queries, top_k=10, nprobe=1)
+    high = recall_at_k(index, ids, matrix, queries, top_k=10, nprobe=8)
+    assert high >= low
+    assert high > 0.9
+    assert recall_at_k(index, ids, matrix, queries, top_k=10, nprobe=32) == 1.0
+
+
+def test_incremental_add_and_replace():
+    """Teste l'insertion incrémentale et le remplacement d'un identifiant existant."""
+    ids, matrix = _clustered_vectors(n=500)
+    index = IVFIndex(nlist=8, nprobe=8)
+    index.train(matrix)
+    index.add(ids[:400], matrix[:400])
+    index.add(ids[400:], matrix[400:])
+    assert len(index) == 500
+
+    index.add(["img_0.jpg"], matrix[499:500])
+    assert len(index) == 500
+    assert index.search(matrix[499], top_k=2)[0][1] > 0.999
+    assert {i for i, _ in index.search(matrix[499], top_k=2)} == {"img_0.jpg", "img_499.jpg"}
+
+
+
+def test_replay_log_after_periodic_save(tmp_path):
+    """Teste que les lots écrits après la dernière sauvegarde sont rejoués depuis le journal, compaction comprise."""
+    from scripts.segment_log import SegmentLog
+
+    ids, matrix = _clustered_vectors(n=300)
+    log = SegmentLog(str(tmp_path / "segments"))
+    log.append(dict(zip(ids[:200], matrix[:200].tolist())))
+    index = IVFIndex(nlist=8, nprobe=8)
+    index.train(matrix[:200])
+    index.add(ids[:200], matrix[:200])
+    index.generation = log.generation
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+
+    # Lots non sauvegardés dans l'index, dont une suppression, puis compaction
+    log.append(dict(zip(ids[200:], matrix[200:].tolist())))
+    log.append({}, deleted=["img_3.jpg"])
+    log.compact()
+    assert log.approx_count == 299
+
+    loaded = IVFIndex.load(path)
+    assert loaded.generation == 1
+    assert apply_log_changes(loaded, log) == 1
+    assert loaded.generation == log.generation == 3
+    assert len(loaded) == 299 and "img_3.jpg" not in loaded._id_to_list
+    assert loaded.search(matrix[250], top_k=1)[0][0] == "img_250.jpg"
+    assert apply_log_changes(loaded, log) == 0
+
+def test_save_and_load(tmp_path):
+    """Teste la persistance de l'index."""
+    ids, matrix = _clustered_vectors(n=300)
+    index = IVFIndex(nlist=8, nprobe=3)
+    index.train(matrix)
+    index.add(ids, matrix)
+
+    path = str(tmp_path / "index.npz")
+    index.save(path)
+    loaded = IVFIndex.load(path)
+
+    assert len(loaded) == len(index)
+    assert loaded.nprobe == 3
+    assert loaded.search(matrix[7], top_k=5) == index.search(matrix[7], top_k=5)
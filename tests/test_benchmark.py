@@ -0,0 +1,34 @@
+import hashlib
+from PIL import Image
+from scripts.benchmark import generate_corpus, run_benchmark, run_stage
+
+
+def _digest(path):
+    with open(path, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+def test_corpus_is_deterministic(tmp_path):
+    """Teste que le corpus est identique octet pour octet à graine égale."""
+    first = generate_corpus(str(tmp_path / "a"), count=4, seed=1)
+    second = generate_corpus(str(tmp_path / "b"), count=4, seed=1)
+    assert [e["kind"] for e in first] == ["photo", "document", "alpha", "large"]
+    assert [_digest(e["path"]) for e in first] == [_digest(e["path"]) for e in second]
+    assert Image.open(first[2]["path"]).mode == "RGBA"
+    assert Image.open(first[0]["path"]).getexif()[0x010F] == "Phototheque"
+
+
+def test_run_stage_counts_errors():
+    """Teste les mesures d'une étape et le comptage des erreurs."""
+    result = run_stage("division", lambda x: 1 / x, [1, 2, 0, 4])
+    assert result["items"] == 4 and result["errors"] == 1
+    assert result["throughput_per_s"] > 0 and result["peak_rss_mb"] > 0
+
+
+def test_run_benchmark_io_stages(tmp_path):
+    """Teste les étapes sans modèle sur un petit corpus."""
+    report = run_benchmark(["hash", "optimize", "metadata", "exif"], count=4, workdir=str(tmp_path))
+    assert set(report["stages"]) == {"hash", "optimize", "metadata", "exif"}
+    for row in report["stages"].values():
+        assert row["items"] == 4 and row["errors"] == 0
+    assert len(list((tmp_path / "optimized").iterdir())) == 4
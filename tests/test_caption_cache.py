@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from scripts.caption_cache import CaptionCache, caption_key, normalize_caption
+
+
+def test_normalize_caption():
+    """Teste que casse, espaces et formes Unicode ne changent pas la clé."""
+    assert normalize_caption("  Aucun   texte\tDÉTECTÉ ") == "aucun texte détecté"
+    assert caption_key("Plage  Mer") == caption_key("plage mer")
+    # Forme décomposée (e + accent combinant) et ligature
+    assert caption_key("été ﬁn") == caption_key("été fin")
+    assert caption_key("plage") != caption_key("plages")
+
+
+def test_caption_cache_persistence_and_hit_rate(tmp_path):
+    """Teste la réutilisation entre instances et le taux de hits."""
+    cache = CaptionCache(str(tmp_path))
+    assert cache.get("Facture total") is None
+    cache.add("Facture total", [0.5, 0.25])
+    cache.add("facture   TOTAL", [9.0, 9.0])  # même légende: premier vecteur conservé
+    assert cache.get("FACTURE total") == [0.5, 0.25]
+    assert cache.stats == {"hits": 1, "misses": 1}
+    assert cache.hit_rate == 0.5
+    cache.flush()
+
+    reopened = CaptionCache(str(tmp_path))
+    assert len(reopened) == 1
+    assert list(reopened.get("facture total")) == [0.5, 0.25]
+
+    stats = reopened.drain_stats()
+    assert stats == {"hits": 1, "misses": 0} and reopened.hit_rate == 0.0
+    cache.merge_stats(stats)
+    assert cache.stats == {"hits": 2, "misses": 1}
+
+
+def test_caption_cache_is_bounded(tmp_path):
+    """Teste que seules les légendes les plus récemment utilisées restent en mémoire."""
+    cache = CaptionCache(str(tmp_path), max_entries=2)
+    cache.add("un", [1.0])
+    cache.add("deux", [2.0])
+    assert cache.get("un") == [1.0]
+    cache.add("trois", [3.0])
+    assert len(cache) == 2
+    assert cache.get("deux") is None
+    cache.flush()
+
+    # Tout est persisté ; la réouverture ne charge que les segments les plus récents
+    cache.add("quatre", [4.0])
+    cache.flush()
+    reopened = CaptionCache(str(tmp_path), max_entries=2)
+    assert len(reopened) == 2
+    assert reopened.get("quatre") == [4.0]
+    assert len(CaptionCache(str(tmp_path), max_entries=10)) == 4
+
+
+def test_caption_cache_read_only(tmp_path):
+    """Teste qu'un worker réutilise ses légendes sans rien accumuler à persister."""
+    cache = CaptionCache(str(tmp_path))
+    cache.read_only = True
+    cache.add("plage", [1.0, 0.0])
+    assert cache.get("plage") == [1.0, 0.0]
+    cache.flush()
+    assert cache._pending == {} and cache.segment_log.generation == 0
+
+
+def test_search_queries_bypass_caption_cache(tmp_path, monkeypatch):
+    """Teste que les requêtes de recherche ne remplissent pas le cache ni ses statistiques."""
+    pytest.importorskip("sentence_transformers")
+    from scripts.embeddings import embedding_manager
+
+    class Encoder:
+        def encode(self, texts):
+            return np.ones((len(texts), 2), dtype=np.float32)
+
+    cache = CaptionCache(str(tmp_path))
+    monkeypatch.setattr(embedding_manager, "encoder", Encoder())
+    monkeypatch.setattr(embedding_manager, "caption_cache", cache)
+    monkeypatch.setattr(embedding_manager, "_embeddings_cache", {"a.jpg": [1.0, 0.0]})
+    for name in ("_matrix", "ann_index", "sharded_index", "cluster_index"):
+        monkeypatch.setattr(embedding_manager, name, None)
+
+    assert embedding_manager.search_similar("chat noir", top_k=1)[0][0] == "a.jpg"
+    assert len(cache) == 0 and cache.stats == {"hits": 0, "misses": 0}
+
+    embedding_manager.generate_embedding("chat noir")
+    assert len(cache) == 1 and cache.stats == {"hits": 0, "misses": 1}
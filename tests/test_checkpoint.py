@@ -0,0 +1,64 @@
+import pytest
+
+from scripts.checkpoint import PipelineCheckpoint
+
+
+def test_flush_and_resume(tmp_path):
+    """Teste qu'une reprise retrouve les images et étapes déjà persistées."""
+    stored = {}
+    checkpoint = PipelineCheckpoint(str(tmp_path), every=2, interval=3600)
+    checkpoint.reset()
+    checkpoint.mark_stage_done("ingest")
+
+    checkpoint.record("a.jpg", "texte", ["paysage"], [0.1, 0.2])
+    assert not checkpoint.should_flush()
+    checkpoint.record("b.jpg", "Aucun texte détecté", ["mer"], None)
+    assert checkpoint.should_flush()
+    assert checkpoint.flush(stored.update) == ["a.jpg", "b.jpg"]
+    assert stored == {"a.jpg": [0.1, 0.2]}
+
+    checkpoint.record("c.jpg", "non persisté", [], [0.3, 0.4])
+
+    resumed = PipelineCheckpoint(str(tmp_path))
+    assert resumed.resume()
+    assert resumed.done == {"a.jpg", "b.jpg"}
+    assert resumed.stage_done("ingest")
+    assert resumed.state["embeddings"] == 1
+
+
+def test_resume_truncates_uncommitted_results(tmp_path):
+    """Teste que des résultats écrits après le dernier état (crash) sont ignorés."""
+    checkpoint = PipelineCheckpoint(str(tmp_path), every=1)
+    checkpoint.reset()
+    checkpoint.record("a.jpg", "texte", [], None)
+    checkpoint.flush(lambda embeddings: None)
+    with open(checkpoint.results_path, "a", encoding="utf-8") as f:
+        f.write('{"filename": "b.jpg", "text": "", "tags": []}\n')
+
+    resumed = PipelineCheckpoint(str(tmp_path))
+    resumed.resume()
+    assert resumed.done == {"a.jpg"}
+    assert [r["filename"] for r in resumed.iter_results()] == ["a.jpg"]
+
+
+def test_failed_store_does_not_advance(tmp_path):
+    """Teste qu'un échec de sauvegarde des embeddings ne marque aucune image comme persistée."""
+    checkpoint = PipelineCheckpoint(str(tmp_path), every=1)
+    checkpoint.reset()
+    checkpoint.record("a.jpg", "texte", [], [0.1])
+
+    def broken(embeddings):
+        raise OSError("disque plein")
+
+    with pytest.raises(OSError):
+        checkpoint.flush(broken)
+    assert checkpoint.flush(lambda embeddings: False) == []
+    assert checkpoint.state["processed"] == 0 and checkpoint.state["embeddings"] == 0
+    assert list(checkpoint.iter_results()) == []
+    resumed = PipelineCheckpoint(str(tmp_path))
+    resumed.resume()
+    assert resumed.done == set()
+
+    stored = {}
+    assert checkpoint.flush(stored.update) == ["a.jpg"]
+    assert stored == {"a.jpg": [0.1]} and checkpoint.state["embeddings"] == 1
@@ -0,0 +1,93 @@
+import numpy as np
+from scripts.clustering import ClusterIndex, apply_log_changes, top_tags
+from scripts.segment_log import SegmentLog
+
+
+def _blobs(n_per_blob=30, dim=8, seed=0):
+    """Trois groupes de vecteurs bien séparés."""
+    rng = np.random.default_rng(seed)
+    centers = np.eye(dim, dtype=np.float32)[:3] * 5
+    vectors = np.vstack([c + rng.normal(scale=0.3, size=(n_per_blob, dim)) for c in centers])
+    ids = [f"img_{i}.jpg" for i in range(len(vectors))]
+    return ids, vectors.astype(np.float32)
+
+
+def _chunks(ids, vectors, size=16):
+    return lambda: ((ids[i:i + size], vectors[i:i + size]) for i in range(0, len(ids), size))
+
+
+def test_fit_streams_chunks_and_groups_blobs():
+    """Teste l'entraînement par blocs et le regroupement de groupes séparés."""
+    ids, vectors = _blobs()
+    index = ClusterIndex.fit(_chunks(ids, vectors), n_clusters=3, passes=2)
+    assert index.n_clusters == 3 and len(index) == 90
+    groups = index.groups()
+    assert sorted(len(g) for g in groups.values()) == [30, 30, 30]
+    assert {index.labels[i] for i in ids[:30]} == {index.labels[ids[0]]}
+    # Le premier membre est le plus proche du centroïde
+    first = groups[index.labels[ids[0]]]
+    assert index.scores[first[0]] == max(index.scores[i] for i in first)
+
+
+def test_fit_with_fewer_vectors_than_clusters():
+    """Teste la réduction du nombre de clusters sur un petit jeu."""
+    ids, vectors = _blobs(n_per_blob=1)
+    index = ClusterIndex.fit(_chunks(ids, vectors), n_clusters=8)
+    assert index.n_clusters == 3 and len(index) == 3
+
+
+def test_update_remove_probe_and_persistence(tmp_path):
+    """Teste l'affectation incrémentale, le filtre grossier et la sauvegarde."""
+    ids, vectors = _blobs()
+    index = ClusterIndex.fit(_chunks(ids, vectors), n_clusters=3)
+    before = index.centroids.copy()
+    index.update(["new.jpg"], vectors[:1] * 2)
+    assert index.labels["new.jpg"] == index.labels[ids[0]]
+    moved = np.flatnonzero(np.abs(index.centroids - before).sum(axis=1) > 0)
+    assert moved.tolist() == [index.labels[ids[0]]]
+
+    assert index.probe(vectors[40], 1).tolist() == [index.labels[ids[40]]]
+
+    index.remove(["new.jpg", "absent.jpg"])
+    index.generation = 7
+    index.save(str(tmp_path / "clusters.npz"))
+    loaded = ClusterIndex.load(str(tmp_path / "clusters.npz"))
+    assert loaded.labels == index.labels and loaded.generation == 7
+    assert np.allclose(loaded.centroids, index.centroids)
+
+
+def test_top_tags():
+    """Teste le libellé d'un cluster par ses tags les plus fréquents."""
+    tags = {"a.jpg": ["mer", "plage"], "b.jpg": ["mer"], "c.jpg": ["ville"]}
+    assert top_tags(["a.jpg", "b.jpg", "x.jpg"], tags, 1) == ["mer"]
+
+
+def test_segment_log_iter_current(tmp_path):
+    """Teste le parcours par blocs de l'état courant du journal."""
+    log = SegmentLog(str(tmp_path))
+    log.append({"a.jpg": [1.0], "b.jpg": [2.0], "c.jpg": [3.0]})
+    log.append({"a.jpg": [4.0]}, deleted=["b.jpg"])
+    chunks = list(log.iter_current(chunk_size=1))
+    assert [ids for ids, _ in chunks] == [["c.jpg"], ["a.jpg"]]
+    assert dict((i, v.tolist()) for ids, vectors in chunks for i, v in zip(ids, vectors)) == log.load()
+
+
+def test_apply_log_changes_replays_unsaved_batches(tmp_path):
+    """Teste le rattrapage des segments publiés après la sauvegarde des clusters."""
+    ids, vectors = _blobs()
+    log = SegmentLog(str(tmp_path))
+    log.append(dict(zip(ids, vectors)))
+    index = ClusterIndex.fit(_chunks(ids, vectors), n_clusters=3)
+    index.generation = log.generation
+
+    log.append({"new.jpg": vectors[0] * 2}, deleted=[ids[1]])
+    assert apply_log_changes(index, log)
+    assert index.generation == 2
+    assert index.labels["new.jpg"] == index.labels[ids[0]] and ids[1] not in index.labels
+
+    # Segments non lus fusionnés par une compaction: reconstruction nécessaire
+    log.append({"other.jpg": vectors[40]})
+    log.compact()
+    log.append({"last.jpg": vectors[50]})
+    index.generation = 2
+    assert not apply_log_changes(index, log)
@@ -0,0 +1,50 @@
+import csv
+from PIL import Image
+from scripts.extract_metadata import METADATA_COLUMNS, MetadataExtractor
+
+
+def _corpus(folder, count=40):
+    for i in range(count):
+        exif = Image.Exif()
+        exif[0x010F] = "Phototheque"
+        exif.get_ifd(0x8769)[0x9003] = "2024:05:01 10:00:00"
+        Image.new("RGB", (10 + i, 8), (i, 0, 0)).save(folder / f"{i:03d}.jpg", exif=exif)
+    (folder / "notes.txt").write_text("pas une image")
+    (folder / "casse.png").write_bytes(b"pas un png")
+
+
+def test_extract_row_single_open_fixed_schema(tmp_path):
+    """Teste la ligne complète (en-tête + EXIF du sous-IFD) au schéma fixe."""
+    _corpus(tmp_path, 1)
+    row = MetadataExtractor().extract_row(str(tmp_path / "000.jpg"))
+    assert list(row) == METADATA_COLUMNS
+    assert (row["width"], row["height"], row["format"]) == (10, 8, "JPEG")
+    assert row["Make"] == "Phototheque"
+    assert row["DateTimeOriginal"] == "2024:05:01 10:00:00"
+    assert row["LensModel"] == ""
+
+    broken = MetadataExtractor().extract_row(str(tmp_path / "casse.png"))
+    assert broken["filename"] == "casse.png" and broken["width"] == ""
+
+
+def test_parallel_extraction_matches_serial(tmp_path, monkeypatch, capsys):
+    """Teste que le pool de threads produit les mêmes lignes, dans le même ordre."""
+    import scripts.extract_metadata as extract_metadata
+
+    _corpus(tmp_path)
+    extractor = MetadataExtractor()
+    strip = lambda rows: [{k: v for k, v in r.items() if k != "extracted_at"} for r in rows]
+    serial = strip(extractor.iter_metadata(str(tmp_path), workers=1))
+    parallel = strip(extractor.iter_metadata(str(tmp_path), workers=4))
+    assert parallel == serial
+    assert len(serial) == 41  # 40 JPEG + le PNG illisible, pas le .txt
+
+    output = tmp_path / "out" / "metadata.csv"
+    output.parent.mkdir()
+    monkeypatch.setattr(extract_metadata, "METADATA_PATH", str(output))
+    extractor.storage = "csv"
+    extractor.save_metadata(str(tmp_path))
+    with open(output, newline="", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        assert reader.fieldnames == METADATA_COLUMNS
+        assert sum(1 for _ in reader) == 41
@@ -0,0 +1,55 @@
+import zlib
+import numpy as np
+from scripts.inference import clip_probabilities, compare_text_encoders, compare_clip_encoders
+
+
+class _FakeTextEncoder:
+    def __init__(self, name, noise=0.0):
+        self.name = name
+        self.noise = noise
+
+    def encode(self, texts):
+        rng = np.random.default_rng(0)
+        vectors = np.array([np.random.default_rng(zlib.crc32(t.encode())).normal(size=16) for t in texts])
+        return vectors + self.noise * rng.normal(size=vectors.shape)
+
+
+class _FakeClipEncoder:
+    logit_scale = 100.0
+
+    def __init__(self, name):
+        self.name = name
+
+    def image_features(self, images):
+        return np.array([np.eye(4)[i % 4] for i in images], dtype=np.float32)
+
+    def text_features(self, texts):
+        return np.eye(4, dtype=np.float32)[:len(texts)]
+
+
+def test_clip_probabilities():
+    """Teste le softmax zero-shot sur les features normalisées."""
+    probs = clip_probabilities(np.array([[2.0, 0.0], [0.0, 3.0]]), np.eye(2), 100.0)
+    assert np.allclose(probs.sum(axis=1), 1.0)
+    assert probs[0].argmax() == 0 and probs[1].argmax() == 1
+
+
+def test_compare_text_encoders_agreement():
+    """Teste l'accord parfait entre deux encodeurs identiques."""
+    texts = [f"texte {i}" for i in range(40)]
+    report = compare_text_encoders(_FakeTextEncoder("torch"), _FakeTextEncoder("onnx"), texts, 8)
+    assert report["agreement"]["mean_cosine"] > 0.999
+    assert report["agreement"]["ranking_overlap@10"] == 1.0
+    assert report["onnx"]["throughput_per_s"] > 0
+
+    noisy = compare_text_encoders(_FakeTextEncoder("torch"), _FakeTextEncoder("onnx", 2.0), texts, 8)
+    assert noisy["agreement"]["mean_cosine"] < 0.99
+
+
+def test_compare_clip_encoders_agreement():
+    """Teste l'accord des tags entre deux encodeurs CLIP."""
+    report = compare_clip_encoders(
+        _FakeClipEncoder("torch"), _FakeClipEncoder("onnx"), list(range(8)), ["a", "b", "c", "d"], top_k=2
+    )
+    assert report["agreement"]["top1"] == 1.0
+    assert report["agreement"]["tag_overlap@2"] == 1.0
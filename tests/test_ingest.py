@@ -0,0 +1,77 @@
+import os
+import shutil
+import pytest
+from PIL import Image
+import scripts.ingest as ingest
+from scripts.ingest import ImageIngestor
+
+
+def _sources(directory):
+    directory.mkdir()
+    paths = []
+    for i, color in enumerate(["red", "green", "blue"]):
+        path = directory / f"img{i}.png"
+        Image.new("RGBA", (64, 48), color).save(path)
+        paths.append(str(path))
+    # Copie de img0 placée avant et après, et un fichier illisible
+    shutil.copy(paths[0], directory / "copie.png")
+    (directory / "casse.jpg").write_bytes(b"pas une image")
+    return [str(directory / "copie.png")] + paths + [str(directory / "casse.jpg"), str(directory / "missing.jpg")]
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_ingest_files_parallel_matches_serial(tmp_path, monkeypatch, workers):
+    """Teste que l'ingestion parallèle garde l'ordre, les doublons et les échecs du mode séquentiel."""
+    monkeypatch.setattr(ingest, "PROCESSED_IMAGE_DIR", str(tmp_path / "processed"))
+    (tmp_path / "processed").mkdir()
+    sources = _sources(tmp_path / "src")
+
+    ingestor = ImageIngestor()
+    results = list(ingestor.ingest_files(sources, workers=workers))
+
+    assert [s for s, _ in results] == sources
+    outputs = [None if p is None else p.rsplit("/", 1)[1] for _, p in results]
+    assert outputs == ["copie.png", None, "img1.png", "img2.png", None, None]
+    assert ingestor.duplicates == ["img0.png"]
+    assert len(ingestor.processed_hashes) == 4
+    with Image.open(results[0][1]) as image:
+        assert image.format == "JPEG" and image.mode == "RGB"
+
+
+_optimize_image = ImageIngestor._optimize_image
+_hash_image = ImageIngestor._hash_image
+
+
+def _crashing_optimize(self, input_path, output_path=None):
+    if "crash-optimize" in str(input_path):
+        os._exit(1)
+    return _optimize_image(self, input_path, output_path)
+
+
+def _crashing_hash(self, image_path):
+    if "crash-hash" in image_path:
+        os._exit(1)
+    return _hash_image(self, image_path)
+
+
+def test_ingest_survives_worker_crash(tmp_path, monkeypatch):
+    """Teste qu'un processus tué n'échoue que son image: toutes les autres sont ingérées."""
+    monkeypatch.setattr(ingest, "PROCESSED_IMAGE_DIR", str(tmp_path / "processed"))
+    monkeypatch.setattr(ImageIngestor, "_optimize_image", _crashing_optimize)
+    monkeypatch.setattr(ImageIngestor, "_hash_image", _crashing_hash)
+    (tmp_path / "processed").mkdir()
+    (tmp_path / "src").mkdir()
+    sources = []
+    for i in range(40):
+        name = {5: "crash-optimize.png", 20: "crash-hash.png"}.get(i, f"{i}.png")
+        path = tmp_path / "src" / name
+        Image.new("RGB", (16, 16), (i, 2 * i, 3 * i)).save(path)
+        sources.append(str(path))
+
+    ingestor = ImageIngestor()
+    results = list(ingestor.ingest_files(sources, workers=2))
+
+    assert [s for s, _ in results] == sources
+    failed = sorted(os.path.basename(s) for s, p in results if p is None)
+    assert failed == ["crash-hash.png", "crash-optimize.png"]
+    assert len(os.listdir(tmp_path / "processed")) == 38
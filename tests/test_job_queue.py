@@ -0,0 +1,213 @@
+import multiprocessing
+
+import pytest
+
+from scripts.job_queue import (
+    JobQueue, LeaseKeeper, QueueServer, RemoteJobQueue, SQLiteJobQueue, backoff_delay, open_queue,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=["sqlite", "remote"])
+def queue_and_clock(request, tmp_path):
+    """File SQLite, utilisée directement ou à travers le serveur réseau."""
+    clock = Clock()
+    local = SQLiteJobQueue(str(tmp_path / "jobs.db"), max_attempts=3, backoff=10, backoff_max=25, clock=clock)
+    if request.param == "sqlite":
+        yield local, clock
+        local.close()
+        return
+    server = QueueServer(local, ("127.0.0.1", 0), b"test").start()
+    remote = RemoteJobQueue(server.address, authkey=b"test")
+    yield remote, clock
+    remote.close()
+    server.close()
+    local.close()
+
+
+def test_enqueue_and_claim(queue_and_clock):
+    """Teste que chaque tâche n'est réservée qu'une fois et qu'un réenvoi est sans effet."""
+    queue, _ = queue_and_clock
+    assert queue.enqueue(["a.jpg", "b.jpg", "c.jpg"], {"a.jpg": {"size": 1}}) == 3
+    assert queue.enqueue(["a.jpg", "d.jpg"]) == 1
+
+    first = queue.claim("w1", batch_size=2)
+    second = queue.claim("w2", batch_size=5)
+    assert first == [("a.jpg", {"size": 1}), ("b.jpg", None)]
+    assert [key for key, _ in second] == ["c.jpg", "d.jpg"]
+    assert queue.claim("w3") == []
+    assert queue.counts() == {"pending": 0, "leased": 4, "done": 0, "dead": 0}
+
+
+
+def test_job_queue_interface_is_abstract():
+    """Teste qu'une file qui n'implémente pas toute l'interface est refusée."""
+    class Partial(JobQueue):
+        def enqueue(self, keys, payloads=None):
+            return 0
+
+    with pytest.raises(TypeError):
+        JobQueue()
+    with pytest.raises(TypeError):
+        Partial()
+
+def test_complete_is_idempotent(queue_and_clock):
+    """Teste que seul le premier résultat d'une tâche est conservé."""
+    queue, clock = queue_and_clock
+    queue.enqueue(["a.jpg", "b.jpg"])
+    queue.claim("w1", batch_size=2, lease=60)
+
+    assert queue.complete("a.jpg", "w1", {"text": "un"}) is True
+    assert queue.complete("a.jpg", "w1", {"text": "deux"}) is False
+    # Bail expiré: b.jpg est repris par w2, puis w1 termine quand même
+    clock.now += 61
+    assert queue.claim("w2") == []
+    clock.now += backoff_delay(1, 10, 25)
+    assert [key for key, _ in queue.claim("w2")] == ["b.jpg"]
+    assert queue.complete("b.jpg", "w1", {"text": "w1"}) is True
+    assert queue.complete("b.jpg", "w2", {"text": "w2"}) is False
+
+    results = queue.results()
+    assert [(key, result) for _, key, result in results] == [("a.jpg", {"text": "un"}), ("b.jpg", {"text": "w1"})]
+    assert results[0][0] < results[1][0]
+    assert queue.results(after=results[0][0]) == results[1:]
+    assert queue.counts()["done"] == 2
+    assert queue.is_drained()
+
+
+def test_heartbeat_keeps_lease(queue_and_clock):
+    """Teste que le battement de cœur prolonge le bail du seul propriétaire."""
+    queue, clock = queue_and_clock
+    queue.enqueue(["a.jpg"])
+    queue.claim("w1", lease=30)
+
+    clock.now += 20
+    assert queue.heartbeat("w1", ["a.jpg"], lease=30) == ["a.jpg"]
+    assert queue.heartbeat("w2", ["a.jpg"], lease=30) == []
+    clock.now += 20
+    assert queue.claim("w2") == []
+    clock.now += 20
+    assert queue.heartbeat("w1", ["a.jpg"], lease=30) == []
+    assert queue.counts()["leased"] == 0
+
+
+def test_retries_with_backoff_then_dead_letter(queue_and_clock):
+    """Teste les nouveaux essais espacés puis la lettre morte après 3 tentatives."""
+    queue, clock = queue_and_clock
+    queue.enqueue(["a.jpg"])
+
+    queue.claim("w1")
+    assert queue.fail("a.jpg", "w2", "pas mon bail") == "ignored"
+    assert queue.fail("a.jpg", "w1", "erreur 1") == "pending"
+    clock.now += 9
+    assert queue.claim("w1") == []
+    clock.now += 1
+    assert queue.claim("w1") == [("a.jpg", None)]
+
+    assert queue.fail("a.jpg", "w1", "erreur 2") == "pending"
+    clock.now += 19
+    assert queue.claim("w1") == []
+    clock.now += 1
+    assert queue.claim("w1") == [("a.jpg", None)]
+
+    assert queue.fail("a.jpg", "w1", "erreur 3") == "dead"
+    clock.now += 1000
+    assert queue.claim("w1") == []
+    assert queue.dead_letters() == [("a.jpg", 3, "erreur 3")]
+    assert queue.is_drained()
+
+    assert queue.retry_dead() == 1
+    assert queue.claim("w1") == [("a.jpg", None)]
+
+
+def test_expired_lease_counts_as_attempt(queue_and_clock):
+    """Teste qu'un worker arrêté (bail jamais prolongé) finit en lettre morte."""
+    queue, clock = queue_and_clock
+    queue.enqueue(["a.jpg"])
+    for _ in range(3):
+        clock.now += 100
+        assert queue.claim("w1", lease=5) == [("a.jpg", None)]
+    clock.now += 6
+    assert queue.counts()["dead"] == 1
+    assert queue.dead_letters() == [("a.jpg", 3, "bail expiré")]
+
+
+def test_backoff_delay():
+    assert [backoff_delay(n, 10, 50) for n in range(1, 6)] == [10, 20, 40, 50, 50]
+
+
+def test_remote_unknown_method(tmp_path):
+    local = SQLiteJobQueue(str(tmp_path / "jobs.db"))
+    server = QueueServer(local, ("127.0.0.1", 0), b"test").start()
+    remote = RemoteJobQueue(server.address, authkey=b"test")
+    try:
+        with pytest.raises(RuntimeError):
+            remote._call("close")
+        assert remote.counts()["pending"] == 0
+    finally:
+        remote.close()
+        server.close()
+        local.close()
+
+
+def test_lease_keeper_tracks_lost_leases(tmp_path):
+    """Teste que le battement de cœur note les baux perdus."""
+    clock = Clock()
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"), clock=clock)
+    queue.enqueue(["a.jpg", "b.jpg"])
+    queue.claim("w1", batch_size=2, lease=30)
+    keeper = LeaseKeeper(queue, "w1", lease=30)
+    keeper.track(["a.jpg", "b.jpg"])
+
+    clock.now += 20
+    keeper.beat()
+    assert keeper.release("b.jpg")
+    clock.now += 40
+    keeper.beat()
+    assert keeper.lost == {"a.jpg"} and keeper.keys == set()
+    # Le worker voit que son bail est perdu et n'enregistre pas le résultat
+    assert not keeper.release("a.jpg") and keeper.lost == set()
+    queue.close()
+
+
+def _claim_all(path, worker_id, results):
+    queue = SQLiteJobQueue(path)
+    claimed = []
+    while True:
+        jobs = queue.claim(worker_id, batch_size=3)
+        if not jobs:
+            break
+        claimed.extend(key for key, _ in jobs)
+        for key, _ in jobs:
+            queue.complete(key, worker_id, {"worker": worker_id})
+    queue.close()
+    results.put(claimed)
+
+
+def test_concurrent_workers_claim_each_job_once(tmp_path):
+    """Teste que des processus concurrents se partagent les tâches sans doublon."""
+    path = str(tmp_path / "jobs.db")
+    queue = open_queue(f"sqlite://{path}")
+    keys = [f"img{i:03d}.jpg" for i in range(120)]
+    queue.enqueue(keys)
+
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    workers = [ctx.Process(target=_claim_all, args=(path, f"w{i}", results)) for i in range(3)]
+    for worker in workers:
+        worker.start()
+    claimed = [key for _ in workers for key in results.get(timeout=60)]
+    for worker in workers:
+        worker.join()
+
+    assert sorted(claimed) == keys
+    assert queue.counts()["done"] == 120
+    assert len(queue.results(limit=1000)) == 120
+    queue.close()
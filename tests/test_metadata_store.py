@@ -0,0 +1,105 @@
+import os
+from datetime import date, datetime
+from fractions import Fraction
+from PIL import Image
+from scripts.extract_metadata import MetadataExtractor
+from scripts.metadata_store import MetadataStore, open_snapshot
+
+
+def _record(name, size=100, mtime=1.0, **extra):
+    return {"filename": name, "filepath": f"/x/{name}", "size_bytes": size, "mtime": mtime,
+            "extracted_at": datetime.now(), "width": 640, "height": 480, "format": "JPEG",
+            "mode": "RGB", **extra}
+
+
+def test_append_only_new_or_changed_with_types(tmp_path):
+    """Teste l'ajout incrémental, les types et la dernière version par image."""
+    store = MetadataStore(str(tmp_path))
+    records = [_record("a.jpg", DateTimeOriginal="2024:05:01 10:00:00", FNumber=Fraction(28, 10),
+                       Make="Canon\x00"),
+               _record("b.jpg", DateTimeOriginal="date invalide")]
+    assert store.append(records, date(2024, 5, 1)) == 2
+    assert store.append(records, date(2024, 5, 2)) == 0
+    assert store.append([_record("a.jpg", mtime=2.0, width=10)], date(2024, 5, 2)) == 1
+    assert sorted(os.listdir(tmp_path)) == ["ingest_date=2024-05-01", "ingest_date=2024-05-02"]
+
+    # Nouvelle instance: l'état est relu depuis le disque (colonnes projetées)
+    reopened = MetadataStore(str(tmp_path))
+    assert reopened.known_files() == {"a.jpg": (100, 2.0), "b.jpg": (100, 1.0)}
+    table = reopened.read(["filename", "width"])
+    assert table.column_names == ["filename", "width"]
+    assert dict(zip(*table.to_pydict().values())) == {"a.jpg": 10, "b.jpg": 640}
+
+    b = next(r for r in reopened.read().to_pylist() if r["filename"] == "b.jpg")
+    assert b["DateTimeOriginal"] is None and b["width"] == 640
+    a = reopened.get("a.jpg")
+    assert a["width"] == 10 and a["mtime"] == 2.0
+    assert reopened.get("inconnue.jpg") == {}
+
+
+def test_snapshot_and_extractor_incremental_save(tmp_path, capsys):
+    """Teste la sauvegarde incrémentale depuis un dossier et l'instantané Arrow."""
+    images = tmp_path / "images"
+    images.mkdir()
+    for i in range(5):
+        exif = Image.Exif()
+        exif.get_ifd(0x8769)[0x829D] = 4.0  # FNumber
+        Image.new("RGB", (20 + i, 10)).save(images / f"{i}.jpg", exif=exif)
+
+    snapshot = str(tmp_path / "metadata.arrow")
+    extractor = MetadataExtractor()
+    extractor.storage = "parquet"
+    extractor._store = MetadataStore(str(tmp_path / "store"), snapshot)
+
+    extractor.save_metadata(str(images))
+    assert "5 nouvelles ou modifiées, 5 images" in capsys.readouterr().out
+    extractor.save_metadata(str(images))
+    assert "0 nouvelles ou modifiées, 5 images" in capsys.readouterr().out
+    os.utime(images / "3.jpg", (0, 12345))
+    extractor.save_metadata(str(images))
+    assert "1 nouvelles ou modifiées, 5 images" in capsys.readouterr().out
+
+    table = open_snapshot(snapshot, ["filename", "width", "FNumber"])
+    rows = {r["filename"]: r for r in table.to_pylist()}
+    assert len(rows) == 5
+    assert rows["3.jpg"]["width"] == 23 and rows["3.jpg"]["FNumber"] == 4.0
+
+
+def test_metadata_view_on_snapshot(tmp_path):
+    """Teste la vue en lecture seule sur l'instantané mappé."""
+    from scripts.metadata_store import MetadataView
+
+    store = MetadataStore(str(tmp_path / "store"), str(tmp_path / "metadata.arrow"))
+    store.append([_record(f"{i}.jpg", width=i) for i in range(10)])
+    store.write_snapshot()
+    view = MetadataView(open_snapshot(store.snapshot_path))
+    assert len(view) == 10 and "3.jpg" in view and "x.jpg" not in view
+    assert view["3.jpg"]["width"] == 3 and view.get("x.jpg", {}) == {}
+    assert sorted(name for name, row in view.items() if row["width"] > 6) == ["7.jpg", "8.jpg", "9.jpg"]
+    # Instantané trié: recherche dichotomique sur les noms
+    assert list(view) == sorted(f"{i}.jpg" for i in range(10))
+
+    import pyarrow as pa
+    unsorted = MetadataView(pa.table({"filename": ["c.jpg", "a.jpg", "b.jpg"], "width": [3, 1, 2]}))
+    assert unsorted["a.jpg"]["width"] == 1 and "b.jpg" in unsorted and "0.jpg" not in unsorted
+
+
+def test_small_parts_are_compacted(tmp_path, monkeypatch):
+    """Teste la fusion des petits fichiers écrits lot par lot (mode watch)."""
+    import scripts.metadata_store as metadata_store
+
+    monkeypatch.setattr(metadata_store, "METADATA_COMPACTION_THRESHOLD", 4)
+    store = MetadataStore(str(tmp_path))
+    for i in range(10):
+        store.append([_record(f"{i}.jpg", width=i)], date(2024, 5, 1))
+    store.append([_record("3.jpg", mtime=2.0, width=33)], date(2024, 5, 1))
+    assert len(store.parts()) <= 4
+
+    store.append([_record("a.jpg")], date(2024, 5, 2))
+    store.append([_record("b.jpg")], date(2024, 5, 2))
+    before = len(store.parts())
+    assert store.compact() == before
+    assert len(store.parts()) == 2
+
+    widths = dict(zip(*MetadataStore(str(tmp_path)).read(["filename", "width"]).to_pydict().values()))
+    assert len(widths) == 12 and widths["3.jpg"] == 33 and widths["9.jpg"] == 9
@@ -0,0 +1,63 @@
+import json
+import time
+from scripts.metrics import MetricsRegistry
+
+
+def test_disabled_registry_records_nothing(tmp_path):
+    """Teste qu'un registre désactivé n'enregistre ni n'écrit rien."""
+    registry = MetricsRegistry(enabled=False, tracing=True)
+    with registry.span("ocr", filename="a.jpg"):
+        pass
+    registry.inc("images_processed")
+    registry.write_prometheus(str(tmp_path / "metrics.prom"))
+    assert registry.histograms == {} and registry.counters == {}
+    assert not (tmp_path / "metrics.prom").exists()
+    assert registry.drain() is None
+
+
+def test_prometheus_export(tmp_path):
+    """Teste l'exposition texte Prometheus (compteurs, jauges, histogrammes)."""
+    registry = MetricsRegistry(enabled=True)
+    registry.inc("images_processed", 3)
+    registry.set_gauge("queue_pending_images", 7)
+    for seconds in (0.002, 0.02, 0.2):
+        registry.observe("ocr", seconds)
+
+    path = tmp_path / "metrics.prom"
+    registry.write_prometheus(str(path))
+    text = path.read_text()
+    assert "phototheque_images_processed_total 3" in text
+    assert "phototheque_queue_pending_images 7" in text
+    assert 'phototheque_stage_seconds_bucket{stage="ocr",le="0.005"} 1' in text
+    assert 'phototheque_stage_seconds_bucket{stage="ocr",le="0.25"} 3' in text
+    assert 'phototheque_stage_seconds_count{stage="ocr"} 3' in text
+
+
+def test_chrome_trace_and_merge(tmp_path):
+    """Teste les spans de trace et la fusion des mesures d'un worker."""
+    worker = MetricsRegistry(enabled=True, tracing=True)
+    with worker.span("image", filename="a.jpg"):
+        time.sleep(0.01)
+    worker.inc("ocr_cache_hits")
+
+    parent = MetricsRegistry(enabled=True, tracing=True)
+    parent.merge(worker.drain())
+    assert worker.counters == {} and worker.events == []
+    assert parent.counters == {"ocr_cache_hits": 1}
+    assert parent.summary()["stages"]["image"]["count"] == 1
+
+    path = tmp_path / "trace.json"
+    parent.write_chrome_trace(str(path))
+    event, = json.loads(path.read_text())["traceEvents"]
+    assert event["name"] == "image" and event["ph"] == "X"
+    assert event["dur"] >= 10000 and event["args"] == {"filename": "a.jpg"}
+
+
+def test_trace_event_limit():
+    """Teste que la trace est bornée en mémoire."""
+    registry = MetricsRegistry(enabled=True, tracing=True, max_events=2)
+    for _ in range(5):
+        with registry.span("hash"):
+            pass
+    assert len(registry.events) == 2 and registry.dropped_events == 3
+    assert registry.histograms["hash"].count == 5
@@ -0,0 +1,174 @@
+import json
+
+import numpy as np
+
+from scripts.caption_cache import CaptionCache
+from scripts.model_versions import (
+    ReembeddingJob, VersionRegistry, caption_cache_dir, load_captions, model_id, model_name,
+)
+from scripts.segment_log import SegmentLog
+
+
+def _encoder(dim, calls=None):
+    """Encodeur déterministe: un vecteur par légende (taille propre au « modèle »)."""
+    def encode(texts):
+        if calls is not None:
+            calls.append(list(texts))
+        return np.array([[float(len(t) + k) for k in range(dim)] for t in texts], dtype=np.float32)
+    return encode
+
+
+def _setup(tmp_path, n=10):
+    root = str(tmp_path / "embeddings")
+    registry = VersionRegistry(str(tmp_path / "versions.json"), root, default_model="old")
+    source = SegmentLog(root, model="old")
+    source.append({f"img{i}.jpg": [1.0, 0.0] for i in range(n)})
+    captions = {f"img{i}.jpg": f"texte {i % 3} tag" for i in range(n)}
+    return registry, source, captions
+
+
+def test_model_ids(tmp_path):
+    assert model_id("all-MiniLM-L6-v2", "torch", True) == "all-MiniLM-L6-v2"
+    assert model_id("all-MiniLM-L6-v2", "onnx", True) == "all-MiniLM-L6-v2-int8"
+    assert model_name("all-MiniLM-L6-v2-int8") == "all-MiniLM-L6-v2"
+    assert caption_cache_dir("org/mpnet-int8", "onnx").endswith("org_mpnet-onnx-int8")
+
+    registry = VersionRegistry(str(tmp_path / "versions.json"), str(tmp_path / "embeddings"), default_model="old")
+    assert registry.active() == {"model": "old", "dir": str(tmp_path / "embeddings")}
+    assert registry.signature() is None
+    assert registry.version_dir("org/mpnet") == str(tmp_path / "embeddings-org_mpnet")
+
+
+def test_load_captions(tmp_path):
+    """Teste que les légendes sont recomposées comme dans la pipeline."""
+    (tmp_path / "ocr.json").write_text(json.dumps({"a.jpg": "Bonjour", "b.jpg": ""}))
+    (tmp_path / "tags.json").write_text(json.dumps({"a.jpg": ["mer", "ciel"], "c.jpg": ["nuit"]}))
+    captions = load_captions(str(tmp_path / "ocr.json"), str(tmp_path / "tags.json"))
+    assert captions == {"a.jpg": "Bonjour mer ciel", "b.jpg": " ", "c.jpg": " nuit"}
+
+
+def test_reembed_builds_then_switches(tmp_path):
+    """Teste que l'ancienne version reste active jusqu'à la bascule, puis que le registre change d'un coup."""
+    registry, source, captions = _setup(tmp_path)
+    captions.pop("img9.jpg")
+    calls = []
+    seen_active = []
+
+    def encode(texts):
+        # Pendant la construction, la version servie est toujours l'ancienne
+        seen_active.append(registry.active()["model"])
+        return _encoder(3, calls)(texts)
+
+    cache = CaptionCache(str(tmp_path / "cache"))
+    job = ReembeddingJob(registry, "new", encode, lambda: captions, rate=0, batch_size=4, caption_cache=cache)
+    assert job.run() is True
+
+    assert set(seen_active) == {"old"}
+    state = registry.read()
+    assert state["active"]["model"] == "new" and state["building"] is None
+    assert state["previous"] == {"model": "old", "dir": source.directory, "generation": 1}
+
+    target = SegmentLog(state["active"]["dir"])
+    assert target.model == "new"
+    vectors = target.load()
+    assert sorted(vectors) == [f"img{i}.jpg" for i in range(9)]
+    assert len(vectors["img0.jpg"]) == 3
+    # Trois légendes distinctes: une seule fois chacune par le modèle, le reste en cache
+    assert sorted(t for batch in calls for t in batch) == ["texte 0 tag", "texte 1 tag", "texte 2 tag"]
+    assert job.stats == {"encoded": 3, "cached": 6, "deleted": 0, "missing": 1}
+    assert len(CaptionCache(str(tmp_path / "cache"))) == 3
+
+    # Déjà active: rien à reconstruire
+    assert ReembeddingJob(registry, "new", _encoder(3), lambda: captions).run() is False
+
+
+def test_reembed_catches_up_concurrent_changes(tmp_path):
+    """Teste que les écritures faites pendant la construction sont reportées avant la bascule."""
+    registry, source, captions = _setup(tmp_path, n=4)
+    state = {"done": False}
+
+    def encode(texts):
+        if not state["done"]:
+            # Un écrivain ajoute, modifie et supprime pendant le passage complet
+            state["done"] = True
+            captions["new.jpg"] = "nouvelle image"
+            captions["img1.jpg"] = "légende modifiée"
+            source.append({"new.jpg": [0.0, 1.0], "img1.jpg": [0.5, 0.5]}, deleted=["img2.jpg"])
+        return _encoder(2)(texts)
+
+    job = ReembeddingJob(registry, "new", encode, lambda: dict(captions), rate=0, batch_size=2)
+    assert job.run() is True
+
+    vectors = SegmentLog(registry.active()["dir"]).load()
+    assert sorted(vectors) == ["img0.jpg", "img1.jpg", "img3.jpg", "new.jpg"]
+    assert vectors["img1.jpg"] == _encoder(2)(["légende modifiée"])[0].tolist()
+    assert registry.read()["previous"]["generation"] == source.generation
+
+
+def test_reembed_resumes_after_interruption(tmp_path):
+    """Teste la reprise d'une construction interrompue sans ré-encoder ce qui est fait."""
+    registry, source, captions = _setup(tmp_path, n=6)
+    captions = {f"img{i}.jpg": f"légende {i}" for i in range(6)}
+    calls = []
+
+    def failing(texts):
+        if len(calls) == 1:
+            raise KeyboardInterrupt
+        return _encoder(2, calls)(texts)
+
+    job = ReembeddingJob(registry, "new", failing, lambda: captions, rate=0, batch_size=2)
+    try:
+        job.run()
+    except KeyboardInterrupt:
+        pass
+    assert registry.read()["building"]["model"] == "new"
+    assert registry.active()["model"] == "old"
+
+    calls.clear()
+    assert ReembeddingJob(registry, "new", _encoder(2, calls), lambda: captions, rate=0, batch_size=2).run()
+    assert sum(len(batch) for batch in calls) == 4
+    assert len(SegmentLog(registry.active()["dir"]).load()) == 6
+
+
+def test_reembed_throttles(tmp_path):
+    """Teste que le débit d'encodage est limité à `rate` légendes par seconde."""
+    registry, _, _ = _setup(tmp_path, n=10)
+    captions = {f"img{i}.jpg": f"légende {i}" for i in range(10)}
+    now = [0.0]
+    sleeps = []
+
+    def sleep(delay):
+        sleeps.append(delay)
+        now[0] += delay
+
+    job = ReembeddingJob(registry, "new", _encoder(2), lambda: captions, rate=5, batch_size=5,
+                         sleep=sleep, clock=lambda: now[0])
+    job.run()
+    # 10 légendes à 5/s: au moins 2 secondes au total
+    assert now[0] >= 2.0 - 1e-9
+    assert len(sleeps) == 2
+
+
+def test_writes_to_previous_version_are_carried_over(tmp_path):
+    """Teste le rattrapage des embeddings écrits dans l'ancienne version après la bascule."""
+    registry, source, captions = _setup(tmp_path, n=2)
+    assert ReembeddingJob(registry, "new", _encoder(2), lambda: captions, rate=0).run()
+
+    # Un écrivain lancé avant la bascule continue sur l'ancien journal
+    source.append({"late.jpg": [1.0, 1.0]}, deleted=["img0.jpg"])
+    captions["late.jpg"] = "arrivée tardive"
+    job = ReembeddingJob(registry, "new", _encoder(2), lambda: captions, rate=0)
+    assert job.run() is False
+
+    vectors = SegmentLog(registry.active()["dir"]).load()
+    assert sorted(vectors) == ["img1.jpg", "late.jpg"]
+    assert registry.read()["previous"]["generation"] == source.generation
+
+
+def test_registry_paths_are_relative(tmp_path):
+    """Teste que le registre reste valide si le dossier de données est déplacé."""
+    registry, _, captions = _setup(tmp_path, n=1)
+    ReembeddingJob(registry, "new", _encoder(2), lambda: captions, rate=0).run()
+    stored = json.loads((tmp_path / "versions.json").read_text())
+    assert stored["active"]["dir"] == "embeddings-new"
+    assert stored["previous"]["dir"] == "embeddings"
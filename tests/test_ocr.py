@@ -0,0 +1,109 @@
+import sys
+import threading
+import types
+
+import pytest
+from PIL import Image
+
+import scripts.ocr as ocr
+from scripts.ocr import OCRProcessor
+
+
+class _StubAPI:
+    """API tesserocr factice: mémorise ses créations et les images reçues."""
+    instances = []
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.images = []
+        self.thread = threading.get_ident()
+        _StubAPI.instances.append(self)
+
+    def SetImage(self, image):
+        self.images.append(image)
+
+    def GetUTF8Text(self):
+        return "texte reconnu"
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    _StubAPI.instances = []
+    monkeypatch.setitem(sys.modules, "tesserocr", types.SimpleNamespace(PyTessBaseAPI=_StubAPI))
+    monkeypatch.setattr(ocr, "OCR_PATH", str(tmp_path / "ocr.json"))
+    monkeypatch.setattr(ocr, "TESSDATA_PATH", "")
+
+    def no_subprocess(image, lang=None):
+        raise AssertionError("pytesseract appelé")
+
+    monkeypatch.setattr(ocr, "pytesseract", types.SimpleNamespace(image_to_string=no_subprocess))
+    processor = OCRProcessor()
+    processor.engine = "tesserocr"
+    return processor
+
+
+def test_one_api_per_thread(processor):
+    """Teste que l'API (modèles de langue) est créée une fois par thread, puis réutilisée."""
+    image = Image.new("RGB", (8, 8))
+    assert processor._recognize(image) == "texte reconnu"
+    assert processor._recognize(image) == "texte reconnu"
+    assert len(_StubAPI.instances) == 1
+    assert _StubAPI.instances[0].kwargs == {"lang": ocr.OCR_LANGUAGE}
+
+    threads = [threading.Thread(target=processor._recognize, args=(image,)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(_StubAPI.instances) == 3
+    assert len({api.thread for api in _StubAPI.instances}) == 3
+
+
+def test_new_api_after_fork(processor, monkeypatch):
+    """Teste qu'un processus enfant (autre pid) ne réutilise pas l'API du parent."""
+    image = Image.new("RGB", (8, 8))
+    processor._recognize(image)
+    monkeypatch.setattr(ocr.os, "getpid", lambda: -1)
+    processor._recognize(image)
+    processor._recognize(image)
+    assert len(_StubAPI.instances) == 2
+
+
+def test_images_passed_in_memory(processor):
+    """Teste que l'image est transmise en mémoire (convertie si le mode n'est pas accepté)."""
+    rgb = Image.new("RGB", (8, 8))
+    palette = Image.new("P", (8, 8))
+    processor._recognize(rgb)
+    processor._recognize(palette)
+    [api] = _StubAPI.instances
+    assert api.images[0] is rgb
+    assert api.images[1].mode == "RGB" and api.images[1].size == (8, 8)
+
+
+@pytest.mark.parametrize("failure", [ImportError, RuntimeError])
+def test_fallback_to_pytesseract(processor, monkeypatch, failure):
+    """Teste le repli sur pytesseract si tesserocr est absent ou ne s'initialise pas."""
+    if failure is ImportError:
+        monkeypatch.setitem(sys.modules, "tesserocr", None)
+    else:
+        def broken(**kwargs):
+            raise RuntimeError("Failed to init API")
+        monkeypatch.setitem(sys.modules, "tesserocr", types.SimpleNamespace(PyTessBaseAPI=broken))
+    calls = []
+    monkeypatch.setattr(ocr, "pytesseract", types.SimpleNamespace(
+        image_to_string=lambda image, lang=None: calls.append(lang) or "repli"))
+
+    image = Image.new("RGB", (8, 8))
+    assert processor._recognize(image) == "repli"
+    assert processor.engine == "pytesseract"
+    assert processor._recognize(image) == "repli"
+    assert calls == [ocr.OCR_LANGUAGE] * 2
+
+
+def test_no_engine_available(processor, monkeypatch, tmp_path):
+    """Teste le message d'erreur lorsque ni tesserocr ni pytesseract ne sont installés."""
+    monkeypatch.setitem(sys.modules, "tesserocr", None)
+    monkeypatch.setattr(ocr, "pytesseract", None)
+    path = tmp_path / "scan.png"
+    Image.new("RGB", (8, 8)).save(path)
+    assert processor.run_ocr(str(path)) == "Erreur: Tesseract non disponible"
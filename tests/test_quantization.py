@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from scripts.quantization import make_codec, evaluate_codec
+from scripts.vector_store import VectorStore
+
+
+def _normalized(n=1000, dim=48, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(10, dim))
+    vectors = centers[rng.integers(10, size=n)] + 0.5 * rng.normal(size=(n, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+
+@pytest.mark.parametrize("name,min_recall", [("float16", 0.99), ("int8", 0.9), ("pq", 0.4)])
+def test_codec_recall(name, min_recall):
+    """Teste la qualité de classement de chaque codec par rapport au float32."""
+    matrix = _normalized()
+    codec = make_codec(name, m=12) if name == "pq" else make_codec(name)
+    codec.fit(matrix)
+    result = evaluate_codec(codec, matrix, matrix[:30], top_k=10)
+    assert result["recall"] >= min_recall
+
+
+def test_codec_size():
+    """Teste le nombre d'octets par vecteur de chaque codec."""
+    matrix = _normalized()
+    sizes = {}
+    for name in ("float32", "float16", "int8", "pq"):
+        codec = make_codec(name, m=12) if name == "pq" else make_codec(name)
+        codec.fit(matrix)
+        sizes[name] = evaluate_codec(codec, matrix, matrix[:1])["bytes_per_vector"]
+    assert sizes == {"float32": 192, "float16": 96, "int8": 48, "pq": 12}
+
+
+def test_pq_rerank_improves_recall():
+    """Teste que le reclassement float32 améliore le rappel du PQ."""
+    matrix = _normalized()
+    codec = make_codec("pq", m=6)
+    codec.fit(matrix)
+    plain = evaluate_codec(codec, matrix, matrix[:30], top_k=10)
+    reranked = evaluate_codec(codec, matrix, matrix[:30], top_k=10, rerank=200)
+    assert reranked["recall"] > plain["recall"]
+
+
+def test_vector_store_mapping_and_search(tmp_path):
+    """Teste le stockage compressé: accès exact, remplacement et recherche."""
+    matrix = _normalized(n=300)
+    store = VectorStore(make_codec("int8"), str(tmp_path / "raw.f32"), rerank=20)
+    store.update({f"img_{i}.jpg": matrix[i].tolist() for i in range(200)})
+    store.update({f"img_{i}.jpg": matrix[i].tolist() for i in range(150, 300)})
+
+    assert len(store) == 300
+    assert np.allclose(store["img_10.jpg"], matrix[10])
+
+    store.update({"img_0.jpg": matrix[299].tolist()})
+    assert len(store) == 300
+    assert np.allclose(store["img_0.jpg"], matrix[299])
+
+    results = store.search(matrix[42], top_k=3)
+    assert results[0][0] == "img_42.jpg"
+    assert results[0][1] == pytest.approx(1.0, abs=1e-4)
+    assert store.nbytes == 300 * 48
+
+
+def test_vector_store_remove(tmp_path):
+    """Teste la suppression : dernière ligne déplacée, fichier brut tronqué."""
+    matrix = _normalized(50, 16)
+    raw_path = tmp_path / "raw.f32"
+    store = VectorStore(make_codec("int8"), str(raw_path), rerank=10)
+    store.update({f"img_{i}.jpg": matrix[i].tolist() for i in range(50)})
+
+    store.remove(["img_3.jpg", "img_49.jpg", "absente.jpg"])
+    assert len(store) == 48 and "img_3.jpg" not in store
+    assert raw_path.stat().st_size == 48 * 16 * 4
+    assert np.allclose(store["img_48.jpg"], matrix[48])
+    assert store.search(matrix[48], top_k=1)[0][0] == "img_48.jpg"
+    assert all(f != "img_3.jpg" for f, _ in store.search(matrix[3], top_k=5))
+
+    store.update({"img_3.jpg": matrix[3].tolist()})
+    assert len(store) == 49 and store.search(matrix[3], top_k=1)[0][0] == "img_3.jpg"
@@ -0,0 +1,88 @@
+import csv
+import threading
+
+import pytest
+
+pytest.importorskip("sentence_transformers")
+
+import scripts.search as search
+from scripts.search import ImageSearchEngine
+
+
+class _NoStore:
+    store = None
+
+
+def _write_rows(path, start, count, header=False):
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["filename", "width", "height", "format"])
+        if header:
+            writer.writeheader()
+        for i in range(start, start + count):
+            writer.writerow({"filename": f"img{i}.jpg", "width": 800, "height": 600, "format": "JPEG"})
+
+
+def test_refresh_during_metadata_search(tmp_path, monkeypatch):
+    """Teste que des recherches concurrentes d'un rafraîchissement qui ajoute des lignes n'échouent pas."""
+    path = str(tmp_path / "metadata.csv")
+    monkeypatch.setattr(search, "METADATA_PATH", path)
+    monkeypatch.setattr(search, "SERVING_INDEX", False)
+    monkeypatch.setattr(search, "metadata_extractor", _NoStore())
+    _write_rows(path, 0, 2000, header=True)
+    engine = ImageSearchEngine()
+    assert len(engine.search_by_metadata({"min_width": 640})) == 2000
+
+    errors = []
+    done = threading.Event()
+
+    def searcher():
+        while not done.is_set():
+            try:
+                engine.search_by_metadata({"min_width": 640, "format": "jpeg"})
+            except Exception as e:
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=searcher) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    try:
+        for start in range(2000, 6000, 20):
+            _write_rows(path, start, 20)
+            assert engine._refresh_metadata() == 20
+    finally:
+        done.set()
+        for thread in threads:
+            thread.join()
+
+    assert errors == []
+    assert len(engine.search_by_metadata({"min_width": 640})) == 6000
+
+
+def test_parquet_refresh_after_compaction(tmp_path, monkeypatch):
+    """Teste qu'une fusion de partition ne ramène pas une version plus ancienne d'une image."""
+    from datetime import date, datetime
+
+    import scripts.metadata_store as metadata_store
+    from scripts.metadata_store import MetadataStore
+
+    class _Extractor:
+        store = MetadataStore(str(tmp_path / "metadata"))
+
+    def record(name, width, mtime=1.0):
+        return {"filename": name, "filepath": f"/x/{name}", "size_bytes": 1, "mtime": mtime,
+                "extracted_at": datetime.now(), "width": width, "height": 1}
+
+    monkeypatch.setattr(search, "SERVING_INDEX", False)
+    monkeypatch.setattr(search, "metadata_extractor", _Extractor())
+    store = _Extractor.store
+    store.append([record("a.jpg", 10)], date(2024, 5, 1))
+    store.append([record("b.jpg", 20)], date(2024, 5, 1))
+    store.append([record("a.jpg", 11, mtime=2.0)], date(2024, 5, 2))
+    engine = ImageSearchEngine()
+    assert engine.metadata["a.jpg"]["width"] == 11
+
+    monkeypatch.setattr(metadata_store, "METADATA_COMPACTION_THRESHOLD", 1)
+    store.append([record("c.jpg", 30)], date(2024, 5, 1))
+    engine._refresh_metadata()
+    assert engine.metadata["a.jpg"]["width"] == 11 and engine.metadata["c.jpg"]["width"] == 30
@@ -0,0 +1,157 @@
+import os
+import json
+import numpy as np
+import pytest
+from scripts.segment_log import SegmentLog, MANIFEST_NAME
+
+
+def test_append_and_reload(tmp_path):
+    """Teste que les segments sont rejoués dans l'ordre, suppressions comprises."""
+    log = SegmentLog(str(tmp_path))
+    log.append({"a.jpg": [1.0, 0.0], "b.jpg": [0.0, 1.0]})
+    log.append({"a.jpg": [0.5, 0.5]}, deleted=["b.jpg"])
+    assert log.generation == 2
+
+    embeddings = SegmentLog(str(tmp_path)).load()
+    assert embeddings == {"a.jpg": [0.5, 0.5]}
+
+
+def test_incremental_read(tmp_path):
+    """Teste la lecture des seuls segments postérieurs à une génération."""
+    log = SegmentLog(str(tmp_path))
+    first = log.append({"a.jpg": [1.0]})
+    log.append({"b.jpg": [2.0]})
+    new_ids = [ids for _, ids, _, _ in log.iter_segments(since_generation=first)]
+    assert new_ids == [["b.jpg"]]
+
+
+def test_compaction_keeps_content(tmp_path):
+    """Teste que la compaction fusionne les segments sans changer le contenu."""
+    log = SegmentLog(str(tmp_path))
+    for i in range(5):
+        log.append({f"img_{i}.jpg": [float(i)]}, deleted=["img_0.jpg"] if i == 3 else ())
+    before = log.load()
+
+    log.compact()
+    assert log.segment_count == 1
+    assert log.generation == 5
+    assert log.load() == before
+    assert sorted(os.listdir(tmp_path)) == [MANIFEST_NAME, "seg-00000006.npy", "seg-00000006.npz"]
+
+
+
+def test_reload_during_compaction_keeps_reserved_segment(tmp_path):
+    """Teste qu'une relecture et un ajout pendant une compaction ne réutilisent pas son segment."""
+    log = SegmentLog(str(tmp_path))
+    for i in range(3):
+        log.append({f"img_{i}.jpg": [float(i)]})
+    write_blocks = log._write_segment_blocks
+    compacting = []
+
+    def interleaved(name, *args):
+        write_blocks(name, *args)
+        if not compacting:
+            # Pendant la compaction (fichier fusionné écrit, manifeste pas encore publié)
+            compacting.append(name)
+            log.read_changes(0)
+            log.append({"new.jpg": [9.0]})
+
+    log._write_segment_blocks = interleaved
+    log.compact()
+
+    names = [segment["name"] for segment in log.manifest["segments"]]
+    assert names == ["seg-00000004.npz", "seg-00000005.npz"]
+    expected = {"img_0.jpg": [0.0], "img_1.jpg": [1.0], "img_2.jpg": [2.0], "new.jpg": [9.0]}
+    assert log.load() == expected
+    assert SegmentLog(str(tmp_path)).load() == expected
+
+def test_uncommitted_segment_is_ignored(tmp_path):
+    """Teste qu'un segment écrit sans mise à jour du manifeste (crash) est invisible."""
+    log = SegmentLog(str(tmp_path))
+    log.append({"a.jpg": [1.0]})
+    log._write_segment("seg-00000099.npz", ["b.jpg"], np.ones((1, 1)), [])
+
+    with open(tmp_path / MANIFEST_NAME, encoding="utf-8") as f:
+        assert len(json.load(f)["segments"]) == 1
+    assert SegmentLog(str(tmp_path)).load() == {"a.jpg": [1.0]}
+
+
+def test_read_changes_deltas_and_reset_after_compaction(tmp_path):
+    """Teste la lecture des seuls changements, et la reprise complète après une compaction non lue."""
+    writer = SegmentLog(str(tmp_path))
+    reader = SegmentLog(str(tmp_path))
+    generation, reset, changes = reader.read_changes(0)
+    assert (generation, reset, changes) == (0, True, [])
+
+    writer.append({"a.jpg": [1.0], "b.jpg": [2.0]})
+    generation, reset, changes = reader.read_changes(0)
+    assert generation == 1 and reset and [c[0] for c in changes] == [["a.jpg", "b.jpg"]]
+
+    writer.append({"a.jpg": [3.0]}, deleted=["b.jpg"])
+    generation, reset, changes = reader.read_changes(1)
+    assert generation == 2 and not reset
+    [(ids, vectors, deleted)] = changes
+    assert ids == ["a.jpg"] and vectors.tolist() == [[3.0]] and deleted == ["b.jpg"]
+    assert reader.read_changes(2) == (2, False, [])
+
+    writer.append({"c.jpg": [4.0]})
+    writer.compact()
+    # Lecteur à jour avant la compaction: seul le segment suivant est nouveau
+    writer.append({"d.jpg": [5.0]})
+    generation, reset, changes = reader.read_changes(3)
+    assert generation == 4 and not reset and [c[0] for c in changes] == [["d.jpg"]]
+    # Lecteur en retard: état complet depuis le segment compacté
+    generation, reset, changes = reader.read_changes(2)
+    assert reset and [sorted(c[0]) for c in changes] == [["a.jpg", "c.jpg"], ["d.jpg"]]
+
+
+def test_append_deletions_only(tmp_path):
+    """Teste un segment ne contenant que des suppressions."""
+    log = SegmentLog(str(tmp_path))
+    log.append({"a.jpg": [1.0], "b.jpg": [2.0]})
+    assert log.append({}, deleted=["a.jpg"]) == 2
+    assert SegmentLog(str(tmp_path)).load() == {"b.jpg": [2.0]}
+
+
+def test_model_tag(tmp_path):
+    """Teste que chaque segment porte le modèle de ses vecteurs et qu'un autre modèle est refusé."""
+    log = SegmentLog(str(tmp_path), model="minilm")
+    log.append({"a.jpg": [1.0]})
+    log.compact()
+    log.append({"b.jpg": [2.0]})
+    assert SegmentLog(str(tmp_path)).model == "minilm"
+    assert {s["model"] for s in log.manifest["segments"]} == {"minilm"}
+
+    other = SegmentLog(str(tmp_path), model="mpnet")
+    with pytest.raises(ValueError):
+        other.append({"c.jpg": [3.0]})
+    assert SegmentLog(str(tmp_path)).load() == {"a.jpg": [1.0], "b.jpg": [2.0]}
+
+
+def test_vectors_are_memory_mapped(tmp_path):
+    """Teste que les vecteurs des segments (compactés compris) sont lus en mémoire mappée."""
+    log = SegmentLog(str(tmp_path))
+    for i in range(3):
+        log.append({f"img_{i}_{j}.jpg": [float(i), float(j)] for j in range(4)})
+    log.compact()
+    [(_, ids, vectors, _)] = list(log.iter_segments())
+    assert isinstance(vectors, np.memmap) and vectors.shape == (12, 2)
+
+    chunks = list(log.iter_current(chunk_size=5))
+    assert [len(chunk_ids) for chunk_ids, _ in chunks] == [5, 5, 2]
+    assert dict(zip(ids, vectors.tolist())) == log.load()
+
+
+def test_legacy_segments_are_readable(tmp_path):
+    """Teste la lecture d'un segment écrit avec ses vecteurs dans le .npz, et sa compaction."""
+    log = SegmentLog(str(tmp_path))
+    log.append({"a.jpg": [1.0, 0.0]})
+    with open(tmp_path / "seg-00000001.npz", "wb") as f:
+        np.savez(f, ids=np.array(["a.jpg"]), vectors=np.array([[1.0, 0.0]], dtype=np.float32),
+                 deleted=np.array([], dtype=str))
+    os.remove(tmp_path / "seg-00000001.npy")
+    log.append({"b.jpg": [0.0, 1.0]})
+
+    assert SegmentLog(str(tmp_path)).load() == {"a.jpg": [1.0, 0.0], "b.jpg": [0.0, 1.0]}
+    log.compact()
+    assert log.load() == {"a.jpg": [1.0, 0.0], "b.jpg": [0.0, 1.0]}
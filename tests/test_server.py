@@ -0,0 +1,137 @@
+import json
+import asyncio
+from scripts.model_versions import ModelMismatchError
+from scripts.server import SearchService, MicroBatcher
+
+
+class FakeEmbeddingManager:
+    def __init__(self):
+        self.embeddings_cache = {"mer.jpg": [1.0, 0.0], "ville.jpg": [0.0, 1.0]}
+        self.calls = []
+        self.model = "minilm"
+        # Modèle activé juste après le prochain encodage (changement de version concurrent)
+        self.switch_to = None
+
+    def count(self):
+        return len(self.embeddings_cache)
+
+    def encode_batch(self, texts):
+        self.calls.append(list(texts))
+        return [[1.0, 0.0] if "mer" in t else [0.0, 1.0] for t in texts]
+
+    def encode_queries(self, texts):
+        tagged = [(self.model, v) for v in self.encode_batch(texts)]
+        if self.switch_to:
+            self.model, self.switch_to = self.switch_to, None
+        return tagged
+
+    def search_by_vector(self, vector, top_k, model=None):
+        if model is not None and model != self.model:
+            raise ModelMismatchError(model)
+        scores = {f: sum(a * b for a, b in zip(v, vector)) for f, v in self.embeddings_cache.items()}
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:top_k]
+
+
+class FakeSearchEngine:
+    def search_by_metadata(self, filters):
+        return ["ville.jpg"] if filters.get("format") == "PNG" else ["mer.jpg", "ville.jpg"]
+
+    def search_by_tags(self, tags, mode="any"):
+        return ["mer.jpg"] if "mer" in tags else []
+
+
+def test_micro_batcher_coalesces_concurrent_queries():
+    """Teste que des requêtes simultanées sont encodées en un seul lot."""
+    manager = FakeEmbeddingManager()
+
+    async def scenario():
+        batcher = MicroBatcher(manager.encode_batch, max_batch=8, window_ms=50)
+        batcher.start()
+        vectors = await asyncio.gather(*(batcher.encode(q) for q in ["mer", "ville", "mer bleue"]))
+        await batcher.stop()
+        return vectors, batcher
+
+    vectors, batcher = asyncio.run(scenario())
+    assert vectors == [[1.0, 0.0], [0.0, 1.0], [1.0, 0.0]]
+    assert manager.calls == [["mer", "ville", "mer bleue"]]
+    assert batcher.batch_sizes.summary()["max"] == 3
+
+
+def test_http_endpoints():
+    """Teste les routes de l'API via une vraie connexion HTTP."""
+    service = SearchService(FakeSearchEngine(), FakeEmbeddingManager(), window_ms=1)
+
+    async def request(port, method, path, body=None):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        data = json.dumps(body).encode() if body is not None else b""
+        writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(data)}\r\n"
+                     f"Connection: close\r\n\r\n".encode() + data)
+        response = await reader.read()
+        writer.close()
+        head, _, payload = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(payload)
+
+    async def scenario():
+        ready = asyncio.get_running_loop().create_future()
+        server = asyncio.create_task(service.serve("127.0.0.1", 0, ready))
+        port = await ready
+        responses = [
+            await request(port, "GET", "/search/text?q=mer&k=1"),
+            await request(port, "POST", "/search/metadata", {"format": "PNG"}),
+            await request(port, "GET", "/search/tags?tags=mer"),
+            await request(port, "POST", "/search/hybrid", {"text": "mer", "filters": {"format": "PNG"}}),
+            await request(port, "GET", "/search/text"),
+            await request(port, "GET", "/inconnu"),
+            await request(port, "GET", "/stats"),
+        ]
+        server.cancel()
+        return responses
+
+    text, metadata, tags, hybrid, missing, unknown, stats = asyncio.run(scenario())
+    assert text == (200, {"results": [{"filename": "mer.jpg", "score": 1.0}]})
+    assert metadata == (200, {"results": ["ville.jpg"]})
+    assert tags == (200, {"results": ["mer.jpg"]})
+    assert hybrid == (200, {"results": [{"filename": "ville.jpg", "score": 0.0}]})
+    assert missing[0] == 400 and unknown[0] == 404
+    assert stats[1]["latency_ms"]["/search/text"]["count"] == 2
+    assert stats[1]["batch_size"]["count"] == 2
+    assert stats[1]["indexed"] == 2
+
+
+def test_query_reencoded_after_model_switch_and_input_limits():
+    """Teste le ré-encodage d'une requête après un changement de modèle, et les limites des requêtes."""
+    manager = FakeEmbeddingManager()
+    service = SearchService(FakeSearchEngine(), manager, window_ms=1, max_body=64)
+
+    async def raw_request(port, data):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(data)
+        response = await reader.read()
+        writer.close()
+        head, _, payload = response.partition(b"\r\n\r\n")
+        return int(head.split()[1]), json.loads(payload)
+
+    def request(port, method, path, body=b""):
+        return raw_request(port, f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+                                 f"Connection: close\r\n\r\n".encode() + body)
+
+    async def scenario():
+        ready = asyncio.get_running_loop().create_future()
+        server = asyncio.create_task(service.serve("127.0.0.1", 0, ready))
+        port = await ready
+        manager.switch_to = "mpnet"
+        responses = [
+            await request(port, "GET", "/search/text?q=mer&k=1"),
+            await request(port, "GET", "/search/text?q=mer&k=0"),
+            await request(port, "POST", "/search/hybrid", json.dumps({"text": "mer", "limit": -1}).encode()),
+            await request(port, "POST", "/search/metadata", b"{" + b" " * 100 + b"}"),
+            await raw_request(port, b"POST /search/metadata HTTP/1.1\r\nContent-Length: abc\r\n\r\n"),
+        ]
+        server.cancel()
+        return responses
+
+    switched, zero, negative, too_large, invalid = asyncio.run(scenario())
+    assert switched == (200, {"results": [{"filename": "mer.jpg", "score": 1.0}]})
+    assert manager.calls == [["mer"], ["mer"]] and manager.model == "mpnet"
+    assert zero[0] == negative[0] == 400
+    assert too_large[0] == 413 and invalid[0] == 400
@@ -0,0 +1,150 @@
+import os
+import numpy as np
+import pytest
+from scripts.ann_index import _normalize, exact_search
+from scripts.model_versions import ModelMismatchError
+from scripts.serving_index import ServingIndex, publish_serving_index
+
+
+def _embeddings(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    return {f"{i:04d}_é.jpg": v.tolist() for i, v in enumerate(rng.normal(size=(n, dim)))}
+
+
+def test_publish_and_search_memory_mapped(tmp_path):
+    """Teste que l'index publié est mappé et donne les résultats de la recherche exacte."""
+    embeddings = _embeddings(200)
+    publish_serving_index(embeddings, str(tmp_path))
+    index = ServingIndex(str(tmp_path))
+
+    assert index.generation == "gen-000001"
+    assert isinstance(index._generation.vectors, np.memmap)
+    assert len(index) == 200 and "0007_é.jpg" in index and "absente.jpg" not in index
+    assert sorted(index) == sorted(embeddings)
+    np.testing.assert_allclose(index["0007_é.jpg"], _normalize(embeddings["0007_é.jpg"])[0], rtol=1e-6)
+
+    ids = list(embeddings)
+    matrix = _normalize([embeddings[i] for i in ids])
+    query = np.random.default_rng(1).normal(size=16)
+    expected = exact_search(ids, matrix, query, 5)
+    assert [i for i, _ in index.search(query, 5)] == [i for i, _ in expected]
+
+
+def test_reload_swaps_generation(tmp_path):
+    """Teste la bascule atomique et la suppression des anciennes générations."""
+    publish_serving_index(_embeddings(10), str(tmp_path))
+    index = ServingIndex(str(tmp_path))
+    assert not index.reload()
+
+    old = index._generation
+    for seed in (1, 2):
+        publish_serving_index(_embeddings(20, seed=seed), str(tmp_path), keep=2)
+    assert sorted(os.listdir(tmp_path)) == ["CURRENT", "gen-000002", "gen-000003"]
+    assert index.reload() and index.generation == "gen-000003"
+    assert len(index) == 20
+    # Une recherche commencée sur l'ancienne génération reste valide
+    assert len(old.ids) == 10 and old.vectors.shape == (10, 16)
+
+    publish_serving_index({}, str(tmp_path))
+    assert index.reload() and len(index) == 0 and index.search([1.0] * 16) == []
+    assert not ServingIndex.exists(str(tmp_path / "vide"))
+
+
+
+def test_publish_streams_from_segment_log(tmp_path):
+    """Teste qu'une génération publiée par blocs depuis le journal est identique à celle du dictionnaire."""
+    from scripts.segment_log import SegmentLog
+
+    embeddings = _embeddings(120)
+    ids = list(embeddings)
+    log = SegmentLog(str(tmp_path / "segments"))
+    for start in range(0, 120, 25):
+        log.append({i: embeddings[i] for i in reversed(ids[start:start + 25])})
+    log.append({ids[0]: [1.0] * 16}, deleted=[ids[1]])
+    embeddings[ids[0]] = [1.0] * 16
+    del embeddings[ids[1]]
+
+    publish_serving_index(embeddings, str(tmp_path / "dict"))
+    publish_serving_index(log.iter_current(7), str(tmp_path / "log"), block_size=10)
+    expected, streamed = ServingIndex(str(tmp_path / "dict")), ServingIndex(str(tmp_path / "log"))
+
+    assert list(streamed) == list(expected) == sorted(embeddings)
+    np.testing.assert_array_equal(streamed._generation.vectors, expected._generation.vectors)
+    assert sorted(os.listdir(tmp_path / "log" / "gen-000001")) == ["ids.npy", "vectors.npy"]
+
+def test_published_model(tmp_path):
+    """Teste que le modèle des vecteurs suit la génération publiée."""
+    from scripts.serving_index import published_model
+
+    publish_serving_index(_embeddings(3), str(tmp_path))
+    index = ServingIndex(str(tmp_path))
+    assert index.model is None and published_model(str(tmp_path)) is None
+
+    publish_serving_index(_embeddings(3, dim=8), str(tmp_path), model="mpnet")
+    assert published_model(str(tmp_path)) == "mpnet"
+    assert index.model is None
+    index.reload()
+    assert index.model == "mpnet"
+    assert len(index.search([1.0] * 8, 1, model="mpnet")) == 1
+    with pytest.raises(ModelMismatchError):
+        index.search([1.0] * 8, 1, model="minilm")
+
+
+def test_serving_index_bypasses_process_ann_index(tmp_path, monkeypatch):
+    """Teste qu'un processus de service cherche dans l'index partagé, pas dans un index ANN local."""
+    pytest.importorskip("sentence_transformers")
+    from scripts.embeddings import embedding_manager
+
+    class StaleIndex:
+        is_trained = True
+
+        def search(self, query, top_k):
+            raise AssertionError("index ANN du processus interrogé")
+
+    embeddings = _embeddings(50)
+    publish_serving_index(embeddings, str(tmp_path))
+    monkeypatch.setattr(embedding_manager, "_embeddings_cache", ServingIndex(str(tmp_path)))
+    monkeypatch.setattr(embedding_manager, "ann_index", StaleIndex())
+    monkeypatch.setattr(embedding_manager, "sharded_index", StaleIndex())
+
+    query = embeddings["0003_é.jpg"]
+    assert embedding_manager.search_by_vector(query, 1)[0][0] == "0003_é.jpg"
+
+
+def test_writer_uses_active_version_not_published_model(tmp_path, monkeypatch):
+    """Teste qu'un processus qui a servi l'ancien index écrit dans la version active, avec son modèle."""
+    pytest.importorskip("sentence_transformers")
+    import scripts.embeddings as embeddings
+    from scripts.model_versions import VersionRegistry
+    from scripts.segment_log import SegmentLog
+
+    class Encoder:
+        name = "test"
+
+    serving_dir = str(tmp_path / "serving")
+    segment_dir = str(tmp_path / "embeddings-new")
+    publish_serving_index(_embeddings(5), serving_dir, model="old")
+    manager = embeddings.embedding_manager
+    monkeypatch.setattr(embeddings, "SERVING_INDEX_DIR", serving_dir)
+    monkeypatch.setattr(embeddings, "EMBEDDING_STORAGE", "segments")
+    monkeypatch.setattr(embeddings, "CAPTION_CACHE_ENABLED", False)
+    monkeypatch.setattr(embeddings, "load_text_encoder", lambda model: (None, Encoder()))
+    monkeypatch.setattr(manager, "registry", VersionRegistry(
+        str(tmp_path / "versions.json"), segment_dir, default_model="new"))
+    monkeypatch.setattr(manager, "model_id", "new")
+    monkeypatch.setattr(manager, "segment_dir", segment_dir)
+    monkeypatch.setattr(manager, "_serving", True)
+    for name in ("segment_log", "_embeddings_cache", "_matrix", "caption_cache",
+                 "ann_index", "sharded_index", "cluster_index"):
+        monkeypatch.setattr(manager, name, None)
+
+    # Lecture: requêtes encodées avec le modèle des vecteurs publiés
+    assert isinstance(manager.embeddings_cache, ServingIndex)
+    assert manager.model_id == "old"
+
+    # Écriture: modèle et dossier de la version active
+    manager.store_embeddings({"x.jpg": [1.0] * 16})
+    assert manager.model_id == "new" and not manager._serving
+    log = SegmentLog(segment_dir)
+    assert log.model == "new" and list(log.load()) == ["x.jpg"]
+    manager.segment_log.stop_background_compaction()
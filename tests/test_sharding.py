@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+from scripts.ann_index import exact_search, _normalize
+from scripts.sharding import DEFAULT_AUTHKEY, ShardedIndex, listen_authkey, shard_for
+
+
+def test_shard_for_is_stable():
+    """Teste que l'affectation d'un shard est déterministe et bornée."""
+    assert shard_for("photo.jpg", 4) == shard_for("photo.jpg", 4)
+    assert {shard_for(f"img_{i}.jpg", 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+def test_scatter_gather_matches_exact_search():
+    """Teste que la fusion des top-k par shard donne le top-k global exact."""
+    rng = np.random.default_rng(0)
+    matrix = _normalize(rng.normal(size=(600, 16)))
+    ids = [f"img_{i}.jpg" for i in range(600)]
+
+    with ShardedIndex(n_shards=3) as index:
+        index.add({i: v.tolist() for i, v in zip(ids[:400], matrix[:400])})
+        index.add({i: v.tolist() for i, v in zip(ids[400:], matrix[400:])})
+        assert len(index) == 600
+        assert index.ping()
+
+        for query in matrix[:5]:
+            expected = exact_search(ids, matrix, query, top_k=10)
+            results = index.search(query, top_k=10)
+            assert [i for i, _ in results] == [i for i, _ in expected]
+
+
+def test_listen_authkey_requires_explicit_key_off_loopback():
+    """Teste que la clé par défaut n'est acceptée que sur la boucle locale."""
+    assert listen_authkey("127.0.0.1", "", "SHARD_AUTHKEY") == DEFAULT_AUTHKEY.encode()
+    assert listen_authkey("localhost", "", "SHARD_AUTHKEY") == DEFAULT_AUTHKEY.encode()
+    with pytest.raises(ValueError, match="SHARD_AUTHKEY"):
+        listen_authkey("0.0.0.0", "", "SHARD_AUTHKEY")
+    assert listen_authkey("0.0.0.0", "secret", "SHARD_AUTHKEY") == b"secret"
+
+
+def test_pq_shards_use_codec_kwargs_and_remove():
+    """Teste que les shards PQ reçoivent leurs paramètres (m) et que les suppressions sont réparties."""
+    rng = np.random.default_rng(1)
+    matrix = _normalize(rng.normal(size=(300, 16)))
+    ids = [f"img_{i}.jpg" for i in range(300)]
+
+    # m=48 par défaut ne divise pas 16: l'ajout échouerait sans codec_kwargs
+    with ShardedIndex(n_shards=2, codec_name="pq", rerank=50, codec_kwargs={"m": 4}) as index:
+        index.add({i: v.tolist() for i, v in zip(ids, matrix)})
+        assert index.search(matrix[7], top_k=1)[0][0] == "img_7.jpg"
+        index.remove(["img_7.jpg", "absente.jpg"])
+        assert len(index) == 299
+        assert "img_7.jpg" not in [i for i, _ in index.search(matrix[7], top_k=5)]
+
+
+def test_dead_shard_gives_partial_results():
+    """Teste qu'un shard arrêté donne des résultats partiels au lieu de faire échouer la recherche."""
+    rng = np.random.default_rng(3)
+    matrix = _normalize(rng.normal(size=(60, 16)))
+    ids = [f"img_{i}.jpg" for i in range(60)]
+
+    with ShardedIndex(n_shards=3) as index:
+        index.add({i: v.tolist() for i, v in zip(ids, matrix)})
+        lost = {i for i in ids if shard_for(i, 3) == 1}
+        index._processes[1].kill()
+        index._processes[1].join()
+
+        results = index.search(matrix[0], top_k=60)
+        assert index.failed == {1}
+        assert {i for i, _ in results} == set(ids) - lost
+        assert len(index) == 60 - len(lost)
+        assert not index.ping()
+        with pytest.raises(RuntimeError):
+            index.add({"new.jpg": matrix[0].tolist()})
+
+
+def test_coordinator_streams_log_to_shards_without_holding_vectors(tmp_path, monkeypatch):
+    """Teste que le coordinateur alimente les shards depuis le journal sans garder les vecteurs."""
+    pytest.importorskip("sentence_transformers")
+    import scripts.embeddings as embeddings
+    from scripts.segment_log import SegmentLog
+
+    rng = np.random.default_rng(2)
+    matrix = _normalize(rng.normal(size=(50, 16)))
+    segment_dir = str(tmp_path / "embeddings")
+    log = SegmentLog(segment_dir)
+    log.append({f"img_{i}.jpg": v.tolist() for i, v in enumerate(matrix[:40])})
+    log.append({f"img_{i}.jpg": v.tolist() for i, v in enumerate(matrix[40:], 40)})
+
+    manager = embeddings.embedding_manager
+    monkeypatch.setattr(embeddings, "EMBEDDING_STORAGE", "segments")
+    monkeypatch.setattr(embeddings, "EMBEDDING_SHARDS", 2)
+    monkeypatch.setattr(embeddings, "STREAM_CHUNK_SIZE", 16)
+    monkeypatch.setattr(manager, "segment_dir", segment_dir)
+    for name in ("_embeddings_cache", "_matrix", "ann_index", "sharded_index", "cluster_index"):
+        monkeypatch.setattr(manager, name, None)
+    monkeypatch.setattr(manager, "_follow_active_version", lambda: False)
+    manager._start_shards()
+    try:
+        assert manager.count() == 50 and manager.generation == 2
+        assert manager.search_by_vector(matrix[45].tolist(), 1)[0][0] == "img_45.jpg"
+
+        # Changements publiés par un autre écrivain: transmis aux shards
+        log.append({"new.jpg": matrix[0].tolist()}, deleted=["img_0.jpg"])
+        stats = manager.refresh()
+        assert (stats["added"], stats["removed"], stats["generation"]) == (1, 1, 3)
+        assert manager.search_by_vector(matrix[0].tolist(), 1)[0][0] == "new.jpg"
+        assert manager.count() == 50
+        assert manager._embeddings_cache is None
+
+        # Shard perdu: redémarré et réalimenté depuis le journal au prochain refresh
+        manager.sharded_index._processes[0].kill()
+        manager.sharded_index._processes[0].join()
+        assert len(manager.search_by_vector(matrix[1].tolist(), 50)) < 50
+        assert manager.refresh()["reset"]
+        assert not manager.sharded_index.failed and manager.count() == 50
+    finally:
+        manager.sharded_index.close()
@@ -0,0 +1,206 @@
+import io
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+from PIL import Image
+
+import scripts.ingest as ingest
+from scripts.ingest import ImageIngestor
+from scripts.storage import LocalStorage, S3Storage, Storage, iter_prefetched, open_storage
+
+
+class _ClientError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class FakeS3Client:
+    """Client S3 minimal en mémoire (pages de `page_size` objets)."""
+
+    def __init__(self, page_size=2):
+        self.objects = {}
+        self.page_size = page_size
+        self.calls = []
+
+    def list_objects_v2(self, Bucket, Prefix, Delimiter, ContinuationToken=None):
+        self.calls.append(("list", ContinuationToken))
+        keys = sorted(k for k in self.objects if k.startswith(Prefix) and Delimiter not in k[len(Prefix):])
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + self.page_size]
+        response = {
+            "Contents": [{"Key": k, "Size": len(self.objects[k]),
+                          "LastModified": datetime(2024, 1, 1, tzinfo=timezone.utc)} for k in page],
+            "IsTruncated": start + self.page_size < len(keys),
+        }
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = str(start + self.page_size)
+        return response
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise _ClientError("404")
+        return {"ContentLength": len(self.objects[Key]), "LastModified": datetime(2024, 1, 1, tzinfo=timezone.utc)}
+
+    def get_object(self, Bucket, Key, Range=None):
+        self.calls.append(("get", Key, Range))
+        if Key not in self.objects:
+            raise _ClientError("NoSuchKey")
+        data = self.objects[Key]
+        if Range:
+            start, _, end = Range[len("bytes="):].partition("-")
+            data = data[int(start):int(end) + 1 if end else None]
+        return {"Body": io.BytesIO(data)}
+
+    def put_object(self, Bucket, Key, Body):
+        self.objects[Key] = bytes(Body)
+
+
+def test_local_storage(tmp_path):
+    """Teste la liste, la lecture partielle et l'écriture d'un dossier local."""
+    storage = open_storage(str(tmp_path))
+    assert isinstance(storage, LocalStorage)
+    storage.write("a.jpg", b"0123456789")
+    storage.write("b.png", b"xy")
+    (tmp_path / "sous-dossier").mkdir()
+
+    assert sorted(info.key for info in storage.list()) == ["a.jpg", "b.png"]
+    assert [info.key for info in storage.list("a")] == ["a.jpg"]
+    assert storage.stat("a.jpg").size == 10
+    assert storage.read("a.jpg") == b"0123456789"
+    assert storage.read("a.jpg", 3, 4) == b"3456"
+    assert storage.local_path("a.jpg") == str(tmp_path / "a.jpg")
+    with pytest.raises(FileNotFoundError):
+        storage.stat("absent.jpg")
+    assert list(LocalStorage(str(tmp_path / "absent")).list()) == []
+
+
+
+def test_storage_interface_is_abstract():
+    """Teste qu'une implémentation incomplète est refusée dès sa création."""
+    class Partial(Storage):
+        def read(self, key, start=0, length=None):
+            return b""
+
+    with pytest.raises(TypeError):
+        Storage()
+    with pytest.raises(TypeError):
+        Partial()
+
+def test_s3_storage():
+    """Teste le stockage S3: pagination, préfixe, plages d'octets et objets absents."""
+    client = FakeS3Client(page_size=2)
+    storage = S3Storage("photos", "raw/", client=client)
+    for i in range(5):
+        storage.write(f"img{i}.jpg", bytes(range(10)))
+    client.objects["raw/sous/ignore.jpg"] = b""
+    client.objects["autre/img.jpg"] = b""
+
+    assert [info.key for info in storage.list()] == [f"img{i}.jpg" for i in range(5)]
+    assert [c for c in client.calls if c[0] == "list"] == [("list", None), ("list", "2"), ("list", "4")]
+    assert storage.stat("img0.jpg").size == 10
+    assert storage.read("img1.jpg", 2, 3) == b"\x02\x03\x04"
+    assert storage.read("img1.jpg", 8) == b"\x08\x09"
+    assert storage.read("img1.jpg", 0, 0) == b""
+    assert client.calls[-1] == ("get", "raw/img1.jpg", "bytes=8-")
+    with pytest.raises(FileNotFoundError):
+        storage.stat("absent.jpg")
+    with pytest.raises(FileNotFoundError):
+        storage.read("absent.jpg")
+    assert storage.local_path("img0.jpg") is None
+
+
+class _SlowStorage:
+    """Lecture lente qui compte les lectures simultanées."""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def read(self, key):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if key == "casse":
+            raise OSError("lecture impossible")
+        return key.encode()
+
+
+def test_prefetch_order_window_and_errors():
+    """Teste que le préchargement garde l'ordre, borne les lectures et transmet les erreurs."""
+    storage = _SlowStorage()
+    keys = [f"k{i}" for i in range(12)] + ["casse", "fin"]
+    results = list(iter_prefetched(storage, keys, window=3))
+
+    assert [key for key, _ in results] == keys
+    assert results[0][1] == b"k0" and results[-1][1] == b"fin"
+    assert isinstance(results[-2][1], OSError)
+    assert 1 < storage.max_active <= 3
+
+
+def test_prefetch_overlaps_reads():
+    """Teste que les lectures se recouvrent (latence masquée)."""
+    storage = _SlowStorage(delay=0.05)
+    start = time.perf_counter()
+    assert len(list(iter_prefetched(storage, [f"k{i}" for i in range(8)], window=8))) == 8
+    assert time.perf_counter() - start < 8 * 0.05
+
+
+def test_prefetch_lists_keys_off_the_loop():
+    """Teste qu'un listing paresseux (pages S3) est parcouru hors du thread de la boucle."""
+    storage = _SlowStorage()
+    threads = []
+
+    def listing():
+        for i in range(6):
+            threads.append(threading.current_thread().name)
+            yield f"k{i}"
+
+    results = list(iter_prefetched(storage, listing(), window=3))
+    assert [key for key, _ in results] == [f"k{i}" for i in range(6)]
+    assert threads and all(name.startswith("prefetch-list") for name in threads)
+
+
+def test_prefetch_stops_early():
+    """Teste qu'un arrêt anticipé de l'appelant libère la boucle et les threads."""
+    storage = _SlowStorage()
+    results = iter_prefetched(storage, (f"k{i}" for i in range(100)), window=4)
+    assert next(results) == ("k0", b"k0")
+    results.close()
+    assert not any(t.name == "prefetch-loop" for t in threading.enumerate())
+
+
+def _png(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 24), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_ingest_from_s3(tmp_path, monkeypatch, workers):
+    """Teste l'ingestion depuis un stockage objet: doublons, erreurs et ordre conservés."""
+    monkeypatch.setattr(ingest, "PROCESSED_IMAGE_DIR", str(tmp_path / "processed"))
+    (tmp_path / "processed").mkdir()
+    storage = S3Storage("photos", "raw", client=FakeS3Client())
+    storage.write("a.png", _png("red"))
+    storage.write("b.png", _png("green"))
+    storage.write("copie.png", _png("red"))
+    storage.write("casse.jpg", b"pas une image")
+    keys = ["a.png", "b.png", "copie.png", "casse.jpg", "absent.jpg"]
+
+    ingestor = ImageIngestor()
+    results = list(ingestor.ingest_objects(storage, keys, workers=workers, window=2))
+
+    assert [key for key, _ in results] == keys
+    outputs = [None if p is None else p.rsplit("/", 1)[1] for _, p in results]
+    assert outputs == ["a.png", "b.png", None, None, None]
+    assert ingestor.duplicates == ["copie.png"]
+    with Image.open(results[0][1]) as image:
+        assert image.format == "JPEG" and image.size == (32, 24)
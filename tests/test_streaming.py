@@ -0,0 +1,103 @@
+import csv
+import json
+import tracemalloc
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from scripts.checkpoint import PipelineCheckpoint
+from scripts.streaming import chunked, merged_items, write_json_object
+
+
+def test_write_json_object_matches_json_dump(tmp_path):
+    """Teste que l'écriture en flux produit le même fichier que json.dump."""
+    data = {"a.jpg": ["mer", "plage"], "é.png": "Texte\nsur deux lignes", "b.jpg": {"k": [1, 2]}}
+    path = tmp_path / "out.json"
+    assert write_json_object(str(path), data.items()) == 3
+    assert path.read_text(encoding="utf-8") == json.dumps(data, indent=2, ensure_ascii=False)
+
+    write_json_object(str(path), iter(()))
+    assert json.loads(path.read_text()) == {}
+
+
+def test_merged_items_and_chunked():
+    """Teste la priorité des mises à jour et le découpage en morceaux."""
+    merged = dict(merged_items([("a", 1), ("b", 2), ("a", 9)], {"a": 0, "c": 3}))
+    assert merged == {"a": 1, "b": 2, "c": 3}
+    assert [len(c) for c in chunked(range(7), 3)] == [3, 3, 1]
+
+
+def test_pipeline_results_memory_ceiling(tmp_path, monkeypatch):
+    """
+    Teste que la mémoire reste bornée sur un grand corpus synthétique :
+    20 000 résultats (~40 Mo de texte OCR, ~30 Mo d'embeddings float32)
+    traversent checkpoints, stockage des embeddings et export final avec un
+    pic d'allocation de quelques Mo seulement.
+    """
+    pytest.importorskip("sentence_transformers")
+    import scripts.embeddings as embeddings
+    from scripts.model_versions import VersionRegistry
+    from scripts.segment_log import SegmentLog
+
+    manager = embeddings.embedding_manager
+    segment_dir = str(tmp_path / "embeddings")
+    monkeypatch.setattr(embeddings, "EMBEDDING_STORAGE", "segments")
+    monkeypatch.setattr(manager, "registry", VersionRegistry(
+        str(tmp_path / "versions.json"), segment_dir, default_model=manager.model_id))
+    monkeypatch.setattr(manager, "segment_dir", segment_dir)
+    for name in ("segment_log", "_embeddings_cache", "_matrix", "caption_cache",
+                 "ann_index", "sharded_index", "cluster_index"):
+        monkeypatch.setattr(manager, name, None)
+    monkeypatch.setattr(manager, "_serving", False)
+
+    text = "x" * 2000
+    rng = np.random.default_rng(0)
+    checkpoint = PipelineCheckpoint(str(tmp_path / "checkpoint"), every=200, interval=1e9)
+    checkpoint.reset()
+
+    tracemalloc.start()
+    try:
+        for i in range(20000):
+            checkpoint.record(f"{i:06d}.jpg", text, ["mer", "plage"], rng.random(384, dtype=np.float32).tolist())
+            if checkpoint.should_flush():
+                checkpoint.flush(manager.store_embeddings)
+        checkpoint.flush(manager.store_embeddings)
+        count = write_json_object(
+            str(tmp_path / "ocr_results.json"),
+            merged_items(((r["filename"], r["text"]) for r in checkpoint.iter_results()), {}),
+        )
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        if manager.segment_log is not None:
+            manager.segment_log.stop_background_compaction()
+
+    assert count == 20000
+    assert manager._embeddings_cache is None
+    assert sum(len(ids) for ids, _ in SegmentLog(segment_dir).iter_current()) == 20000
+    # Noms des images traitées (reprise) et un lot d'embeddings en attente ;
+    # les vecteurs du corpus en listes Python occuperaient ~245 Mo
+    assert peak < 12 * 2**20
+
+
+def test_save_metadata_memory_ceiling(tmp_path, monkeypatch, capsys):
+    """Teste que l'extraction des métadonnées n'accumule pas les lignes en mémoire."""
+    import scripts.extract_metadata as extract_metadata
+
+    for i in range(300):
+        Image.new("RGB", (8, 8), (i % 256, 0, 0)).save(tmp_path / f"{i:04d}.jpg")
+    output = tmp_path / "out" / "metadata.csv"
+    output.parent.mkdir()
+    monkeypatch.setattr(extract_metadata, "METADATA_PATH", str(output))
+
+    tracemalloc.start()
+    extractor = extract_metadata.MetadataExtractor()
+    extractor.storage = "csv"
+    extractor.save_metadata(str(tmp_path))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with open(output, newline="", encoding="utf-8") as f:
+        assert sum(1 for _ in csv.DictReader(f)) == 300
+    assert peak < 2 * 2**20
@@ -0,0 +1,72 @@
+import json
+import numpy as np
+from scripts.tag_taxonomy import TagTaxonomy, load_taxonomy
+
+# Chaque texte a un axe: les features d'une image sont une combinaison d'axes
+AXES = ["animal", "ville", "chien", "chat", "voiture", "route", "jour", "nuit"]
+
+
+class _Encoder:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, texts):
+        self.calls += 1
+        return np.array([np.eye(len(AXES))[AXES.index(t)] for t in texts], dtype=np.float32)
+
+
+def _image(**weights):
+    vector = np.zeros(len(AXES), dtype=np.float32)
+    for name, weight in weights.items():
+        vector[AXES.index(name)] = weight
+    return vector[None, :]
+
+
+def _taxonomy(tmp_path):
+    path = tmp_path / "taxonomy.json"
+    path.write_text(json.dumps({
+        "animal": ["chien", "chat"],
+        "ville": ["voiture", "route", "chien"],
+        "moment": {"always": True, "prompt": "jour", "children": ["jour", "nuit"]},
+    }), encoding="utf-8")
+    return TagTaxonomy.from_file(str(path))
+
+
+def test_load_taxonomy_dedups_labels(tmp_path):
+    """Teste la lecture de la taxonomie et l'unicité des tags partagés entre catégories."""
+    taxonomy = _taxonomy(tmp_path)
+    assert taxonomy.parents == ["animal", "ville", "moment"]
+    assert taxonomy.labels == ["chien", "chat", "voiture", "route", "jour", "nuit"]
+    assert taxonomy.children[1].tolist() == [2, 3, 0]
+    assert taxonomy.always == [2]
+    assert load_taxonomy(str(tmp_path / "taxonomy.json"))["moment"]["prompt"] == "jour"
+
+
+def test_select_prunes_and_thresholds(tmp_path):
+    """Teste la sélection catégorie puis tags, multi-label et bornée."""
+    taxonomy = _taxonomy(tmp_path)
+    taxonomy.encode(_Encoder())
+
+    # Chien et chat proches: deux tags au-dessus du seuil, plus le moment (catégorie always)
+    [tags] = taxonomy.select(_image(animal=1, chien=1, chat=0.9, jour=1), 10.0, max_parents=1)
+    assert [t for t, _ in tags] == ["jour", "chien", "chat"]
+    assert all(p >= 0.1 for _, p in tags)
+
+    # Voiture n'est pas évaluée: la catégorie ville est écartée
+    [tags] = taxonomy.select(_image(animal=1, chien=1, voiture=1), 10.0, max_parents=1)
+    assert "voiture" not in [t for t, _ in tags] and "chien" in [t for t, _ in tags]
+
+    [tags] = taxonomy.select(_image(animal=1, chien=1, jour=1), 10.0, max_tags=1)
+    assert len(tags) == 1
+
+
+def test_encode_uses_cache(tmp_path):
+    """Teste que les features ne sont recalculées que si la taxonomie ou le modèle change."""
+    cache = str(tmp_path / "features.npz")
+    encoder = _Encoder()
+    _taxonomy(tmp_path).encode(encoder, "clip", cache)
+    cached = _taxonomy(tmp_path)
+    cached.encode(encoder, "clip", cache)
+    assert encoder.calls == 2 and cached.child_features.shape == (6, len(AXES))
+    _taxonomy(tmp_path).encode(encoder, "autre", cache)
+    assert encoder.calls == 4
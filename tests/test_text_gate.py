@@ -0,0 +1,58 @@
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from scripts.text_gate import TextPresenceGate, stroke_features, evaluate_gate
+
+
+def _document(path):
+    image = Image.new("RGB", (1200, 1600), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=24)
+    for i in range(30):
+        draw.text((40, 40 + i * 50), "Facture numéro 12345 montant total 120,00", fill="black", font=font)
+    image.save(path)
+
+
+def _photo(path, seed=0):
+    rng = np.random.default_rng(seed)
+    base = np.clip(rng.normal(size=(30, 40, 3)) * 60 + 128, 0, 255).astype(np.uint8)
+    Image.fromarray(base).resize((1600, 1200), Image.BICUBIC).save(path)
+
+
+def test_stroke_features_separate_text_and_photo(tmp_path):
+    """Teste que les documents ont plus de traits contrastés que les photos."""
+    _document(tmp_path / "doc.png")
+    _photo(tmp_path / "photo.jpg")
+    doc = stroke_features(Image.open(tmp_path / "doc.png"))
+    photo = stroke_features(Image.open(tmp_path / "photo.jpg"))
+    assert doc["edge_density"] > 10 * photo["edge_density"]
+    assert doc["text_rows"] > photo["text_rows"]
+
+
+def test_gate_evaluation(tmp_path):
+    """Teste précision, rappel et taux d'OCR évités sur un échantillon annoté."""
+    labels = {}
+    for i in range(3):
+        _document(tmp_path / f"doc{i}.png")
+        _photo(tmp_path / f"photo{i}.jpg", seed=i)
+        labels[f"doc{i}.png"] = True
+        labels[f"photo{i}.jpg"] = False
+
+    gate = TextPresenceGate("edges", verbose=False)
+    result = evaluate_gate(gate, labels, str(tmp_path))
+    assert result == {"images": 6, "precision": 1.0, "recall": 1.0, "skip_rate": 0.5}
+    assert gate.stats == {"checked": 6, "skipped": 3}
+
+
+def test_gate_clip_and_off(tmp_path):
+    """Teste la décision par tags CLIP et la désactivation."""
+    gate = TextPresenceGate("clip", verbose=False)
+    assert gate.decide("a.jpg", tags=["document", "intérieur"])[0]
+    assert not gate.decide("b.jpg", tags=["mer", "paysage"])[0]
+    assert TextPresenceGate("off").decide("c.jpg")[0]
+
+    # Compteurs transmis par un worker au processus principal
+    stats = gate.drain_stats()
+    assert stats == {"checked": 2, "skipped": 1} and gate.stats == {"checked": 0, "skipped": 0}
+    gate.merge_stats(stats)
+    gate.merge_stats(stats)
+    assert gate.stats == {"checked": 4, "skipped": 2}
@@ -0,0 +1,67 @@
+import os
+import time
+import threading
+import pytest
+from scripts.watcher import FolderWatchDaemon, InotifyWatcher
+
+
+def _run_daemon(tmp_path, use_inotify, actions):
+    images = tmp_path / "raw"
+    images.mkdir()
+    (images / "old.jpg").write_bytes(b"ancienne image")
+    batches = []
+    daemon = FolderWatchDaemon(
+        str(images), lambda paths: batches.append(sorted(os.path.basename(p) for p in paths)),
+        str(tmp_path / "state.json"), {".jpg"}, quiet_period=0.3, poll_interval=0.05,
+        use_inotify=use_inotify,
+    )
+    stop = threading.Event()
+    thread = threading.Thread(target=daemon.run, args=(stop,))
+    thread.start()
+    try:
+        actions(images)
+        time.sleep(1.0)
+    finally:
+        stop.set()
+        thread.join()
+    return batches
+
+
+@pytest.mark.parametrize("use_inotify", [False, True])
+def test_new_files_are_debounced(tmp_path, use_inotify):
+    """Teste qu'un fichier écrit en plusieurs fois n'est traité qu'une fois, une fois stable."""
+    if use_inotify:
+        try:
+            InotifyWatcher(str(tmp_path)).close()
+        except OSError:
+            pytest.skip("inotify indisponible")
+
+    def actions(images):
+        with open(images / "new.jpg", "wb") as f:
+            for _ in range(3):
+                f.write(b"x" * 1000)
+                f.flush()
+                time.sleep(0.1)
+        (images / "notes.txt").write_text("ignoré")
+
+    batches = _run_daemon(tmp_path, use_inotify, actions)
+    assert sorted(sum(batches, [])) == ["new.jpg", "old.jpg"]
+
+
+def test_restart_only_processes_changes(tmp_path):
+    """Teste qu'au redémarrage seuls les fichiers modifiés sont retraités."""
+    _run_daemon(tmp_path, False, lambda images: None)
+    images = tmp_path / "raw"
+    state = tmp_path / "state.json"
+
+    (images / "old.jpg").write_bytes(b"image modifiee")
+    batches = []
+    daemon = FolderWatchDaemon(str(images), batches.append, str(state), {".jpg"}, quiet_period=0.1,
+                               poll_interval=0.05, use_inotify=False)
+    stop = threading.Event()
+    thread = threading.Thread(target=daemon.run, args=(stop,))
+    thread.start()
+    time.sleep(0.5)
+    stop.set()
+    thread.join()
+    assert [[os.path.basename(p) for p in batch] for batch in batches] == [["old.jpg"]]
@@ -0,0 +1,75 @@
+import gc
+import os
+import pytest
+from scripts.worker_pool import ModelWorkerPool
+
+# "Modèle" chargé dans le parent avant le fork
+_WEIGHTS = {"scale": 3}
+
+
+def _scaled(x):
+    if x == "boom":
+        raise ValueError("boom")
+    return x * _WEIGHTS["scale"], os.getpid()
+
+
+def _crash_once(x):
+    marker = f"{x}.crashed"
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return x
+
+
+def _crash_always(x):
+    os._exit(1)
+
+
+def test_pool_results_and_errors():
+    """Teste la répartition des tâches et le report des erreurs par élément."""
+    with ModelWorkerPool(_scaled, workers=2) as pool:
+        results = pool.map([1, 2, "boom", 4])
+        again = pool.map([5])
+    assert [r[2][0] for r in results if r[1]] == [3, 6, 12]
+    assert results[2][1] is False and "ValueError" in results[2][2]
+    assert again[0][2][1] != os.getpid()
+
+
+def test_pool_persistent_workers():
+    """Teste que les mêmes workers traitent les lots successifs."""
+    with ModelWorkerPool(_scaled, workers=2) as pool:
+        first = {r[2][1] for r in pool.map(range(20))}
+        second = {r[2][1] for r in pool.map(range(20))}
+        assert first == second == {w.process.pid for w in pool.workers}
+        assert pool.health_check() == 0
+        # Le parent rend ses objets au GC une fois les workers forkés
+        assert gc.get_freeze_count() == 0
+
+
+def test_pool_restarts_crashed_worker(tmp_path):
+    """Teste le redémarrage d'un worker planté et la nouvelle tentative."""
+    item = str(tmp_path / "image")
+    with ModelWorkerPool(_crash_once, workers=1) as pool:
+        assert pool.map([item]) == [(item, True, item)]
+        assert pool.restarts == 1
+
+    with ModelWorkerPool(_crash_always, workers=1, max_retries=1) as pool:
+        (_, ok, error), = pool.map(["x"])
+        assert not ok and "arrêté" in error
+        assert pool.restarts == 2
+        assert pool.health_check() == 0
+
+
+def test_pool_timeout():
+    """Teste l'abandon d'une tâche trop longue."""
+    import time
+    with ModelWorkerPool(time.sleep, workers=1, task_timeout=0.2) as pool:
+        (_, ok, error), = pool.map([30])
+        assert not ok and "délai" in error
+        assert pool.map([0])[0][1]
+
+
+def test_pool_inline():
+    """Teste l'exécution dans le processus courant sans workers."""
+    pool = ModelWorkerPool(_scaled, workers=0)
+    assert pool.map([2])[0][2] == (6, os.getpid())
@@ -5,6 +5,7 @@ import pandas as pd
 from datetime import datetime
 from scripts.search import search_engine
 from scripts.embeddings import embedding_manager
+from scripts.clustering import top_tags
 from config.settings import PROCESSED_IMAGE_DIR, IMAGE_DIR
 
 st.set_page_config(page_title="Photothèque Intelligente", page_icon="📸", layout="wide")
@@ -44,6 +45,10 @@ def display_image_grid(images, cols=3):
 def main():
     """Fonction principale de l'application."""
 
+    # Nouvelles images indexées depuis le dernier passage (au plus toutes les
+    # INDEX_POLL_INTERVAL secondes, changements seulement)
+    search_engine.poll()
+
     # En-tête
     st.title("📸 Photothèque Intelligente")
     st.markdown("**Exploration et recherche intelligente de vos images avec IA**")
@@ -54,7 +59,7 @@ def main():
         st.header("⚙️ Menu")
         page = st.radio(
             "Sélectionnez une page:",
-            ["Accueil", "Recherche", "Galerie", "Détails", "Gestion"],
+            ["Accueil", "Recherche", "Galerie", "Clusters", "Détails", "Gestion"],
         )
 
     # Page: Accueil
@@ -65,7 +70,7 @@ def main():
             st.subheader("📊 Statistiques")
             images = get_all_images()
             st.metric("Images importées", len(images))
-            st.metric("Embeddings indexés", len(embedding_manager.embeddings_cache))
+            st.metric("Embeddings indexés", embedding_manager.count())
 
         with col2:
             st.subheader("ℹ️ À propos")
@@ -168,6 +173,27 @@ def main():
         else:
             st.info("Aucune image importée. Importez d'abord des images.")
 
+    # Page: Clusters
+    elif page == "Clusters":
+        st.subheader("🧭 Parcourir par cluster")
+
+        clusters = embedding_manager.cluster_index
+        if clusters is None or not len(clusters):
+            st.info("Aucun cluster. Construisez-les avec: python -m scripts.clustering")
+        else:
+            groups = clusters.groups()
+            order = sorted(groups, key=lambda c: -len(groups[c]))
+            labels = {c: ", ".join(top_tags(groups[c], search_engine.tags)) for c in order}
+            selected = st.selectbox(
+                "Sélectionnez un cluster:", order,
+                format_func=lambda c: f"Cluster {c} — {len(groups[c])} images — {labels[c] or 'sans tag'}",
+            )
+            cols = st.slider("Colonnes", 1, 6, 3, key="cluster_cols")
+            limit = st.slider("Images affichées", 3, 60, 24, key="cluster_limit")
+            # Les images les plus proches du centroïde d'abord (les plus représentatives)
+            members = [f for f in groups[selected] if os.path.exists(os.path.join(PROCESSED_IMAGE_DIR, f))]
+            display_image_grid(members[:limit], cols=cols)
+
     # Page: Détails
     elif page == "Détails":
         st.subheader("📋 Détails des Images")
@@ -224,13 +250,13 @@ def main():
             with col1:
                 st.markdown("**Embeddings**")
                 st.info(
-                    f"✅ {len(embedding_manager.embeddings_cache)} embeddings indexés"
+                    f"✅ {embedding_manager.count()} embeddings indexés"
                 )
 
             with col2:
                 st.markdown("**Cache**")
                 st.info(
-                    f"🗂️ Taille du cache: {len(embedding_manager.embeddings_cache)} entrées"
+                    f"🗂️ Taille du cache: {embedding_manager.count()} entrées"
                 )
 
         with tab2:
@@ -238,9 +264,12 @@ def main():
 
             if st.button("🔄 Actualiser l'index"):
                 with st.spinner("Actualisation en cours..."):
-                    embedding_manager._load_existing_embeddings()
-                    search_engine.metadata = search_engine._load_metadata()
-                    st.success("✅ Index actualisé!")
+                    stats = search_engine.refresh()
+                    st.success(
+                        f"✅ Index actualisé (génération {stats['generation']}): "
+                        f"{stats['added']} ajoutés, {stats['updated']} modifiés, "
+                        f"{stats['removed']} supprimés, {stats['metadata']} métadonnées"
+                    )
 
             st.divider()
 